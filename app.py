@@ -1,5 +1,5 @@
-from flask import Flask, render_template, request, jsonify, session
-from flask_socketio import SocketIO, emit
+from flask import Flask, Response, render_template, request, jsonify, session
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms as client_rooms
 import json
 import os
 import threading
@@ -7,6 +7,25 @@ import time
 from datetime import datetime
 import logging
 from chat_downloader import ChatDownloader
+from chat_pipeline import ChatPipeline
+from chat_history import record_to_dict
+from ranking_journal import RankingJournal
+from sqlite_store import SQLiteStore, SQLiteQuestionList, storage_backend
+from quiz_scheduler import TimerService, PHASE_RESULTS
+from quiz_room import (QuizRoom, RoomManager, RoomVoteBroadcaster, DEFAULT_ROOM, ROOM_CONFIG_KEYS, room_channel,
+                       topic_channel, event_channel, parse_topics, validate_room_id)
+from question_model import CompiledQuestions, QuestionError, compile_question, validate_questions, packet_json, dumps
+from question_store import (QuestionStore, QuestionConflict, QuestionNotFound, FACETS, WRITE_MODES, DEFAULT_PAGE_SIZE,
+                            MAX_PAGE_SIZE, list_page, list_facets, json_array_chunks, merge_question, question_etag)
+from question_import import ImportFormatError, import_stream
+from question_search import QuestionSearchIndex
+from question_history import QuestionHistory
+from question_order import DEFAULT_ORDER, QuestionCatalog, validate_order
+from quiz_cluster import QuizCluster
+from shared_state import BrokerClientManager, create_state_backend
+from event_stream import BroadcastHub
+from state_versions import etag_matches, stable_phase, cursor_of, parse_cursor, pieces_changed
+from connection_registry import ConnectionRegistry
 import random
 import re
 import socket
@@ -14,6 +33,7 @@ import socket
 # Configuração para estabilidade de longo prazo
 import sys
 import gc
+import atexit
 
 # Configurar coleta de lixo mais agressiva
 gc.set_threshold(700, 10, 10)  # Valores mais baixos = coleta mais frequente
@@ -33,6 +53,20 @@ is_production = os.environ.get('FLASK_ENV') == 'production'
 # Usar threading em todos os ambientes para maior compatibilidade
 async_mode = 'threading'
 
+# Vários workers: estado compartilhado (STATE_BACKEND) e fila de mensagens do Socket.IO
+# (SOCKETIO_MESSAGE_QUEUE) para que os envios de qualquer worker cheguem a todos os sockets.
+# Aceitam 'tcp://host:porta' (broker local, state_broker.py) ou 'redis://...'
+STATE_BACKEND = os.environ.get('STATE_BACKEND', 'local')
+SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE', '')
+
+# Opções do SocketIO para a fila de mensagens configurada
+def socketio_queue_options():
+    if not SOCKETIO_MESSAGE_QUEUE:
+        return {}
+    if SOCKETIO_MESSAGE_QUEUE.startswith('tcp://'):
+        return {'client_manager': BrokerClientManager(SOCKETIO_MESSAGE_QUEUE)}
+    return {'message_queue': SOCKETIO_MESSAGE_QUEUE}
+
 socketio = SocketIO(
     app, 
     cors_allowed_origins="*", 
@@ -46,7 +80,9 @@ socketio = SocketIO(
     manage_session=False,     # Não gerenciar sessões para reduzir overhead
     logger=False,             # Desativar logging para reduzir I/O
     engineio_logger=False,    # Desativar logging do engine para reduzir I/O
-    http_compression=False    # Desativar compressão para reduzir CPU
+    http_compression=False,   # Desativar compressão para reduzir CPU
+    json=packet_json,         # Perguntas enviadas com o JSON pré-codificado
+    **socketio_queue_options()
 )
 
 # Diretório para armazenar dados
@@ -59,6 +95,20 @@ CONFIG_FILE = os.path.join(DATA_DIR, 'config.json')
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
+# Armazenamento opcional em SQLite (QUIZ_STORAGE=sqlite); o padrão continua sendo JSON
+QUIZ_DB_PATH = os.environ.get('QUIZ_DB_PATH', os.path.join(DATA_DIR, 'quiz.db'))
+sqlite_store = SQLiteStore(QUIZ_DB_PATH) if storage_backend() == 'sqlite' else None
+
+# Banco de perguntas indexado (questions.jsonl + questions.idx), lido sob demanda
+question_store = QuestionStore(DATA_DIR)
+
+# Busca textual nas perguntas (índice em memória) e histórico das perguntas feitas
+search_index = QuestionSearchIndex()
+question_history = QuestionHistory(DATA_DIR)
+
+# Categorias e taxas de acerto por pergunta, pré-calculadas para a ordem das perguntas ('question_order')
+question_catalog = QuestionCatalog(question_history)
+
 # Configurações padrão do quiz
 quiz_config = {
     'youtube_url': '',
@@ -67,102 +117,90 @@ quiz_config = {
     'result_display_time': 5,
     'primary_color': '#f39c12',
     'secondary_color': '#8e44ad',
-    'enable_chat_simulator': True
+    'enable_chat_simulator': True,
+    'vote_policy': 'last',  # 'last', 'first' ou 'lock'
+    'vote_lock_seconds': 0,  # Com 'lock': segundos em que a troca de voto é permitida
+    'question_order': 'sequential'  # 'sequential', 'shuffle', 'category' ou 'adaptive'
 }
 
 # Carregar configurações do arquivo JSON
 def load_config():
     """Carrega as configurações do arquivo config.json."""
-    global quiz_config
     try:
-        if os.path.exists(CONFIG_FILE):
+        if sqlite_store:
+            loaded_config = sqlite_store.load_config()
+            if loaded_config:
+                quiz_config.update(loaded_config)
+            else:
+                save_config()
+        elif os.path.exists(CONFIG_FILE):
             with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
                 loaded_config = json.load(f)
                 # Atualizar configuração com os valores carregados
                 quiz_config.update(loaded_config)
         else:
             # Configuração padrão
-            quiz_config = {
+            quiz_config.update({
                 'youtube_url': '',
                 'answer_time': 20,
                 'vote_count_time': 8,
                 'result_display_time': 5,
                 'primary_color': '#f39c12',
                 'secondary_color': '#8e44ad',
-                'enable_chat_simulator': True
-            }
+                'enable_chat_simulator': True,
+                'vote_policy': 'last',
+                'vote_lock_seconds': 0,
+                'question_order': 'sequential'
+            })
             save_config()
     except Exception as e:
         logger.error(f"Erro ao carregar configurações: {str(e)}")
         # Configuração padrão em caso de erro
-        quiz_config = {
+        quiz_config.update({
             'youtube_url': '',
             'answer_time': 20,
             'vote_count_time': 8,
             'result_display_time': 5,
             'primary_color': '#f39c12',
             'secondary_color': '#8e44ad',
-            'enable_chat_simulator': True
-        }
+            'enable_chat_simulator': True,
+            'vote_policy': 'last',
+            'vote_lock_seconds': 0,
+            'question_order': 'sequential'
+        })
 
 # Salvar configurações em arquivo JSON
 def save_config():
     try:
+        if sqlite_store:
+            sqlite_store.save_config(quiz_config)
+            logger.info("Configurações salvas com sucesso")
+            return
         with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
             json.dump(quiz_config, f, ensure_ascii=False, indent=4)
         logger.info("Configurações salvas com sucesso")
     except Exception as e:
         logger.error(f"Erro ao salvar configurações: {e}")
 
-current_question_index = 0
-current_question = None
-quiz_running = False
 chat_thread = None
-quiz_thread = None
-user_votes = {}  # Armazena votos por usuário para a pergunta atual
-voted_users = set()  # Armazena usuários que já votaram na pergunta atual
 questions = []
-ranking = {}
-current_votes = [0, 0, 0, 0]
+compiled_questions = CompiledQuestions(questions)  # Perguntas prontas para envio (parte pública e resposta)
 
 # Variável para rastrear o tempo de início do servidor
 server_start_time = time.time()
 
 # Variáveis globais para o chat
-chat_messages = []  # Lista para armazenar mensagens do chat
+CHAT_HISTORY_SIZE = int(os.environ.get('CHAT_HISTORY_SIZE', 1000))
 is_chat_running = False  # Controla se o chat está em execução
 is_simulator_running = False  # Controla especificamente se o simulador está em execução
 
 # Função para adicionar uma mensagem ao chat
 def add_chat_message(author, message):
     try:
-        # Adicionar mensagem ao histórico
-        global chat_messages
         timestamp = time.time()
-        chat_messages.append({
-            'author': author,
-            'message': message,
-            'timestamp': timestamp
-        })
-        
-        # Limitar o número de mensagens armazenadas (manter apenas as 100 últimas)
-        if len(chat_messages) > 100:
-            chat_messages = chat_messages[-100:]
-        
-        # Emitir evento de mensagem de chat em uma thread separada para não bloquear
-        def emit_message():
-            try:
-                socketio.emit('chat_message', {
-                    'author': author,
-                    'message': message
-                })
-            except Exception as e:
-                logger.error(f"Erro ao emitir mensagem de chat: {e}")
         
-        # Iniciar thread para emitir mensagem
-        message_thread = threading.Thread(target=emit_message)
-        message_thread.daemon = True
-        message_thread.start()
+        # O consumidor do pipeline grava a mensagem no histórico e a retransmite
+        chat_pipeline.submit(author, message, echo_only=True)
         
         # Log da mensagem
         logger.info(f"Mensagem de chat: {author} -> {message}")
@@ -172,14 +210,29 @@ def add_chat_message(author, message):
         logger.error(f"Erro ao adicionar mensagem ao chat: {e}")
         return time.time()
 
-# Carregar perguntas do arquivo JSON
+# Carregar perguntas: banco indexado em disco (ou SQLite); questions.json é convertido quando é mais novo
 def load_questions():
     global questions
-    if os.path.exists(QUESTIONS_FILE):
+    if sqlite_store and sqlite_store.count_questions():
+        # Perguntas lidas sob demanda do banco
+        questions = SQLiteQuestionList(sqlite_store)
+        questions.assign_ids()
+        logger.info(f"Banco SQLite com {len(questions)} perguntas")
+    elif question_store.exists() and not question_store.older_than(QUESTIONS_FILE):
+        # Perguntas lidas sob demanda do banco indexado
+        question_store.invalidate()
+        question_store.assign_ids()
+        questions = question_store
+        logger.info(f"Banco indexado com {len(questions)} perguntas")
+        if sqlite_store:
+            save_questions()
+    elif os.path.exists(QUESTIONS_FILE):
         try:
             with open(QUESTIONS_FILE, 'r', encoding='utf-8') as f:
                 questions = json.load(f)
             logger.info(f"Carregadas {len(questions)} perguntas do arquivo")
+            # Converter para o banco indexado (ou importar no SQLite vazio)
+            save_questions()
         except Exception as e:
             logger.error(f"Erro ao carregar perguntas: {e}")
             questions = []
@@ -200,124 +253,125 @@ def load_questions():
             }
         ]
         save_questions()
+    compile_questions()
+
+# Compilar as perguntas carregadas: validadas uma única vez, parte pública e resposta privada
+def compile_questions():
+    global questions, compiled_questions
+    compiled_questions = CompiledQuestions(questions)
+    if isinstance(questions, list):
+        # Os dicionários originais são descartados: a lista compilada devolve as perguntas no formato do banco
+        questions = compiled_questions
+    question_catalog.invalidate(compiled_questions)
+    questions_changed()
+
+# Resposta 400 com os erros de validação das perguntas (posição, campo e motivo)
+def invalid_questions_response(errors):
+    return jsonify({
+        'success': False,
+        'message': str(errors[0]),
+        'errors': [error.to_dict() for error in errors]
+    }), 400
+
+# Pergunta e total de perguntas mudaram para as rotas de polling de todas as salas
+def questions_changed():
+    for room in room_manager.rooms():
+        room.versions.bump('question')
 
-# Salvar perguntas em arquivo JSON
+# Salvar perguntas no banco indexado (ou no SQLite)
 def save_questions():
+    global questions
     try:
-        with open(QUESTIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(questions, f, ensure_ascii=False, indent=4)
-        logger.info(f"Salvas {len(questions)} perguntas no arquivo")
+        if sqlite_store:
+            if not isinstance(questions, SQLiteQuestionList):
+                sqlite_store.replace_questions(questions)
+                questions = SQLiteQuestionList(sqlite_store)
+            logger.info(f"Salvas {len(questions)} perguntas no banco")
+            return
+        if questions is not question_store:
+            question_store.replace(questions)
+            questions = question_store
+        logger.info(f"Salvas {len(questions)} perguntas no banco indexado")
     except Exception as e:
         logger.error(f"Erro ao salvar perguntas: {e}")
 
-# Carregar ranking do arquivo JSON
-def load_ranking():
-    global ranking
-    if os.path.exists(RANKING_FILE):
-        try:
-            with open(RANKING_FILE, 'r', encoding='utf-8') as f:
-                ranking = json.load(f)
-            logger.info(f"Ranking carregado com {len(ranking)} usuários")
-        except Exception as e:
-            logger.error(f"Erro ao carregar ranking: {e}")
-            ranking = {}
-    else:
-        ranking = {}
-        save_ranking()
+# Persistência do ranking: diário de variações por pergunta + snapshot compactado
+ranking_journal = RankingJournal(DATA_DIR, legacy_file=RANKING_FILE)
 
-# Thread para salvar o ranking de forma assíncrona
-def save_ranking_thread():
+# Carregar ranking (snapshot + diário)
+def load_ranking():
     try:
-        # Criar uma cópia local do ranking para evitar problemas de concorrência
-        ranking_copy = ranking.copy()
-        
-        with open(RANKING_FILE, 'w', encoding='utf-8') as f:
-            json.dump(ranking_copy, f, ensure_ascii=False, indent=4)
-        logger.info("Ranking salvo com sucesso de forma assíncrona")
+        if sqlite_store:
+            ranking.load(sqlite_store.load_ranking())
+        else:
+            ranking.load(ranking_journal.load())
+        logger.info(f"Ranking carregado com {len(ranking)} usuários")
     except Exception as e:
-        logger.error(f"Erro ao salvar ranking de forma assíncrona: {e}")
+        logger.error(f"Erro ao carregar ranking: {e}")
+        ranking.load({})
+    default_room.versions.bump('ranking')
 
-# Salvar ranking em arquivo JSON de forma assíncrona
-def save_ranking():
+# Registrar as variações de pontuação de uma pergunta (escrita em segundo plano)
+def save_ranking(deltas):
     try:
-        # Criar uma thread para salvar o ranking sem bloquear o servidor
-        save_thread = threading.Thread(target=save_ranking_thread)
-        save_thread.daemon = True
-        save_thread.start()
-        logger.info("Iniciada thread para salvar ranking")
+        if sqlite_store:
+            # Uma transação por pergunta
+            sqlite_store.apply_score_deltas(deltas)
+        else:
+            ranking_journal.append(deltas)
     except Exception as e:
-        logger.error(f"Erro ao iniciar thread para salvar ranking: {e}")
+        logger.error(f"Erro ao registrar variações do ranking: {e}")
 
 # Processar mensagem do chat
-def process_chat_message(author, message):
-    global current_votes, voted_users
-    
+def process_chat_message(author, message, room_id=None):
+    """Enfileira a mensagem no pipeline de ingestão do chat."""
     try:
-        # Log para debug
-        logger.info(f"Processando mensagem: {author} -> {message}")
-        
-        # Converter para maiúsculas para facilitar comparação
-        message_upper = message.upper()
-        
-        # Verificar se é um comando de voto (!A, !B, !C, !D)
-        is_vote = False
-        if message_upper in ['!A', '!B', '!C', '!D']:
-            # Extrair a opção votada (A, B, C ou D)
-            vote_option = message_upper[1]  # Pegar o caractere após o !
-            
-            # Registrar o voto do usuário
-            user_votes[author] = vote_option
-            
-            # Atualizar contagem de votos
-            vote_index = ord(vote_option) - ord('A')  # Converter A->0, B->1, C->2, D->3
-            if 0 <= vote_index < 4:  # Garantir que o índice é válido
-                current_votes[vote_index] += 1
-                logger.info(f"Voto registrado: {author} votou na opção !{vote_option}")
-                is_vote = True
-        
-        # Processar a mensagem e o voto em threads separadas para não bloquear
-        def process_vote_and_message():
-            try:
-                # Emitir evento de atualização de votos se for um voto
-                if is_vote:
-                    try:
-                        votes_data = count_votes()
-                        logger.info(f"Enviando atualização de votos: {votes_data}")
-                        socketio.emit('update_votes', {
-                            'votes': votes_data,
-                            'timestamp': time.time()  # Adicionar timestamp para evitar cache
-                        }, namespace='/')
-                    except Exception as e:
-                        logger.error(f"Erro ao enviar atualização de votos: {e}")
-                        # Tentar novamente após um pequeno delay
-                        time.sleep(0.1)
-                        try:
-                            socketio.emit('update_votes', {
-                                'votes': count_votes(),
-                                'timestamp': time.time()
-                            }, namespace='/')
-                        except Exception as e2:
-                            logger.error(f"Falha na segunda tentativa de enviar votos: {e2}")
-                    
-                
-                # Adicionar mensagem ao chat (independente de ser comando ou não)
-                socketio.emit('chat_message', {
-                    'author': author,
-                    'message': message
-                })
-            except Exception as e:
-                logger.error(f"Erro ao processar voto/mensagem em thread: {e}")
-        
-        # Iniciar thread para processar voto e mensagem
-        process_thread = threading.Thread(target=process_vote_and_message)
-        process_thread.daemon = True
-        process_thread.start()
-        
-        return True
+        logger.debug(f"Enfileirando mensagem: {author} -> {message}")
+        if not cluster.is_leader:
+            # Votos são contados apenas no líder
+            return cluster.send_command('chat', room_id, author=author, message=message)
+        return chat_pipeline.submit(author, message, room=room_id)
     except Exception as e:
         logger.error(f"Erro ao processar mensagem do chat: {e}")
         return False
 
+# Consumidor do pipeline: registra votos e retransmite a mensagem aos clientes da sala
+def handle_chat_item(author, message, vote, room_id):
+    # vote é a letra (A-D) quando a mensagem é um comando de voto, senão None
+    room = room_manager.get(room_id or DEFAULT_ROOM)
+    if room is None:
+        logger.debug(f"Mensagem descartada: sala {room_id} não existe mais")
+        return
+    try:
+        # Trocas de voto seguem a política configurada; a contagem é enviada no próximo tick
+        room.handle_chat(author, message, vote)
+    except Exception as e:
+        logger.error(f"Erro ao emitir mensagem de chat: {e}")
+
+# Enviar a contagem atual de votos para os clientes da sala
+def emit_votes_update(room):
+    room.emit('update_votes', {
+        'votes': room.count_votes(),
+        'timestamp': time.time()  # Adicionar timestamp para evitar cache
+    })
+
+# Transmissor de votos: no máximo um envio por tick, independente da taxa de votos
+VOTE_BROADCAST_INTERVAL = float(os.environ.get('VOTE_BROADCAST_INTERVAL', 0.2))
+
+vote_broadcaster = RoomVoteBroadcaster(emit_votes_update, interval=VOTE_BROADCAST_INTERVAL)
+
+# Pipeline de ingestão do chat: fila limitada e pool fixo de consumidores
+CHAT_PIPELINE_WORKERS = int(os.environ.get('CHAT_PIPELINE_WORKERS', 2))
+CHAT_QUEUE_SIZE = int(os.environ.get('CHAT_QUEUE_SIZE', 2000))
+CHAT_OVERFLOW_POLICY = os.environ.get('CHAT_OVERFLOW_POLICY', 'drop_oldest')
+
+chat_pipeline = ChatPipeline(
+    handle_chat_item,
+    workers=CHAT_PIPELINE_WORKERS,
+    max_queue_size=CHAT_QUEUE_SIZE,
+    overflow_policy=CHAT_OVERFLOW_POLICY
+)
+
 # Função para monitorar o chat do YouTube
 def monitor_youtube_chat():
     """Monitora o chat do YouTube para capturar votos."""
@@ -358,25 +412,16 @@ def monitor_youtube_chat():
         
         # Processar mensagens do chat
         for message in chat:
-            if not is_chat_running:
+            # Parar se este worker deixou de ser o líder (o novo líder lê o chat)
+            if not is_chat_running or default_room.replica:
                 break
                 
             try:
                 author = message.get('author', {}).get('name', 'Anônimo')
                 text = message.get('message', '')
                 
-                # Verificar se é um voto válido
-                if text.startswith('!'):
-                    vote = text.lower().strip()
-                    if vote in ['!a', '!b', '!c', '!d']:
-                        option_index = {'!a': 0, '!b': 1, '!c': 2, '!d': 3}[vote]
-                        register_vote(author, option_index)
-                
-                # Emitir mensagem para o cliente
-                socketio.emit('chat_message', {
-                    'author': author,
-                    'message': text
-                })
+                # Votos e retransmissão são tratados pelo pipeline de ingestão
+                process_chat_message(author, text)
                 
                 logger.debug(f"Mensagem do chat: {author} -> {text}")
             except Exception as e:
@@ -393,330 +438,292 @@ def monitor_youtube_chat():
             chat_thread.daemon = True
             chat_thread.start()
 
-# Função para executar o loop do quiz
-def quiz_loop():
-    global quiz_running, current_question_index, current_question, current_votes, voted_users, user_votes, chat_messages
-    
-    # Configurar limites de threads para evitar sobrecarga do sistema
-    try:
-        threading.stack_size(128 * 1024)  # 128 KB stack size para reduzir uso de memória
-    except (ValueError, RuntimeError):
-        logger.warning("Não foi possível configurar stack_size de threads")
-        
-    # Contador de ciclos para forçar coleta de lixo periódica
-    cycle_count = 0
-    
-    # Timestamp da última vez que o servidor foi "limpo"
-    last_cleanup_time = time.time()
-    
-    while True:
-        # Verificar se é hora de fazer limpeza de recursos (a cada 1 hora)
-        current_time = time.time()
-        if current_time - last_cleanup_time > 3600:  # 3600 segundos = 1 hora
-            try:
-                logger.info("Realizando limpeza periódica de recursos do servidor...")
-                # Forçar coleta de lixo
-                gc.collect()
-                # Limpar caches internos
-                chat_messages = chat_messages[-1000:] if len(chat_messages) > 1000 else chat_messages
-                # Reiniciar contadores
-                cycle_count = 0
-                last_cleanup_time = current_time
-                logger.info("Limpeza de recursos concluída com sucesso")
-            except Exception as e:
-                logger.error(f"Erro durante limpeza de recursos: {e}")
-        
-        # Incrementar contador de ciclos
-        cycle_count += 1
-        
-        # Forçar coleta de lixo a cada 100 ciclos
-        if cycle_count % 100 == 0:
-            gc.collect()
-        
-        if quiz_running and questions:
-            # Selecionar pergunta atual
-            current_question_index = current_question_index % len(questions)
-            current_question = questions[current_question_index]
-            current_votes = [0, 0, 0, 0]
-            voted_users = set()  # Limpar usuários que votaram
-            user_votes = {}  # Limpar votos para a nova pergunta
-            
-            # Verificar formato da pergunta e obter a resposta correta
-            correct_answer = 0  # Valor padrão
-            if 'correct' in current_question:
-                correct_answer = current_question['correct']
-            elif 'correct_answer' in current_question:
-                correct_answer = current_question['correct_answer']
-            
-            # Enviar a pergunta atual para o cliente
-            try:
-                logger.info(f"Enviando pergunta {current_question_index + 1}/{len(questions)}")
-                socketio.emit('next_question', {
-                    'question': current_question,
-                    'question_num': current_question_index + 1,
-                    'total_questions': len(questions),
-                    'answer_time': quiz_config['answer_time']
-                })
-                
-                # Pequena pausa para garantir que a mensagem foi entregue
-                time.sleep(0.5)
-            except Exception as e:
-                logger.error(f"Erro ao enviar pergunta: {e}")
-            
-            # Aguardar o tempo de resposta
-            time.sleep(quiz_config['answer_time'])
-            
-            # SOLUÇÃO RADICAL: Reduzir drasticamente o tempo de contabilização de votos
-            # para minimizar a chance de desconexões
-            reduced_vote_count_time = 2  # Reduzir para apenas 2 segundos
-            
-            logger.info(f"Enviando mensagem de contabilização de votos (tempo reduzido: {reduced_vote_count_time}s)")
-            socketio.emit('show_counting_votes', {
-                'time': reduced_vote_count_time  # Usar tempo reduzido
-            })
+# Tempo da fase de contabilização dos votos (mantido curto para reduzir desconexões)
+COUNTING_TIME = float(os.environ.get('QUIZ_COUNTING_TIME', 2))
+
+# Limite de salas de quiz simultâneas no processo
+MAX_QUIZ_ROOMS = int(os.environ.get('MAX_QUIZ_ROOMS', 500))
+
+# Uma única thread de timer dispara as transições de fase de todas as salas
+quiz_timer = TimerService()
+room_manager = RoomManager(max_rooms=MAX_QUIZ_ROOMS)
+
+# Backend de estado compartilhado entre os workers (eleição do líder e replicação)
+state_backend = create_state_backend(STATE_BACKEND)
+LEADER_LEASE_TTL = float(os.environ.get('LEADER_LEASE_TTL', 5))
+
+# Server-Sent Events: um hub por sala com os mesmos eventos enviados aos sockets
+SSE_BUFFER_SIZE = int(os.environ.get('SSE_BUFFER_SIZE', 500))  # Eventos guardados para retomar (Last-Event-ID)
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 1000))  # Conexões por sala
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+SSE_SNAPSHOT_CHAT = 50  # Mensagens de chat na fotografia inicial
+event_hubs = {}
+
+# Rotas de polling com ETag: o navegador sempre revalida (max-age=0) e um proxy
+# na frente do app pode servir a mesma resposta por HTTP_CACHE_SECONDS
+HTTP_CACHE_SECONDS = int(os.environ.get('HTTP_CACHE_SECONDS', 1))
+HTTP_CACHE_CONTROL = f'public, max-age=0, s-maxage={HTTP_CACHE_SECONDS}'
+
+# /api/quiz/state: diferença do estado desde o cursor do cliente, com long-poll opcional (?wait=)
+STATE_LONG_POLL_MAX = float(os.environ.get('STATE_LONG_POLL_MAX', 25))  # Espera máxima em segundos
+STATE_LONG_POLL_WAITERS = int(os.environ.get('STATE_LONG_POLL_WAITERS', 500))  # Esperas simultâneas
+long_poll_slots = threading.BoundedSemaphore(STATE_LONG_POLL_WAITERS)
+
+# Conexões Socket.IO: limite de conexões simultâneas e de novas conexões por segundo
+# (acima do limite o connect é recusado e o cliente tenta de novo com backoff)
+MAX_CONNECTIONS = int(os.environ.get('MAX_CONNECTIONS', 10000))
+CONNECT_RATE = float(os.environ.get('CONNECT_RATE', 200))  # Conexões por segundo
+CONNECT_BURST = int(os.environ.get('CONNECT_BURST', 500))  # Rajada aceita de uma vez
+connections = ConnectionRegistry(MAX_CONNECTIONS, CONNECT_RATE, CONNECT_BURST)
+
+# Função de envio de uma sala: apenas os clientes inscritos no tópico do evento na sala
+# (todo cliente entra na sala do quiz padrão ao conectar) e os clientes SSE da sala.
+# O evento também é publicado para as réplicas da sala nos outros workers.
+def room_emitter(room_id, hub):
+    def emit_event(event, data):
+        socketio.emit(event, data, to=event_channel(room_id, event))
+        hub.publish(event, data)
+        cluster.publish_event(room_id, event, data)
+    return emit_event
+
+# Top 10 da sala (o quiz padrão pode estar no SQLite)
+def room_top_ranking(room, n=10):
+    if room is default_room:
+        return get_top_ranking(n)
+    return [{"name": name, "score": score} for name, score in room.ranking.page(0, n)]
+
+# O ranking não é enviado aos sockets em tempo real; os clientes SSE o recebem após cada pergunta
+def publish_ranking(room):
+    hub = event_hubs.get(room.room_id)
+    if hub:
+        hub.publish('ranking_update', {'success': True, 'ranking': room_top_ranking(room)})
+
+# Resultados de uma pergunta: pontuar o ranking da sala em segundo plano
+def handle_room_results(room, question_position, correct_letter, final_user_votes, final_votes):
+    question_id = room.current_question.id
+    def update_ranking_silently():
+        try:
+            # Histórico das perguntas feitas (filtro "nunca perguntadas" da busca)
+            if question_id is not None:
+                question_history.record(question_id, sum(final_votes.values()), final_votes.get(correct_letter, 0))
+                room.picker.catalog.update(question_id)  # Nova taxa de acerto para a ordem adaptativa
+
+            logger.info(f"Atualizando ranking da sala {room.room_id}. Resposta correta: {correct_letter}")
             
-            # Aguardar o tempo reduzido
-            time.sleep(reduced_vote_count_time)
+            # Atualizar ranking com usuários que acertaram
+            users_updated = 0
+            deltas = {}
+            for user, vote in final_user_votes.items():
+                # Comparar voto (que é uma letra) com a resposta correta;
+                # quem errou entra no ranking com 0 pontos
+                if vote == correct_letter:
+                    total = room.ranking.add(user, 1)
+                    deltas[user] = 1
+                    users_updated += 1
+                    logger.info(f"Usuário {user} acertou e ganhou 1 ponto. Total: {total}")
+                elif user not in room.ranking:
+                    room.ranking.set(user, 0)
+                    deltas[user] = 0
             
-            # Calcular resultado
-            explanation = current_question.get('explanation', 'Sem explicação disponível.')
+            # Apenas o quiz padrão é persistido (diário ou SQLite); as demais salas ficam em memória
+            if room is default_room:
+                save_ranking(deltas)
+                if sqlite_store:
+                    sqlite_store.record_question_result(question_position, correct_letter, final_votes)
             
-            # Converter índice numérico para letra (0=A, 1=B, 2=C, 3=D)
-            correct_letter = chr(65 + correct_answer)  # ASCII: A=65, B=66, etc.
+            # Réplicas do ranking nos outros workers
+            room.versions.bump('ranking')
+            cluster.publish_event(room.room_id, '_ranking_deltas', deltas)
+            publish_ranking(room)
             
-            # Enviar resultado para o frontend primeiro (sem atualizar o ranking ainda)
-            try:
-                logger.info(f"Enviando resultados: resposta correta={correct_letter}, votos={count_votes()}")
-                # Usar socketio.emit com timeout maior para garantir entrega
-                socketio.emit('show_results', {
-                    'correct_answer': correct_letter,
-                    'explanation': explanation,
-                    'votes': count_votes()
-                }, namespace='/', timeout=10)  # Aumentar timeout para 10 segundos
-                
-                # Pequena pausa para garantir que a mensagem foi entregue
-                time.sleep(0.5)
-                
-                # Atualizar ranking silenciosamente sem enviar para os clientes
-                def update_ranking_silently():
-                    try:
-                        # Converter índice numérico para letra (0=A, 1=B, 2=C, 3=D)
-                        correct_letter = chr(65 + correct_answer)  # ASCII: A=65, B=66, etc.
-                        
-                        logger.info(f"Atualizando ranking silenciosamente. Resposta correta: {correct_letter}")
-                        
-                        # Criar uma cópia local dos votos para evitar problemas de concorrência
-                        local_user_votes = user_votes.copy()
-                        
-                        # Atualizar ranking com usuários que acertaram
-                        users_updated = 0
-                        for user, vote in local_user_votes.items():
-                            if user not in ranking:
-                                ranking[user] = 0
-                            
-                            # Comparar voto (que é uma letra) com a resposta correta
-                            if vote == correct_letter:
-                                ranking[user] += 1
-                                users_updated += 1
-                                logger.info(f"Usuário {user} acertou e ganhou 1 ponto. Total: {ranking[user]}")
-                        
-                        # Salvar ranking atualizado (agora é assíncrono)
-                        save_ranking()
-                        
-                        # Log do ranking atualizado
-                        logger.info(f"Ranking atualizado silenciosamente: {users_updated} usuários pontuaram")
-                    except Exception as e:
-                        logger.error(f"Erro ao atualizar ranking silenciosamente: {e}")
-                
-                # Iniciar thread para atualizar o ranking silenciosamente
-                ranking_thread = threading.Thread(target=update_ranking_silently)
-                ranking_thread.daemon = True
-                ranking_thread.start()
-                
-                # Aguardar antes de avançar para a próxima pergunta
-                time.sleep(quiz_config['result_display_time'])
-                
-                # Avançar para a próxima pergunta em uma thread separada
-                def advance_question():
-                    try:
-                        global current_question_index
-                        current_question_index += 1
-                        logger.info(f"Avançando para a pergunta {current_question_index + 1}")
-                    except Exception as e:
-                        logger.error(f"Erro ao avançar para a próxima pergunta: {e}")
-                
-                # Iniciar thread para avançar para a próxima pergunta
-                advance_thread = threading.Thread(target=advance_question)
-                advance_thread.daemon = True
-                advance_thread.start()
-            except Exception as e:
-                logger.error(f"Erro ao enviar resultados: {e}")
-                
-                # Fallback em caso de erro
-                try:
-                    # Tentar novamente enviar os resultados
-                    socketio.emit('show_results', {
-                        'correct_answer': correct_letter,
-                        'explanation': explanation,
-                        'votes': count_votes()
-                    })
-                    
-                    # Atualizar o ranking
-                    update_ranking(correct_answer)
-                    
-                    # Aguardar antes de passar para a próxima pergunta
-                    time.sleep(quiz_config['result_display_time'])
-                    
-                    # Avançar para a próxima pergunta
-                    current_question_index += 1
-                except Exception as e2:
-                    logger.error(f"Erro no fallback: {e2}")
-                    # Último recurso: apenas avançar para a próxima pergunta
-                    time.sleep(quiz_config['result_display_time'])
-                    current_question_index += 1
-        else:
-            # Se o quiz não estiver rodando, aguardar um pouco antes de verificar novamente
-            time.sleep(1)
+            logger.info(f"Ranking da sala {room.room_id} atualizado: {users_updated} usuários pontuaram")
+        except Exception as e:
+            logger.error(f"Erro ao atualizar ranking silenciosamente: {e}")
+    
+    # Iniciar thread para atualizar o ranking (fora da thread do agendador)
+    ranking_thread = threading.Thread(target=update_ranking_silently)
+    ranking_thread.daemon = True
+    ranking_thread.start()
 
-# Obter os top N usuários do ranking
-def get_top_ranking(n=10):
-    sorted_ranking = sorted(ranking.items(), key=lambda x: x[1], reverse=True)
-    return [{"name": name, "score": score} for name, score in sorted_ranking[:n]]
+# Criar uma sala de quiz; config e questions são opcionais (padrão: configuração e perguntas globais)
+def create_room(room_id, config=None, room_questions=None):
+    if config is None:
+        config = quiz_config
+    if room_questions is None:
+        questions_fn = lambda: compiled_questions
+        catalog = question_catalog
+    else:
+        room_compiled = CompiledQuestions(room_questions)
+        questions_fn = lambda: room_compiled
+        catalog = QuestionCatalog(question_history)
+        catalog.invalidate(room_compiled)
+    hub = BroadcastHub(capacity=SSE_BUFFER_SIZE, heartbeat=SSE_HEARTBEAT, max_clients=SSE_MAX_CLIENTS)
+    room = QuizRoom(
+        room_id,
+        config,
+        questions_fn,
+        quiz_timer,
+        room_emitter(room_id, hub),
+        on_results=handle_room_results,
+        votes=vote_broadcaster,
+        counting_time=COUNTING_TIME,
+        chat_history_size=CHAT_HISTORY_SIZE,
+        catalog=catalog
+    )
+    # Nos seguidores a sala é uma réplica das fases executadas pelo líder
+    if cluster.started and not cluster.is_leader:
+        room.demote()
+    room_manager.add(room)
+    event_hubs[room_id] = hub
+    return room
 
-# Contar votos
-def count_votes():
-    global current_votes
-    return {
-        'A': current_votes[0],
-        'B': current_votes[1],
-        'C': current_votes[2],
-        'D': current_votes[3]
-    }
+# Remover uma sala e encerrar os streams SSE dela
+def remove_room(room_id):
+    hub = event_hubs.pop(room_id, None)
+    if hub:
+        hub.close()
+    return room_manager.remove(room_id)
 
-# Thread para atualizar o ranking de forma completamente isolada
-def update_ranking_thread(correct_answer):
-    global ranking, user_votes
-    
-    try:
-        # Adicionar um atraso para garantir que os resultados já foram exibidos
-        time.sleep(3)  # Esperar 3 segundos antes de atualizar o ranking
-        
-        # Converter índice numérico para letra (0=A, 1=B, 2=C, 3=D)
-        correct_letter = chr(65 + correct_answer)  # ASCII: A=65, B=66, etc.
-        
-        logger.info(f"Atualizando ranking. Resposta correta: {correct_letter}")
-        
-        # Criar uma cópia local dos votos para evitar problemas de concorrência
-        local_user_votes = user_votes.copy()
-        
-        # Atualizar ranking com usuários que acertaram
-        users_updated = 0
-        for user, vote in local_user_votes.items():
-            if user not in ranking:
-                ranking[user] = 0
-            
-            # Comparar voto (que é uma letra) com a resposta correta
-            if vote == correct_letter:
-                ranking[user] += 1
-                users_updated += 1
-                logger.info(f"Usuário {user} acertou e ganhou 1 ponto. Total: {ranking[user]}")
-        
-        # Salvar ranking atualizado (agora é assíncrono)
-        save_ranking()
-        
-        # Log do ranking atualizado
-        logger.info(f"Ranking atualizado: {users_updated} usuários pontuaram")
-            
-    except Exception as e:
-        logger.error(f"Erro ao atualizar ranking: {e}")
-        
-# Thread separada para enviar o ranking para os clientes
-# Esta função é executada em uma thread completamente separada
-def send_ranking_to_clients():
+# Controle do quiz de uma sala; nos seguidores a ação é encaminhada ao líder
+def control_room(room, action):
+    if not cluster.is_leader:
+        return cluster.send_command(action, room.room_id)
+    if action == 'start':
+        return start_room_quiz(room)
+    return getattr(room, action)()
+
+# Iniciar o quiz de uma sala e a leitura do chat dela
+def start_room_quiz(room):
+    if not room.start():
+        return False
+    start_chat_monitor(room)
+    return True
+
+# Leitura do chat de uma sala (apenas no líder)
+def start_chat_monitor(room):
+    global chat_thread
+    if room is default_room:
+        if not chat_thread or not chat_thread.is_alive():
+            chat_thread = threading.Thread(target=monitor_youtube_chat)
+            chat_thread.daemon = True
+            chat_thread.start()
+        return
+    monitor_thread = threading.Thread(target=monitor_room_chat, args=(room,))
+    monitor_thread.daemon = True
+    monitor_thread.start()
+
+# Evento publicado por outro worker: atualiza a réplica da sala ou o estado global
+def apply_cluster_event(room_id, event, data):
     try:
-        # Pausa maior para garantir que o ranking foi atualizado e que as operações críticas já terminaram
-        time.sleep(5)
-        
-        # Obter o ranking atual
-        top_ranking = get_top_ranking(10)
-        
-        # Verificar se o ranking está vazio (proteção contra erros)
-        if not top_ranking:
-            logger.warning("Ranking vazio, não enviando para os clientes")
+        if event == '_config_updated':
+            quiz_config.update(data)
+            questions_changed()
+            return
+        if event == '_questions_updated':
+            load_questions()
+            refresh_search(data.get('id'))
+            return
+        if event == '_room_created':
+            if room_id not in room_manager:
+                create_room(room_id, data.get('config'), data.get('questions'))
+            return
+        if event == '_room_removed':
+            remove_room(room_id)
             return
-            
-        # Log detalhado para debug
-        logger.info(f"Preparando para enviar ranking com {len(top_ranking)} usuários")
-        
-        # Enviar uma mensagem de preparação primeiro
-        logger.info("Enviando mensagem de preparação do ranking")
-        try:
-            socketio.emit('prepare_ranking_update', {
-                'count': len(top_ranking)
-            }, timeout=5)  # Adicionar timeout para garantir entrega
-            
-            # Pequena pausa para garantir que a mensagem de preparação foi recebida
-            time.sleep(1)  # Aumentar para 1 segundo
-        except Exception as e:
-            logger.error(f"Erro ao enviar mensagem de preparação do ranking: {e}")
-        
-        # Enviar cada item do ranking individualmente para evitar sobrecarga
-        for i, item in enumerate(top_ranking):
-            try:
-                logger.info(f"Enviando item {i+1} do ranking: {item['name']}")
-                socketio.emit('ranking_item', {
-                    'item': item,
-                    'position': i,
-                    'is_last': i == len(top_ranking) - 1
-                })
-                # Pequena pausa entre cada envio
-                time.sleep(0.2)
-            except Exception as e:
-                logger.error(f"Erro ao enviar item {i+1} do ranking: {e}")
-        
-        # Enviar mensagem de conclusão
-        logger.info("Enviando mensagem de conclusão do ranking")
-        socketio.emit('ranking_update_complete', {})
         
-        logger.info("Ranking enviado com sucesso para os clientes")
+        room = room_manager.get(room_id)
+        if room is None:
+            return
+        if event == '_ranking_deltas':
+            for user, delta in data.items():
+                if delta:
+                    room.ranking.add(user, delta)
+                elif user not in room.ranking:
+                    room.ranking.set(user, 0)
+            # Sem SQLite, o diário é gravado pelo worker que detém o lock de escrita
+            if room is default_room and not sqlite_store:
+                save_ranking(data)
+            room.versions.bump('ranking')
+            publish_ranking(room)
+            return
+        room.apply_event(event, data)
+        # Clientes SSE conectados a este worker
+        event_hubs[room_id].publish(event, data)
     except Exception as e:
-        logger.error(f"Erro ao enviar ranking para os clientes: {e}")
-        # Tentar novamente após um tempo, mas enviando tudo de uma vez como fallback
-        time.sleep(2)
-        try:
-            top_ranking = get_top_ranking(10)
-            logger.info(f"Tentando enviar ranking novamente (fallback): {len(top_ranking)} usuários")
-            socketio.emit('update_ranking', {
-                'ranking': top_ranking
-            })
-        except Exception as e2:
-            logger.error(f"Erro na segunda tentativa de enviar ranking: {e2}")
-
+        logger.error(f"Erro ao aplicar evento {event} da sala {room_id}: {e}")
 
-# Atualizar ranking com base nos votos
-def update_ranking(correct_answer):
+# Comando encaminhado por um seguidor ao líder
+def handle_cluster_command(command):
+    action = command.get('action')
+    room = room_manager.get(command.get('room') or DEFAULT_ROOM)
+    if room is None:
+        logger.warning(f"Comando {action} para sala inexistente: {command.get('room')}")
+        return
     try:
-        # SOLUÇÃO RADICAL: Apenas salvar o ranking em arquivo sem enviar para os clientes
-        # Isso evita completamente problemas de conexão durante a atualização do ranking
-        
-        # Criar uma thread para atualizar o ranking sem bloquear o servidor
-        update_thread = threading.Thread(target=update_ranking_thread, args=(correct_answer,))
-        update_thread.daemon = True
-        update_thread.start()
-        logger.info("Iniciada thread para atualizar ranking silenciosamente (sem envio em tempo real)")
-        
-        # NÃO agendar envio do ranking para evitar problemas de conexão
-        # Os clientes obterão o ranking atualizado na próxima pergunta ou via polling HTTP
-        
-        # Log para informar sobre a estratégia adotada
-        logger.info("Usando estratégia de não enviar ranking em tempo real para evitar desconexões")
-        
-        # Retornar o ranking atual para uso imediato (apenas para o servidor)
-        return get_top_ranking(10)
+        if action == 'chat':
+            chat_pipeline.submit(command.get('author'), command.get('message'), room=command.get('room'))
+        elif action in ('start', 'stop', 'pause', 'resume', 'skip'):
+            control_room(room, action)
+        else:
+            logger.warning(f"Comando desconhecido: {action}")
     except Exception as e:
-        logger.error(f"Erro ao iniciar thread para atualizar ranking: {e}")
-        # Retornar o ranking atual em caso de erro
-        return get_top_ranking(10)
+        logger.error(f"Erro ao executar o comando {action}: {e}")
+
+# Mudança de liderança: o líder executa as fases; os seguidores viram réplicas
+def handle_leader_change(is_leader):
+    for room in room_manager.rooms():
+        if is_leader:
+            # Quiz em andamento no líder anterior: retomar a partir da pergunta atual
+            if room.promote():
+                start_chat_monitor(room)
+        else:
+            room.demote()
+
+cluster = QuizCluster(
+    state_backend,
+    on_event=apply_cluster_event,
+    on_command=handle_cluster_command,
+    on_leader_change=handle_leader_change,
+    lease_ttl=LEADER_LEASE_TTL
+)
+
+# Quiz padrão (rotas /api/quiz/* e eventos sem sala)
+default_room = create_room(DEFAULT_ROOM)
+quiz_scheduler = default_room.scheduler
+vote_tally = default_room.vote_tally  # Contadores por opção + voto de cada usuário
+chat_history = default_room.chat_history  # Buffer circular com as últimas mensagens do chat
+ranking = default_room.ranking  # Ranking indexado: top-K, posição e paginação sem reordenar tudo
+
+# Iniciar o agendador de fases a partir da primeira pergunta
+def start_quiz_scheduler():
+    return default_room.start()
+
+# Parar o agendador de fases imediatamente
+def stop_quiz_scheduler():
+    return default_room.stop()
+
+# Obter os top N usuários do ranking
+def get_top_ranking(n=10):
+    return [{"name": name, "score": score} for name, score in ranking_page(0, n)]
+
+# Página do ranking como lista de (usuário, pontuação)
+def ranking_page(offset, limit):
+    # Com SQLite o ranking é lido do banco, compartilhado entre processos
+    if sqlite_store:
+        return sqlite_store.top_ranking(limit, offset)
+    return ranking.page(offset, limit)
+
+# Posição (1-based), pontuação e total de participantes para um usuário
+def ranking_position(name):
+    if sqlite_store:
+        position = sqlite_store.rank(name)
+        score = sqlite_store.get_score(name)
+        return position, score, sqlite_store.ranking_size()
+    return ranking.rank(name), ranking.score(name), len(ranking)
+
+# Contar votos
+def count_votes():
+    return default_room.count_votes()
 
 # Função para normalizar URL do YouTube
 def normalize_youtube_url(url):
@@ -780,12 +787,34 @@ def health_check():
     return jsonify({
         'status': 'ok',
         'timestamp': datetime.now().isoformat(),
-        'quiz_running': quiz_running,
+        'quiz_running': default_room.running,
         'uptime': time.time() - server_start_time,
         'thread_count': thread_count,
-        'memory_usage_mb': memory_usage
+        'memory_usage_mb': memory_usage,
+        'chat_pipeline': chat_pipeline.stats(),
+        'vote_broadcaster': vote_broadcaster.stats(),
+        'rooms': len(room_manager),
+        'rooms_running': room_manager.running_count(),
+        'state_versions': default_room.versions.stats(),
+        'connections': connections.stats(),
+        'question_store': question_store.stats(),
+        'question_search': search_index.stats(),
+        'question_history': question_history.stats(),
+        'question_catalog': question_catalog.stats(),
+        'event_stream': event_hubs[DEFAULT_ROOM].stats(),
+        'event_stream_clients': sum(hub.clients for hub in list(event_hubs.values())),
+        'cluster': cluster.stats()
     })
 
+# Latência (percentis das respostas de keep-alive) de um cliente conectado neste processo
+@app.route('/api/connections/<sid>')
+def api_connection(sid):
+    latency = connections.latency(sid)
+    if latency is None:
+        return jsonify({'success': False, 'message': 'Conexão não encontrada'}), 404
+    return jsonify({'success': True, 'sid': sid, 'subscriptions': sorted(connections.subscriptions(sid)),
+                    'latency_ms': latency})
+
 # Rotas da aplicação
 @app.route('/')
 def home():
@@ -871,11 +900,19 @@ def api_save_config():
         old_simulator_setting = quiz_config.get('enable_chat_simulator', True)
         new_simulator_setting = data.get('enable_chat_simulator', True)
         
+        if 'question_order' in data:
+            try:
+                validate_order(data['question_order'])
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+        
         # Atualizar configuração
         quiz_config.update(data)
         
         # Salvar configuração
         save_config()
+        questions_changed()  # O tempo de resposta faz parte da pergunta atual
+        cluster.broadcast_event(None, '_config_updated', data)
         
         # Se a configuração do simulador mudou e o chat está rodando, reiniciar o chat
         if old_simulator_setting != new_simulator_setting and is_chat_running:
@@ -903,21 +940,199 @@ def api_questions():
     if request.method == 'POST':
         data = request.json
         if 'questions' in data:
+            errors = validate_questions(data['questions'])
+            if errors:
+                return invalid_questions_response(errors)
             questions = data['questions']
             save_questions()
+            compile_questions()
+            search_index.invalidate()
+            cluster.broadcast_event(None, '_questions_updated', {})
             return jsonify({'success': True, 'count': len(questions)})
+        # Uma única pergunta: acrescentada ao banco com um id novo
+        try:
+            position, question = question_bank().add(compile_question(data, len(questions)).to_dict())
+        except QuestionError as e:
+            return invalid_questions_response([e])
+        questions_edited(question['id'])
+        return question_response(position, question, 201)
     
-    return jsonify(questions)
+    # Listagem paginada e filtrada (offset, limit, category, difficulty)
+    if any(key in request.args for key in ('offset', 'limit') + FACETS):
+        try:
+            offset, limit = page_params(request.args)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'offset/limit inválido'}), 400
+        filters = {facet: request.args[facet] for facet in FACETS if request.args.get(facet)}
+        total, items = list_page(questions, offset, limit, filters)
+        return jsonify({
+            'success': True,
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'questions': [dict(question, position=position, etag=question_etag(question)) for position, question in items]
+        })
+    
+    # Sem parâmetros: todas as perguntas (exportação), enviadas em stream direto do banco
+    headers = {'Content-Disposition': 'attachment; filename=quiz-perguntas.json'} if request.args.get('download') else {}
+    return Response(json_array_chunks(questions), mimetype='application/json', headers=headers)
+
+# Importação em massa: lista JSON ou JSON Lines (corpo da requisição ou campo 'file'), lida em stream
+@app.route('/api/questions/import', methods=['POST'])
+def api_import_questions():
+    """Valida e grava as perguntas em lotes (?mode=append|upsert|replace); responde com o relatório."""
+    mode = request.args.get('mode', 'append')
+    if mode not in WRITE_MODES:
+        return jsonify({'success': False, 'message': f"Modo inválido: {mode} (use {', '.join(WRITE_MODES)})"}), 400
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'success': False, 'message': "Envie o arquivo no campo 'file'"}), 400
+        stream = upload.stream
+    else:
+        stream = request.stream
+    try:
+        report = import_stream(question_writer(mode), stream.read)
+    except ImportFormatError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao importar perguntas: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    questions_edited()
+    return jsonify(dict(report, success=True, count=len(questions),
+                        message=f"{report['added']} perguntas novas, {report['updated']} substituídas, "
+                                f"{report['invalid']} inválidas"))
+
+# Banco de perguntas em uso (SQLite ou banco indexado): edições pelo id e gravação em lotes
+def question_bank():
+    return SQLiteQuestionList(sqlite_store) if sqlite_store else question_store
+
+def question_writer(mode):
+    return question_bank().writer(mode)
+
+# Perguntas editadas (uma, pelo id, ou o banco todo): recarrega neste worker e avisa os demais
+def questions_edited(question_id=None):
+    load_questions()
+    refresh_search(question_id)
+    cluster.broadcast_event(None, '_questions_updated', {'id': question_id} if question_id is not None else {})
+
+# Índice de busca: só a pergunta editada é reindexada; sem id (importação), remontado na próxima busca
+def refresh_search(question_id=None):
+    if question_id is None:
+        search_index.invalidate()
+    else:
+        search_index.refresh(question_bank(), question_id)
+
+# Uma pergunta com a posição e a ETag (também no cabeçalho, para o If-Match da edição)
+def question_response(position, question, status=200):
+    etag = question_etag(question)
+    response = jsonify({'success': True, 'position': position, 'etag': etag, 'question': question})
+    response.headers['ETag'] = etag
+    return response, status
+
+@app.route('/api/questions/<question_id>', methods=['GET', 'PATCH', 'DELETE'])
+def api_question(question_id):
+    """Lê, altera (JSON Merge Patch) ou exclui uma pergunta pelo id; PATCH e DELETE conferem o If-Match."""
+    bank = question_bank()
+    if request.method == 'GET':
+        found = bank.get(question_id)
+        if found is None:
+            return jsonify({'success': False, 'message': 'Pergunta não encontrada'}), 404
+        return question_response(*found)
+    if request.method == 'PATCH':
+        patch = request.get_json(silent=True)
+        if not isinstance(patch, dict):
+            return jsonify({'success': False, 'message': 'Envie um objeto JSON com os campos alterados'}), 400
+        change = lambda current, position: merge_question(current, patch, position)
+    else:
+        change = lambda current, position: None
+    try:
+        position, question = bank.edit(question_id, change, request.headers.get('If-Match'))
+    except QuestionNotFound:
+        return jsonify({'success': False, 'message': 'Pergunta não encontrada'}), 404
+    except QuestionConflict as e:
+        return jsonify({'success': False, 'message': str(e), 'etag': e.etag, 'question': e.question}), 412
+    except QuestionError as e:
+        return invalid_questions_response([e])
+    questions_edited(question_id)
+    if question is None:
+        return jsonify({'success': True, 'position': position, 'count': len(questions)})
+    return question_response(position, question)
+
+@app.route('/api/questions/search', methods=['GET'])
+def api_search_questions():
+    """Busca por palavras (q), categoria, dificuldade e nunca perguntadas (never_asked=1), por relevância."""
+    try:
+        offset, limit = page_params(request.args)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'offset/limit inválido'}), 400
+    return jsonify(search_questions(request.args, offset, limit))
+
+# Página de resultados da busca: só as perguntas da página são lidas do banco
+def search_questions(args, offset, limit):
+    start = time.perf_counter()
+    bank = question_bank()
+    search_index.ensure(bank)
+    query = args.get('q', '')
+    filters = {facet: args[facet] for facet in FACETS if args.get(facet)}
+    history = question_history.snapshot()
+    never_asked = args.get('never_asked', '').lower() in ('1', 'true', 'sim')
+    total, results = search_index.search(query, filters, history if never_asked else (), offset, limit)
+    items = []
+    for question_id, score in results:
+        found = bank.get(question_id)
+        if found is not None:
+            position, question = found
+            stats = history.get(question_id)
+            items.append(dict(question, position=position, etag=question_etag(question), score=score,
+                              asked=stats.asked if stats else 0))
+    return {
+        'success': True,
+        'query': query,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'took_ms': round((time.perf_counter() - start) * 1000, 2),
+        'questions': items
+    }
+
+@app.route('/api/questions/facets', methods=['GET'])
+def api_question_facets():
+    """Valores de categoria e dificuldade com o número de perguntas (filtros da listagem)."""
+    return jsonify({'success': True, 'total': len(questions), 'facets': list_facets(questions)})
+
+# offset e limit de uma listagem paginada (limit entre 1 e MAX_PAGE_SIZE)
+def page_params(args):
+    offset = max(0, int(args.get('offset', 0)))
+    limit = min(MAX_PAGE_SIZE, max(1, int(args.get('limit', DEFAULT_PAGE_SIZE))))
+    return offset, limit
 
 @app.route('/api/ranking', methods=['GET'])
 def api_ranking():
-    """Retorna o ranking atual dos 10 melhores participantes."""
+    """Retorna o ranking atual (por padrão os 10 melhores; aceita offset e limit)."""
     try:
-        return jsonify(get_top_ranking(10))
+        offset = request.args.get('offset', 0, type=int)
+        limit = min(request.args.get('limit', 10, type=int), 500)
+        return jsonify([{"name": name, "score": score} for name, score in ranking_page(offset, limit)])
     except Exception as e:
         logger.error(f"Erro ao obter ranking: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ranking/user/<path:name>', methods=['GET'])
+def api_ranking_user(name):
+    """Retorna a posição e a pontuação de um participante."""
+    position, score, total = ranking_position(name)
+    if position is None:
+        return jsonify({'success': False, 'message': 'Usuário não encontrado no ranking'}), 404
+    
+    return jsonify({
+        'success': True,
+        'name': name,
+        'score': score,
+        'position': position,
+        'total': total
+    })
+
 @app.route('/api/test-connection', methods=['POST'])
 def test_connection():
     """Testar conexão com o chat do YouTube."""
@@ -1006,14 +1221,25 @@ def test_connection():
             'error_details': error_message
         }), 500
 
+# Resposta JSON condicional das rotas de polling: o corpo é serializado uma vez por versão
+# das partes do estado usadas (pieces) e If-None-Match igual à ETag responde 304 sem corpo
+def versioned_response(room, key, pieces, build):
+    etag, body, status = room.versions.cached(key, pieces, build)
+    if status != 200:
+        return Response(body, status=status, mimetype='application/json')
+    headers = {'ETag': etag, 'Cache-Control': HTTP_CACHE_CONTROL}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
 @app.route('/api/quiz/status-http', methods=['GET'])
 def api_status_http():
     """Rota HTTP para obter o status do quiz (se está em execução ou não)."""
-    return jsonify({
+    return versioned_response(default_room, 'status', ('phase',), lambda: ({
         'success': True,
-        'quiz_running': quiz_running,
-        'timestamp': time.time()
-    })
+        'quiz_running': default_room.running,
+        'phase': stable_phase(default_room.phase_state())
+    }, 200))
 
 # Rota para keep-alive via HTTP (especialmente para a terceira pergunta)
 @app.route('/api/quiz/keep-alive-http', methods=['POST'])
@@ -1042,72 +1268,63 @@ def api_keep_alive_http():
             'timestamp': time.time()
         }), 500
 
-@app.route('/api/quiz/current-question-http', methods=['GET'])
-def api_current_question_http():
+# Pergunta atual de uma sala (parte pública, sem a resposta correta) com o prazo da fase
+def current_question_payload(room):
     try:
-        if not quiz_running or current_question is None:
-            return jsonify({
+        question = room.current_question
+        if not room.running or question is None:
+            return {
                 'success': False,
                 'message': 'Quiz não está em execução ou não há pergunta atual'
-            }), 404
-        
-        # Obter opções da pergunta de forma segura
-        options = []
-        if 'options' in current_question:
-            if isinstance(current_question['options'], list):
-                options = current_question['options'][:4]  # Garantir que temos 4 opções
-                # Preencher com vazios se não tiver 4 opções
-                while len(options) < 4:
-                    options.append("")
-            else:
-                # Formato de dicionário
-                options = [
-                    current_question['options'].get('A', ''),
-                    current_question['options'].get('B', ''),
-                    current_question['options'].get('C', ''),
-                    current_question['options'].get('D', '')
-                ]
+            }, 404
         
-        return jsonify({
+        # O tempo restante é calculado pelo cliente a partir de phase.deadline
+        # (um valor calculado aqui mudaria o corpo, e a ETag, a cada polling)
+        return {
             'success': True,
-            'question': {
-                'id': current_question.get('id', current_question_index),
-                'text': current_question.get('question', ''),
-                'options': options,
-                'time': quiz_config.get('answer_time', 20)
-            },
-            'remaining_time': quiz_config.get('answer_time', 20),
-            'question_num': current_question_index + 1,
-            'total_questions': len(questions)
-        })
+            'question': question.public,
+            'answer_time': room.config.get('answer_time', 20),
+            'phase': stable_phase(room.phase_state()),
+            'question_num': room.current_question_index + 1,
+            'total_questions': room.total_questions()
+        }, 200
     except Exception as e:
         logger.error(f"Erro ao obter pergunta atual: {e}")
-        return jsonify({
+        return {
             'success': False,
             'message': str(e)
-        }), 500
+        }, 500
 
-@app.route('/api/quiz/votes-http', methods=['GET'])
-def api_votes_http():
+def current_question_response(room):
+    return versioned_response(room, 'current_question', ('phase', 'question'),
+                              lambda: current_question_payload(room))
+
+@app.route('/api/quiz/current-question-http', methods=['GET'])
+def api_current_question_http():
+    return current_question_response(default_room)
+
+# Contagem de votos de uma sala com a porcentagem de acertos
+def votes_payload(room):
     try:
         # Resposta rápida para evitar timeout
-        if not quiz_running:
-            return jsonify({
+        if not room.running:
+            return {
                 'success': False,
                 'message': 'Quiz não está em execução'
-            }), 404
+            }, 404
         
-        # Criar cópia local dos votos para evitar problemas de concorrência
-        votes_copy = current_votes.copy() if current_votes else [0, 0, 0, 0]
+        # Cópia consistente dos contadores (nas réplicas, a última contagem do líder)
+        votes_copy = list(room.count_votes().values())
         
         # Calcular porcentagem de acertos
         total_votes = sum(votes_copy)
-        correct_index = current_question.get('correct', 0) if current_question else 0
+        question = room.current_question
+        correct_index = question.correct if question else 0
         correct_votes = votes_copy[correct_index] if 0 <= correct_index < len(votes_copy) else 0
         correct_percentage = (correct_votes / total_votes * 100) if total_votes > 0 else 0
         
         # Resposta simplificada para ser mais rápida
-        return jsonify({
+        return {
             'success': True,
             'votes': {
                 'a': votes_copy[0] if len(votes_copy) > 0 else 0,
@@ -1115,36 +1332,39 @@ def api_votes_http():
                 'c': votes_copy[2] if len(votes_copy) > 2 else 0,
                 'd': votes_copy[3] if len(votes_copy) > 3 else 0,
                 'correct_percentage': correct_percentage
-            },
-            'timestamp': time.time()  # Adicionar timestamp para evitar cache
-        })
+            }
+        }, 200
     except Exception as e:
         logger.error(f"Erro ao obter votos: {e}")
         # Resposta de erro simplificada
-        return jsonify({
+        return {
             'success': False,
-            'message': 'Erro interno',
-            'timestamp': time.time()
-        }), 500
+            'message': 'Erro interno'
+        }, 500
 
-@app.route('/api/quiz/chat-http', methods=['GET'])
-def api_chat_http():
+def votes_response(room):
+    return versioned_response(room, 'votes', ('phase', 'question', 'tally'), lambda: votes_payload(room))
+
+@app.route('/api/quiz/votes-http', methods=['GET'])
+def api_votes_http():
+    return votes_response(default_room)
+
+# Mensagens do chat de uma sala a partir de since_seq (ou since, timestamp)
+def chat_response(room):
     try:
+        since_seq = request.args.get('since_seq', type=int)
         since = request.args.get('since', 0, type=float)
         
-        # Filtrar mensagens mais recentes que o timestamp fornecido
-        recent_messages = []
-        
-        # Verificar se chat_messages existe e é uma lista
-        if 'chat_messages' in globals() and isinstance(chat_messages, list):
-            recent_messages = [
-                msg for msg in chat_messages 
-                if msg.get('timestamp', 0) > since
-            ]
+        # Preferir a sequência (O(1)); o timestamp usa busca binária
+        if since_seq is not None:
+            records = room.chat_history.since_seq(since_seq)
+        else:
+            records = room.chat_history.since_timestamp(since)
         
         return jsonify({
             'success': True,
-            'messages': recent_messages
+            'messages': [record_to_dict(record) for record in records],
+            'last_seq': room.chat_history.last_seq()
         })
     except Exception as e:
         logger.error(f"Erro ao obter mensagens do chat: {e}")
@@ -1153,27 +1373,124 @@ def api_chat_http():
             'message': str(e)
         }), 500
 
+@app.route('/api/quiz/chat-http', methods=['GET'])
+def api_chat_http():
+    return chat_response(default_room)
+
+# Partes do estado de uma sala que mudaram depois da versão since (todas se since for None)
+def state_delta(room, versions, since, chat_seq):
+    changed = pieces_changed(versions, since)
+    delta = {
+        'success': True,
+        'version': cursor_of(versions),
+        'full': since is None,
+        'server_time': int(time.time() * 1000)
+    }
+    question = room.current_question if room.running else None
+    if 'phase' in changed:
+        delta['quiz_running'] = room.running
+        delta['phase'] = room.phase_state()
+        # Resposta correta apenas depois que a fase de resultados começou
+        if delta['phase']['phase'] == PHASE_RESULTS and question is not None:
+            delta['results'] = {
+                'correct_answer': question.answer.letter,
+                'explanation': question.answer.explanation,
+                'votes': room.count_votes()
+            }
+    if 'question' in changed:
+        delta['question'] = question.public if question is not None else None
+        delta['question_num'] = room.current_question_index + 1 if question is not None else None
+        delta['total_questions'] = room.total_questions()
+        delta['answer_time'] = room.config.get('answer_time', 20)
+    if 'tally' in changed:
+        delta['votes'] = room.count_votes()
+    if 'chat' in changed:
+        if chat_seq is None:
+            records = room.chat_history.latest(SSE_SNAPSHOT_CHAT)
+        else:
+            records = room.chat_history.since_seq(chat_seq)
+        delta['chat'] = [record_to_dict(record) for record in records]
+        delta['last_seq'] = room.chat_history.last_seq()
+    if 'ranking' in changed:
+        delta['ranking'] = room_top_ranking(room)
+    return delta
+
+# Estado de uma sala desde ?since=<cursor> (fase, pergunta, votos, chat desde ?chat_seq= e ranking).
+# Com ?wait=<segundos> e nada novo, a resposta espera a próxima mudança (long-poll).
+def state_response(room):
+    versions = room.versions.snapshot()
+    since = parse_cursor(request.args.get('since'), versions)
+    chat_seq = request.args.get('chat_seq', type=int)
+    wait = min(request.args.get('wait', 0, type=float), STATE_LONG_POLL_MAX)
+    
+    if since is not None and since >= versions['version'] and wait > 0 and long_poll_slots.acquire(blocking=False):
+        try:
+            if room.versions.wait(since, wait):
+                # Agrupar as mudanças seguintes (votos em rajada) em uma única resposta
+                time.sleep(VOTE_BROADCAST_INTERVAL)
+        finally:
+            long_poll_slots.release()
+        versions = room.versions.snapshot()
+    
+    response = Response(dumps(state_delta(room, versions, since, chat_seq), ensure_ascii=False, separators=(',', ':')),
+                        mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/quiz/state', methods=['GET'])
+def api_quiz_state():
+    return state_response(default_room)
+
+# Estado atual de uma sala, enviado aos clientes SSE que não podem retomar pelo Last-Event-ID
+def stream_snapshot(room):
+    question = room.current_question if room.running else None
+    return {
+        'quiz_running': room.running,
+        'phase': room.phase_state(),
+        'question': question.public if question is not None else None,
+        'question_num': room.current_question_index + 1 if question is not None else None,
+        'total_questions': room.total_questions(),
+        'answer_time': room.config.get('answer_time', 20),
+        'votes': room.count_votes(),
+        'chat': [record_to_dict(record) for record in room.chat_history.latest(SSE_SNAPSHOT_CHAT)],
+        'ranking': room_top_ranking(room),
+        'server_time': int(time.time() * 1000)
+    }
+
+# Stream SSE de uma sala: fases, votos, chat e ranking em uma única conexão
+def event_stream_response(room):
+    hub = event_hubs[room.room_id]
+    if not hub.accepting():
+        return jsonify({'success': False, 'message': 'Limite de conexões de eventos atingido'}), 503
+    
+    # O navegador reenvia o id do último evento ao reconectar
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(
+        hub.stream(last_event_id, lambda: stream_snapshot(room)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/quiz/stream', methods=['GET'])
+def api_quiz_stream():
+    return event_stream_response(default_room)
+
 @app.route('/api/quiz/start-http', methods=['POST'])
 def api_start_quiz_http():
-    global quiz_running, current_question, current_question_index, current_votes
-    
-    if quiz_running:
+    if default_room.running:
         return jsonify({
             'success': False,
             'message': 'Quiz já está em execução'
         })
     
-    # Iniciar o quiz
-    quiz_running = True
-    current_question_index = 0
-    current_votes = [0, 0, 0, 0]
-    
-    # Iniciar a thread de monitoramento do chat se não estiver rodando
-    if 'chat_thread' in globals() and (not chat_thread or not chat_thread.is_alive()):
-        start_chat_monitoring()
+    if not questions:
+        return jsonify({
+            'success': False,
+            'message': 'Nenhuma pergunta cadastrada'
+        })
     
-    # Avançar para a primeira pergunta
-    next_question()
+    # Iniciar o quiz pela primeira pergunta e a leitura do chat (no líder)
+    control_room(default_room, 'start')
     
     return jsonify({
         'success': True,
@@ -1182,38 +1499,55 @@ def api_start_quiz_http():
 
 @app.route('/api/quiz/stop-http', methods=['POST'])
 def api_stop_quiz_http():
-    global quiz_running
-    
-    if not quiz_running:
+    if not default_room.running:
         return jsonify({
             'success': False,
             'message': 'Quiz não está em execução'
         })
     
-    # Parar o quiz
-    quiz_running = False
+    # Parar o quiz imediatamente
+    control_room(default_room, 'stop')
     
     return jsonify({
         'success': True,
         'message': 'Quiz parado com sucesso'
     })
 
+# Pausar, retomar ou pular a fase atual do quiz
+@app.route('/api/quiz/pause', methods=['POST'])
+def api_pause_quiz():
+    if not control_room(default_room, 'pause'):
+        return jsonify({'success': False, 'message': 'Quiz não está em execução ou já está pausado', **default_room.phase_state()})
+    return jsonify({'success': True, 'message': 'Quiz pausado', **default_room.phase_state()})
+
+@app.route('/api/quiz/resume', methods=['POST'])
+def api_resume_quiz():
+    if not control_room(default_room, 'resume'):
+        return jsonify({'success': False, 'message': 'Quiz não está pausado', **default_room.phase_state()})
+    return jsonify({'success': True, 'message': 'Quiz retomado', **default_room.phase_state()})
+
+@app.route('/api/quiz/skip', methods=['POST'])
+def api_skip_phase():
+    if not control_room(default_room, 'skip'):
+        return jsonify({'success': False, 'message': 'Quiz não está em execução', **default_room.phase_state()})
+    return jsonify({'success': True, 'message': 'Fase pulada', **default_room.phase_state()})
+
 @app.route('/api/ranking-http', methods=['GET'])
 def api_ranking_http():
-    try:
-        # Obter o ranking atual
-        ranking_list = get_ranking()
-        
-        return jsonify({
-            'success': True,
-            'ranking': ranking_list
-        })
-    except Exception as e:
-        logger.error(f"Erro ao obter ranking via HTTP: {e}")
-        return jsonify({
-            'success': False,
-            'message': str(e)
-        }), 500
+    def build():
+        try:
+            # Obter o ranking atual
+            return {
+                'success': True,
+                'ranking': get_ranking()
+            }, 200
+        except Exception as e:
+            logger.error(f"Erro ao obter ranking via HTTP: {e}")
+            return {
+                'success': False,
+                'message': str(e)
+            }, 500
+    return versioned_response(default_room, 'ranking', ('ranking',), build)
 
 # API para conectar diretamente ao chat do YouTube
 @app.route('/api/connect-youtube', methods=['POST'])
@@ -1253,13 +1587,13 @@ def api_connect_youtube():
         # Limpar o chat container no cliente
         socketio.emit('clear_chat', {
             'message': 'Chat reiniciado para conexão com YouTube'
-        })
+        }, to=topic_channel(DEFAULT_ROOM, 'chat'))
         
         # Enviar mensagem de sistema
         socketio.emit('chat_message', {
             'author': 'Sistema',
             'message': f'Conectando ao chat do YouTube: {normalized_url}'
-        })
+        }, to=topic_channel(DEFAULT_ROOM, 'chat'))
         
         # Aguardar um momento para garantir que o thread anterior parou
         time.sleep(1)
@@ -1278,23 +1612,162 @@ def api_connect_youtube():
         logger.error(f"Erro ao conectar ao chat do YouTube: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+# Salas de quiz: vários quizzes independentes no mesmo processo (o quiz padrão é a sala 'default')
+
+# Resposta padrão para sala inexistente
+def room_not_found(room_id):
+    return jsonify({'success': False, 'message': f'Sala não encontrada: {room_id}'}), 404
+
+# Monitorar o chat do YouTube de uma sala enquanto o quiz dela estiver rodando
+def monitor_room_chat(room):
+    try:
+        normalized_url = normalize_youtube_url(room.config.get('youtube_url', ''))
+        if not normalized_url:
+            logger.info(f"Sala {room.room_id} sem URL do YouTube; mensagens apenas via /api/rooms/{room.room_id}/chat")
+            return
+        
+        logger.info(f"Sala {room.room_id}: conectando ao chat do YouTube {normalized_url}")
+        chat = ChatDownloader().get_chat(normalized_url, timeout=60, max_attempts=5)
+        for message in chat:
+            if not room.running or room.replica or room_manager.get(room.room_id) is not room:
+                break
+            author = message.get('author', {}).get('name', 'Anônimo')
+            process_chat_message(author, message.get('message', ''), room.room_id)
+    except Exception as e:
+        logger.error(f"Erro ao monitorar chat do YouTube da sala {room.room_id}: {e}")
+
+@app.route('/api/rooms', methods=['GET', 'POST'])
+def api_rooms():
+    """Lista as salas ou cria uma nova (room_id, config e questions opcionais)."""
+    if request.method == 'GET':
+        return jsonify({
+            'success': True,
+            'rooms': [room.status() for room in room_manager.rooms()],
+            'running': room_manager.running_count()
+        })
+    
+    try:
+        data = request.json or {}
+        room_id = validate_room_id(data.get('room_id'))
+        
+        # Configuração da sala: cópia da configuração global com as chaves permitidas sobrescritas
+        config = dict(quiz_config)
+        config.update({key: value for key, value in (data.get('config') or {}).items() if key in ROOM_CONFIG_KEYS})
+        validate_order(config.get('question_order', DEFAULT_ORDER))
+        
+        room_questions = data.get('questions')
+        if room_questions is not None and not isinstance(room_questions, list):
+            return jsonify({'success': False, 'message': 'questions deve ser uma lista'}), 400
+        errors = validate_questions(room_questions) if room_questions is not None else None
+        if errors:
+            return invalid_questions_response(errors)
+        
+        room = create_room(room_id, config, room_questions)
+        cluster.broadcast_event(room_id, '_room_created', {'config': config, 'questions': room_questions})
+        return jsonify({'success': True, 'room': room.status()}), 201
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@app.route('/api/rooms/<room_id>', methods=['GET', 'DELETE'])
+def api_room(room_id):
+    """Estado de uma sala ou remoção da sala (o quiz é parado)."""
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    
+    if request.method == 'DELETE':
+        if room is default_room:
+            return jsonify({'success': False, 'message': 'A sala padrão não pode ser removida'}), 400
+        remove_room(room_id)
+        cluster.broadcast_event(room_id, '_room_removed', {})
+        return jsonify({'success': True, 'message': f'Sala removida: {room_id}'})
+    
+    return jsonify({'success': True, 'room': room.status()})
+
+@app.route('/api/rooms/<room_id>/<action>', methods=['POST'])
+def api_room_control(room_id, action):
+    """Controle do quiz da sala: start, stop, pause, resume ou skip."""
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    
+    if action == 'start':
+        if not room.questions():
+            return jsonify({'success': False, 'message': 'Nenhuma pergunta cadastrada'})
+        success = control_room(room, action)
+    elif action in ('stop', 'pause', 'resume', 'skip'):
+        success = control_room(room, action)
+    else:
+        return jsonify({'success': False, 'message': f'Ação desconhecida: {action}'}), 404
+    
+    return jsonify({'success': success, 'room': room.status()})
+
+@app.route('/api/rooms/<room_id>/current-question', methods=['GET'])
+def api_room_current_question(room_id):
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    return current_question_response(room)
+
+@app.route('/api/rooms/<room_id>/votes', methods=['GET'])
+def api_room_votes(room_id):
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    return votes_response(room)
+
+@app.route('/api/rooms/<room_id>/chat', methods=['GET', 'POST'])
+def api_room_chat(room_id):
+    """Mensagens do chat da sala; POST {author, message} injeta uma mensagem (votos incluídos)."""
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    
+    if request.method == 'POST':
+        data = request.json or {}
+        author = data.get('author')
+        message = data.get('message')
+        if not author or not message:
+            return jsonify({'success': False, 'message': 'author e message são obrigatórios'}), 400
+        accepted = process_chat_message(author, message, room_id)
+        return jsonify({'success': accepted})
+    
+    return chat_response(room)
+
+@app.route('/api/rooms/<room_id>/state', methods=['GET'])
+def api_room_state(room_id):
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    return state_response(room)
+
+@app.route('/api/rooms/<room_id>/stream', methods=['GET'])
+def api_room_stream(room_id):
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    return event_stream_response(room)
+
+@app.route('/api/rooms/<room_id>/ranking', methods=['GET'])
+def api_room_ranking(room_id):
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    
+    offset = request.args.get('offset', 0, type=int)
+    limit = min(request.args.get('limit', 10, type=int), 500)
+    page = ranking_page(offset, limit) if room is default_room else room.ranking.page(offset, limit)
+    return jsonify({
+        'success': True,
+        'ranking': [{"name": name, "score": score} for name, score in page]
+    })
+
 # Função para obter o ranking atual
 def get_ranking():
     """Retorna o ranking atual ordenado por pontuação."""
     try:
-        # Converter o dicionário de ranking em uma lista de dicionários
-        ranking_list = []
-        for name, score in ranking.items():
-            ranking_list.append({
-                'name': name,
-                'score': score
-            })
-        
-        # Ordenar por pontuação (maior para menor)
-        ranking_list.sort(key=lambda x: x['score'], reverse=True)
-        
-        # Retornar os 10 primeiros
-        return ranking_list[:10]
+        # Os 10 primeiros saem direto do índice, sem ordenar o ranking inteiro
+        return get_top_ranking(10)
     except Exception as e:
         logger.error(f"Erro ao obter ranking: {e}")
         return []
@@ -1305,10 +1778,7 @@ def handle_get_ranking(data=None):
     """Manipulador para solicitação de ranking via Socket.IO."""
     emit('ranking_update', {'success': True, 'ranking': get_ranking()})
 
-# Dicionário para armazenar o último timestamp de ping por cliente
-last_ping_time = {}
-last_keep_alive_time = {}
-
+# O último ping e keep-alive de cada cliente ficam no registro de conexões (liberados no disconnect)
 # Intervalo mínimo entre pings e keep-alives (em segundos)
 PING_THROTTLE = 2.0  # Limitar a 1 resposta a cada 2 segundos
 KEEP_ALIVE_THROTTLE = 3.0  # Limitar a 1 keep-alive a cada 3 segundos
@@ -1320,15 +1790,12 @@ def handle_ping(data=None):
         client_id = request.sid
         current_time = time.time()
         
-        # Verificar se este cliente já recebeu uma resposta recentemente
-        if client_id in last_ping_time and current_time - last_ping_time[client_id] < PING_THROTTLE:
+        # Verificar se este cliente já recebeu uma resposta recentemente (e registrar esta)
+        if not connections.throttle(client_id, 'ping', PING_THROTTLE, current_time):
             # Se sim, ignorar este ping para evitar sobrecarga
             logger.debug(f"Ignorando ping do cliente {client_id} (rate limiting)")
             return
         
-        # Atualizar o timestamp do último ping
-        last_ping_time[client_id] = current_time
-        
         logger.info(f"Ping recebido do cliente {client_id}: {data}")
         
         # Verificar se o ping já foi limitado pelo cliente
@@ -1347,8 +1814,7 @@ def handle_ping(data=None):
         is_third_question = data and 'questionNumber' in data and data['questionNumber'] == 3
         
         if (is_third_question or is_critical) and \
-           (client_id not in last_keep_alive_time or \
-            current_time - last_keep_alive_time[client_id] > KEEP_ALIVE_THROTTLE):
+           connections.throttle(client_id, 'keep_alive', KEEP_ALIVE_THROTTLE, current_time):
             
             logger.info(f"Enviando keep-alive para momento crítico para cliente {client_id}")
             emit('keep_alive', {
@@ -1357,9 +1823,6 @@ def handle_ping(data=None):
                 'critical': True,
                 'rateLimited': True
             })
-            
-            # Atualizar o timestamp do último keep-alive
-            last_keep_alive_time[client_id] = current_time
     except Exception as e:
         logger.error(f"Erro ao processar ping do cliente: {e}")
 
@@ -1367,16 +1830,13 @@ def handle_ping(data=None):
 @socketio.on('keep_alive_response')
 def handle_keep_alive_response(data=None):
     try:
-        logger.info(f"Resposta de keep-alive recebida do cliente: {data}")
+        logger.debug(f"Resposta de keep-alive recebida do cliente: {data}")
         client_id = request.sid
         
-        # Registrar que este cliente está ativo
-        if data and 'timestamp' in data:
-            client_timestamp = data['timestamp']
-            server_timestamp = int(time.time() * 1000)
-            latency = server_timestamp - client_timestamp
-            
-            logger.info(f"Cliente {client_id} ativo. Latência: {latency}ms")
+        # Latência: tempo desde o envio do keep-alive (guardada no registro de conexões)
+        latency = connections.record_keep_alive_response(client_id)
+        if latency is not None:
+            logger.debug(f"Cliente {client_id} ativo. Latência: {latency}ms")
             
             # Se a latência for muito alta, enviar um alerta
             if latency > 2000:  # mais de 2 segundos
@@ -1398,34 +1858,34 @@ def handle_get_votes(data=None):
         logger.error(f"Erro ao enviar votos: {e}")
 @socketio.on('start_quiz')
 def handle_start_quiz(data=None):
-    global quiz_running, chat_thread, quiz_thread, current_question_index
+    global chat_thread
     
-    if quiz_running:
-        socketio.emit('quiz_status', {'success': False, 'message': 'Quiz já está em execução', 'quiz_running': quiz_running})
+    if default_room.running:
+        emit('quiz_status', {'success': False, 'message': 'Quiz já está em execução', 'quiz_running': default_room.running})
         return
     
     if not quiz_config['youtube_url']:
-        socketio.emit('quiz_status', {'success': False, 'message': 'URL do YouTube não configurada', 'quiz_running': quiz_running})
+        emit('quiz_status', {'success': False, 'message': 'URL do YouTube não configurada', 'quiz_running': default_room.running})
         return
     
     if not questions:
-        socketio.emit('quiz_status', {'success': False, 'message': 'Nenhuma pergunta cadastrada', 'quiz_running': quiz_running})
+        emit('quiz_status', {'success': False, 'message': 'Nenhuma pergunta cadastrada', 'quiz_running': default_room.running})
+        return
+    
+    if not cluster.is_leader:
+        # O líder inicia o quiz; o novo estado chega pela fila de mensagens
+        cluster.send_command('start', DEFAULT_ROOM)
         return
     
     try:
-        quiz_running = True
-        current_question_index = 0
+        # Iniciar o agendador de fases do quiz
+        start_quiz_scheduler()
         
         # Iniciar thread para monitorar chat
         chat_thread = threading.Thread(target=monitor_youtube_chat)
         chat_thread.daemon = True
         chat_thread.start()
         
-        # Iniciar thread para o loop do quiz
-        quiz_thread = threading.Thread(target=quiz_loop)
-        quiz_thread.daemon = True
-        quiz_thread.start()
-        
         # Iniciar thread para simular mensagens de chat (apenas para testes)
         sim_thread = threading.Thread(target=simulate_chat_messages)
         sim_thread.daemon = True
@@ -1435,45 +1895,160 @@ def handle_start_quiz(data=None):
         socketio.emit('quiz_status', {
             'success': True, 
             'message': 'Quiz iniciado com sucesso',
-            'quiz_running': quiz_running
+            'quiz_running': default_room.running
         })
     except Exception as e:
-        quiz_running = False
+        stop_quiz_scheduler()
         logger.error(f"Erro ao iniciar quiz: {e}")
-        socketio.emit('quiz_status', {
+        emit('quiz_status', {
             'success': False, 
             'message': f'Erro ao iniciar quiz: {str(e)}',
-            'quiz_running': quiz_running
+            'quiz_running': default_room.running
         })
 
 @socketio.on('stop_quiz')
 def handle_stop_quiz(data=None):
-    global quiz_running
-    
-    if not quiz_running:
-        socketio.emit('quiz_status', {'success': False, 'message': 'Quiz não está em execução', 'quiz_running': quiz_running})
+    if not default_room.running:
+        emit('quiz_status', {'success': False, 'message': 'Quiz não está em execução', 'quiz_running': default_room.running})
         return
     
-    quiz_running = False
-    socketio.emit('quiz_status', {'success': True, 'message': 'Quiz interrompido com sucesso', 'quiz_running': quiz_running})
+    control_room(default_room, 'stop')
+    socketio.emit('quiz_status', {'success': True, 'message': 'Quiz interrompido com sucesso', 'quiz_running': default_room.running})
+
+# Pausar a fase atual do quiz (o prazo fica congelado)
+@socketio.on('pause_quiz')
+def handle_pause_quiz(data=None):
+    if control_room(default_room, 'pause'):
+        emit('quiz_control', {'success': True, 'message': 'Quiz pausado', **default_room.phase_state()})
+    else:
+        emit('quiz_control', {'success': False, 'message': 'Quiz não está em execução ou já está pausado', **default_room.phase_state()})
+
+# Retomar a fase atual com o tempo que restava
+@socketio.on('resume_quiz')
+def handle_resume_quiz(data=None):
+    if control_room(default_room, 'resume'):
+        emit('quiz_control', {'success': True, 'message': 'Quiz retomado', **default_room.phase_state()})
+    else:
+        emit('quiz_control', {'success': False, 'message': 'Quiz não está pausado', **default_room.phase_state()})
+
+# Encerrar a fase atual imediatamente e passar para a seguinte
+@socketio.on('skip_phase')
+def handle_skip_phase(data=None):
+    if control_room(default_room, 'skip'):
+        emit('quiz_control', {'success': True, 'message': 'Fase pulada', **default_room.phase_state()})
+    else:
+        emit('quiz_control', {'success': False, 'message': 'Quiz não está em execução', **default_room.phase_state()})
+
+# Trocar o cliente de sala de quiz: a sala do Socket.IO geral e a de cada tópico inscrito
+def follow_quiz_room(room_id):
+    for channel in client_rooms():
+        if channel.startswith(room_channel('')):
+            leave_room(channel)
+    join_room(room_channel(room_id))
+    for topic in connections.subscriptions(request.sid):
+        join_room(topic_channel(room_id, topic))
+
+# Sala de quiz acompanhada pelo cliente
+def followed_quiz_room():
+    for channel in client_rooms():
+        if channel.startswith(room_channel('')) and channel.count(':') == 1:
+            return channel[len(room_channel('')):]
+    return DEFAULT_ROOM
+
+# Entrar na sala do Socket.IO de uma sala de quiz para receber os seus eventos
+@socketio.on('join_quiz_room')
+def handle_join_quiz_room(data=None):
+    room_id = (data or {}).get('room_id')
+    room = room_manager.get(room_id) if room_id else None
+    if room is None:
+        emit('room_joined', {'success': False, 'message': f'Sala não encontrada: {room_id}'})
+        return
+    # Um cliente acompanha uma sala por vez
+    follow_quiz_room(room_id)
+    emit('room_joined', {'success': True, 'room': room.status()})
+
+# Sair da sala do Socket.IO de uma sala de quiz
+@socketio.on('leave_quiz_room')
+def handle_leave_quiz_room(data=None):
+    room_id = (data or {}).get('room_id')
+    if room_id and room_id != DEFAULT_ROOM:
+        # Voltar a acompanhar o quiz padrão
+        follow_quiz_room(DEFAULT_ROOM)
+    emit('room_left', {'success': True, 'room_id': room_id})
+
+# Inscrever o cliente em tópicos (chat, votes, phase, ranking) da sala que ele acompanha
+@socketio.on('subscribe')
+def handle_subscribe(data=None):
+    try:
+        topics = parse_topics((data or {}).get('topics'))
+    except ValueError as e:
+        emit('subscriptions', {'success': False, 'message': str(e)})
+        return
+    room_id = followed_quiz_room()
+    for topic in topics:
+        if connections.subscribe(request.sid, topic):
+            join_room(topic_channel(room_id, topic))
+    emit('subscriptions', {'success': True, 'topics': sorted(connections.subscriptions(request.sid))})
+
+# Cancelar a inscrição em tópicos
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data=None):
+    try:
+        topics = parse_topics((data or {}).get('topics'))
+    except ValueError as e:
+        emit('subscriptions', {'success': False, 'message': str(e)})
+        return
+    room_id = followed_quiz_room()
+    for topic in topics:
+        connections.unsubscribe(request.sid, topic)
+        leave_room(topic_channel(room_id, topic))
+    emit('subscriptions', {'success': True, 'topics': sorted(connections.subscriptions(request.sid))})
 
 # Handler para conexão de cliente
 @socketio.on('connect')
 def handle_connect(data=None):
+    # Tópicos pedidos no auth do Socket.IO ou em ?topics=chat,votes (padrão: todos)
     try:
-        socketio.emit('quiz_status', {
+        requested = data.get('topics') if isinstance(data, dict) else None
+        topics = parse_topics(requested or request.args.get('topics'))
+    except ValueError as e:
+        raise ConnectionRefusedError(str(e))
+    # Controle de admissão: recusar o connect faz o cliente tentar de novo com backoff
+    if connections.admit(request.sid, request.remote_addr) is None:
+        logger.warning(f"Conexão recusada (conexões: {len(connections)}): {request.sid}")
+        return False
+    try:
+        for topic in topics:
+            connections.subscribe(request.sid, topic)
+        # Todo cliente começa acompanhando o quiz padrão
+        follow_quiz_room(DEFAULT_ROOM)
+        # Status apenas para quem conectou (um broadcast aqui seria enviado a todos a cada conexão)
+        emit('quiz_status', {
             'success': True,
-            'quiz_running': quiz_running,
-            'message': 'Conectado ao servidor'
+            'quiz_running': default_room.running,
+            'message': 'Conectado ao servidor',
+            'topics': list(topics)
         })
-        logger.info("Cliente conectado")
+        logger.debug(f"Cliente conectado: {request.sid}")
     except Exception as e:
         logger.error(f"Erro ao processar conexão: {e}")
 
+# Handler para desconexão de cliente
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    connections.remove(request.sid)
+
 # Inicialização
 load_config()
 load_questions()
 load_ranking()
+# Índice de busca montado em segundo plano (a primeira busca não espera a leitura do banco todo)
+threading.Thread(target=lambda: search_index.ensure(question_bank()), daemon=True).start()
+atexit.register(ranking_journal.close)
+chat_pipeline.start()
+vote_broadcaster.start()
+cluster.start()
+atexit.register(cluster.stop)
 
 # Função para simular mensagens de chat (apenas para testes)
 def simulate_chat_messages():
@@ -1499,7 +2074,7 @@ def simulate_chat_messages():
     commands = ["!a", "!b", "!c", "!d", "!A", "!B", "!C", "!D"]
     
     # Loop para simular mensagens enquanto o quiz estiver rodando
-    while quiz_running and is_simulator_running:
+    while default_room.running and not default_room.replica and is_simulator_running:
         try:
             # Verificar se o simulador ainda deve estar rodando
             if not is_simulator_running:
@@ -1510,7 +2085,7 @@ def simulate_chat_messages():
             username = random.choice(usernames)
             
             # 50% de chance de ser um comando de resposta
-            if random.random() > 0.5 and current_question is not None:
+            if random.random() > 0.5 and default_room.current_question is not None:
                 msg = random.choice(commands)
                 logger.info(f"Simulando voto: {username} -> {msg}")
             else:
@@ -1553,23 +2128,18 @@ def simulate_chat_messages():
 
 # Iniciar o quiz automaticamente quando o servidor é iniciado
 def auto_start_quiz():
-    global quiz_running, chat_thread, quiz_thread, current_question_index
+    global chat_thread
     
-    # Verificar se há perguntas 
-    if questions:
-        quiz_running = True
-        current_question_index = 0
+    # Verificar se há perguntas (o quiz roda apenas no worker líder)
+    if questions and cluster.is_leader:
+        # Iniciar o agendador de fases do quiz
+        start_quiz_scheduler()
         
         # Iniciar thread para monitorar chat
         chat_thread = threading.Thread(target=monitor_youtube_chat)
         chat_thread.daemon = True
         chat_thread.start()
         
-        # Iniciar thread para o loop do quiz
-        quiz_thread = threading.Thread(target=quiz_loop)
-        quiz_thread.daemon = True
-        quiz_thread.start()
-        
         # Iniciar thread para simular mensagens de chat (apenas para testes)
         sim_thread = threading.Thread(target=simulate_chat_messages)
         sim_thread.daemon = True
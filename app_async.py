@@ -0,0 +1,1290 @@
+"""
+Servidor asyncio do quiz (python-socketio AsyncServer + aiohttp).
+
+Alternativa ao app.py para dezenas de milhares de espectadores: cada socket
+ou long-poll é uma coroutine em vez de uma thread do sistema operacional.
+O agendador de fases, a ingestão do chat e as transmissões rodam no event
+loop; leitura e escrita em disco (configuração, perguntas, SQLite) e o
+leitor do chat do YouTube rodam em um executor. As rotas HTTP e os eventos
+do Socket.IO espelham os do app.py.
+
+Uso:
+    python app_async.py          (porta em PORT, padrão 5000)
+    SOCKETIO_ASYNC_MODE=asyncio python run_quiz_production.py
+"""
+import asyncio
+import functools
+import inspect
+import json
+import os
+import random
+import socket
+import time
+import logging
+from datetime import datetime
+from urllib.parse import parse_qs
+
+import jinja2
+import socketio
+from aiohttp import web
+from chat_downloader import ChatDownloader
+
+from async_runtime import AsyncioTimer, AsyncVoteBroadcaster, AsyncChatPipeline, AsyncBroadcastHub, spawn
+from chat_history import record_to_dict
+from ranking_journal import RankingJournal
+from sqlite_store import SQLiteStore, SQLiteQuestionList, storage_backend
+from quiz_room import (QuizRoom, RoomManager, DEFAULT_ROOM, ROOM_CONFIG_KEYS, room_channel, topic_channel, event_channel,
+                       parse_topics, validate_room_id)
+from question_model import CompiledQuestions, QuestionError, compile_question, validate_questions, packet_json, dumps
+from question_store import (QuestionStore, QuestionConflict, QuestionNotFound, FACETS, WRITE_MODES, DEFAULT_PAGE_SIZE,
+                            MAX_PAGE_SIZE, list_page, list_facets, json_array_chunks, merge_question, question_etag)
+from question_import import IMPORT_CHUNK_SIZE, ImportFormatError, QuestionImport
+from question_search import QuestionSearchIndex
+from question_history import QuestionHistory
+from question_order import DEFAULT_ORDER, QuestionCatalog, validate_order
+from quiz_scheduler import PHASE_RESULTS
+from state_versions import etag_matches, stable_phase, cursor_of, parse_cursor, pieces_changed
+from connection_registry import ConnectionRegistry
+
+# Configuração de logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Servidor Socket.IO assíncrono (mesmos tempos de ping do app.py)
+sio = socketio.AsyncServer(
+    async_mode='aiohttp',
+    cors_allowed_origins='*',
+    ping_timeout=120,
+    ping_interval=10,
+    max_http_buffer_size=int(5e6),
+    http_compression=False,
+    logger=False,
+    engineio_logger=False,
+    json=packet_json  # Perguntas enviadas com o JSON pré-codificado
+)
+web_app = web.Application()
+sio.attach(web_app)
+
+# Templates do Flask renderizados com Jinja2 (url_for apenas para os arquivos estáticos)
+templates = jinja2.Environment(
+    loader=jinja2.FileSystemLoader('templates'),
+    autoescape=jinja2.select_autoescape(['html'])
+)
+templates.globals['url_for'] = lambda endpoint, filename='': f'/static/{filename}'
+
+# Diretório para armazenar dados
+DATA_DIR = 'data'
+QUESTIONS_FILE = os.path.join(DATA_DIR, 'questions.json')
+RANKING_FILE = os.path.join(DATA_DIR, 'ranking.json')
+CONFIG_FILE = os.path.join(DATA_DIR, 'config.json')
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Armazenamento opcional em SQLite (QUIZ_STORAGE=sqlite)
+QUIZ_DB_PATH = os.environ.get('QUIZ_DB_PATH', os.path.join(DATA_DIR, 'quiz.db'))
+sqlite_store = SQLiteStore(QUIZ_DB_PATH) if storage_backend() == 'sqlite' else None
+question_store = QuestionStore(DATA_DIR)  # questions.jsonl + questions.idx, lido sob demanda
+search_index = QuestionSearchIndex()  # Busca textual nas perguntas (índice em memória)
+question_history = QuestionHistory(DATA_DIR)  # Perguntas feitas (filtro "nunca perguntadas")
+question_catalog = QuestionCatalog(question_history)  # Categorias e taxas de acerto para 'question_order'
+
+DEFAULT_CONFIG = {
+    'youtube_url': '',
+    'answer_time': 20,
+    'vote_count_time': 8,
+    'result_display_time': 5,
+    'primary_color': '#f39c12',
+    'secondary_color': '#8e44ad',
+    'enable_chat_simulator': True,
+    'vote_policy': 'last',
+    'vote_lock_seconds': 0,
+    'question_order': 'sequential'
+}
+
+quiz_config = dict(DEFAULT_CONFIG)
+questions = []
+compiled_questions = CompiledQuestions(questions)  # Perguntas prontas para envio (parte pública e resposta)
+server_start_time = time.time()
+
+CHAT_HISTORY_SIZE = int(os.environ.get('CHAT_HISTORY_SIZE', 1000))
+COUNTING_TIME = float(os.environ.get('QUIZ_COUNTING_TIME', 2))
+MAX_QUIZ_ROOMS = int(os.environ.get('MAX_QUIZ_ROOMS', 500))
+VOTE_BROADCAST_INTERVAL = float(os.environ.get('VOTE_BROADCAST_INTERVAL', 0.2))
+CHAT_PIPELINE_WORKERS = int(os.environ.get('CHAT_PIPELINE_WORKERS', 2))
+CHAT_QUEUE_SIZE = int(os.environ.get('CHAT_QUEUE_SIZE', 2000))
+CHAT_OVERFLOW_POLICY = os.environ.get('CHAT_OVERFLOW_POLICY', 'drop_oldest')
+HTTP_CACHE_SECONDS = int(os.environ.get('HTTP_CACHE_SECONDS', 1))  # s-maxage das rotas de polling
+STATE_LONG_POLL_MAX = float(os.environ.get('STATE_LONG_POLL_MAX', 25))  # Espera máxima de /api/quiz/state
+SSE_BUFFER_SIZE = int(os.environ.get('SSE_BUFFER_SIZE', 500))  # Eventos guardados para retomar (Last-Event-ID)
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 10000))  # Streams SSE por sala (coroutines)
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+SSE_SNAPSHOT_CHAT = 50  # Mensagens de chat na fotografia inicial
+MAX_CONNECTIONS = int(os.environ.get('MAX_CONNECTIONS', 50000))  # Conexões Socket.IO simultâneas
+CONNECT_RATE = float(os.environ.get('CONNECT_RATE', 500))  # Novas conexões por segundo
+CONNECT_BURST = int(os.environ.get('CONNECT_BURST', 2000))  # Rajada de conexões aceita de uma vez
+
+# Executar uma função bloqueante (disco, SQLite) fora do event loop
+async def run_blocking(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+# Armazenamento (funções bloqueantes, chamadas com run_blocking)
+
+def load_config():
+    try:
+        if sqlite_store:
+            loaded_config = sqlite_store.load_config()
+            if loaded_config:
+                quiz_config.update(loaded_config)
+            else:
+                save_config()
+        elif os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                quiz_config.update(json.load(f))
+        else:
+            save_config()
+    except Exception as e:
+        logger.error(f"Erro ao carregar configurações: {e}")
+
+def save_config():
+    try:
+        if sqlite_store:
+            sqlite_store.save_config(quiz_config)
+        else:
+            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+                json.dump(quiz_config, f, ensure_ascii=False, indent=4)
+        logger.info("Configurações salvas com sucesso")
+    except Exception as e:
+        logger.error(f"Erro ao salvar configurações: {e}")
+
+def load_questions():
+    global questions
+    try:
+        if sqlite_store and sqlite_store.count_questions():
+            questions = SQLiteQuestionList(sqlite_store)
+            questions.assign_ids()
+        elif question_store.exists() and not question_store.older_than(QUESTIONS_FILE):
+            question_store.invalidate()
+            question_store.assign_ids()
+            questions = question_store
+            if sqlite_store:
+                save_questions()
+        elif os.path.exists(QUESTIONS_FILE):
+            with open(QUESTIONS_FILE, 'r', encoding='utf-8') as f:
+                questions = json.load(f)
+            # Converter para o banco indexado (ou importar no SQLite vazio)
+            save_questions()
+        logger.info(f"Carregadas {len(questions)} perguntas")
+    except Exception as e:
+        logger.error(f"Erro ao carregar perguntas: {e}")
+        questions = []
+    # Compiladas uma única vez ao carregar (no executor, fora do event loop)
+    compile_questions()
+
+def compile_questions():
+    global questions, compiled_questions
+    compiled_questions = CompiledQuestions(questions)
+    if isinstance(questions, list):
+        # Os dicionários originais são descartados: a lista compilada devolve as perguntas no formato do banco
+        questions = compiled_questions
+    question_catalog.invalidate(compiled_questions)
+
+def save_questions():
+    global questions
+    try:
+        if sqlite_store:
+            if not isinstance(questions, SQLiteQuestionList):
+                sqlite_store.replace_questions(questions)
+                questions = SQLiteQuestionList(sqlite_store)
+        elif questions is not question_store:
+            question_store.replace(questions)
+            questions = question_store
+        logger.info(f"Salvas {len(questions)} perguntas")
+    except Exception as e:
+        logger.error(f"Erro ao salvar perguntas: {e}")
+
+def question_bank():
+    return SQLiteQuestionList(sqlite_store) if sqlite_store else question_store
+
+def question_writer(mode):
+    return question_bank().writer(mode)
+
+# Persistência do ranking: diário de variações por pergunta (escrito pela thread do diário)
+ranking_journal = RankingJournal(DATA_DIR, legacy_file=RANKING_FILE)
+
+def load_ranking():
+    try:
+        if sqlite_store:
+            ranking.load(sqlite_store.load_ranking())
+        else:
+            ranking.load(ranking_journal.load())
+        logger.info(f"Ranking carregado com {len(ranking)} usuários")
+    except Exception as e:
+        logger.error(f"Erro ao carregar ranking: {e}")
+
+def normalize_youtube_url(url):
+    """Normaliza uma URL do YouTube (mesmas regras do app.py); retorna None se inválida."""
+    if not url:
+        return None
+    video_id = None
+    if 'youtube.com/watch' in url and 'v=' in url:
+        video_id = url.split('v=')[1].split('&')[0]
+    elif 'youtu.be/' in url:
+        video_id = url.split('youtu.be/')[1].split('?')[0]
+    elif 'youtube.com/live/' in url:
+        video_id = url.split('youtube.com/live/')[1].split('?')[0]
+    return f"https://www.youtube.com/watch?v={video_id}" if video_id else None
+
+# Chat: fila limitada consumida por coroutines
+
+def handle_chat_item(author, message, vote, room_id):
+    room = room_manager.get(room_id or DEFAULT_ROOM)
+    if room is not None:
+        room.handle_chat(author, message, vote)
+
+def process_chat_message(author, message, room_id=None):
+    return chat_pipeline.submit(author, message, room=room_id)
+
+async def emit_votes_update(room):
+    await sio.emit('update_votes', {
+        'votes': room.count_votes(),
+        'timestamp': time.time()
+    }, to=event_channel(room.room_id, 'update_votes'))
+
+chat_pipeline = AsyncChatPipeline(
+    handle_chat_item,
+    workers=CHAT_PIPELINE_WORKERS,
+    max_queue_size=CHAT_QUEUE_SIZE,
+    overflow_policy=CHAT_OVERFLOW_POLICY
+)
+vote_broadcaster = AsyncVoteBroadcaster(emit_votes_update, interval=VOTE_BROADCAST_INTERVAL)
+
+# Fontes de chat em execução por sala (tarefa do simulador ou leitor do YouTube)
+chat_sources = {}
+
+# Ler o chat do YouTube (bloqueante, roda no executor) enquanto o quiz da sala estiver rodando
+def read_youtube_chat(room, url):
+    try:
+        logger.info(f"Sala {room.room_id}: conectando ao chat do YouTube {url}")
+        chat = ChatDownloader().get_chat(url, timeout=60, max_attempts=5)
+        for message in chat:
+            if not room.running or room_manager.get(room.room_id) is not room:
+                break
+            author = message.get('author', {}).get('name', 'Anônimo')
+            chat_pipeline.submit_threadsafe(author, message.get('message', ''), room.room_id)
+    except Exception as e:
+        logger.error(f"Erro ao monitorar chat do YouTube da sala {room.room_id}: {e}")
+
+# Simulador de mensagens do chat (apenas para testes), como coroutine
+async def simulate_chat_messages(room):
+    usernames = ["João123", "MariaGamer", "PedroYT", "Ana_Live", "Carlos_Fan",
+                 "Lucia_Games", "Roberto_TV", "Patricia_Stream", "FelipeZ", "JuliaQuiz"]
+    messages = ["Olá pessoal!", "Esse quiz é muito legal!", "Adoro participar!",
+                "Qual é a próxima pergunta?", "Estou ganhando!", "Difícil essa!"]
+    commands = ["!a", "!b", "!c", "!d", "!A", "!B", "!C", "!D"]
+    await asyncio.sleep(2)
+    while room.running and room.config.get('enable_chat_simulator', True):
+        if random.random() > 0.5 and room.current_question is not None:
+            text = random.choice(commands)
+        else:
+            text = random.choice(messages)
+        process_chat_message(random.choice(usernames), text, room.room_id)
+        await asyncio.sleep(random.uniform(0.5, 3))
+
+# Iniciar a fonte de chat da sala, se ainda não houver uma ativa
+def start_chat_source(room):
+    current = chat_sources.get(room.room_id)
+    if current is not None and not current.done():
+        return
+    if room is default_room and room.config.get('enable_chat_simulator', True):
+        chat_sources[room.room_id] = spawn(simulate_chat_messages(room), name=f'chat-sim-{room.room_id}')
+        return
+    url = normalize_youtube_url(room.config.get('youtube_url', ''))
+    if not url:
+        logger.info(f"Sala {room.room_id} sem URL do YouTube; mensagens apenas via HTTP")
+        return
+    chat_sources[room.room_id] = asyncio.get_running_loop().run_in_executor(None, read_youtube_chat, room, url)
+
+# Salas: as fases rodam no event loop (AsyncioTimer) e os envios são tarefas
+
+quiz_timer = AsyncioTimer()
+room_manager = RoomManager(max_rooms=MAX_QUIZ_ROOMS)
+
+# Server-Sent Events: um hub por sala com os mesmos eventos enviados aos sockets
+event_hubs = {}
+
+# Cada evento vai apenas para os inscritos no seu tópico na sala (e para os streams SSE)
+def room_emitter(room_id, hub):
+    def emit(event, data):
+        spawn(sio.emit(event, data, to=event_channel(room_id, event)), name=event)
+        hub.publish(event, data)
+    return emit
+
+# Top 10 da sala (o ranking em memória é o completo: carregado na inicialização)
+def room_top_ranking(room, n=10):
+    return [{"name": name, "score": score} for name, score in room.ranking.page(0, n)]
+
+def handle_room_results(room, question_position, correct_letter, final_user_votes, final_votes):
+    # Pontuar no loop (apenas memória); a persistência vai para o diário ou para o executor
+    deltas = {}
+    for user, vote in final_user_votes.items():
+        if vote == correct_letter:
+            room.ranking.add(user, 1)
+            deltas[user] = 1
+        elif user not in room.ranking:
+            room.ranking.set(user, 0)
+            deltas[user] = 0
+    room.versions.bump('ranking')
+    logger.info(f"Ranking da sala {room.room_id} atualizado: {sum(deltas.values())} usuários pontuaram")
+    # O ranking não é enviado aos sockets em tempo real; os clientes SSE o recebem após cada pergunta
+    hub = event_hubs.get(room.room_id)
+    if hub:
+        hub.publish('ranking_update', {'success': True, 'ranking': room_top_ranking(room)})
+
+    question_id = room.current_question.id
+    if question_id is not None:
+        spawn(run_blocking(record_question_history, room.picker.catalog, question_id, sum(final_votes.values()),
+                           final_votes.get(correct_letter, 0)), name='save-history')
+
+    if room is not default_room or not deltas:
+        return
+    if sqlite_store:
+        spawn(run_blocking(sqlite_store.apply_score_deltas, deltas), name='save-ranking')
+        spawn(run_blocking(sqlite_store.record_question_result, question_position, correct_letter, final_votes),
+              name='save-result')
+    else:
+        ranking_journal.append(deltas)  # Apenas enfileira: a thread do diário grava
+
+# Histórico da pergunta feita e a nova taxa de acerto no catálogo (ordem adaptativa); roda no executor
+def record_question_history(catalog, question_id, votes, correct):
+    question_history.record(question_id, votes, correct)
+    catalog.update(question_id)
+
+def create_room(room_id, config=None, room_questions=None):
+    if config is None:
+        config = quiz_config
+    if room_questions is None:
+        questions_fn = lambda: compiled_questions
+        catalog = question_catalog
+    else:
+        room_compiled = CompiledQuestions(room_questions)
+        questions_fn = lambda: room_compiled
+        catalog = QuestionCatalog(question_history)
+        catalog.invalidate(room_compiled)
+    hub = AsyncBroadcastHub(capacity=SSE_BUFFER_SIZE, heartbeat=SSE_HEARTBEAT, max_clients=SSE_MAX_CLIENTS)
+    room = QuizRoom(
+        room_id,
+        config,
+        questions_fn,
+        quiz_timer,
+        room_emitter(room_id, hub),
+        on_results=handle_room_results,
+        votes=vote_broadcaster,
+        counting_time=COUNTING_TIME,
+        chat_history_size=CHAT_HISTORY_SIZE,
+        catalog=catalog
+    )
+    room.versions.on_change = lambda: notify_state_change(room_id)
+    room = room_manager.add(room)
+    event_hubs[room_id] = hub
+    return room
+
+# Long-poll de /api/quiz/state: um evento por sala, trocado a cada mudança de versão
+# (as versões só mudam na thread do event loop)
+state_waiters = {}
+
+def notify_state_change(room_id):
+    event = state_waiters.pop(room_id, None)
+    if event:
+        event.set()
+
+async def wait_for_state(room, since, timeout):
+    if room.versions.version > since:
+        return True
+    event = state_waiters.setdefault(room.room_id, asyncio.Event())
+    try:
+        await asyncio.wait_for(event.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+default_room = create_room(DEFAULT_ROOM)
+ranking = default_room.ranking
+
+def start_room_quiz(room):
+    if not room.start():
+        return False
+    start_chat_source(room)
+    return True
+
+async def ranking_page(offset, limit):
+    if sqlite_store:
+        return await run_blocking(sqlite_store.top_ranking, limit, offset)
+    return ranking.page(offset, limit)
+
+async def get_top_ranking(n=10):
+    return [{"name": name, "score": score} for name, score in await ranking_page(0, n)]
+
+# Respostas HTTP
+
+def json_response(data, status=200):
+    return web.json_response(data, status=status, dumps=functools.partial(dumps, ensure_ascii=False))
+
+async def request_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+def invalid_questions_response(errors):
+    return json_response({
+        'success': False,
+        'message': str(errors[0]),
+        'errors': [error.to_dict() for error in errors]
+    }, 400)
+
+def room_not_found(room_id):
+    return json_response({'success': False, 'message': f'Sala não encontrada: {room_id}'}, 404)
+
+# Rotas de polling: corpo serializado uma vez por versão do estado, ETag e 304 (como no app.py)
+def versioned_response(request, room, key, pieces, build):
+    etag, body, status = room.versions.cached(key, pieces, build)
+    if status != 200:
+        return web.Response(body=body, status=status, content_type='application/json')
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age=0, s-maxage={HTTP_CACHE_SECONDS}'}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type='application/json', headers=headers)
+
+# Pergunta e total de perguntas mudaram em todas as salas
+def questions_changed():
+    for room in room_manager.rooms():
+        room.versions.bump('question')
+
+def current_question_payload(room):
+    question = room.current_question
+    if not room.running or question is None:
+        return {'success': False, 'message': 'Quiz não está em execução ou não há pergunta atual'}, 404
+    return {
+        'success': True,
+        'question': question.public,
+        'answer_time': room.config.get('answer_time', 20),
+        'phase': stable_phase(room.phase_state()),
+        'question_num': room.current_question_index + 1,
+        'total_questions': room.total_questions()
+    }, 200
+
+def votes_payload(room):
+    if not room.running:
+        return {'success': False, 'message': 'Quiz não está em execução'}, 404
+    counts = list(room.count_votes().values())
+    total_votes = sum(counts)
+    question = room.current_question
+    correct_index = question.correct if question else 0
+    correct_votes = counts[correct_index] if 0 <= correct_index < len(counts) else 0
+    votes = {letter: counts[i] for i, letter in enumerate('abcd')}
+    votes['correct_percentage'] = (correct_votes / total_votes * 100) if total_votes > 0 else 0
+    return {'success': True, 'votes': votes}, 200
+
+def chat_payload(room, request):
+    since_seq = request.query.get('since_seq')
+    since = request.query.get('since')
+    try:
+        if since_seq is not None:
+            records = room.chat_history.since_seq(int(since_seq))
+        else:
+            records = room.chat_history.since_timestamp(float(since or 0))
+    except ValueError:
+        return {'success': False, 'message': 'since_seq/since inválido'}, 400
+    return {
+        'success': True,
+        'messages': [record_to_dict(record) for record in records],
+        'last_seq': room.chat_history.last_seq()
+    }, 200
+
+def state_delta(room, versions, since, chat_seq):
+    changed = pieces_changed(versions, since)
+    delta = {
+        'success': True,
+        'version': cursor_of(versions),
+        'full': since is None,
+        'server_time': int(time.time() * 1000)
+    }
+    question = room.current_question if room.running else None
+    if 'phase' in changed:
+        delta['quiz_running'] = room.running
+        delta['phase'] = room.phase_state()
+        if delta['phase']['phase'] == PHASE_RESULTS and question is not None:
+            delta['results'] = {
+                'correct_answer': question.answer.letter,
+                'explanation': question.answer.explanation,
+                'votes': room.count_votes()
+            }
+    if 'question' in changed:
+        delta['question'] = question.public if question is not None else None
+        delta['question_num'] = room.current_question_index + 1 if question is not None else None
+        delta['total_questions'] = room.total_questions()
+        delta['answer_time'] = room.config.get('answer_time', 20)
+    if 'tally' in changed:
+        delta['votes'] = room.count_votes()
+    if 'chat' in changed:
+        records = room.chat_history.latest(50) if chat_seq is None else room.chat_history.since_seq(chat_seq)
+        delta['chat'] = [record_to_dict(record) for record in records]
+        delta['last_seq'] = room.chat_history.last_seq()
+    if 'ranking' in changed:
+        delta['ranking'] = [{"name": name, "score": score} for name, score in room.ranking.page(0, 10)]
+    return delta
+
+# Diferença do estado desde ?since=<cursor>; com ?wait= e nada novo, espera a próxima mudança
+async def state_response(room, request):
+    versions = room.versions.snapshot()
+    since = parse_cursor(request.query.get('since'), versions)
+    try:
+        chat_seq = int(request.query['chat_seq']) if 'chat_seq' in request.query else None
+        wait = min(float(request.query.get('wait', 0)), STATE_LONG_POLL_MAX)
+    except ValueError:
+        return json_response({'success': False, 'message': 'chat_seq/wait inválido'}, 400)
+    if since is not None and since >= versions['version'] and wait > 0:
+        if await wait_for_state(room, since, wait):
+            # Agrupar as mudanças seguintes (votos em rajada) em uma única resposta
+            await asyncio.sleep(VOTE_BROADCAST_INTERVAL)
+        versions = room.versions.snapshot()
+    response = json_response(state_delta(room, versions, since, chat_seq))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+routes = web.RouteTableDef()
+
+@routes.get('/')
+async def home(request):
+    return web.Response(text=templates.get_template('home.html').render(), content_type='text/html')
+
+@routes.get('/quiz')
+async def quiz_page(request):
+    """Página principal do quiz (mesmas variáveis de cor do app.py)."""
+    def hex_to_rgb(hex_color):
+        hex_color = hex_color.lstrip('#')
+        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+
+    def shade(hex_color, factor):
+        # factor > 0 clareia, factor < 0 escurece
+        rgb = hex_to_rgb(hex_color)
+        if factor > 0:
+            rgb = [min(255, int(c + (255 - c) * factor)) for c in rgb]
+        else:
+            rgb = [max(0, int(c * (1 + factor))) for c in rgb]
+        return '#{:02x}{:02x}{:02x}'.format(*rgb)
+
+    primary = quiz_config['primary_color']
+    secondary = quiz_config['secondary_color']
+    config = {
+        'primary_color': primary,
+        'primary_color_rgb': ', '.join(str(c) for c in hex_to_rgb(primary)),
+        'primary_light': shade(primary, 0.2),
+        'primary_dark': shade(primary, -0.2),
+        'secondary_color': secondary,
+        'secondary_color_rgb': ', '.join(str(c) for c in hex_to_rgb(secondary)),
+        'secondary_light': shade(secondary, 0.2),
+        'secondary_dark': shade(secondary, -0.2),
+        'server_ip': socket.gethostname(),
+        'server_port': PORT
+    }
+    return web.Response(text=templates.get_template('quiz.html').render(config=config), content_type='text/html')
+
+@routes.get('/api/health')
+async def health_check(request):
+    return json_response({
+        'status': 'ok',
+        'server': 'asyncio',
+        'timestamp': datetime.now().isoformat(),
+        'quiz_running': default_room.running,
+        'uptime': time.time() - server_start_time,
+        'connected_clients': len(connections),
+        'connections': connections.stats(),
+        'question_store': question_store.stats(),
+        'question_search': search_index.stats(),
+        'question_history': question_history.stats(),
+        'question_catalog': question_catalog.stats(),
+        'tasks': len(asyncio.all_tasks()),
+        'chat_pipeline': chat_pipeline.stats(),
+        'vote_broadcaster': vote_broadcaster.stats(),
+        'rooms': len(room_manager),
+        'rooms_running': room_manager.running_count(),
+        'event_stream': event_hubs[DEFAULT_ROOM].stats(),
+        'event_stream_clients': sum(hub.clients for hub in list(event_hubs.values())),
+        'state_versions': default_room.versions.stats()
+    })
+
+@routes.get('/api/connections/{sid}')
+async def api_connection(request):
+    sid = request.match_info['sid']
+    latency = connections.latency(sid)
+    if latency is None:
+        return json_response({'success': False, 'message': 'Conexão não encontrada'}, status=404)
+    return json_response({'success': True, 'sid': sid, 'subscriptions': sorted(connections.subscriptions(sid)),
+                          'latency_ms': latency})
+
+@routes.get('/api/config')
+async def api_get_config(request):
+    return json_response(quiz_config)
+
+@routes.post('/api/config')
+async def api_save_config(request):
+    data = await request_json(request)
+    if not isinstance(data, dict):
+        return json_response({'success': False, 'message': 'JSON inválido'}, 400)
+    if 'question_order' in data:
+        try:
+            validate_order(data['question_order'])
+        except ValueError as e:
+            return json_response({'success': False, 'message': str(e)}, 400)
+    quiz_config.update(data)
+    questions_changed()
+    await run_blocking(save_config)
+    return json_response({'success': True})
+
+@routes.get('/api/questions')
+async def api_get_questions(request):
+    # Listagem paginada e filtrada (offset, limit, category, difficulty), como no app.py
+    if any(key in request.query for key in ('offset', 'limit') + FACETS):
+        try:
+            offset = max(0, int(request.query.get('offset', 0)))
+            limit = min(MAX_PAGE_SIZE, max(1, int(request.query.get('limit', DEFAULT_PAGE_SIZE))))
+        except ValueError:
+            return json_response({'success': False, 'message': 'offset/limit inválido'}, 400)
+        filters = {facet: request.query[facet] for facet in FACETS if request.query.get(facet)}
+        total, items = await run_blocking(list_page, questions, offset, limit, filters)
+        return json_response({
+            'success': True,
+            'total': total,
+            'offset': offset,
+            'limit': limit,
+            'questions': [dict(question, position=position, etag=question_etag(question)) for position, question in items]
+        })
+    # Sem parâmetros: todas as perguntas em stream, lidas do disco no executor
+    response = web.StreamResponse(headers={'Content-Type': 'application/json; charset=utf-8'})
+    if request.query.get('download'):
+        response.headers['Content-Disposition'] = 'attachment; filename=quiz-perguntas.json'
+    await response.prepare(request)
+    chunks = json_array_chunks(questions)
+    while True:
+        chunk = await run_blocking(next, chunks, None)
+        if chunk is None:
+            break
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+@routes.get('/api/questions/facets')
+async def api_question_facets(request):
+    facets = await run_blocking(list_facets, questions)
+    return json_response({'success': True, 'total': len(questions), 'facets': facets})
+
+@routes.post('/api/questions')
+async def api_save_questions(request):
+    global questions
+    data = await request_json(request)
+    if isinstance(data, dict) and isinstance(data.get('questions'), list):
+        errors = await run_blocking(validate_questions, data['questions'])
+        if errors:
+            return invalid_questions_response(errors)
+        questions = data['questions']
+        await run_blocking(save_questions)
+        await run_blocking(compile_questions)
+        questions_changed()
+        search_index.invalidate()
+        return json_response({'success': True, 'count': len(questions)})
+    if isinstance(data, dict) and 'questions' not in data:
+        # Uma única pergunta: acrescentada ao banco com um id novo
+        try:
+            question = compile_question(data, len(questions)).to_dict()
+            position, question = await run_blocking(question_bank().add, question)
+        except QuestionError as e:
+            return invalid_questions_response([e])
+        await questions_edited(question['id'])
+        return question_response(position, question, 201)
+    return json_response(list(questions))
+
+@routes.post('/api/questions/import')
+async def api_import_questions(request):
+    # Importação em massa como no app.py: o upload é lido em pedaços e cada pedaço é processado no executor
+    mode = request.query.get('mode', 'append')
+    if mode not in WRITE_MODES:
+        return json_response({'success': False, 'message': f"Modo inválido: {mode} (use {', '.join(WRITE_MODES)})"}, 400)
+    read = request.content.read
+    if request.content_type == 'multipart/form-data':
+        reader = await request.multipart()
+        part = await reader.next()
+        while part is not None and part.name != 'file':
+            part = await reader.next()
+        if part is None:
+            return json_response({'success': False, 'message': "Envie o arquivo no campo 'file'"}, 400)
+        read = part.read_chunk
+    importer = QuestionImport(question_writer(mode))
+    try:
+        await run_blocking(importer.open)
+        while True:
+            chunk = await read(IMPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_blocking(importer.feed, chunk)
+        report = await run_blocking(importer.finish)
+    except ImportFormatError as e:
+        await run_blocking(importer.abort)
+        return json_response({'success': False, 'message': str(e)}, 400)
+    except Exception as e:
+        await run_blocking(importer.abort)
+        logger.error(f"Erro ao importar perguntas: {e}")
+        return json_response({'success': False, 'message': str(e)}, 500)
+    await questions_edited()
+    return json_response(dict(report, success=True, count=len(questions),
+                              message=f"{report['added']} perguntas novas, {report['updated']} substituídas, "
+                                      f"{report['invalid']} inválidas"))
+
+async def questions_edited(question_id=None):
+    await run_blocking(load_questions)
+    questions_changed()
+    # Só a pergunta editada é reindexada; sem id (importação), o índice é remontado na próxima busca
+    if question_id is None:
+        search_index.invalidate()
+    else:
+        await run_blocking(search_index.refresh, question_bank(), question_id)
+
+def question_response(position, question, status=200):
+    etag = question_etag(question)
+    response = json_response({'success': True, 'position': position, 'etag': etag, 'question': question}, status)
+    response.headers['ETag'] = etag
+    return response
+
+@routes.get('/api/questions/search')
+async def api_search_questions(request):
+    try:
+        offset = max(0, int(request.query.get('offset', 0)))
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.query.get('limit', DEFAULT_PAGE_SIZE))))
+    except ValueError:
+        return json_response({'success': False, 'message': 'offset/limit inválido'}, 400)
+    return json_response(await run_blocking(search_questions, request.query, offset, limit))
+
+# Busca como no app.py, no executor: índice montado na primeira busca, só as perguntas da página são lidas
+def search_questions(args, offset, limit):
+    start = time.perf_counter()
+    bank = question_bank()
+    search_index.ensure(bank)
+    query = args.get('q', '')
+    filters = {facet: args[facet] for facet in FACETS if args.get(facet)}
+    history = question_history.snapshot()
+    never_asked = args.get('never_asked', '').lower() in ('1', 'true', 'sim')
+    total, results = search_index.search(query, filters, history if never_asked else (), offset, limit)
+    items = []
+    for question_id, score in results:
+        found = bank.get(question_id)
+        if found is not None:
+            position, question = found
+            stats = history.get(question_id)
+            items.append(dict(question, position=position, etag=question_etag(question), score=score,
+                              asked=stats.asked if stats else 0))
+    return {
+        'success': True,
+        'query': query,
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'took_ms': round((time.perf_counter() - start) * 1000, 2),
+        'questions': items
+    }
+
+@routes.get('/api/questions/{question_id}')
+async def api_get_question(request):
+    found = await run_blocking(question_bank().get, request.match_info['question_id'])
+    if found is None:
+        return json_response({'success': False, 'message': 'Pergunta não encontrada'}, 404)
+    return question_response(*found)
+
+@routes.patch('/api/questions/{question_id}')
+async def api_patch_question(request):
+    patch = await request_json(request)
+    if not isinstance(patch, dict):
+        return json_response({'success': False, 'message': 'Envie um objeto JSON com os campos alterados'}, 400)
+    return await edit_question(request, lambda current, position: merge_question(current, patch, position))
+
+@routes.delete('/api/questions/{question_id}')
+async def api_delete_question(request):
+    return await edit_question(request, lambda current, position: None)
+
+# Edição pelo id como no app.py: If-Match conferido sob o lock de gravação, 412 se a pergunta mudou
+async def edit_question(request, change):
+    try:
+        position, question = await run_blocking(question_bank().edit, request.match_info['question_id'], change,
+                                                request.headers.get('If-Match'))
+    except QuestionNotFound:
+        return json_response({'success': False, 'message': 'Pergunta não encontrada'}, 404)
+    except QuestionConflict as e:
+        return json_response({'success': False, 'message': str(e), 'etag': e.etag, 'question': e.question}, 412)
+    except QuestionError as e:
+        return invalid_questions_response([e])
+    await questions_edited(request.match_info['question_id'])
+    if question is None:
+        return json_response({'success': True, 'position': position, 'count': len(questions)})
+    return question_response(position, question)
+
+@routes.get('/api/ranking')
+async def api_ranking(request):
+    offset = int(request.query.get('offset', 0))
+    limit = min(int(request.query.get('limit', 10)), 500)
+    return json_response([{"name": name, "score": score} for name, score in await ranking_page(offset, limit)])
+
+@routes.get('/api/ranking/user/{name:.+}')
+async def api_ranking_user(request):
+    name = request.match_info['name']
+    if sqlite_store:
+        position = await run_blocking(sqlite_store.rank, name)
+        score = await run_blocking(sqlite_store.get_score, name)
+        total = await run_blocking(sqlite_store.ranking_size)
+    else:
+        position, score, total = ranking.rank(name), ranking.score(name), len(ranking)
+    if position is None:
+        return json_response({'success': False, 'message': 'Usuário não encontrado no ranking'}, 404)
+    return json_response({'success': True, 'name': name, 'score': score, 'position': position, 'total': total})
+
+@routes.get('/api/ranking-http')
+async def api_ranking_http(request):
+    # O ranking em memória é o mesmo do SQLite (carregado na partida e pontuado no loop)
+    return versioned_response(request, default_room, 'ranking', ('ranking',), lambda: ({
+        'success': True,
+        'ranking': [{"name": name, "score": score} for name, score in ranking.page(0, 10)]
+    }, 200))
+
+@routes.post('/api/test-connection')
+async def test_connection(request):
+    data = await request_json(request) or {}
+    url = normalize_youtube_url(data.get('url') or data.get('youtube_url'))
+    if not url:
+        return json_response({'success': False, 'message': 'URL inválida. Por favor, forneça uma URL válida do YouTube.'}, 400)
+    return json_response({
+        'success': True,
+        'message': 'URL válida do YouTube. A conexão será estabelecida quando o quiz for iniciado.',
+        'video_id': url.split('v=')[1]
+    })
+
+@routes.post('/api/connect-youtube')
+async def api_connect_youtube(request):
+    data = await request_json(request) or {}
+    url = data.get('url', '')
+    if not normalize_youtube_url(url):
+        return json_response({'success': False, 'message': 'URL do YouTube inválida'}, 400)
+    quiz_config['youtube_url'] = url
+    quiz_config['enable_chat_simulator'] = False
+    await run_blocking(save_config)
+    await sio.emit('clear_chat', {'message': 'Chat reiniciado para conexão com YouTube'})
+    if default_room.running:
+        start_chat_source(default_room)
+    return json_response({'success': True, 'message': 'Conectado ao chat do YouTube com sucesso'})
+
+@routes.get('/api/quiz/status-http')
+async def api_status_http(request):
+    return versioned_response(request, default_room, 'status', ('phase',), lambda: ({
+        'success': True,
+        'quiz_running': default_room.running,
+        'phase': stable_phase(default_room.phase_state())
+    }, 200))
+
+@routes.post('/api/quiz/keep-alive-http')
+async def api_keep_alive_http(request):
+    return json_response({
+        'success': True,
+        'timestamp': time.time(),
+        'message': 'Keep-alive HTTP recebido com sucesso',
+        'server_time': datetime.now().strftime('%H:%M:%S')
+    })
+
+@routes.get('/api/quiz/current-question-http')
+async def api_current_question_http(request):
+    return versioned_response(request, default_room, 'current_question', ('phase', 'question'),
+                              lambda: current_question_payload(default_room))
+
+@routes.get('/api/quiz/votes-http')
+async def api_votes_http(request):
+    return versioned_response(request, default_room, 'votes', ('phase', 'question', 'tally'),
+                              lambda: votes_payload(default_room))
+
+@routes.get('/api/quiz/state')
+async def api_quiz_state(request):
+    return await state_response(default_room, request)
+
+# Fotografia do estado enviada no início de um stream SSE (ou quando o cliente perdeu eventos)
+def stream_snapshot(room):
+    question = room.current_question if room.running else None
+    return {
+        'quiz_running': room.running,
+        'phase': room.phase_state(),
+        'question': question.public if question is not None else None,
+        'question_num': room.current_question_index + 1 if question is not None else None,
+        'total_questions': room.total_questions(),
+        'answer_time': room.config.get('answer_time', 20),
+        'votes': room.count_votes(),
+        'chat': [record_to_dict(record) for record in room.chat_history.latest(SSE_SNAPSHOT_CHAT)],
+        'ranking': room_top_ranking(room),
+        'server_time': int(time.time() * 1000)
+    }
+
+# Stream SSE de uma sala: fases, votos, chat e ranking em uma única conexão (uma coroutine por cliente)
+async def event_stream_response(request, room):
+    hub = event_hubs[room.room_id]
+    if not hub.accepting():
+        return json_response({'success': False, 'message': 'Limite de conexões de eventos atingido'}, 503)
+    # O navegador reenvia o id do último evento ao reconectar
+    last_event_id = request.headers.get('Last-Event-ID') or request.query.get('last_event_id')
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                           'X-Accel-Buffering': 'no'})
+    await response.prepare(request)
+    stream = hub.stream_async(last_event_id, lambda: stream_snapshot(room))
+    try:
+        async for chunk in stream:
+            await response.write(chunk.encode('utf-8'))
+    except ConnectionResetError:
+        pass  # Cliente desconectou
+    finally:
+        await stream.aclose()
+    return response
+
+@routes.get('/api/quiz/stream')
+async def api_quiz_stream(request):
+    return await event_stream_response(request, default_room)
+
+@routes.get('/api/quiz/chat-http')
+async def api_chat_http(request):
+    return json_response(*chat_payload(default_room, request))
+
+@routes.post('/api/quiz/start-http')
+async def api_start_quiz_http(request):
+    if default_room.running:
+        return json_response({'success': False, 'message': 'Quiz já está em execução'})
+    if not questions:
+        return json_response({'success': False, 'message': 'Nenhuma pergunta cadastrada'})
+    start_room_quiz(default_room)
+    return json_response({'success': True, 'message': 'Quiz iniciado com sucesso'})
+
+@routes.post('/api/quiz/stop-http')
+async def api_stop_quiz_http(request):
+    if not default_room.stop():
+        return json_response({'success': False, 'message': 'Quiz não está em execução'})
+    return json_response({'success': True, 'message': 'Quiz parado com sucesso'})
+
+# Mensagens de resposta das ações de controle: (sucesso, falha)
+CONTROL_MESSAGES = {
+    'pause': ('Quiz pausado', 'Quiz não está em execução ou já está pausado'),
+    'resume': ('Quiz retomado', 'Quiz não está pausado'),
+    'skip': ('Fase pulada', 'Quiz não está em execução')
+}
+
+def control_payload(room, action):
+    success = getattr(room, action)()
+    return {'success': success, 'message': CONTROL_MESSAGES[action][0 if success else 1], **room.phase_state()}
+
+@routes.post('/api/quiz/{action:pause|resume|skip}')
+async def api_control_quiz(request):
+    return json_response(control_payload(default_room, request.match_info['action']))
+
+@routes.get('/api/rooms')
+async def api_rooms(request):
+    return json_response({
+        'success': True,
+        'rooms': [room.status() for room in room_manager.rooms()],
+        'running': room_manager.running_count()
+    })
+
+@routes.post('/api/rooms')
+async def api_create_room(request):
+    data = await request_json(request) or {}
+    try:
+        room_id = validate_room_id(data.get('room_id'))
+        config = dict(quiz_config)
+        config.update({key: value for key, value in (data.get('config') or {}).items() if key in ROOM_CONFIG_KEYS})
+        validate_order(config.get('question_order', DEFAULT_ORDER))
+        room_questions = data.get('questions')
+        if room_questions is not None and not isinstance(room_questions, list):
+            return json_response({'success': False, 'message': 'questions deve ser uma lista'}, 400)
+        errors = validate_questions(room_questions) if room_questions is not None else None
+        if errors:
+            return invalid_questions_response(errors)
+        room = create_room(room_id, config, room_questions)
+        return json_response({'success': True, 'room': room.status()}, 201)
+    except ValueError as e:
+        return json_response({'success': False, 'message': str(e)}, 400)
+
+@routes.get('/api/rooms/{room_id}')
+async def api_room(request):
+    room = room_manager.get(request.match_info['room_id'])
+    if room is None:
+        return room_not_found(request.match_info['room_id'])
+    return json_response({'success': True, 'room': room.status()})
+
+@routes.delete('/api/rooms/{room_id}')
+async def api_delete_room(request):
+    room_id = request.match_info['room_id']
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    if room is default_room:
+        return json_response({'success': False, 'message': 'A sala padrão não pode ser removida'}, 400)
+    room_manager.remove(room_id)
+    hub = event_hubs.pop(room_id, None)
+    if hub:
+        hub.close()  # Encerra os streams SSE da sala
+    return json_response({'success': True, 'message': f'Sala removida: {room_id}'})
+
+@routes.post('/api/rooms/{room_id}/{action}')
+async def api_room_control(request):
+    room_id, action = request.match_info['room_id'], request.match_info['action']
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    if action == 'chat':
+        data = await request_json(request) or {}
+        if not data.get('author') or not data.get('message'):
+            return json_response({'success': False, 'message': 'author e message são obrigatórios'}, 400)
+        return json_response({'success': process_chat_message(data['author'], data['message'], room_id)})
+    if action == 'start':
+        if not room.questions():
+            return json_response({'success': False, 'message': 'Nenhuma pergunta cadastrada'})
+        success = start_room_quiz(room)
+    elif action in ('stop', 'pause', 'resume', 'skip'):
+        success = getattr(room, action)()
+    else:
+        return json_response({'success': False, 'message': f'Ação desconhecida: {action}'}, 404)
+    return json_response({'success': success, 'room': room.status()})
+
+@routes.get('/api/rooms/{room_id}/stream')
+async def api_room_stream(request):
+    room = room_manager.get(request.match_info['room_id'])
+    if room is None:
+        return room_not_found(request.match_info['room_id'])
+    return await event_stream_response(request, room)
+
+@routes.get('/api/rooms/{room_id}/state')
+async def api_room_state(request):
+    room = room_manager.get(request.match_info['room_id'])
+    if room is None:
+        return room_not_found(request.match_info['room_id'])
+    return await state_response(room, request)
+
+@routes.get('/api/rooms/{room_id}/{view:current-question|votes|chat|ranking}')
+async def api_room_view(request):
+    room_id, view = request.match_info['room_id'], request.match_info['view']
+    room = room_manager.get(room_id)
+    if room is None:
+        return room_not_found(room_id)
+    if view == 'current-question':
+        return versioned_response(request, room, 'current_question', ('phase', 'question'),
+                                  lambda: current_question_payload(room))
+    if view == 'votes':
+        return versioned_response(request, room, 'votes', ('phase', 'question', 'tally'),
+                                  lambda: votes_payload(room))
+    if view == 'chat':
+        return json_response(*chat_payload(room, request))
+    offset = int(request.query.get('offset', 0))
+    limit = min(int(request.query.get('limit', 10)), 500)
+    page = await ranking_page(offset, limit) if room is default_room else room.ranking.page(offset, limit)
+    return json_response({'success': True, 'ranking': [{"name": name, "score": score} for name, score in page]})
+
+web_app.add_routes(routes)
+web_app.router.add_static('/static', 'static')
+
+# Eventos do Socket.IO
+
+# Conexões aceitas: admissão, throttle de ping/keep-alive, latência e métricas (liberadas no disconnect)
+connections = ConnectionRegistry(MAX_CONNECTIONS, CONNECT_RATE, CONNECT_BURST)
+PING_THROTTLE = 2.0
+KEEP_ALIVE_THROTTLE = 3.0
+
+# enter_room/leave_room são coroutines nas versões recentes do python-socketio
+async def enter_room(sid, channel):
+    result = sio.enter_room(sid, channel)
+    if inspect.isawaitable(result):
+        await result
+
+async def leave_room(sid, channel):
+    result = sio.leave_room(sid, channel)
+    if inspect.isawaitable(result):
+        await result
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    # Tópicos pedidos no auth do Socket.IO ou em ?topics=chat,votes (padrão: todos)
+    requested = auth.get('topics') if isinstance(auth, dict) else None
+    try:
+        topics = parse_topics(requested or parse_qs(environ.get('QUERY_STRING', '')).get('topics', [''])[0])
+    except ValueError as e:
+        raise socketio.exceptions.ConnectionRefusedError(str(e))
+    # Controle de admissão: recusar o connect faz o cliente tentar de novo com backoff
+    if connections.admit(sid, environ.get('REMOTE_ADDR')) is None:
+        logger.warning(f"Conexão recusada (conexões: {len(connections)}): {sid}")
+        return False
+    for topic in topics:
+        connections.subscribe(sid, topic)
+    # Todo cliente começa acompanhando o quiz padrão
+    await follow_quiz_room(sid, DEFAULT_ROOM)
+    await sio.emit('quiz_status', {
+        'success': True,
+        'quiz_running': default_room.running,
+        'message': 'Conectado ao servidor',
+        'topics': list(topics)
+    }, to=sid)
+
+@sio.event
+async def disconnect(sid, *args):
+    connections.remove(sid)
+
+@sio.on('get_ranking')
+async def handle_get_ranking(sid, data=None):
+    await sio.emit('ranking_update', {'success': True, 'ranking': await get_top_ranking(10)}, to=sid)
+
+@sio.on('ping_server')
+async def handle_ping(sid, data=None):
+    now = time.time()
+    if not connections.throttle(sid, 'ping', PING_THROTTLE, now):
+        return
+    await sio.emit('pong_response', {
+        'timestamp': now,
+        'server_time': datetime.now().strftime('%H:%M:%S'),
+        'received_data': data
+    }, to=sid)
+    data = data or {}
+    if (data.get('critical') is True or data.get('questionNumber') == 3) and \
+            connections.throttle(sid, 'keep_alive', KEEP_ALIVE_THROTTLE, now):
+        await sio.emit('keep_alive', {
+            'timestamp': now,
+            'message': 'keep-alive para momento crítico',
+            'critical': True,
+            'rateLimited': True
+        }, to=sid)
+
+@sio.on('keep_alive_response')
+async def handle_keep_alive_response(sid, data=None):
+    latency = connections.record_keep_alive_response(sid)
+    if latency is not None and latency > 2000:
+        logger.warning(f"Latência alta ({latency}ms) para cliente {sid}")
+
+@sio.on('get_votes')
+async def handle_get_votes(sid, data=None):
+    await sio.emit('update_votes', {'votes': default_room.count_votes(), 'timestamp': time.time()}, to=sid)
+
+@sio.on('start_quiz')
+async def handle_start_quiz(sid, data=None):
+    if default_room.running:
+        message, success = 'Quiz já está em execução', False
+    elif not questions:
+        message, success = 'Nenhuma pergunta cadastrada', False
+    else:
+        success = start_room_quiz(default_room)
+        message = 'Quiz iniciado com sucesso'
+    # Erros só para quem pediu; o novo estado vai para todos
+    await sio.emit('quiz_status', {'success': success, 'message': message, 'quiz_running': default_room.running},
+                   to=None if success else sid)
+
+@sio.on('stop_quiz')
+async def handle_stop_quiz(sid, data=None):
+    success = default_room.stop()
+    message = 'Quiz interrompido com sucesso' if success else 'Quiz não está em execução'
+    await sio.emit('quiz_status', {'success': success, 'message': message, 'quiz_running': default_room.running},
+                   to=None if success else sid)
+
+@sio.on('pause_quiz')
+async def handle_pause_quiz(sid, data=None):
+    await sio.emit('quiz_control', control_payload(default_room, 'pause'), to=sid)
+
+@sio.on('resume_quiz')
+async def handle_resume_quiz(sid, data=None):
+    await sio.emit('quiz_control', control_payload(default_room, 'resume'), to=sid)
+
+@sio.on('skip_phase')
+async def handle_skip_phase(sid, data=None):
+    await sio.emit('quiz_control', control_payload(default_room, 'skip'), to=sid)
+
+# Trocar o cliente de sala de quiz: a sala do Socket.IO geral e a de cada tópico inscrito
+async def follow_quiz_room(sid, room_id):
+    for channel in sio.rooms(sid):
+        if channel.startswith(room_channel('')):
+            await leave_room(sid, channel)
+    await enter_room(sid, room_channel(room_id))
+    for topic in connections.subscriptions(sid):
+        await enter_room(sid, topic_channel(room_id, topic))
+
+def followed_quiz_room(sid):
+    for channel in sio.rooms(sid):
+        if channel.startswith(room_channel('')) and channel.count(':') == 1:
+            return channel[len(room_channel('')):]
+    return DEFAULT_ROOM
+
+@sio.on('join_quiz_room')
+async def handle_join_quiz_room(sid, data=None):
+    room_id = (data or {}).get('room_id')
+    room = room_manager.get(room_id) if room_id else None
+    if room is None:
+        await sio.emit('room_joined', {'success': False, 'message': f'Sala não encontrada: {room_id}'}, to=sid)
+        return
+    # Um cliente acompanha uma sala por vez
+    await follow_quiz_room(sid, room_id)
+    await sio.emit('room_joined', {'success': True, 'room': room.status()}, to=sid)
+
+@sio.on('leave_quiz_room')
+async def handle_leave_quiz_room(sid, data=None):
+    room_id = (data or {}).get('room_id')
+    if room_id and room_id != DEFAULT_ROOM:
+        await follow_quiz_room(sid, DEFAULT_ROOM)
+    await sio.emit('room_left', {'success': True, 'room_id': room_id}, to=sid)
+
+@sio.on('subscribe')
+async def handle_subscribe(sid, data=None):
+    try:
+        topics = parse_topics((data or {}).get('topics'))
+    except ValueError as e:
+        await sio.emit('subscriptions', {'success': False, 'message': str(e)}, to=sid)
+        return
+    room_id = followed_quiz_room(sid)
+    for topic in topics:
+        if connections.subscribe(sid, topic):
+            await enter_room(sid, topic_channel(room_id, topic))
+    await sio.emit('subscriptions', {'success': True, 'topics': sorted(connections.subscriptions(sid))}, to=sid)
+
+@sio.on('unsubscribe')
+async def handle_unsubscribe(sid, data=None):
+    try:
+        topics = parse_topics((data or {}).get('topics'))
+    except ValueError as e:
+        await sio.emit('subscriptions', {'success': False, 'message': str(e)}, to=sid)
+        return
+    room_id = followed_quiz_room(sid)
+    for topic in topics:
+        connections.unsubscribe(sid, topic)
+        await leave_room(sid, topic_channel(room_id, topic))
+    await sio.emit('subscriptions', {'success': True, 'topics': sorted(connections.subscriptions(sid))}, to=sid)
+
+# Inicialização e encerramento
+
+async def on_startup(app):
+    quiz_timer.loop = asyncio.get_running_loop()
+    await run_blocking(load_config)
+    await run_blocking(load_questions)
+    await run_blocking(load_ranking)
+    # Índice de busca montado no executor, sem segurar a inicialização
+    spawn(run_blocking(search_index.ensure, question_bank()), name='search-index')
+    chat_pipeline.start()
+    vote_broadcaster.start()
+    logger.info("Servidor asyncio pronto")
+
+async def on_cleanup(app):
+    for room in room_manager.rooms():
+        room.stop()
+    chat_pipeline.stop()
+    vote_broadcaster.stop()
+    await run_blocking(ranking_journal.close)
+
+web_app.on_startup.append(on_startup)
+web_app.on_cleanup.append(on_cleanup)
+
+PORT = int(os.environ.get('PORT', 5000))
+# Fila de conexões pendentes do socket de escuta (rajadas de reconexão de milhares de clientes)
+SERVER_BACKLOG = int(os.environ.get('SERVER_BACKLOG', 2048))
+
+if __name__ == '__main__':
+    web.run_app(web_app, host=os.environ.get('HOST', '0.0.0.0'), port=PORT,
+                backlog=SERVER_BACKLOG, access_log=None)
@@ -2,14 +2,34 @@
 Versão simplificada do app.py para deploy no Render.com
 Esta versão usa apenas Flask e comunicação HTTP, sem Socket.IO,
 para evitar problemas de compatibilidade com Python 3.11.
+
+Com vários workers do gunicorn, apenas o líder (eleito por lock de arquivo)
+executa o quiz; ele grava a fotografia do estado em data/quiz_state.json e
+os demais workers respondem a partir dela, encaminhando votos, chat e
+comandos de controle ao líder (ver file_coordination.py).
 """
 import os
 import json
 import time
 import threading
 import logging
+import atexit
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory
+from vote_tally import VoteTally, letter_to_index
+from chat_history import ChatHistory, record_to_dict
+from leaderboard import Leaderboard
+from ranking_journal import RankingJournal
+from sqlite_store import SQLiteStore, SQLiteQuestionList, storage_backend
+from quiz_scheduler import TimerService, QuizScheduler, PHASE_QUESTION, PHASE_COUNTING, PHASE_RESULTS
+from vote_broadcaster import VoteBroadcaster
+from file_coordination import FileLeaderLock, SharedStateFile, CommandSpool
+from event_stream import BroadcastHub
+from state_versions import StateVersions, etag_matches, stable_phase, cursor_of, parse_cursor, pieces_changed
+from question_model import MAX_SKIPPED_QUESTIONS, CompiledQuestions, QuestionError
+from question_store import QuestionStore
+from question_history import QuestionHistory
+from question_order import DEFAULT_ORDER, QuestionCatalog, QuestionPicker
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -24,34 +44,59 @@ DATA_DIR = 'data'
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
+# Armazenamento opcional em SQLite (QUIZ_STORAGE=sqlite), compartilhado entre os workers
+QUIZ_DB_PATH = os.environ.get('QUIZ_DB_PATH', os.path.join(DATA_DIR, 'quiz.db'))
+sqlite_store = SQLiteStore(QUIZ_DB_PATH) if storage_backend() == 'sqlite' else None
+question_store = QuestionStore(DATA_DIR)  # questions.jsonl + questions.idx, lido sob demanda por todos os workers
+question_history = QuestionHistory(DATA_DIR)  # Perguntas feitas, com votos e acertos
+question_catalog = QuestionCatalog(question_history)  # Categorias e taxas de acerto para 'question_order'
+question_picker = QuestionPicker(question_catalog)  # Escolha da próxima pergunta
+
 # Variáveis globais
 quiz_running = False
 current_question_index = 0
-current_question = None
+current_question = None  # CompiledQuestion atual (parte pública e resposta privada)
 questions = []
-current_votes = [0, 0, 0, 0]  # Votos para as opções A, B, C, D
-voted_users = set()  # Conjunto de usuários que já votaram
-user_votes = {}  # Dicionário para armazenar o voto de cada usuário
-ranking = {}  # Ranking dos usuários
-chat_messages = []  # Mensagens de chat
+compiled_questions = CompiledQuestions(questions)
+vote_tally = VoteTally(num_options=4)  # Votos para as opções A, B, C, D e o voto de cada usuário
+ranking = Leaderboard()  # Ranking dos usuários (indexado por pontuação)
+chat_history = ChatHistory(capacity=1000)  # Buffer circular com as mensagens de chat
+state_versions = StateVersions()  # Versão de cada parte do estado (ETags das rotas de polling)
 
 # Configurações do quiz
 quiz_config = {
     'youtube_url': '',
     'answer_time': 20,  # Tempo para responder cada pergunta (em segundos)
     'result_display_time': 10,  # Tempo para exibir o resultado (em segundos)
-    'auto_start': True  # Iniciar o quiz automaticamente
+    'auto_start': True,  # Iniciar o quiz automaticamente
+    'vote_policy': 'last',  # 'last', 'first' ou 'lock'
+    'vote_lock_seconds': 0,  # Com 'lock': segundos em que a troca de voto é permitida
+    'question_order': DEFAULT_ORDER  # 'sequential', 'shuffle', 'category' ou 'adaptive'
 }
 
-# Carregar perguntas do arquivo JSON
+# Carregar perguntas: banco indexado em disco (ou SQLite); questions.json é convertido quando é mais novo
 def load_questions():
-    global questions
+    global questions, compiled_questions
     try:
         questions_file = os.path.join(DATA_DIR, 'questions.json')
-        if os.path.exists(questions_file):
+        if sqlite_store and sqlite_store.count_questions():
+            # Perguntas lidas sob demanda do banco
+            questions = SQLiteQuestionList(sqlite_store)
+            questions.assign_ids()
+            logger.info(f"Banco SQLite com {len(questions)} perguntas")
+        elif question_store.exists() and not question_store.older_than(questions_file):
+            # Perguntas lidas sob demanda do banco indexado
+            question_store.assign_ids()
+            questions = question_store
+            logger.info(f"Banco indexado com {len(questions)} perguntas")
+            if sqlite_store:
+                save_questions()
+        elif os.path.exists(questions_file):
             with open(questions_file, 'r', encoding='utf-8') as f:
                 questions = json.load(f)
             logger.info(f"Carregadas {len(questions)} perguntas do arquivo")
+            # Converter para o banco indexado (ou importar no SQLite vazio)
+            save_questions()
         else:
             # Criar perguntas de exemplo se o arquivo não existir
             questions = [
@@ -71,79 +116,540 @@ def load_questions():
     except Exception as e:
         logger.error(f"Erro ao carregar perguntas: {e}")
         questions = []
+    # Compiladas uma única vez: parte pública pronta para envio e resposta privada
+    compiled_questions = CompiledQuestions(questions)
+    if isinstance(questions, list):
+        # Os dicionários originais são descartados: a lista compilada devolve as perguntas no formato do banco
+        questions = compiled_questions
+    question_catalog.invalidate(compiled_questions)
 
-# Salvar perguntas no arquivo JSON
+# Salvar perguntas no banco indexado (ou no SQLite)
 def save_questions():
+    global questions
     try:
-        questions_file = os.path.join(DATA_DIR, 'questions.json')
-        with open(questions_file, 'w', encoding='utf-8') as f:
-            json.dump(questions, f, ensure_ascii=False, indent=2)
-        logger.info(f"Salvas {len(questions)} perguntas no arquivo")
+        if sqlite_store:
+            if not isinstance(questions, SQLiteQuestionList):
+                sqlite_store.replace_questions(questions)
+                questions = SQLiteQuestionList(sqlite_store)
+            logger.info(f"Salvas {len(questions)} perguntas no banco")
+            return
+        if questions is not question_store:
+            question_store.replace(questions)
+            questions = question_store
+        logger.info(f"Salvas {len(questions)} perguntas no banco indexado")
     except Exception as e:
         logger.error(f"Erro ao salvar perguntas: {e}")
 
-# Carregar ranking do arquivo JSON
-def load_ranking():
-    global ranking
+# Persistência do ranking: diário de variações por pergunta + snapshot compactado
+ranking_journal = RankingJournal(DATA_DIR, legacy_file=os.path.join(DATA_DIR, 'ranking.json'))
+
+# Carregar ranking (snapshot + diário); read_only nos workers seguidores
+def load_ranking(read_only=False):
     try:
-        ranking_file = os.path.join(DATA_DIR, 'ranking.json')
-        if os.path.exists(ranking_file):
-            with open(ranking_file, 'r', encoding='utf-8') as f:
-                ranking = json.load(f)
-            logger.info(f"Ranking carregado com {len(ranking)} usuários")
+        if sqlite_store:
+            ranking.load(sqlite_store.load_ranking())
         else:
-            ranking = {}
-            save_ranking()
+            ranking.load(ranking_journal.load(read_only=read_only))
+        logger.info(f"Ranking carregado com {len(ranking)} usuários")
     except Exception as e:
         logger.error(f"Erro ao carregar ranking: {e}")
-        ranking = {}
+        ranking.load({})
 
-# Salvar ranking no arquivo JSON
-def save_ranking():
+# Registrar as variações de pontuação de uma pergunta
+def save_ranking(deltas):
     try:
-        ranking_file = os.path.join(DATA_DIR, 'ranking.json')
-        with open(ranking_file, 'w', encoding='utf-8') as f:
-            json.dump(ranking, f, ensure_ascii=False, indent=2)
-        logger.info("Ranking salvo")
+        if sqlite_store:
+            # Uma transação por pergunta
+            sqlite_store.apply_score_deltas(deltas)
+        else:
+            ranking_journal.append(deltas)
+        logger.info("Variações do ranking registradas")
     except Exception as e:
         logger.error(f"Erro ao salvar ranking: {e}")
 
 # Contar votos
 def count_votes():
-    total_votes = sum(current_votes)
-    if total_votes == 0:
-        return {'A': 0, 'B': 0, 'C': 0, 'D': 0}
+    return vote_tally.counts_by_letter()
+
+# Os 10 primeiros do ranking como lista de {name, score}
+def top_ranking(n=10):
+    page = sqlite_store.top_ranking(n, 0) if sqlite_store else ranking.page(0, n)
+    return [{'name': user, 'score': score} for user, score in page]
+
+# Aplicar a política de troca de voto configurada e zerar a contagem
+def reset_votes():
+    try:
+        vote_tally.configure(quiz_config.get('vote_policy', 'last'), quiz_config.get('vote_lock_seconds', 0))
+    except (ValueError, TypeError) as e:
+        logger.error(f"Política de votação inválida na configuração: {e}")
+    vote_tally.reset()
+
+# Tempo da fase de contabilização dos votos (mantido curto para reduzir desconexões)
+COUNTING_TIME = float(os.environ.get('QUIZ_COUNTING_TIME', 2))
+
+# Indica que a próxima fase de pergunta deve avançar o índice (após os resultados)
+advance_pending = False
+
+# Durações das fases do quiz, lidas a cada fase para refletir mudanças de configuração
+def phase_durations():
+    return {
+        PHASE_QUESTION: quiz_config['answer_time'],
+        PHASE_COUNTING: COUNTING_TIME,
+        PHASE_RESULTS: quiz_config['result_display_time']
+    }
+
+# Fase de pergunta: seleciona a pergunta atual e zera os votos
+def start_question_phase(deadline):
+    global current_question_index, current_question, advance_pending
+    
+    if not questions:
+        logger.warning("Nenhuma pergunta disponível; parando o quiz")
+        stop_quiz_scheduler()
+        return
+    
+    # Avançar depois dos resultados da pergunta anterior e selecionar a pergunta atual
+    order = quiz_config.get('question_order', DEFAULT_ORDER)
+    position = current_question_index
+    if advance_pending:
+        position = question_picker.next(order, len(questions), position)
+    position = position % len(questions)
+    question = None
+    for _ in range(min(len(questions), MAX_SKIPPED_QUESTIONS)):
+        try:
+            question = compiled_questions[position]
+            break
+        except QuestionError as e:
+            # Pergunta gravada inválida (banco antigo): pulada sem mexer no estado da anterior
+            logger.warning(f"Pergunta inválida ignorada: {e}")
+            position = question_picker.next(order, len(questions), position)
+    if question is None:
+        logger.warning("Nenhuma pergunta válida; parando o quiz")
+        stop_quiz_scheduler()
+        return
+    current_question_index = position
+    advance_pending = False
+    current_question = question
+    reset_votes()  # Limpar votos para a nova pergunta
+    state_versions.bump('phase', 'question', 'tally')
+    
+    logger.info(f"Pergunta {current_question_index + 1}/{len(questions)} - Aguardando {quiz_config['answer_time']} segundos")
+    publish_state()
+
+# Fase de contabilização dos votos
+def start_counting_phase(deadline):
+    logger.info(f"Contabilizando votos ({COUNTING_TIME}s)")
+    state_versions.bump('phase')
+    publish_state()
+
+# Fase de resultados: pontua o ranking em segundo plano e avança o índice da pergunta
+def start_results_phase(deadline):
+    global advance_pending
+    
+    correct_letter = current_question.answer.letter
     
+    # Cópia consistente dos votos (usuário -> letra) e da contagem
+    local_user_votes = vote_tally.user_letters()
+    final_votes = count_votes()
+    question_position = current_question_index
+    question_id = current_question.id
+    question_picker.observe(quiz_config.get('question_order', DEFAULT_ORDER), question_position,
+                            sum(final_votes.values()), final_votes.get(correct_letter, 0))
+    
+    # Atualizar ranking silenciosamente, fora da thread do agendador
+    def update_ranking_silently():
+        try:
+            # Atualizar ranking com usuários que acertaram
+            users_updated = 0
+            deltas = {}
+            for user, vote in local_user_votes.items():
+                # Comparar voto (que é uma letra) com a resposta correta;
+                # quem errou entra no ranking com 0 pontos
+                if vote == correct_letter:
+                    total = ranking.add(user, 1)
+                    deltas[user] = 1
+                    users_updated += 1
+                    logger.info(f"Usuário {user} acertou e ganhou 1 ponto. Total: {total}")
+                elif user not in ranking:
+                    ranking.set(user, 0)
+                    deltas[user] = 0
+            
+            # Registrar as variações no diário
+            save_ranking(deltas)
+            publish_ranking_change()
+            
+            # Guardar o resultado da pergunta no histórico da sessão
+            if sqlite_store:
+                sqlite_store.record_question_result(question_position, correct_letter, final_votes)
+            if question_id is not None:
+                question_history.record(question_id, sum(final_votes.values()), final_votes.get(correct_letter, 0))
+                question_catalog.update(question_id)
+            
+            # Log do ranking atualizado
+            logger.info(f"Ranking atualizado: {users_updated} usuários pontuaram")
+        except Exception as e:
+            logger.error(f"Erro ao atualizar ranking: {e}")
+    
+    ranking_thread = threading.Thread(target=update_ranking_silently)
+    ranking_thread.daemon = True
+    ranking_thread.start()
+    
+    logger.info(f"Exibindo resultados por {quiz_config['result_display_time']} segundos")
+    
+    # A próxima fase de pergunta avança para a pergunta seguinte
+    advance_pending = True
+    state_versions.bump('phase')
+    publish_state()
+
+# Uma única thread de timer dispara as transições de fase do quiz
+quiz_timer = TimerService()
+quiz_scheduler = QuizScheduler(
+    quiz_timer,
+    {
+        PHASE_QUESTION: start_question_phase,
+        PHASE_COUNTING: start_counting_phase,
+        PHASE_RESULTS: start_results_phase
+    },
+    phase_durations,
+    on_state=lambda state: publish_phase_change()
+)
+
+# Pausa, retomada ou parada
+def publish_phase_change():
+    state_versions.bump('phase')
+    publish_state()
+
+# Iniciar o agendador de fases a partir da pergunta atual (ou da escolhida pela ordem, com advance)
+def start_quiz_scheduler(advance=False):
+    global quiz_running, advance_pending
+    quiz_running = True
+    advance_pending = advance
+    return quiz_scheduler.start()
+
+# Parar o agendador de fases imediatamente
+def stop_quiz_scheduler():
+    global quiz_running
+    quiz_running = False
+    return quiz_scheduler.stop()
+
+# Coordenação dos workers: arquivos de liderança, estado e comandos
+LEADER_LOCK_FILE = os.path.join(DATA_DIR, 'quiz_leader.lock')
+SHARED_STATE_FILE = os.path.join(DATA_DIR, 'quiz_state.json')
+COMMANDS_FILE = os.path.join(DATA_DIR, 'quiz_commands.jsonl')
+
+# Intervalo das tentativas de assumir a liderança (deve ser menor que uma fase)
+LEADER_CHECK_INTERVAL = float(os.environ.get('LEADER_CHECK_INTERVAL', 1))
+
+# Mensagens de chat incluídas na fotografia do estado
+SHARED_CHAT_SIZE = 100
+
+# Um líder que caiu há mais que isso (após o prazo da fase) não tem o quiz retomado
+LEADER_TAKEOVER_GRACE = 60
+
+# Ações de controle do quiz aceitas de qualquer worker
+CONTROL_ACTIONS = ('start', 'stop', 'pause', 'resume', 'skip')
+
+ranking_version = 0  # Incrementada pelo líder a cada atualização do ranking
+loaded_ranking_version = 0  # Versão do ranking carregada por um seguidor
+
+# Estado do quiz neste processo (no líder, o estado servido a todos os workers)
+def local_state():
     return {
-        'A': current_votes[0],
-        'B': current_votes[1],
-        'C': current_votes[2],
-        'D': current_votes[3]
+        'versions': state_versions.snapshot(),  # Lidas antes do estado: nunca mais novas que ele
+        'running': quiz_running,
+        'question_index': current_question_index,
+        'question': current_question.public if current_question else None,
+        # Resposta privada: lida pelos workers apenas na fase de resultados
+        'answer': current_question.answer._asdict() if current_question else None,
+        'total_questions': len(questions),
+        'votes': count_votes(),
+        'phase': quiz_scheduler.state(),
+        'chat': [record_to_dict(record) for record in chat_history.latest(SHARED_CHAT_SIZE)],
+        'ranking_version': ranking_version,
+        'leader_pid': os.getpid(),
+        'updated_at': time.time()
     }
 
-# Atualizar ranking com base nos votos
-def update_ranking(correct_answer):
-    global ranking
+# Gravar a fotografia do estado para os seguidores (apenas no líder)
+def write_shared_state():
+    if not leader_lock.is_leader:
+        return
+    try:
+        state = local_state()
+        shared_state.write(state)
+        publish_view_events(state)
+    except Exception as e:
+        logger.error(f"Erro ao gravar o estado compartilhado: {e}")
+
+# Mudanças de fase e de controle são gravadas imediatamente
+def publish_state():
+    state_writer.flush()
+
+# Votos e mensagens de chat são agregados e gravados no máximo uma vez por tick
+def mark_state_dirty():
+    state_writer.mark_dirty()
+
+# O ranking mudou: os seguidores o relêem quando a versão muda
+def publish_ranking_change():
+    global ranking_version
+    if not sqlite_store:
+        ranking_journal.flush(timeout=5)
+    ranking_version += 1
+    state_versions.bump('ranking')
+    mark_state_dirty()
+
+# Fase vista pelos seguidores: o tempo restante é recalculado a partir do prazo
+def phase_view(phase):
+    phase = dict(phase)
+    now_ms = int(time.time() * 1000)
+    if phase.get('deadline') and not phase.get('paused'):
+        phase['remaining'] = max(0.0, (phase['deadline'] - now_ms) / 1000)
+    phase['server_time'] = now_ms
+    return phase
+
+# Estado servido pelas rotas: o do próprio processo no líder, a fotografia do líder nos seguidores
+def quiz_view():
+    global loaded_ranking_version
+    if leader_lock.is_leader:
+        return local_state()
+    snapshot = shared_state.read()
+    if not snapshot:
+        return local_state()
     
-    # Converter índice numérico para letra (0=A, 1=B, 2=C, 3=D)
-    correct_letter = chr(65 + correct_answer)  # ASCII: A=65, B=66, etc.
+    # Réplicas do chat e do ranking nos seguidores
+    for message in snapshot.get('chat', []):
+        chat_history.add_record((message['seq'], message['timestamp'], message['author'], message['message']))
+    if snapshot.get('ranking_version') != loaded_ranking_version and not sqlite_store:
+        load_ranking(read_only=True)
+        loaded_ranking_version = snapshot.get('ranking_version')
     
-    # Atualizar ranking com usuários que acertaram
-    for user, vote in user_votes.items():
-        if user not in ranking:
-            ranking[user] = 0
+    view = dict(snapshot)
+    view['phase'] = phase_view(snapshot['phase'])
+    return view
+
+# Server-Sent Events: fases, votos, chat e ranking em uma única conexão por cliente.
+# Cada worker tem o seu hub; os eventos saem das mudanças entre fotografias do estado
+# (no líder a cada gravação; nos seguidores, lendo o arquivo de estado).
+SSE_BUFFER_SIZE = int(os.environ.get('SSE_BUFFER_SIZE', 500))
+SSE_MAX_CLIENTS = int(os.environ.get('SSE_MAX_CLIENTS', 50))  # Por worker: cada stream ocupa uma thread
+SSE_HEARTBEAT = float(os.environ.get('SSE_HEARTBEAT', 15))
+SSE_SNAPSHOT_CHAT = 50
+STREAM_POLL_INTERVAL = float(os.environ.get('STREAM_POLL_INTERVAL', 0.2))
+
+event_hub = BroadcastHub(capacity=SSE_BUFFER_SIZE, heartbeat=SSE_HEARTBEAT, max_clients=SSE_MAX_CLIENTS)
+last_stream_view = None  # Última fotografia convertida em eventos
+stream_lock = threading.Lock()
+stream_watcher = None
+
+# Publicar no hub as mudanças desde a fotografia anterior (mesmos eventos do Socket.IO no app.py)
+def publish_view_events(view):
+    global last_stream_view
+    with stream_lock:
+        previous = last_stream_view or {'phase': {}, 'chat': []}
+        last_stream_view = view
+        phase = view['phase']
+        server_time = int(time.time() * 1000)
+        
+        # Votos antes da mudança de fase (a contagem final chega antes dos resultados)
+        if view['votes'] != previous.get('votes'):
+            event_hub.publish('update_votes', {'votes': view['votes'], 'timestamp': time.time()})
+        
+        last_seq = max((message['seq'] for message in previous['chat']), default=0)
+        for message in view['chat']:
+            if message['seq'] > last_seq:
+                event_hub.publish('chat_message', message)
+        
+        phase_key = (phase.get('phase'), phase.get('paused'), phase.get('deadline'), view['question_index'])
+        previous_key = (previous['phase'].get('phase'), previous['phase'].get('paused'),
+                        previous['phase'].get('deadline'), previous.get('question_index'))
+        if phase_key != previous_key:
+            entered = phase.get('phase') != previous['phase'].get('phase') or view['question_index'] != previous.get('question_index')
+            if entered and phase.get('phase') == PHASE_QUESTION and view['question']:
+                event_hub.publish('next_question', {
+                    'question': view['question'],
+                    'question_num': view['question_index'] + 1,
+                    'total_questions': view['total_questions'],
+                    'answer_time': quiz_config['answer_time'],
+                    'deadline': phase.get('deadline'),
+                    'server_time': server_time
+                })
+            elif entered and phase.get('phase') == PHASE_COUNTING:
+                event_hub.publish('show_counting_votes', {
+                    'time': COUNTING_TIME,
+                    'deadline': phase.get('deadline'),
+                    'server_time': server_time
+                })
+            elif entered and phase.get('phase') == PHASE_RESULTS and view.get('answer'):
+                event_hub.publish('show_results', {
+                    'correct_answer': view['answer']['letter'],
+                    'explanation': view['answer']['explanation'],
+                    'votes': view['votes'],
+                    'deadline': phase.get('deadline'),
+                    'server_time': server_time
+                })
+            else:
+                # Pausa, retomada ou parada
+                event_hub.publish('quiz_phase', dict(phase, server_time=server_time))
         
-        # Comparar voto (que é uma letra) com a resposta correta
-        if vote == correct_letter:
-            ranking[user] += 1
-            logger.info(f"Usuário {user} acertou e ganhou 1 ponto. Total: {ranking[user]}")
+        if view.get('ranking_version') != previous.get('ranking_version') and previous.get('ranking_version') is not None:
+            event_hub.publish('ranking_update', {'success': True, 'ranking': top_ranking(10)})
+
+# Nos seguidores, converter o estado do líder em eventos enquanto houver clientes SSE
+def watch_shared_state():
+    while True:
+        time.sleep(STREAM_POLL_INTERVAL)
+        if leader_lock.is_leader or not event_hub.clients:
+            continue
+        try:
+            publish_view_events(quiz_view())
+        except Exception as e:
+            logger.error(f"Erro ao publicar eventos do estado compartilhado: {e}")
+
+def start_stream_watcher():
+    global stream_watcher
+    with stream_lock:
+        if stream_watcher is None:
+            stream_watcher = threading.Thread(target=watch_shared_state, name='stream-watcher')
+            stream_watcher.daemon = True
+            stream_watcher.start()
+
+# Estado atual enviado aos clientes SSE que não podem retomar pelo Last-Event-ID
+def stream_snapshot():
+    view = quiz_view()
+    question = view['question'] if view['running'] else None
+    return {
+        'quiz_running': view['running'],
+        'phase': view['phase'],
+        'question': question,
+        'question_num': view['question_index'] + 1 if question is not None else None,
+        'total_questions': view['total_questions'],
+        'answer_time': quiz_config['answer_time'],
+        'votes': view['votes'],
+        'chat': view['chat'][-SSE_SNAPSHOT_CHAT:],
+        'ranking': top_ranking(10),
+        'server_time': int(time.time() * 1000)
+    }
+
+# Registrar o voto de um usuário (no líder); retorna False se a troca de voto não for permitida
+def register_vote(user, vote):
+    changed = vote_tally.vote_letter(user, vote)
+    if changed:
+        state_versions.bump('tally')
+    mark_state_dirty()
+    return changed or vote_tally.get(user) == letter_to_index(vote)
+
+# Registrar uma mensagem de chat (no líder)
+def post_chat_message(user, message):
+    chat_history.append(user, message)
+    state_versions.bump('chat')
+    mark_state_dirty()
+
+# Iniciar o quiz pela primeira pergunta
+def start_quiz():
+    global current_question_index
+    if quiz_running or not questions:
+        return False
+    # A primeira pergunta também é escolhida pela ordem configurada
+    current_question_index = -1
+    question_picker.reset()
+    return start_quiz_scheduler(advance=True)
+
+# Executar uma ação de controle; nos seguidores ela é encaminhada ao líder
+def control_quiz(action):
+    if not leader_lock.is_leader:
+        command_spool.append({'action': action})
+        return True
+    if action == 'start':
+        return start_quiz()
+    if action == 'stop':
+        return stop_quiz_scheduler()
+    return getattr(quiz_scheduler, action)()
+
+# Comando encaminhado por um seguidor
+def handle_worker_command(command):
+    action = command.get('action')
+    if action == 'vote':
+        if quiz_running:
+            register_vote(command.get('user', 'Anônimo'), command.get('vote'))
+    elif action == 'chat':
+        post_chat_message(command.get('user', 'Anônimo'), command.get('message', ''))
+    elif action in CONTROL_ACTIONS:
+        control_quiz(action)
+    else:
+        logger.warning(f"Comando de worker desconhecido: {action}")
+
+# Este worker virou o líder: assumir o diário do ranking e retomar o quiz do líder anterior
+def become_leader(is_leader):
+    global current_question_index, current_question, advance_pending, quiz_running, ranking_version
+    snapshot = shared_state.read()
+    load_ranking()
+    state_versions.renew()  # O estado servido passa a ser o deste processo
+    command_spool.start()
+    state_writer.start()
     
-    # Salvar ranking atualizado
-    save_ranking()
+    if snapshot:
+        ranking_version = snapshot.get('ranking_version', 0) + 1
+        for message in snapshot.get('chat', []):
+            chat_history.add_record((message['seq'], message['timestamp'], message['author'], message['message']))
+        phase = snapshot['phase']
+        deadline = phase.get('deadline')
+        if snapshot.get('running') and phase.get('paused') and questions:
+            # Quiz pausado (sem prazo): assumir a mesma fase, ainda pausada, com o tempo que restava
+            current_question_index = snapshot.get('question_index', 0) % len(questions)
+            current_question = compiled_questions[current_question_index]
+            if phase.get('phase') == PHASE_QUESTION:
+                reset_votes()  # Os votos de cada usuário ficaram no líder anterior
+            # Depois dos resultados, a retomada passa para a pergunta seguinte
+            advance_pending = phase.get('phase') == PHASE_RESULTS
+            logger.info(f"Assumindo o quiz pausado na pergunta {current_question_index + 1}")
+            quiz_running = True
+            quiz_scheduler.restore_paused(phase.get('phase'), phase.get('remaining'))
+        elif snapshot.get('running') and deadline and deadline / 1000 > time.time() - LEADER_TAKEOVER_GRACE and questions:
+            # Retomar a partir da pergunta em que o líder anterior estava
+            # (ou da seguinte, se ela já tinha sido pontuada)
+            current_question_index = snapshot.get('question_index', 0)
+            if phase.get('phase') == PHASE_RESULTS:
+                current_question_index += 1
+            logger.info(f"Assumindo o quiz na pergunta {current_question_index + 1}")
+            start_quiz_scheduler()
+    publish_state()
+
+shared_state = SharedStateFile(SHARED_STATE_FILE)
+state_writer = VoteBroadcaster(write_shared_state, interval=0.2, name='quiz-state-writer')
+command_spool = CommandSpool(COMMANDS_FILE, handle_worker_command)
+leader_lock = FileLeaderLock(LEADER_LOCK_FILE, become_leader, interval=LEADER_CHECK_INTERVAL)
 
 # Carregar dados iniciais
 load_questions()
-load_ranking()
+leader_lock.start()
+if not leader_lock.is_leader:
+    # O líder carrega o ranking como escritor do diário ao assumir
+    load_ranking(read_only=True)
+atexit.register(ranking_journal.close)
+
+# Rotas de polling com ETag: o navegador sempre revalida (max-age=0) e um proxy
+# na frente dos workers pode servir a mesma resposta por HTTP_CACHE_SECONDS
+HTTP_CACHE_SECONDS = int(os.environ.get('HTTP_CACHE_SECONDS', 1))
+HTTP_CACHE_CONTROL = f'public, max-age=0, s-maxage={HTTP_CACHE_SECONDS}'
+
+# Versões do estado servido: as deste processo no líder, as da fotografia do líder nos seguidores
+# (todos os workers respondem com a mesma ETag)
+def served_versions():
+    if not leader_lock.is_leader:
+        snapshot = shared_state.read()
+        if snapshot and snapshot.get('versions'):
+            return snapshot['versions']
+    return state_versions.snapshot()
+
+# Resposta JSON condicional: o corpo é serializado uma vez por versão das partes usadas
+# (pieces) e If-None-Match igual à ETag responde 304 sem corpo
+def versioned_response(key, pieces, build):
+    etag, body, status = state_versions.cached(key, pieces, build, served_versions())
+    if status != 200:
+        return Response(body, status=status, mimetype='application/json')
+    headers = {'ETag': etag, 'Cache-Control': HTTP_CACHE_CONTROL}
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
 
 # Rotas da API
 
@@ -163,48 +669,130 @@ def quiz_http():
 def serve_static(path):
     return send_from_directory('static', path)
 
-@app.route('/api/quiz/status', methods=['GET'])
-def api_quiz_status():
-    """Rota para obter o status atual do quiz."""
-    global quiz_running, current_question_index, current_question
+# /api/quiz/state: diferença do estado desde o cursor do cliente, com long-poll opcional (?wait=)
+STATE_LONG_POLL_MAX = float(os.environ.get('STATE_LONG_POLL_MAX', 25))
+STATE_LONG_POLL_WAITERS = int(os.environ.get('STATE_LONG_POLL_WAITERS', 10))  # Por worker: cada espera ocupa uma thread
+long_poll_slots = threading.BoundedSemaphore(STATE_LONG_POLL_WAITERS)
+
+# Esperar o estado servido passar da versão since: no líder pela notificação das versões,
+# nos seguidores relendo a fotografia do líder. Retorna False no timeout.
+def wait_for_state(versions, since, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        current = served_versions()
+        if current['epoch'] != versions['epoch'] or current['version'] > since:
+            if leader_lock.is_leader:
+                # Agrupar as mudanças seguintes (votos em rajada) em uma única resposta
+                time.sleep(STREAM_POLL_INTERVAL)
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if leader_lock.is_leader:
+            state_versions.wait(since, min(remaining, 1.0))
+        else:
+            time.sleep(min(remaining, STREAM_POLL_INTERVAL))
+
+# Partes do estado que mudaram depois da versão since (todas se since for None)
+def state_delta(view, since, chat_seq):
+    changed = pieces_changed(view['versions'], since)
+    delta = {
+        'success': True,
+        'version': cursor_of(view['versions']),
+        'full': since is None,
+        'server_time': int(time.time() * 1000)
+    }
+    question = view['question'] if view['running'] else None
+    if 'phase' in changed:
+        delta['quiz_running'] = view['running']
+        delta['phase'] = view['phase']
+        # Resposta correta apenas depois que a fase de resultados começou
+        if view['phase'].get('phase') == PHASE_RESULTS and question and view.get('answer'):
+            delta['results'] = {
+                'correct_answer': view['answer']['letter'],
+                'explanation': view['answer']['explanation'],
+                'votes': view['votes']
+            }
+    if 'question' in changed:
+        delta['question'] = question
+        delta['question_num'] = view['question_index'] + 1 if question is not None else None
+        delta['total_questions'] = view['total_questions']
+        delta['answer_time'] = quiz_config['answer_time']
+    if 'tally' in changed:
+        delta['votes'] = view['votes']
+    if 'chat' in changed:
+        if chat_seq is None:
+            delta['chat'] = view['chat'][-SSE_SNAPSHOT_CHAT:]
+        else:
+            delta['chat'] = [message for message in view['chat'] if message['seq'] > chat_seq]
+        delta['last_seq'] = max((message['seq'] for message in view['chat']), default=0)
+    if 'ranking' in changed:
+        delta['ranking'] = top_ranking(10)
+    return delta
+
+@app.route('/api/quiz/state', methods=['GET'])
+def api_quiz_state():
+    """Estado desde ?since=<cursor> (fase, pergunta, votos, chat desde ?chat_seq= e ranking); ?wait= faz long-poll."""
+    cursor = request.args.get('since')
+    chat_seq = request.args.get('chat_seq', type=int)
+    wait = min(request.args.get('wait', 0, type=float), STATE_LONG_POLL_MAX)
     
-    if not quiz_running:
-        return jsonify({
+    view = quiz_view()
+    since = parse_cursor(cursor, view['versions'])
+    if since is not None and since >= view['versions']['version'] and wait > 0 and long_poll_slots.acquire(blocking=False):
+        try:
+            wait_for_state(view['versions'], since, wait)
+        finally:
+            long_poll_slots.release()
+        view = quiz_view()
+        since = parse_cursor(cursor, view['versions'])  # Outro líder: estado completo
+    
+    response = jsonify(state_delta(view, since, chat_seq))
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def quiz_status_payload():
+    view = quiz_view()
+    
+    if not view['running']:
+        return {
             'running': False,
             'message': 'Quiz não está em execução'
-        })
+        }, 200
     
-    if current_question_index >= len(questions):
-        return jsonify({
+    if view['question_index'] >= view['total_questions']:
+        return {
             'running': True,
             'message': 'Quiz concluído',
             'completed': True
-        })
+        }, 200
     
-    return jsonify({
+    return {
         'running': True,
         'message': 'Quiz em execução',
         'completed': False,
-        'current_question': current_question_index + 1,
-        'total_questions': len(questions),
-        'question': current_question,
-        'answer_time': quiz_config['answer_time']
-    })
+        'current_question': view['question_index'] + 1,
+        'total_questions': view['total_questions'],
+        'question': view['question'],
+        'answer_time': quiz_config['answer_time'],
+        'phase': stable_phase(view['phase'])
+    }, 200
+
+@app.route('/api/quiz/status', methods=['GET'])
+def api_quiz_status():
+    """Rota para obter o status atual do quiz."""
+    return versioned_response('status', ('phase', 'question'), quiz_status_payload)
 
 @app.route('/api/quiz/votes', methods=['GET'])
 def api_get_votes():
     """Rota para obter os votos atuais."""
-    return jsonify({
-        'votes': count_votes(),
-        'timestamp': time.time()
-    })
+    return versioned_response('votes', ('tally',), lambda: ({'votes': quiz_view()['votes']}, 200))
 
 @app.route('/api/quiz/vote', methods=['POST'])
 def api_vote():
     """Rota para registrar um voto."""
-    global current_votes, voted_users, user_votes
-    
-    if not quiz_running:
+    view = quiz_view()
+    if not view['running']:
         return jsonify({
             'success': False,
             'message': 'Quiz não está em execução'
@@ -220,19 +808,22 @@ def api_vote():
             'message': 'Voto inválido. Use A, B, C ou D.'
         })
     
-    if user in voted_users:
-        # Usuário já votou, atualizar o voto
-        old_vote = user_votes.get(user)
-        if old_vote:
-            old_vote_index = ord(old_vote) - 65  # Converter A->0, B->1, etc.
-            current_votes[old_vote_index] -= 1
-    else:
-        voted_users.add(user)
+    # Nos seguidores o voto é encaminhado ao líder (a política de troca é aplicada lá)
+    if not leader_lock.is_leader:
+        command_spool.append({'action': 'vote', 'user': user, 'vote': vote})
+        return jsonify({
+            'success': True,
+            'message': f'Voto registrado: {vote}',
+            'votes': view['votes']
+        })
     
-    # Registrar o novo voto
-    vote_index = ord(vote) - 65  # Converter A->0, B->1, etc.
-    current_votes[vote_index] += 1
-    user_votes[user] = vote
+    # Registrar o voto (a troca de voto é atômica e segue a política configurada)
+    if not register_vote(user, vote):
+        return jsonify({
+            'success': False,
+            'message': 'Troca de voto não permitida',
+            'votes': count_votes()
+        })
     
     logger.info(f"Voto registrado: {user} votou na opção !{vote}")
     
@@ -245,16 +836,29 @@ def api_vote():
 @app.route('/api/quiz/chat', methods=['GET'])
 def api_get_chat():
     """Rota para obter as mensagens de chat."""
+    since_seq = request.args.get('since_seq', type=int)
+    since = request.args.get('since', type=float)
+    
+    # Nos seguidores, atualiza a réplica do chat a partir do estado do líder
+    quiz_view()
+    
+    # Com since_seq/since retornar apenas as mensagens novas; senão as últimas 50
+    if since_seq is not None:
+        records = chat_history.since_seq(since_seq)
+    elif since is not None:
+        records = chat_history.since_timestamp(since)
+    else:
+        records = chat_history.latest(50)
+    
     return jsonify({
-        'messages': chat_messages[-50:],  # Retornar apenas as últimas 50 mensagens
+        'messages': [record_to_dict(record) for record in records],
+        'last_seq': chat_history.last_seq(),
         'timestamp': time.time()
     })
 
 @app.route('/api/quiz/chat', methods=['POST'])
 def api_send_chat():
     """Rota para enviar uma mensagem de chat."""
-    global chat_messages
-    
     data = request.json
     user = data.get('user', 'Anônimo')
     message = data.get('message', '')
@@ -265,17 +869,10 @@ def api_send_chat():
             'message': 'Mensagem vazia'
         })
     
-    chat_message = {
-        'author': user,
-        'message': message,
-        'timestamp': time.time()
-    }
-    
-    chat_messages.append(chat_message)
-    
-    # Limitar o número de mensagens armazenadas
-    if len(chat_messages) > 1000:
-        chat_messages = chat_messages[-1000:]
+    if leader_lock.is_leader:
+        post_chat_message(user, message)
+    else:
+        command_spool.append({'action': 'chat', 'user': user, 'message': message})
     
     logger.info(f"Mensagem de chat: {user} -> {message}")
     
@@ -284,79 +881,121 @@ def api_send_chat():
         'message': 'Mensagem enviada'
     })
 
-@app.route('/api/quiz/ranking', methods=['GET'])
-def api_get_ranking():
-    """Rota para obter o ranking atual."""
-    # Converter o ranking para uma lista ordenada
-    ranking_list = [{'user': user, 'score': score} for user, score in ranking.items()]
-    ranking_list.sort(key=lambda x: x['score'], reverse=True)
+def ranking_payload():
+    # Nos seguidores, relê o ranking se o líder o atualizou
+    quiz_view()
     
-    return jsonify({
+    total = sqlite_store.ranking_size() if sqlite_store else len(ranking)
+    # Por padrão só os 10 melhores; o limite negativo viraria "sem limite" no SQLite
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(0, request.args.get('limit', 10, type=int)), 500)
+    
+    # A página sai direto do índice (em memória ou no SQLite), sem ordenar o ranking inteiro
+    if sqlite_store:
+        page = sqlite_store.top_ranking(limit, offset)
+    else:
+        page = ranking.page(offset, limit)
+    ranking_list = [{'user': user, 'score': score} for user, score in page]
+    
+    response = {
         'ranking': ranking_list,
-        'timestamp': time.time()
-    })
+        'total': total
+    }
+    
+    # Posição de um participante específico (?user=nome)
+    user = request.args.get('user')
+    if user:
+        if sqlite_store:
+            response['user_position'] = sqlite_store.rank(user)
+            response['user_score'] = sqlite_store.get_score(user)
+        else:
+            response['user_position'] = ranking.rank(user)
+            response['user_score'] = ranking.score(user)
+    
+    return response, 200
 
-@app.route('/api/quiz/current_question', methods=['GET'])
-def api_get_current_question():
-    """Rota para obter a pergunta atual."""
-    global current_question, current_question_index
+@app.route('/api/quiz/ranking', methods=['GET'])
+def api_get_ranking():
+    """Rota para obter o ranking atual (por padrão os 10 melhores; aceita offset e limit)."""
+    # Uma entrada do cache por combinação de parâmetros (offset, limit, user)
+    key = 'ranking?' + request.query_string.decode('utf-8', 'replace')
+    return versioned_response(key, ('ranking',), ranking_payload)
+
+def current_question_payload():
+    view = quiz_view()
     
-    if not quiz_running:
-        return jsonify({
+    if not view['running']:
+        return {
             'success': False,
             'message': 'Quiz não está em execução'
-        })
+        }, 200
     
-    if current_question_index >= len(questions):
-        return jsonify({
+    if view['question_index'] >= view['total_questions']:
+        return {
             'success': False,
             'message': 'Quiz concluído'
-        })
+        }, 200
     
-    return jsonify({
+    return {
         'success': True,
-        'question': current_question,
-        'question_num': current_question_index + 1,
-        'total_questions': len(questions),
-        'answer_time': quiz_config['answer_time']
-    })
+        'question': view['question'],
+        'question_num': view['question_index'] + 1,
+        'total_questions': view['total_questions'],
+        'answer_time': quiz_config['answer_time'],
+        'phase': stable_phase(view['phase'])
+    }, 200
+
+@app.route('/api/quiz/current_question', methods=['GET'])
+def api_get_current_question():
+    """Rota para obter a pergunta atual."""
+    return versioned_response('current_question', ('phase', 'question'), current_question_payload)
 
 @app.route('/api/quiz/results', methods=['GET'])
 def api_get_results():
     """Rota para obter os resultados da pergunta atual."""
-    global current_question
+    view = quiz_view()
+    question = view['question']
     
-    if not quiz_running:
+    if not view['running']:
         return jsonify({
             'success': False,
             'message': 'Quiz não está em execução'
         })
     
-    if not current_question:
+    if not question:
         return jsonify({
             'success': False,
             'message': 'Nenhuma pergunta atual'
         })
     
-    # Verificar formato da pergunta e obter a resposta correta
-    correct_answer = 0  # Valor padrão
-    if 'correct' in current_question:
-        correct_answer = current_question['correct']
-    elif 'correct_answer' in current_question:
-        correct_answer = current_question['correct_answer']
-    
-    # Converter índice numérico para letra (0=A, 1=B, 2=C, 3=D)
-    correct_letter = chr(65 + correct_answer)  # ASCII: A=65, B=66, etc.
-    
-    explanation = current_question.get('explanation', 'Sem explicação disponível.')
+    # A resposta só é revelada depois que a fase de resultados começou
+    if view['phase'].get('phase') != PHASE_RESULTS or not view.get('answer'):
+        return jsonify({
+            'success': False,
+            'message': 'Resultados ainda não disponíveis'
+        })
     
     return jsonify({
         'success': True,
-        'correct_answer': correct_letter,
-        'explanation': explanation,
-        'votes': count_votes()
+        'correct_answer': view['answer']['letter'],
+        'explanation': view['answer']['explanation'],
+        'votes': view['votes']
     })
 
+@app.route('/api/quiz/stream', methods=['GET'])
+def api_quiz_stream():
+    """Stream SSE com as fases, votos, chat e ranking (retoma pelo Last-Event-ID)."""
+    if not event_hub.accepting():
+        return jsonify({'success': False, 'message': 'Limite de conexões de eventos atingido'}), 503
+    start_stream_watcher()
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    return Response(
+        event_hub.stream(last_event_id, stream_snapshot),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/quiz/keep-alive-http', methods=['POST'])
 def api_keep_alive_http():
     """Rota HTTP para manter a conexão ativa durante momentos críticos."""
@@ -380,10 +1019,8 @@ def api_keep_alive_http():
 
 @app.route('/api/quiz/start', methods=['POST'])
 def api_start_quiz():
-    """Rota para iniciar o quiz."""
-    global quiz_running, current_question_index, current_question, current_votes, voted_users, user_votes
-    
-    if quiz_running:
+    """Rota para iniciar o quiz (executado pelo worker líder)."""
+    if quiz_view()['running']:
         return jsonify({
             'success': False,
             'message': 'Quiz já está em execução'
@@ -395,43 +1032,33 @@ def api_start_quiz():
             'message': 'Nenhuma pergunta disponível'
         })
     
-    # Iniciar o quiz
-    quiz_running = True
-    current_question_index = 0
-    current_question = questions[current_question_index]
-    current_votes = [0, 0, 0, 0]
-    voted_users = set()
-    user_votes = {}
-    
-    # Iniciar thread para executar o loop do quiz
-    quiz_thread = threading.Thread(target=quiz_loop)
-    quiz_thread.daemon = True
-    quiz_thread.start()
+    # Iniciar o quiz pela primeira pergunta
+    control_quiz('start')
     
     logger.info("Quiz iniciado")
     
+    view = quiz_view()
     return jsonify({
         'success': True,
         'message': 'Quiz iniciado',
-        'question': current_question,
-        'question_num': current_question_index + 1,
-        'total_questions': len(questions),
-        'answer_time': quiz_config['answer_time']
+        'question': view['question'],
+        'question_num': view['question_index'] + 1,
+        'total_questions': view['total_questions'],
+        'answer_time': quiz_config['answer_time'],
+        'phase': view['phase']
     })
 
 @app.route('/api/quiz/stop', methods=['POST'])
 def api_stop_quiz():
     """Rota para parar o quiz."""
-    global quiz_running
-    
-    if not quiz_running:
+    if not quiz_view()['running']:
         return jsonify({
             'success': False,
             'message': 'Quiz não está em execução'
         })
     
-    # Parar o quiz
-    quiz_running = False
+    # Parar o quiz imediatamente
+    control_quiz('stop')
     
     logger.info("Quiz parado")
     
@@ -440,114 +1067,32 @@ def api_stop_quiz():
         'message': 'Quiz parado'
     })
 
-# Função para executar o loop do quiz
-def quiz_loop():
-    global quiz_running, current_question_index, current_question, current_votes, voted_users, user_votes, chat_messages
-    
-    # Contador de ciclos para forçar coleta de lixo periódica
-    cycle_count = 0
-    
-    # Timestamp da última vez que o servidor foi "limpo"
-    last_cleanup_time = time.time()
-    
-    while True:
-        # Verificar se é hora de fazer limpeza de recursos (a cada 1 hora)
-        current_time = time.time()
-        if current_time - last_cleanup_time > 3600:  # 3600 segundos = 1 hora
-            try:
-                logger.info("Realizando limpeza periódica de recursos do servidor...")
-                # Limpar caches internos
-                chat_messages = chat_messages[-1000:] if len(chat_messages) > 1000 else chat_messages
-                # Reiniciar contadores
-                cycle_count = 0
-                last_cleanup_time = current_time
-                logger.info("Limpeza de recursos concluída com sucesso")
-            except Exception as e:
-                logger.error(f"Erro durante limpeza de recursos: {e}")
-        
-        # Incrementar contador de ciclos
-        cycle_count += 1
-        
-        if quiz_running and questions:
-            # Selecionar pergunta atual
-            current_question_index = current_question_index % len(questions)
-            current_question = questions[current_question_index]
-            current_votes = [0, 0, 0, 0]
-            voted_users = set()  # Limpar usuários que votaram
-            user_votes = {}  # Limpar votos para a nova pergunta
-            
-            # Verificar formato da pergunta e obter a resposta correta
-            correct_answer = 0  # Valor padrão
-            if 'correct' in current_question:
-                correct_answer = current_question['correct']
-            elif 'correct_answer' in current_question:
-                correct_answer = current_question['correct_answer']
-            
-            # Aguardar o tempo de resposta
-            logger.info(f"Pergunta {current_question_index + 1}/{len(questions)} - Aguardando {quiz_config['answer_time']} segundos")
-            time.sleep(quiz_config['answer_time'])
-            
-            # SOLUÇÃO RADICAL: Reduzir drasticamente o tempo de contabilização de votos
-            # para minimizar a chance de desconexões
-            reduced_vote_count_time = 2  # Reduzir para apenas 2 segundos
-            
-            logger.info(f"Contabilizando votos (tempo reduzido: {reduced_vote_count_time}s)")
-            time.sleep(reduced_vote_count_time)
-            
-            # Calcular resultado
-            explanation = current_question.get('explanation', 'Sem explicação disponível.')
-            
-            # Converter índice numérico para letra (0=A, 1=B, 2=C, 3=D)
-            correct_letter = chr(65 + correct_answer)  # ASCII: A=65, B=66, etc.
-            
-            # Atualizar ranking silenciosamente
-            try:
-                # Criar uma cópia local dos votos para evitar problemas de concorrência
-                local_user_votes = user_votes.copy()
-                
-                # Atualizar ranking com usuários que acertaram
-                users_updated = 0
-                for user, vote in local_user_votes.items():
-                    if user not in ranking:
-                        ranking[user] = 0
-                    
-                    # Comparar voto (que é uma letra) com a resposta correta
-                    if vote == correct_letter:
-                        ranking[user] += 1
-                        users_updated += 1
-                        logger.info(f"Usuário {user} acertou e ganhou 1 ponto. Total: {ranking[user]}")
-                
-                # Salvar ranking atualizado
-                save_ranking()
-                
-                # Log do ranking atualizado
-                logger.info(f"Ranking atualizado: {users_updated} usuários pontuaram")
-            except Exception as e:
-                logger.error(f"Erro ao atualizar ranking: {e}")
-            
-            # Aguardar antes de avançar para a próxima pergunta
-            logger.info(f"Exibindo resultados por {quiz_config['result_display_time']} segundos")
-            time.sleep(quiz_config['result_display_time'])
-            
-            # Avançar para a próxima pergunta
-            current_question_index += 1
-            logger.info(f"Avançando para a pergunta {current_question_index + 1}")
-        else:
-            # Se o quiz não estiver rodando, aguardar um pouco antes de verificar novamente
-            time.sleep(1)
+@app.route('/api/quiz/pause', methods=['POST'])
+def api_pause_quiz():
+    """Rota para pausar a fase atual (o prazo fica congelado)."""
+    if not control_quiz('pause'):
+        return jsonify({'success': False, 'message': 'Quiz não está em execução ou já está pausado', 'phase': quiz_view()['phase']})
+    return jsonify({'success': True, 'message': 'Quiz pausado', 'phase': quiz_view()['phase']})
+
+@app.route('/api/quiz/resume', methods=['POST'])
+def api_resume_quiz():
+    """Rota para retomar a fase atual com o tempo que restava."""
+    if not control_quiz('resume'):
+        return jsonify({'success': False, 'message': 'Quiz não está pausado', 'phase': quiz_view()['phase']})
+    return jsonify({'success': True, 'message': 'Quiz retomado', 'phase': quiz_view()['phase']})
+
+@app.route('/api/quiz/skip', methods=['POST'])
+def api_skip_phase():
+    """Rota para encerrar a fase atual e passar para a seguinte."""
+    if not control_quiz('skip'):
+        return jsonify({'success': False, 'message': 'Quiz não está em execução', 'phase': quiz_view()['phase']})
+    return jsonify({'success': True, 'message': 'Fase pulada', 'phase': quiz_view()['phase']})
 
 # Iniciar o quiz automaticamente após 2 segundos (para dar tempo de carregar tudo)
 def auto_start_quiz():
-    global quiz_running
-    
-    if quiz_config['auto_start'] and not quiz_running and questions:
-        # Iniciar o quiz
-        quiz_running = True
-        
-        # Iniciar thread para executar o loop do quiz
-        quiz_thread = threading.Thread(target=quiz_loop)
-        quiz_thread.daemon = True
-        quiz_thread.start()
+    if quiz_config['auto_start'] and leader_lock.is_leader and not quiz_running and questions:
+        # Iniciar o agendador de fases do quiz
+        start_quiz_scheduler()
         
         logger.info("Quiz iniciado automaticamente")
 
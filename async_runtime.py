@@ -0,0 +1,290 @@
+"""
+Peças do quiz para o servidor asyncio (app_async.py).
+
+O agendador de fases (QuizScheduler) e as salas (QuizRoom) são os mesmos do
+app.py; aqui ficam apenas os substitutos das partes que usam threads:
+
+- AsyncioTimer: agenda as transições de fase no próprio event loop
+  (loop.call_at usa o relógio monotônico, como o TimerService);
+- AsyncVoteBroadcaster: transmissão agregada dos votos como uma coroutine;
+- AsyncChatPipeline: fila limitada do chat com consumidores coroutines;
+- AsyncBroadcastHub: o hub de eventos SSE com clientes coroutines.
+
+Todas as chamadas (exceto submit_threadsafe e AsyncBroadcastHub.publish)
+devem ser feitas na thread do event loop.
+"""
+import asyncio
+import collections
+import time
+import logging
+
+from chat_pipeline import OVERFLOW_POLICIES, parse_vote
+from event_stream import BroadcastHub, format_event
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncioTimer:
+    """Interface do TimerService sobre o event loop (prazos em time.monotonic)."""
+
+    def __init__(self, loop=None):
+        self.loop = loop
+
+    def _get_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        return self.loop
+
+    def start(self):
+        pass
+
+    def stop(self, timeout=None):
+        pass
+
+    def call_at(self, deadline, callback):
+        # O relógio do loop padrão é time.monotonic, o mesmo dos prazos do agendador
+        return self._get_loop().call_at(deadline, callback)
+
+    def call_later(self, delay, callback):
+        return self._get_loop().call_later(max(0.0, delay), callback)
+
+    def call_soon(self, callback):
+        return self._get_loop().call_soon(callback)
+
+
+def spawn(coroutine, name=None):
+    """Executa a coroutine em segundo plano, registrando exceções no log."""
+    task = asyncio.get_running_loop().create_task(coroutine, name=name)
+    task.add_done_callback(_log_task_error)
+    return task
+
+
+def _log_task_error(task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Erro em tarefa assíncrona {task.get_name()}: {task.exception()}")
+
+
+class AsyncVoteBroadcaster:
+    """
+    Transmissão agregada de votos de todas as salas em uma coroutine.
+
+    Mesma interface do RoomVoteBroadcaster: emit_fn(room) é uma coroutine
+    que lê a contagem atual da sala e a envia.
+    """
+
+    def __init__(self, emit_fn, interval=0.2):
+        self.emit_fn = emit_fn
+        self.interval = max(0.01, float(interval))
+        self._dirty = {}
+        self._wakeup = None
+        self._task = None
+
+        # Contadores
+        self.marks = 0
+        self.broadcasts = 0
+        self.flushes = 0
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = spawn(self._run(), name='vote-broadcaster')
+
+    def stop(self, timeout=None):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def mark_dirty(self, room):
+        self.marks += 1
+        self._dirty[room.room_id] = room
+        if self._wakeup:
+            self._wakeup.set()
+
+    def flush(self, room):
+        """Envia a contagem da sala antes dos eventos agendados em seguida (mudanças de fase)."""
+        self._dirty.pop(room.room_id, None)
+        self.flushes += 1
+        spawn(self.emit_fn(room), name='vote-flush')
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            rooms = list(self._dirty.values())
+            self._dirty.clear()
+            for room in rooms:
+                try:
+                    await self.emit_fn(room)
+                    self.broadcasts += 1
+                except Exception as e:
+                    logger.error(f"Erro ao transmitir votos da sala {room.room_id}: {e}")
+            # No máximo um envio por sala a cada intervalo
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        return {
+            'interval_ms': int(self.interval * 1000),
+            'marks': self.marks,
+            'broadcasts': self.broadcasts,
+            'flushes': self.flushes,
+            'dirty_rooms': len(self._dirty)
+        }
+
+
+class AsyncChatPipeline:
+    """
+    Ingestão do chat com fila limitada e consumidores coroutines.
+
+    handler(author, message, vote, room) é chamado no event loop. Leitores
+    do chat que rodam em threads (chat-downloader) usam submit_threadsafe.
+    """
+
+    def __init__(self, handler, workers=2, max_queue_size=2000, overflow_policy='drop_oldest'):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de overflow inválida: {overflow_policy}")
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.max_queue_size = max(1, int(max_queue_size))
+        self.overflow_policy = overflow_policy
+        self.loop = None
+        self._queue = collections.deque()
+        self._available = None
+        self._tasks = []
+
+        # Contadores
+        self.submitted = 0
+        self.votes = 0
+        self.processed = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self.loop = asyncio.get_running_loop()
+        self._available = asyncio.Semaphore(0)
+        self._tasks = [spawn(self._worker(), name=f'chat-{i}') for i in range(self.workers)]
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def submit(self, author, message, room=None):
+        """Enfileira uma mensagem; retorna False se ela foi descartada."""
+        vote = parse_vote(message)
+        if vote is None and len(self._queue) >= self.max_queue_size:
+            # Votos nunca são descartados (passam do limite); só as mensagens comuns.
+            # drop_oldest: a mensagem comum mais antiga dá lugar à nova (ou a nova é descartada)
+            self.dropped += 1
+            if self.overflow_policy == 'drop_new' or not self._drop_oldest_chat():
+                return False
+        else:
+            self._available.release()
+        self._queue.append((author, message, vote, room))
+        self.submitted += 1
+        if vote is not None:
+            self.votes += 1
+        return True
+
+    def _drop_oldest_chat(self):
+        """Remove a mensagem comum mais antiga da fila (votos são preservados)."""
+        for index, queued in enumerate(self._queue):
+            if queued[2] is None:
+                del self._queue[index]
+                return True
+        return False
+
+    def submit_threadsafe(self, author, message, room=None):
+        """Enfileira a partir de outra thread (leitores bloqueantes do chat)."""
+        self.loop.call_soon_threadsafe(self.submit, author, message, room)
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            author, message, vote, room = self._queue.popleft()
+            try:
+                self.handler(author, message, vote, room)
+                self.processed += 1
+            except Exception as e:
+                logger.error(f"Erro ao processar mensagem do chat: {e}")
+            # Ceder o loop entre mensagens para não atrasar os envios
+            await asyncio.sleep(0)
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'queue_size': len(self._queue),
+            'max_queue_size': self.max_queue_size,
+            'overflow_policy': self.overflow_policy,
+            'submitted': self.submitted,
+            'votes': self.votes,
+            'processed': self.processed,
+            'dropped': self.dropped
+        }
+
+
+class AsyncBroadcastHub(BroadcastHub):
+    """
+    BroadcastHub com stream_async(): cada cliente SSE é uma coroutine.
+
+    O buffer, os ids e a retomada por Last-Event-ID são os do BroadcastHub;
+    publish() pode vir de qualquer thread e acorda os clientes no loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = None
+        self._wakeup = None  # Evento dos clientes esperando (um por rodada de publicação)
+
+    def publish(self, event, data):
+        super().publish(event, data)
+        self._wake_soon()
+
+    def close(self):
+        super().close()
+        self._wake_soon()
+
+    def _wake_soon(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+            self._wakeup = None
+
+    async def stream_async(self, last_event_id, snapshot):
+        """Como BroadcastHub.stream, mas um gerador assíncrono (a espera não bloqueia o loop)."""
+        self.loop = asyncio.get_running_loop()
+        with self._condition:
+            self.clients += 1
+            self.peak_clients = max(self.peak_clients, self.clients)
+        try:
+            yield f'retry: {self.retry_ms}\n\n'
+            seq, frames = self._resume_from(last_event_id)
+            if frames is None:
+                yield format_event('snapshot', snapshot(), f'{self.epoch}-{seq}')
+            elif frames:
+                yield ''.join(frames)
+
+            while True:
+                if self._seq == seq and not self._closed:
+                    if self._wakeup is None:
+                        self._wakeup = asyncio.Event()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        pass
+                if self._closed:
+                    return
+                with self._condition:
+                    seq, frames = self._take(seq)
+                if frames is None:
+                    yield format_event('snapshot', snapshot(), f'{self.epoch}-{seq}')
+                elif frames:
+                    yield ''.join(frames)
+                else:
+                    yield f': keep-alive {int(time.time())}\n\n'
+        finally:
+            with self._condition:
+                self.clients -= 1
@@ -0,0 +1,147 @@
+"""
+Benchmark de conexões ociosas no servidor asyncio (app_async.py).
+
+Inicia o servidor em um subprocesso, abre N conexões WebSocket do Socket.IO
+(protocolo Engine.IO 4, respondendo aos pings do servidor) e mede a memória
+residente do servidor antes e depois. Todas as conexões ficam abertas por
+alguns ciclos de ping para confirmar que o servidor as mantém.
+
+Uso:
+    python benchmark_async_sockets.py [--clients 10000] [--port 5099] [--hold 25]
+
+Cada conexão usa um descritor de arquivo no cliente e outro no servidor:
+aumente o limite (ulimit -n) antes de rodar com muitos clientes.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+
+def rss_mb(pid):
+    """Memória residente do processo em MB (Linux, /proc)."""
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class IdleClient:
+    """Cliente Socket.IO mínimo: conecta ao namespace padrão e só responde aos pings."""
+
+    def __init__(self, session, url):
+        self.session = session
+        self.url = url
+        self.connected = False
+        self.failed = False
+        self.pings = 0
+
+    async def run(self, stop):
+        try:
+            await self._run(stop)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.failed = True
+
+    async def _run(self, stop):
+        async with self.session.ws_connect(self.url, autoping=False) as ws:
+            await ws.receive_str()  # Pacote "0{...}" de abertura do Engine.IO
+            await ws.send_str('40')  # CONNECT no namespace padrão
+            while not stop.is_set():
+                message = await ws.receive()
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                if message.data == '2':
+                    self.pings += 1
+                    await ws.send_str('3')
+                elif message.data.startswith('40'):
+                    self.connected = True
+
+
+async def open_clients(url, count, batch, hold):
+    stop = asyncio.Event()
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        clients = [IdleClient(session, url) for _ in range(count)]
+        tasks = []
+        started = time.time()
+        for i in range(0, count, batch):
+            tasks.extend(asyncio.create_task(client.run(stop)) for client in clients[i:i + batch])
+            # Abrir o lote seguinte só depois que este conectar (ou falhar)
+            deadline = time.time() + 30
+            while time.time() < deadline and any(
+                    not (client.connected or client.failed) for client in clients[i:i + batch]):
+                await asyncio.sleep(0.05)
+        yield {
+            'connected': sum(client.connected for client in clients),
+            'failed': sum(client.failed for client in clients),
+            'connect_seconds': time.time() - started
+        }
+
+        await asyncio.sleep(hold)
+        alive = sum(1 for task in tasks if not task.done())
+        yield {'alive': alive, 'pings': sum(client.pings for client in clients)}
+
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def main(args):
+    env = dict(os.environ, PORT=str(args.port))
+    server = subprocess.Popen(
+        [sys.executable, 'app_async.py'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        base = f'http://127.0.0.1:{args.port}'
+        async with aiohttp.ClientSession() as session:
+            for _ in range(100):
+                try:
+                    async with session.get(f'{base}/api/health') as response:
+                        if response.status == 200:
+                            break
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.1)
+
+        baseline = rss_mb(server.pid)
+        print(f"Servidor iniciado (pid {server.pid}); memória base: {baseline:.1f} MB")
+
+        url = f'{base}/socket.io/?EIO=4&transport=websocket'
+        steps = open_clients(url, args.clients, args.batch, args.hold)
+        result = await steps.__anext__()
+        loaded = rss_mb(server.pid)
+        print(f"{result['connected']}/{args.clients} conexões ({result['failed']} falhas) "
+              f"em {result['connect_seconds']:.1f}s; "
+              f"memória: {loaded:.1f} MB")
+
+        result = await steps.__anext__()
+        held = rss_mb(server.pid)
+        print(f"Após {args.hold}s ociosas: {result['alive']} conexões abertas, {result['pings']} pings respondidos; "
+              f"memória: {held:.1f} MB")
+        if result['alive']:
+            print(f"Memória por conexão: {(held - baseline) * 1024 / result['alive']:.1f} KB")
+        await steps.aclose()
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Conexões ociosas no servidor asyncio do quiz')
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--batch', type=int, default=500, help='conexões abertas por lote')
+    parser.add_argument('--hold', type=float, default=25, help='segundos com as conexões ociosas')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""
+Benchmark do banco de perguntas compilado (question_model.CompiledQuestions).
+
+Gera um banco grande no formato do arquivo questions.json (lido com
+json.loads, como no carregamento), mede a memória das perguntas como
+dicionários e depois de compiladas (com os dicionários descartados), o
+tempo de compilação e o tempo de acesso à pergunta e à resposta.
+
+Uso:
+    python benchmark_questions.py [perguntas]
+"""
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from question_model import CompiledQuestions
+
+CATEGORIES = ['Geografia', 'História', 'Ciências', 'Literatura', 'Esportes', 'Música']
+
+
+def generate_questions(total, seed=42):
+    """Texto JSON de um banco com os formatos aceitos (lista ou A-D, índice ou letra)."""
+    rng = random.Random(seed)
+    questions = []
+    for i in range(total):
+        options = [f"Opção {letter} da pergunta {i}" for letter in 'ABCD']
+        question = {
+            'id': f"q{i}",
+            'question': f"Pergunta número {i} do banco de testes?",
+            'category': rng.choice(CATEGORIES),
+            'difficulty': rng.choice(['fácil', 'média', 'difícil']),
+            'explanation': f"Explicação da pergunta {i}."
+        }
+        if i % 2:
+            question['options'] = dict(zip('ABCD', options))
+            question['correct_answer'] = rng.choice('ABCD')
+        else:
+            question['options'] = options
+            question['correct'] = rng.randrange(4)
+        questions.append(question)
+    return json.dumps(questions, ensure_ascii=False)
+
+
+def measure(build):
+    """(resultado, bytes alocados que continuam vivos) de build()."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    print(f"Gerando {total} perguntas...")
+    text = generate_questions(total)
+
+    raw, raw_bytes = measure(lambda: json.loads(text))
+    print(f"dicionários:  {raw_bytes / 2**20:>8.1f} MB  ({raw_bytes / total:,.0f} bytes/pergunta)")
+
+    start = time.perf_counter()
+    compiled = CompiledQuestions(raw)
+    elapsed = time.perf_counter() - start
+    print(f"compilação:   {elapsed:>8.2f} s   ({total / elapsed:,.0f} perguntas/s, {len(compiled.errors)} inválidas)")
+    del raw, compiled
+
+    compiled, compiled_bytes = measure(lambda: CompiledQuestions(json.loads(text)))
+    print(f"compiladas:   {compiled_bytes / 2**20:>8.1f} MB  ({compiled_bytes / total:,.0f} bytes/pergunta, "
+          f"{compiled_bytes / raw_bytes:.0%} dos dicionários)")
+
+    start = time.perf_counter()
+    for position in range(len(compiled)):
+        question = compiled[position]
+        question.answer.letter
+        question.option_count
+    elapsed = time.perf_counter() - start
+    print(f"acesso:       {elapsed / total * 1e9:>8.0f} ns/pergunta (pergunta, resposta e número de opções)")
+
+    start = time.perf_counter()
+    for position in range(len(compiled)):
+        compiled[position].public.json_text
+    elapsed = time.perf_counter() - start
+    print(f"parte pública:{elapsed / total * 1e6:>8.1f} µs/pergunta (codificada no primeiro envio)")
+
+
+if __name__ == '__main__':
+    main()
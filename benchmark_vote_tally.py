@@ -0,0 +1,75 @@
+"""
+Benchmark da contagem de votos (vote_tally.VoteTally).
+
+Mede a vazão de votos com uma e várias threads de ingestão e verifica a
+consistência da contagem: a soma dos contadores deve ser igual ao número
+de usuários distintos e cada contador deve bater com o mapa de votos.
+
+Uso:
+    python benchmark_vote_tally.py [votos] [usuarios] [threads]
+"""
+import sys
+import time
+import random
+import threading
+
+from vote_tally import VoteTally
+
+
+def generate_votes(total_votes, total_users, seed=42):
+    """Gera uma lista de (usuário, opção) com muitas trocas de voto."""
+    rng = random.Random(seed)
+    users = [f"user{i}" for i in range(total_users)]
+    return [(rng.choice(users), rng.randrange(4)) for _ in range(total_votes)]
+
+
+def check_consistency(tally):
+    """Confere se os contadores batem com o mapa usuário -> opção."""
+    counts = tally.counts()
+    expected = [0] * len(counts)
+    for option in tally.user_votes().values():
+        expected[option] += 1
+    return counts == expected and sum(counts) == tally.total()
+
+
+def run(policy, votes, threads):
+    tally = VoteTally(num_options=4, policy=policy, lock_after=0.5)
+    chunks = [votes[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        vote = tally.vote
+        for user, option in chunk:
+            vote(user, option)
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return len(votes) / elapsed, check_consistency(tally), tally
+
+
+def main():
+    total_votes = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    total_users = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    max_threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    print(f"Gerando {total_votes} votos de {total_users} usuários...")
+    votes = generate_votes(total_votes, total_users)
+
+    thread_counts = sorted({1, 2, 4, max_threads})
+    for policy in ('last', 'first', 'lock'):
+        for threads in thread_counts:
+            rate, consistent, tally = run(policy, votes, threads)
+            status = "OK" if consistent else "INCONSISTENTE"
+            print(f"política={policy:<5} threads={threads:<2} "
+                  f"{rate:>12,.0f} votos/s  votantes={tally.total():<7} contagem={tally.counts()} [{status}]")
+            if not consistent:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Histórico do chat em buffer circular.
+
+Guarda as últimas N mensagens como tuplas compactas
+(seq, timestamp, author, message) em uma lista pré-alocada. Cada mensagem
+recebe um número de sequência crescente, de modo que a consulta "mensagens
+depois da sequência X" é resolvida em O(1) (cálculo direto da posição no
+buffer) e a consulta por timestamp em O(log n) (busca binária).
+"""
+import threading
+import time
+
+SEQ, TIMESTAMP, AUTHOR, MESSAGE = range(4)
+
+
+def record_to_dict(record):
+    """Converte um registro do histórico no formato enviado aos clientes."""
+    return {
+        'seq': record[SEQ],
+        'author': record[AUTHOR],
+        'message': record[MESSAGE],
+        'timestamp': record[TIMESTAMP]
+    }
+
+
+class ChatHistory:
+    """Buffer circular de capacidade fixa com números de sequência."""
+
+    def __init__(self, capacity=1000):
+        self.capacity = max(1, int(capacity))
+        self._buffer = [None] * self.capacity
+        self._next_seq = 1  # Sequência que será atribuída à próxima mensagem
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def append(self, author, message, timestamp=None):
+        """Adiciona uma mensagem e retorna o registro criado."""
+        with self._lock:
+            if timestamp is None:
+                timestamp = time.time()
+            if self._size:
+                # Garantir timestamps não decrescentes para a busca binária
+                last = self._buffer[(self._next_seq - 2) % self.capacity]
+                if timestamp < last[TIMESTAMP]:
+                    timestamp = last[TIMESTAMP]
+            record = (self._next_seq, timestamp, author, message)
+            self._buffer[(self._next_seq - 1) % self.capacity] = record
+            self._next_seq += 1
+            if self._size < self.capacity:
+                self._size += 1
+            return record
+
+    def add_record(self, record):
+        """
+        Adiciona um registro já numerado (réplica do histórico de outro processo).
+
+        Registros repetidos são ignorados; se houver uma lacuna na sequência o
+        buffer é reiniciado a partir do registro recebido.
+        """
+        with self._lock:
+            seq = record[SEQ]
+            if seq < self._next_seq:
+                return False
+            if seq > self._next_seq:
+                self._buffer = [None] * self.capacity
+                self._size = 0
+                self._next_seq = seq
+            self._buffer[(seq - 1) % self.capacity] = tuple(record)
+            self._next_seq = seq + 1
+            if self._size < self.capacity:
+                self._size += 1
+            return True
+
+    def _first_seq(self):
+        return self._next_seq - self._size
+
+    def _slice_from_seq(self, start_seq, limit):
+        """Registros a partir de start_seq (inclusive), em ordem; chamar com o lock."""
+        start_seq = max(start_seq, self._first_seq())
+        end_seq = self._next_seq
+        if limit is not None and end_seq - start_seq > limit:
+            # Com limite, retornar as mensagens mais antigas primeiro para não pular nenhuma
+            end_seq = start_seq + limit
+        return [self._buffer[(seq - 1) % self.capacity] for seq in range(start_seq, end_seq)]
+
+    def since_seq(self, seq, limit=None):
+        """Mensagens com sequência maior que seq (O(1) para localizar o início)."""
+        with self._lock:
+            return self._slice_from_seq(int(seq) + 1, limit)
+
+    def since_timestamp(self, timestamp, limit=None):
+        """Mensagens com timestamp maior que o informado (busca binária)."""
+        with self._lock:
+            low = self._first_seq()
+            high = self._next_seq
+            while low < high:
+                middle = (low + high) // 2
+                if self._buffer[(middle - 1) % self.capacity][TIMESTAMP] <= timestamp:
+                    low = middle + 1
+                else:
+                    high = middle
+            return self._slice_from_seq(low, limit)
+
+    def latest(self, count):
+        """As últimas count mensagens, da mais antiga para a mais nova."""
+        with self._lock:
+            return self._slice_from_seq(self._next_seq - max(0, int(count)), None)
+
+    def last_seq(self):
+        """Sequência da mensagem mais recente (0 se o histórico estiver vazio)."""
+        with self._lock:
+            return self._next_seq - 1
+
+    def clear(self):
+        """Remove todas as mensagens mantendo a numeração de sequência."""
+        with self._lock:
+            self._buffer = [None] * self.capacity
+            self._size = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._size
@@ -0,0 +1,198 @@
+"""
+Pipeline de ingestão do chat.
+
+Substitui a criação de uma thread por mensagem por um conjunto fixo de
+consumidores, cada um com sua própria fila limitada. As mensagens são
+distribuídas pelo nome do autor, de modo que os votos de um mesmo usuário
+são sempre processados na ordem em que chegaram.
+
+Política de transbordo:
+- votos nunca são descartados (o produtor espera por espaço na fila);
+- mensagens comuns de chat são descartadas quando a fila está cheia,
+  seja a mais nova ('drop_new') ou a mais antiga da fila ('drop_oldest').
+
+O handler é chamado como handler(author, message, vote, room), onde room
+identifica a sala de quiz de origem (None para o quiz padrão).
+"""
+import queue
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+VOTE_COMMANDS = ('!A', '!B', '!C', '!D')
+
+OVERFLOW_POLICIES = ('drop_new', 'drop_oldest')
+
+
+def parse_vote(message):
+    """Retorna a letra do voto (A-D) se a mensagem for um comando de voto, senão None."""
+    if not message:
+        return None
+    command = message.strip().upper()
+    if command in VOTE_COMMANDS:
+        return command[1]
+    return None
+
+
+class ChatPipeline:
+    """Fila limitada com um pool fixo de consumidores para mensagens do chat."""
+
+    def __init__(self, handler, workers=2, max_queue_size=1000, overflow_policy='drop_new', name='chat'):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de transbordo inválida: {overflow_policy}")
+
+        self.handler = handler
+        self.overflow_policy = overflow_policy
+        self.name = name
+        self.num_workers = max(1, int(workers))
+        # Cada consumidor tem a sua fila; o tamanho total continua limitado
+        per_worker_size = max(1, int(max_queue_size) // self.num_workers)
+        self._queues = [queue.Queue(maxsize=per_worker_size) for _ in range(self.num_workers)]
+        self._threads = []
+        self._running = False
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.submitted = 0
+        self.processed = 0
+        self.dropped_chat = 0
+        self.votes = 0
+        self.errors = 0
+        self.peak_depth = 0
+
+    def start(self):
+        """Inicia os consumidores (idempotente)."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._threads = []
+            for index, worker_queue in enumerate(self._queues):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(worker_queue,),
+                    name=f"{self.name}-pipeline-{index}"
+                )
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Pipeline de chat iniciado com {self.num_workers} consumidores")
+
+    def stop(self, timeout=1.0):
+        """Para os consumidores após esvaziar as filas."""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            threads = self._threads
+            self._threads = []
+        for worker_queue in self._queues:
+            # Sentinela para acordar o consumidor; bloqueia apenas se a fila estiver cheia
+            worker_queue.put(None)
+        for thread in threads:
+            thread.join(timeout=timeout)
+
+    def submit(self, author, message, echo_only=False, room=None):
+        """
+        Enfileira uma mensagem do chat.
+
+        Com echo_only=True a mensagem é apenas retransmitida, sem ser
+        interpretada como voto. Retorna True se a mensagem foi aceita e
+        False se foi descartada pela política de transbordo.
+        """
+        vote = None if echo_only else parse_vote(message)
+        item = (author, message, vote, room)
+        worker_queue = self._queues[hash((room, author)) % self.num_workers]
+
+        if vote is not None:
+            # Votos nunca são descartados: aplicar contrapressão no produtor
+            worker_queue.put(item)
+            self._count_submit(is_vote=True)
+            return True
+
+        try:
+            worker_queue.put_nowait(item)
+        except queue.Full:
+            if self.overflow_policy == 'drop_new':
+                self._count_drop()
+                return False
+            # drop_oldest: remover a mensagem comum mais antiga para abrir espaço
+            if not self._drop_oldest_chat(worker_queue):
+                self._count_drop()
+                return False
+            try:
+                worker_queue.put_nowait(item)
+            except queue.Full:
+                self._count_drop()
+                return False
+        self._count_submit(is_vote=False)
+        return True
+
+    def _drop_oldest_chat(self, worker_queue):
+        """Remove a mensagem comum mais antiga da fila (votos são preservados)."""
+        with worker_queue.mutex:
+            for index, queued in enumerate(worker_queue.queue):
+                if queued is not None and queued[2] is None:
+                    del worker_queue.queue[index]
+                    # Manter a contabilidade interna da Queue consistente
+                    worker_queue.unfinished_tasks -= 1
+                    worker_queue.not_full.notify()
+                    break
+            else:
+                return False
+        self._count_drop()
+        return True
+
+    def _count_submit(self, is_vote):
+        # A profundidade é lida fora do lock para não aninhar com o mutex das filas
+        depth = self.depth()
+        with self._lock:
+            self.submitted += 1
+            if is_vote:
+                self.votes += 1
+            if depth > self.peak_depth:
+                self.peak_depth = depth
+
+    def _count_drop(self):
+        with self._lock:
+            self.dropped_chat += 1
+
+    def depth(self):
+        """Número de mensagens aguardando processamento."""
+        return sum(worker_queue.qsize() for worker_queue in self._queues)
+
+    def _worker(self, worker_queue):
+        while True:
+            item = worker_queue.get()
+            try:
+                if item is None:
+                    return
+                author, message, vote, room = item
+                try:
+                    self.handler(author, message, vote, room)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    logger.error(f"Erro ao processar mensagem do chat no pipeline: {e}")
+                with self._lock:
+                    self.processed += 1
+            finally:
+                worker_queue.task_done()
+
+    def stats(self):
+        """Retorna os contadores do pipeline."""
+        depth = self.depth()
+        with self._lock:
+            return {
+                'running': self._running,
+                'workers': self.num_workers,
+                'queue_depth': depth,
+                'peak_queue_depth': self.peak_depth,
+                'submitted': self.submitted,
+                'processed': self.processed,
+                'votes': self.votes,
+                'dropped_chat': self.dropped_chat,
+                'errors': self.errors,
+                'overflow_policy': self.overflow_policy
+            }
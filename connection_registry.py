@@ -0,0 +1,220 @@
+"""
+Registro das conexões Socket.IO do processo com controle de admissão.
+
+Quando uma live começa, milhares de espectadores abrem a página ao mesmo
+tempo. O registro limita o número de conexões simultâneas e a taxa de
+novas conexões (balde de fichas): uma conexão recusada recebe
+connect_error e o cliente do Socket.IO tenta de novo com backoff, o que
+espalha a rajada em vez de derrubar o servidor.
+
+Cada conexão aceita tem um registro próprio (ClientConnection) com o
+throttle de ping/keep-alive, as últimas amostras de latência e as
+inscrições do cliente; tudo é liberado no disconnect. As estruturas têm
+tamanho fixo por cliente, então uma live de horas com reconexões não faz
+a memória crescer. stats() expõe as conexões atuais, o pico e os
+percentis de latência.
+"""
+import collections
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+LATENCY_SAMPLES = 32  # Amostras de latência guardadas por cliente
+RECENT_LATENCY_SAMPLES = 1024  # Amostras recentes de todos os clientes (percentis do processo)
+MAX_SUBSCRIPTIONS = 16  # Inscrições por cliente
+KEEP_ALIVE_TIMEOUT = 30.0  # Respostas de keep-alive mais antigas que isto não viram amostra
+
+
+def percentiles(samples, points=(50, 90, 99)):
+    """Percentis (pelo posto mais próximo) de uma sequência de latências em ms."""
+    if not samples:
+        return {f'p{point}': None for point in points}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {f'p{point}': ordered[min(last, int(round(point / 100 * last)))] for point in points}
+
+
+class ClientConnection:
+    """Estado de uma conexão (um sid do Socket.IO)."""
+
+    __slots__ = ('sid', 'address', 'connected_at', 'last_ping', 'last_keep_alive',
+                 'keep_alive_pending', 'latencies', 'subscriptions')
+
+    def __init__(self, sid, address):
+        self.sid = sid
+        self.address = address
+        self.connected_at = time.time()
+        self.last_ping = 0.0  # Última resposta a ping_server
+        self.last_keep_alive = 0.0  # Último keep_alive enviado
+        self.keep_alive_pending = False  # keep_alive enviado sem resposta (mede o tempo de ida e volta)
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.subscriptions = set()
+
+
+class ConnectionRegistry:
+    """
+    Conexões ativas por sid, com limite de conexões e de taxa de conexão.
+
+    max_connections: conexões simultâneas (0 = sem limite).
+    connect_rate: novas conexões por segundo em regime (0 = sem limite);
+    connect_burst: conexões aceitas de uma vez antes de aplicar a taxa.
+    """
+
+    def __init__(self, max_connections=10000, connect_rate=200, connect_burst=500):
+        self.max_connections = max_connections
+        self.connect_rate = float(connect_rate)
+        self.connect_burst = max(1.0, float(connect_burst))
+        self._connections = {}
+        self._tokens = self.connect_burst
+        self._refilled_at = time.monotonic()
+        self._recent_latencies = collections.deque(maxlen=RECENT_LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.peak = 0
+        self.admitted = 0
+        self.disconnected = 0
+        self.rejected_full = 0
+        self.rejected_rate = 0
+
+    def _take_token(self):
+        """Consome uma ficha do balde de conexões; False se a rajada passou da taxa. Chamar com o lock."""
+        if not self.connect_rate:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.connect_burst, self._tokens + (now - self._refilled_at) * self.connect_rate)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def admit(self, sid, address=None):
+        """Registra a conexão; retorna None se ela foi recusada (servidor cheio ou rajada acima da taxa)."""
+        with self._lock:
+            if sid in self._connections:
+                return self._connections[sid]
+            if self.max_connections and len(self._connections) >= self.max_connections:
+                self.rejected_full += 1
+                return None
+            if not self._take_token():
+                self.rejected_rate += 1
+                return None
+            connection = ClientConnection(sid, address)
+            self._connections[sid] = connection
+            self.admitted += 1
+            self.peak = max(self.peak, len(self._connections))
+            return connection
+
+    def remove(self, sid):
+        """Remove a conexão (disconnect); retorna o registro removido ou None."""
+        with self._lock:
+            connection = self._connections.pop(sid, None)
+            if connection is not None:
+                self.disconnected += 1
+            return connection
+
+    def get(self, sid):
+        with self._lock:
+            return self._connections.get(sid)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._connections)
+
+    def throttle(self, sid, kind, interval, now=None):
+        """
+        True se o cliente pode receber mais um 'ping' (pong_response) ou
+        'keep_alive' agora, e registra o envio; False se ele recebeu um há
+        menos de interval segundos ou não está registrado.
+        """
+        now = now or time.time()
+        with self._lock:
+            connection = self._connections.get(sid)
+            if connection is None:
+                return False
+            if kind == 'ping':
+                if now - connection.last_ping < interval:
+                    return False
+                connection.last_ping = now
+            else:
+                if now - connection.last_keep_alive < interval:
+                    return False
+                connection.last_keep_alive = now
+                connection.keep_alive_pending = True
+            return True
+
+    def record_keep_alive_response(self, sid, now=None):
+        """
+        Registra a resposta a um keep_alive; retorna a latência (ida e volta,
+        em ms) ou None se não havia keep_alive pendente para o cliente.
+
+        O tempo é medido só com o relógio do servidor: o timestamp enviado
+        pelo navegador carrega a diferença entre os relógios.
+        """
+        now = now or time.time()
+        with self._lock:
+            connection = self._connections.get(sid)
+            if connection is None or not connection.keep_alive_pending:
+                return None
+            connection.keep_alive_pending = False
+            elapsed = now - connection.last_keep_alive
+            if elapsed > KEEP_ALIVE_TIMEOUT:
+                return None
+            latency = int(elapsed * 1000)
+            connection.latencies.append(latency)
+            self._recent_latencies.append(latency)
+            return latency
+
+    def latency(self, sid):
+        """Percentis de latência de um cliente (None se não está registrado)."""
+        with self._lock:
+            connection = self._connections.get(sid)
+            if connection is None:
+                return None
+            samples = list(connection.latencies)
+        return {'samples': len(samples), **percentiles(samples)}
+
+    def subscribe(self, sid, topic):
+        """Inscreve o cliente em um tópico; False se ele não está registrado ou atingiu o limite."""
+        with self._lock:
+            connection = self._connections.get(sid)
+            if connection is None:
+                return False
+            if topic not in connection.subscriptions and len(connection.subscriptions) >= MAX_SUBSCRIPTIONS:
+                return False
+            connection.subscriptions.add(topic)
+            return True
+
+    def unsubscribe(self, sid, topic):
+        with self._lock:
+            connection = self._connections.get(sid)
+            if connection is not None:
+                connection.subscriptions.discard(topic)
+
+    def subscriptions(self, sid):
+        with self._lock:
+            connection = self._connections.get(sid)
+            return set(connection.subscriptions) if connection is not None else set()
+
+    def stats(self):
+        with self._lock:
+            subscriptions = collections.Counter()
+            for connection in self._connections.values():
+                subscriptions.update(connection.subscriptions)
+            recent = list(self._recent_latencies)
+            return {
+                'current': len(self._connections),
+                'peak': self.peak,
+                'max_connections': self.max_connections,
+                'connect_rate': self.connect_rate,
+                'connect_burst': self.connect_burst,
+                'admitted': self.admitted,
+                'disconnected': self.disconnected,
+                'rejected_full': self.rejected_full,
+                'rejected_rate': self.rejected_rate,
+                'subscriptions': dict(subscriptions),
+                'latency_ms': {'samples': len(recent), **percentiles(recent)}
+            }
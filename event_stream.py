@@ -0,0 +1,173 @@
+"""
+Hub de eventos para Server-Sent Events (SSE).
+
+Os clientes sem WebSocket recebem as fases, votos, chat e ranking por uma
+única conexão HTTP (text/event-stream) em vez de quatro requisições de
+polling por ciclo. Cada evento é serializado uma única vez ao ser
+publicado e guardado em um buffer circular com um id sequencial; todos os
+clientes leem os mesmos bytes.
+
+Ao reconectar, o navegador envia o cabeçalho Last-Event-ID e o cliente
+recebe apenas os eventos que perdeu. Se eles já saíram do buffer (ou o id
+é de outro processo), o cliente recebe uma fotografia do estado atual
+(evento 'snapshot') e continua a partir dela.
+"""
+import collections
+import itertools
+import os
+import threading
+import time
+import logging
+
+from question_model import dumps
+
+logger = logging.getLogger(__name__)
+
+# Identifica este processo nos ids dos eventos (ids de outro worker forçam uma fotografia)
+_epochs = itertools.count(1)
+
+
+def format_event(event, data, event_id=None):
+    """Formata um evento SSE (data em JSON compacto)."""
+    payload = dumps(data, ensure_ascii=False, separators=(',', ':'))  # Perguntas com o JSON pré-codificado
+    prefix = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{prefix}event: {event}\ndata: {payload}\n\n'
+
+
+class BroadcastHub:
+    """
+    Buffer circular de eventos publicados e espera dos clientes conectados.
+
+    publish() pode ser chamado de qualquer thread; stream() é um gerador
+    para a resposta HTTP de um cliente (uma thread ou greenlet por cliente).
+    """
+
+    def __init__(self, capacity=500, heartbeat=15.0, max_clients=1000, retry_ms=3000):
+        self.capacity = max(1, int(capacity))
+        self.heartbeat = max(1.0, float(heartbeat))
+        self.max_clients = max_clients
+        self.retry_ms = retry_ms
+        self.epoch = f'{os.getpid():x}{int(time.time()):x}.{next(_epochs)}'
+        self._events = collections.deque(maxlen=self.capacity)  # (seq, evento formatado)
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._closed = False
+
+        # Contadores
+        self.clients = 0
+        self.peak_clients = 0
+        self.published = 0
+        self.resumed = 0
+        self.snapshots = 0
+        self.rejected = 0
+
+    def publish(self, event, data):
+        """Publica um evento para todos os clientes conectados."""
+        with self._condition:
+            self._seq += 1
+            self._events.append((self._seq, format_event(event, data, f'{self.epoch}-{self._seq}')))
+            self.published += 1
+            self._condition.notify_all()
+
+    def close(self):
+        """Encerra os streams abertos (os clientes reconectam)."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _parse_id(self, last_event_id):
+        """Sequência de um Last-Event-ID deste processo; None se ausente ou de outro processo."""
+        if not last_event_id:
+            return None
+        epoch, _, seq = last_event_id.rpartition('-')
+        if epoch != self.epoch:
+            return None
+        try:
+            return int(seq)
+        except ValueError:
+            return None
+
+    def _events_after(self, seq):
+        """Eventos após seq; None se algum já saiu do buffer. Chamar com o lock."""
+        if seq >= self._seq:
+            return []
+        if not self._events or self._events[0][0] > seq + 1:
+            return None
+        start = seq + 1 - self._events[0][0]
+        return [frame for _, frame in itertools.islice(self._events, start, None)]
+
+    def accepting(self):
+        """False se o limite de clientes foi atingido (a rota responde 503)."""
+        with self._condition:
+            if self.max_clients and self.clients >= self.max_clients:
+                self.rejected += 1
+                return False
+            return True
+
+    def _resume_from(self, last_event_id):
+        """(sequência atual, eventos perdidos desde last_event_id ou None se é preciso uma fotografia)."""
+        with self._condition:
+            seq = self._parse_id(last_event_id)
+            frames = self._events_after(seq) if seq is not None else None
+            if frames is None:
+                self.snapshots += 1
+            else:
+                self.resumed += 1
+            return self._seq, frames
+
+    def _take(self, seq):
+        """(sequência atual, eventos depois de seq ou None se algum já saiu do buffer). Chamar com o lock."""
+        frames = self._events_after(seq)
+        if frames is None:
+            self.snapshots += 1
+        return self._seq, frames
+
+    def stream(self, last_event_id, snapshot):
+        """
+        Gerador com os eventos para um cliente.
+
+        snapshot() retorna o estado atual (dicionário), enviado como o evento
+        'snapshot' quando não é possível retomar a partir de last_event_id.
+        """
+        with self._condition:
+            self.clients += 1
+            self.peak_clients = max(self.peak_clients, self.clients)
+        try:
+            yield f'retry: {self.retry_ms}\n\n'
+            seq, frames = self._resume_from(last_event_id)
+            if frames is None:
+                # Sem como retomar: fotografia do estado com o id atual
+                yield format_event('snapshot', snapshot(), f'{self.epoch}-{seq}')
+            elif frames:
+                yield ''.join(frames)
+
+            while True:
+                with self._condition:
+                    if self._seq == seq and not self._closed:
+                        self._condition.wait(self.heartbeat)
+                    if self._closed:
+                        return
+                    seq, frames = self._take(seq)
+                if frames is None:
+                    # Cliente lento demais: o buffer já descartou eventos que ele não recebeu
+                    yield format_event('snapshot', snapshot(), f'{self.epoch}-{seq}')
+                elif frames:
+                    yield ''.join(frames)
+                else:
+                    yield f': keep-alive {int(time.time())}\n\n'
+        finally:
+            with self._condition:
+                self.clients -= 1
+
+    def stats(self):
+        with self._condition:
+            return {
+                'clients': self.clients,
+                'peak_clients': self.peak_clients,
+                'max_clients': self.max_clients,
+                'published': self.published,
+                'buffered': len(self._events),
+                'resumed': self.resumed,
+                'snapshots': self.snapshots,
+                'rejected': self.rejected
+            }
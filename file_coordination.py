@@ -0,0 +1,201 @@
+"""
+Coordenação de workers na mesma máquina usando apenas arquivos.
+
+Usado pelo app_render.py (gunicorn com vários workers, sem Socket.IO e sem
+serviço externo):
+
+- FileLeaderLock: o worker que obtém o lock exclusivo (flock) do arquivo de
+  liderança é o líder. O sistema operacional libera o lock quando o
+  processo morre, e os demais workers tentam obtê-lo periodicamente.
+- SharedStateFile: o líder grava a fotografia do estado do quiz com
+  substituição atômica (arquivo temporário + os.replace); os seguidores
+  releem o arquivo apenas quando ele muda.
+- CommandSpool: os seguidores acrescentam comandos (votos, chat, controle)
+  em um arquivo JSONL; o líder lê as linhas novas e os executa.
+"""
+import json
+import os
+import threading
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (um único worker)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class FileLeaderLock:
+    """
+    Eleição do líder por lock de arquivo.
+
+    on_change(is_leader) é chamado quando este processo vira o líder. A
+    liderança só é perdida com o fim do processo (ou stop()).
+    """
+
+    def __init__(self, path, on_change, interval=1.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = max(0.05, float(interval))
+        self.is_leader = False
+        self._handle = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Tenta obter a liderança agora e, se não conseguir, a cada intervalo."""
+        if self._try_acquire():
+            return
+        self._thread = threading.Thread(target=self._run, name='leader-lock')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._handle:
+            self._handle.close()  # Fecha o arquivo e libera o lock
+            self._handle = None
+            self.is_leader = False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._try_acquire():
+                return
+
+    def _try_acquire(self):
+        if fcntl is not None:
+            handle = open(self.path, 'a')
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+            self._handle = handle
+        self.is_leader = True
+        logger.info(f"Worker {os.getpid()} agora é o líder")
+        try:
+            self.on_change(True)
+        except Exception as e:
+            logger.error(f"Erro ao assumir a liderança: {e}")
+        return True
+
+
+class SharedStateFile:
+    """Fotografia do estado gravada pelo líder e lida pelos seguidores."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cached = None
+        self._cached_key = None
+
+    def write(self, state):
+        """Grava o estado com substituição atômica (leitores nunca veem um arquivo pela metade)."""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def read(self):
+        """Estado atual; o arquivo só é relido quando muda. Retorna None se não existir."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        with self._lock:
+            if key != self._cached_key:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._cached = json.load(f)
+                    self._cached_key = key
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Erro ao ler o estado compartilhado: {e}")
+            return self._cached
+
+
+class CommandSpool:
+    """
+    Fila de comandos em um arquivo JSONL (seguidores escrevem, o líder lê).
+
+    Cada comando é uma única escrita com O_APPEND, então linhas de processos
+    diferentes não se misturam. O líder rotaciona o arquivo quando ele passa
+    de max_bytes.
+    """
+
+    def __init__(self, path, handler, interval=0.1, max_bytes=1024 * 1024):
+        self.path = path
+        self.handler = handler
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Contadores
+        self.appended = 0
+        self.handled = 0
+
+    def append(self, command):
+        """Acrescenta um comando para o líder."""
+        line = (json.dumps(command, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        self.appended += 1
+
+    def start(self):
+        """Inicia a leitura no líder; comandos escritos antes disso são descartados."""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name='command-spool')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _open(self, skip_existing):
+        handle = open(self.path, 'a+b')
+        handle.seek(0, os.SEEK_END if skip_existing else os.SEEK_SET)
+        return handle
+
+    def _run(self):
+        handle = self._open(skip_existing=True)
+        rotated = None  # Arquivo anterior, lido até o fim após a rotação
+        buffer = b''
+        while not self._stop.wait(self.interval):
+            try:
+                if rotated is not None:
+                    _, got_data = self._read_lines(rotated, b'')
+                    if not got_data:
+                        rotated.close()
+                        rotated = None
+                buffer, _ = self._read_lines(handle, buffer)
+                if rotated is None and not buffer and handle.tell() > self.max_bytes:
+                    # Seguidores abrem o arquivo a cada comando: após a renomeação
+                    # passam a escrever no novo; o antigo ainda é lido até o fim
+                    os.replace(self.path, f'{self.path}.1')
+                    rotated = handle
+                    handle = self._open(skip_existing=False)
+            except Exception as e:
+                logger.error(f"Erro ao ler comandos dos workers: {e}")
+
+    def _read_lines(self, handle, buffer):
+        """Executa as linhas completas novas. Retorna (linha parcial restante, se havia dados)."""
+        data = handle.read()
+        if not data:
+            return buffer, False
+        buffer += data
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if not line:
+                continue
+            try:
+                self.handler(json.loads(line))
+                self.handled += 1
+            except Exception as e:
+                logger.error(f"Erro ao executar comando de worker: {e}")
+        return buffer, True
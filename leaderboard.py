@@ -0,0 +1,207 @@
+"""
+Ranking incremental dos participantes.
+
+Em vez de ordenar o dicionário inteiro a cada consulta, o ranking é
+mantido indexado conforme as pontuações mudam:
+
+- um "balde" por pontuação com os usuários em ordem alfabética;
+- a lista ordenada das pontuações distintas;
+- uma árvore de Fenwick com a quantidade de usuários por pontuação.
+
+Com isso o top-K sai em O(K), a posição de um usuário em O(log n) e uma
+página do ranking em O(log n + tamanho da página). As pontuações são
+inteiros não negativos (pontos por acerto).
+"""
+import bisect
+import threading
+
+
+class _FenwickTree:
+    """Árvore de Fenwick (BIT) com contagem de usuários por pontuação."""
+
+    def __init__(self, size=64):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def grow(self, min_size):
+        """Aumenta a capacidade (dobrando) preservando as contagens."""
+        counts = [self.range_count(i) for i in range(self.size)]
+        new_size = self.size
+        while new_size < min_size:
+            new_size *= 2
+        self.size = new_size
+        self.tree = [0] * (new_size + 1)
+        for index, count in enumerate(counts):
+            if count:
+                self.add(index, count)
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, index):
+        """Quantidade de usuários com pontuação <= index."""
+        if index < 0:
+            return 0
+        i = min(index + 1, self.size)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_count(self, index):
+        return self.prefix(index) - self.prefix(index - 1)
+
+    def lower_bound(self, target):
+        """Menor pontuação cujo prefixo acumulado é >= target."""
+        position = 0
+        step = 1
+        while step * 2 <= self.size:
+            step *= 2
+        remaining = target
+        while step:
+            next_position = position + step
+            if next_position <= self.size and self.tree[next_position] < remaining:
+                position = next_position
+                remaining -= self.tree[next_position]
+            step //= 2
+        return position  # índice 0-based da pontuação
+
+
+class Leaderboard:
+    """Ranking com atualização incremental, top-K, posição e paginação."""
+
+    def __init__(self, scores=None):
+        self._lock = threading.RLock()
+        self._scores = {}
+        self._buckets = {}
+        self._distinct = []
+        self._counts = _FenwickTree()
+        if scores:
+            self.load(scores)
+
+    # Manutenção interna (chamar com o lock)
+
+    def _insert(self, user, score):
+        if score >= self._counts.size:
+            self._counts.grow(score + 1)
+        bucket = self._buckets.get(score)
+        if bucket is None:
+            bucket = self._buckets[score] = []
+            bisect.insort(self._distinct, score)
+        bisect.insort(bucket, user)
+        self._counts.add(score, 1)
+        self._scores[user] = score
+
+    def _remove(self, user, score):
+        bucket = self._buckets[score]
+        del bucket[bisect.bisect_left(bucket, user)]
+        if not bucket:
+            del self._buckets[score]
+            del self._distinct[bisect.bisect_left(self._distinct, score)]
+        self._counts.add(score, -1)
+        del self._scores[user]
+
+    @staticmethod
+    def _validate(score):
+        score = int(score)
+        if score < 0:
+            raise ValueError(f"Pontuação negativa não suportada: {score}")
+        return score
+
+    # Escrita
+
+    def load(self, scores):
+        """Substitui o ranking pelo conteúdo de um dicionário usuário -> pontuação."""
+        with self._lock:
+            self._scores = {}
+            self._buckets = {}
+            self._distinct = []
+            self._counts = _FenwickTree()
+            for user, score in scores.items():
+                self._insert(user, self._validate(score))
+
+    def set(self, user, score):
+        """Define a pontuação de um usuário."""
+        score = self._validate(score)
+        with self._lock:
+            current = self._scores.get(user)
+            if current == score:
+                return score
+            if current is not None:
+                self._remove(user, current)
+            self._insert(user, score)
+            return score
+
+    def add(self, user, delta=1):
+        """Soma delta à pontuação do usuário (criando-o com 0) e retorna o total."""
+        with self._lock:
+            current = self._scores.get(user, 0)
+            return self.set(user, current + delta)
+
+    def remove(self, user):
+        """Remove um usuário do ranking."""
+        with self._lock:
+            current = self._scores.get(user)
+            if current is not None:
+                self._remove(user, current)
+
+    # Leitura
+
+    def score(self, user, default=None):
+        with self._lock:
+            return self._scores.get(user, default)
+
+    def rank(self, user):
+        """Posição (1-based) do usuário no ranking, ou None se não estiver nele."""
+        with self._lock:
+            score = self._scores.get(user)
+            if score is None:
+                return None
+            above = len(self._scores) - self._counts.prefix(score)
+            return above + bisect.bisect_left(self._buckets[score], user) + 1
+
+    def page(self, offset=0, limit=10):
+        """Lista de (usuário, pontuação) a partir da posição offset (0-based)."""
+        with self._lock:
+            total = len(self._scores)
+            offset = max(0, int(offset))
+            limit = max(0, int(limit))
+            if offset >= total or limit == 0:
+                return []
+
+            # Localizar a pontuação que contém a posição offset
+            score = self._counts.lower_bound(total - offset)
+            above = total - self._counts.prefix(score)
+            start = offset - above
+
+            result = []
+            score_index = bisect.bisect_left(self._distinct, score)
+            while score_index >= 0 and len(result) < limit:
+                score = self._distinct[score_index]
+                bucket = self._buckets[score]
+                for user in bucket[start:start + limit - len(result)]:
+                    result.append((user, score))
+                start = 0
+                score_index -= 1
+            return result
+
+    def top(self, k=10):
+        """Os k primeiros colocados como lista de (usuário, pontuação)."""
+        return self.page(0, k)
+
+    def to_dict(self):
+        """Cópia do ranking como dicionário usuário -> pontuação."""
+        with self._lock:
+            return dict(self._scores)
+
+    def __contains__(self, user):
+        with self._lock:
+            return user in self._scores
+
+    def __len__(self):
+        with self._lock:
+            return len(self._scores)
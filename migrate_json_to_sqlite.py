@@ -0,0 +1,69 @@
+"""
+Importa os arquivos JSON de data/ para o banco SQLite.
+
+Lê as perguntas (banco indexado data/questions.jsonl ou data/questions.json), data/config.json e o ranking (snapshot + diário,
+ou o antigo data/ranking.json) e grava tudo no banco usado com
+QUIZ_STORAGE=sqlite.
+
+Uso:
+    python migrate_json_to_sqlite.py [diretorio_de_dados] [caminho_do_banco]
+"""
+import json
+import os
+import sys
+import logging
+
+from question_store import QuestionStore
+from ranking_journal import RankingJournal
+from sqlite_store import SQLiteStore
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        logger.warning(f"Arquivo não encontrado: {path}")
+        return default
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_ranking(data_dir):
+    """Lê o ranking do snapshot + diário sem abrir o diário para escrita."""
+    journal = RankingJournal(data_dir, legacy_file=os.path.join(data_dir, 'ranking.json'))
+    scores, _, _, _ = journal._replay()
+    return scores
+
+
+def main():
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'data'
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.environ.get('QUIZ_DB_PATH', os.path.join(data_dir, 'quiz.db'))
+
+    store = SQLiteStore(db_path)
+    logger.info(f"Migrando {data_dir} para {db_path}")
+
+    question_store = QuestionStore(data_dir)
+    if question_store.exists():
+        questions = question_store
+    else:
+        questions = load_json(os.path.join(data_dir, 'questions.json'), [])
+    errors = store.replace_questions(questions) if questions else []
+    logger.info(f"{len(questions) - len(errors)} perguntas importadas")
+    for error in errors:
+        logger.warning(f"Pergunta ignorada: {error}")
+
+    config = load_json(os.path.join(data_dir, 'config.json'), {})
+    if config:
+        store.save_config(config)
+    logger.info(f"{len(config)} configurações importadas")
+
+    scores = load_ranking(data_dir)
+    store.replace_ranking(scores)
+    logger.info(f"{len(scores)} usuários do ranking importados")
+
+    logger.info("Migração concluída. Inicie o servidor com QUIZ_STORAGE=sqlite para usar o banco.")
+
+
+if __name__ == '__main__':
+    main()
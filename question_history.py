@@ -0,0 +1,138 @@
+"""
+Histórico das perguntas feitas no quiz, pelo id da pergunta.
+
+Cada resultado exibido acrescenta uma linha a data/questions.history:
+
+    {"id": "a1b2c3", "ts": 1700000000.0, "votes": 120, "correct": 45}
+
+Em memória fica só o resumo por pergunta (vezes em que foi feita, votos,
+acertos e a última vez), montado lendo o arquivo na inicialização; depois
+só as linhas novas são lidas, no máximo uma vez por refresh_interval, então
+os outros workers percebem as perguntas feitas pelo líder. Usado pelo
+filtro "nunca perguntadas" da busca e pelas estatísticas de acerto.
+"""
+import json
+import os
+import threading
+import time
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class QuestionStats:
+    """Resumo de uma pergunta no histórico."""
+
+    __slots__ = ('asked', 'votes', 'correct', 'last_asked')
+
+    def __init__(self):
+        self.asked = 0
+        self.votes = 0
+        self.correct = 0
+        self.last_asked = 0.0
+
+    @property
+    def correct_rate(self):
+        """Fração dos votos que acertaram (None sem votos)."""
+        return self.correct / self.votes if self.votes else None
+
+    def to_dict(self):
+        return {
+            'asked': self.asked,
+            'votes': self.votes,
+            'correct': self.correct,
+            'correct_rate': self.correct_rate,
+            'last_asked': self.last_asked
+        }
+
+
+class QuestionHistory:
+    """Histórico das perguntas feitas, compartilhado pelos processos pelo arquivo."""
+
+    def __init__(self, data_dir, name='questions', refresh_interval=1.0):
+        self.path = os.path.join(data_dir, f'{name}.history')
+        self.refresh_interval = refresh_interval
+        self._stats = {}  # id (texto) -> QuestionStats
+        self._offset = 0  # Bytes do arquivo já lidos
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self, force=False):
+        """Lê as linhas acrescentadas desde a última leitura. Chamar com o lock."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size < self._offset:
+            # Arquivo apagado ou trocado: relê do começo
+            self._stats = {}
+            self._offset = 0
+        if size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        end = data.rfind(b'\n') + 1  # Uma linha sendo escrita fica para a próxima leitura
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+                self._apply(str(entry['id']), entry.get('ts', 0.0), entry.get('votes', 0), entry.get('correct', 0))
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Linha inválida ignorada em {self.path}")
+        self._offset += end
+
+    def _apply(self, question_id, ts, votes, correct):
+        stats = self._stats.get(question_id)
+        if stats is None:
+            stats = self._stats[question_id] = QuestionStats()
+        stats.asked += 1
+        stats.votes += votes
+        stats.correct += correct
+        stats.last_asked = max(stats.last_asked, ts)
+
+    def record(self, question_id, votes=0, correct=0):
+        """Registra que a pergunta foi feita, com o total de votos e de acertos."""
+        line = json.dumps({'id': str(question_id), 'ts': round(time.time(), 3), 'votes': int(votes),
+                           'correct': int(correct)}, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._refresh(force=True)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'ab') as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)  # Liberado ao fechar
+                f.write(line.encode('utf-8'))
+            # A linha nova (e as de outros processos) entram pela leitura incremental
+            self._refresh(force=True)
+
+    def get(self, question_id):
+        """QuestionStats da pergunta, ou None se ela nunca foi feita."""
+        with self._lock:
+            self._refresh()
+            return self._stats.get(str(question_id))
+
+    def asked(self, question_id):
+        return self.get(question_id) is not None
+
+    def snapshot(self):
+        """Dicionário id -> QuestionStats (o atual; não alterar)."""
+        with self._lock:
+            self._refresh()
+            return self._stats
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                'questions_asked': len(self._stats),
+                'times_asked': sum(stats.asked for stats in self._stats.values()),
+                'history_bytes': self._offset
+            }
@@ -0,0 +1,268 @@
+"""
+Importação em massa de perguntas, lida em stream.
+
+O upload (lista JSON ou JSON Lines, uma pergunta por linha) é lido em
+pedaços: cada pergunta é decodificada assim que chega, validada e
+normalizada (compile_question) e gravada no banco em lotes; só o lote atual
+e a pergunta sendo lida ficam em memória, então um arquivo de 100 MB usa a
+mesma memória que um de 1 MB. Entre os lotes a importação cede a vez
+(time.sleep(0)) para o quiz em andamento.
+
+Perguntas inválidas não interrompem a importação: vão para o relatório com
+o número do registro, o campo e o motivo. Uma lista JSON malformada (ou um
+texto que não é UTF-8) interrompe a importação e nada é gravado; em JSON
+Lines uma linha malformada é apenas um registro inválido.
+
+Modos (QuestionWriter): 'append' acrescenta as perguntas (id repetido é
+recusado), 'upsert' substitui a pergunta com o mesmo id e acrescenta as
+demais, 'replace' troca o banco inteiro. As perguntas ficam visíveis de uma
+vez, no fim da importação.
+"""
+import codecs
+import json
+import time
+import logging
+
+from question_model import QuestionError, compile_question
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = 64 * 1024  # Bytes lidos do upload por vez
+IMPORT_BATCH_SIZE = 500  # Perguntas gravadas por lote
+MAX_RECORD_BYTES = 1024 * 1024  # Tamanho máximo de uma pergunta no upload
+MAX_REPORTED_ERRORS = 100  # Erros por registro incluídos no relatório
+
+
+class ImportFormatError(ValueError):
+    """Upload que não pode ser lido (lista JSON malformada, texto que não é UTF-8)."""
+
+
+class RecordParser:
+    """
+    Registros de um upload JSON (lista de perguntas) ou JSON Lines, em pedaços.
+
+    feed() recebe bytes e retorna os registros completos até ali como
+    (número do registro, valor); um registro ilegível de JSON Lines vem como
+    (número, QuestionError). O formato é escolhido pelo primeiro caractere:
+    '[' é uma lista JSON, qualquer outro é JSON Lines.
+    """
+
+    def __init__(self, max_record_bytes=MAX_RECORD_BYTES):
+        self.max_record_bytes = max_record_bytes
+        self.format = None  # 'json' ou 'jsonl'
+        self.records = 0
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._position = 0
+        self._expect = 'value'  # Lista JSON: 'value', 'separator' ou 'end'
+        self._discarding = False  # JSON Lines: pulando o resto de uma linha grande demais
+
+    def feed(self, chunk, final=False):
+        try:
+            text = self._decoder.decode(chunk, final)
+        except UnicodeDecodeError as e:
+            raise ImportFormatError(f"O arquivo não é texto UTF-8 (byte {e.start})") from None
+        self._buffer = self._buffer[self._position:] + text
+        self._position = 0
+        if self.format is None:
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                self._buffer = ''
+                return []
+            self.format = 'json' if stripped[0] == '[' else 'jsonl'
+            if self.format == 'json':
+                self._buffer = stripped[1:]
+        if self.format == 'json':
+            return self._feed_json(final)
+        return self._feed_lines(final)
+
+    def close(self):
+        """Registros restantes; verifica se a lista JSON foi fechada."""
+        records = self.feed(b'', final=True)
+        if self.format == 'json' and self._expect != 'end':
+            raise ImportFormatError(f"Lista JSON incompleta depois da pergunta {self.records}")
+        return records
+
+    def _skip_whitespace(self):
+        buffer, position = self._buffer, self._position
+        while position < len(buffer) and buffer[position] in ' \t\r\n':
+            position += 1
+        self._position = position
+
+    def _feed_json(self, final):
+        records = []
+        while True:
+            self._skip_whitespace()
+            if self._position >= len(self._buffer):
+                break
+            char = self._buffer[self._position]
+            if self._expect == 'end':
+                raise ImportFormatError(f"Conteúdo depois do fim da lista JSON (pergunta {self.records})")
+            if char == ']' and (self._expect == 'separator' or self.records == 0):
+                self._position += 1
+                self._expect = 'end'
+                continue
+            if self._expect == 'separator':
+                if char != ',':
+                    raise ImportFormatError(f"Esperado ',' ou ']' depois da pergunta {self.records}")
+                self._position += 1
+                self._expect = 'value'
+                continue
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError as e:
+                pending = len(self._buffer) - self._position
+                if final or pending > self.max_record_bytes:
+                    raise ImportFormatError(f"JSON inválido na pergunta {self.records + 1}: {e.msg}") from None
+                break  # Registro incompleto: espera o próximo pedaço
+            if not final and end == len(self._buffer) and not isinstance(value, (dict, list, str)):
+                break  # Um número no fim do pedaço pode continuar no próximo
+            records.append((self.records, value))
+            self.records += 1
+            self._position = end
+            self._expect = 'separator'
+        return records
+
+    def _feed_lines(self, final):
+        records = []
+        buffer = self._buffer
+        while True:
+            end = buffer.find('\n', self._position)
+            if self._discarding:
+                # Resto de um registro grande demais (já informado): descartado até o fim da linha
+                if end < 0:
+                    self._position = len(buffer)
+                    self._discarding = not final
+                    break
+                self._position = end + 1
+                self._discarding = False
+                continue
+            if end < 0:
+                if final and self._position < len(buffer):
+                    end = len(buffer)
+                else:
+                    break
+            line = buffer[self._position:end]
+            self._position = end + 1
+            if line.strip():
+                records.append(self._decode_line(line))
+        if len(buffer) - self._position > self.max_record_bytes:
+            records.append(self._too_large())
+            self._discarding = True
+            self._position = len(buffer)
+        return records
+
+    def _decode_line(self, line):
+        number = self.records
+        self.records += 1
+        try:
+            return number, json.loads(line)
+        except json.JSONDecodeError as e:
+            return number, QuestionError(number, None, f"JSON inválido: {e.msg} (coluna {e.colno})")
+
+    def _too_large(self):
+        number = self.records
+        self.records += 1
+        return number, QuestionError(number, None, f"registro maior que {self.max_record_bytes // 1024} KB")
+
+
+class QuestionImport:
+    """
+    Importação de um upload com um QuestionWriter (ou SQLiteQuestionWriter).
+
+    Use como context manager
+    (abort() se algo falhar) e chame feed() com os pedaços do upload e
+    finish() no fim, que grava o que falta e retorna o relatório.
+    """
+
+    def __init__(self, writer, batch_size=IMPORT_BATCH_SIZE, max_errors=MAX_REPORTED_ERRORS):
+        self.writer = writer
+        self.mode = writer.mode
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.parser = RecordParser()
+        self.invalid = 0
+        self.errors = []
+        self._batch = []
+        self._started_at = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            self.abort()
+        return False
+
+    def open(self):
+        self._started_at = time.perf_counter()
+        self.writer.open()
+
+    def feed(self, chunk):
+        self._add(self.parser.feed(chunk))
+
+    def finish(self):
+        """Grava o último lote, confirma a importação e retorna o relatório."""
+        self._add(self.parser.close())
+        self._flush()
+        if self.mode == 'replace' and not self.writer.added:
+            raise ImportFormatError("Nenhuma pergunta válida no arquivo: o banco não foi substituído")
+        self.writer.commit()
+        report = self.report()
+        logger.info(f"Importação ({self.mode}): {report['added']} novas, {report['updated']} substituídas, "
+                    f"{report['invalid']} inválidas em {report['seconds']}s")
+        return report
+
+    def abort(self):
+        self.writer.abort()
+
+    def _add(self, records):
+        for number, value in records:
+            if isinstance(value, QuestionError):
+                self._reject([value])
+                continue
+            try:
+                self._batch.append((number, compile_question(value, number).to_dict()))
+            except QuestionError as e:
+                self._reject([e])
+                continue
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+
+    def _flush(self):
+        if self._batch:
+            self._reject(self.writer.write(self._batch))
+            self._batch = []
+            time.sleep(0)  # Cede a vez às fases do quiz (gevent/threads) entre os lotes
+
+    def _reject(self, errors):
+        self.invalid += len(errors)
+        room = self.max_errors - len(self.errors)
+        if room > 0:
+            self.errors.extend(errors[:room])
+
+    def report(self):
+        return {
+            'mode': self.mode,
+            'format': self.parser.format,
+            'records': self.parser.records,
+            'added': self.writer.added,
+            'updated': self.writer.updated,
+            'invalid': self.invalid,
+            'errors': [error.to_dict() for error in sorted(self.errors, key=lambda error: error.position)],
+            'errors_truncated': self.invalid > len(self.errors),
+            'seconds': round(time.perf_counter() - self._started_at, 2) if self._started_at else 0
+        }
+
+
+def import_stream(writer, read, chunk_size=IMPORT_CHUNK_SIZE):
+    """Importa tudo o que read(chunk_size) devolver (arquivo, request.stream); retorna o relatório."""
+    with QuestionImport(writer) as importer:
+        while True:
+            chunk = read(chunk_size)
+            if not chunk:
+                break
+            importer.feed(chunk)
+        return importer.finish()
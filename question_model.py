@@ -0,0 +1,326 @@
+"""
+Perguntas compiladas para envio aos clientes.
+
+Cada pergunta é validada e compilada uma única vez, ao carregar o banco de
+perguntas, em um objeto com __slots__: texto, opções normalizadas (tupla
+de textos internados, aceitando lista ou dicionário A-D), número de
+opções, índice da resposta correta (de 'correct' ou 'correct_answer',
+número ou letra) e explicação. Entradas inválidas são recusadas com a
+posição e o campo do erro (QuestionError), então as fases do quiz e as
+rotas não tratam formatos alternativos.
+
+A parte pública (sem a resposta) é codificada em JSON uma única vez, no
+primeiro envio da pergunta, e guardada no objeto; a resposta correta fica
+no registro privado (Answer), usado apenas na fase de resultados. O
+Socket.IO, os streams SSE e as rotas HTTP enviam os mesmos bytes: dumps()
+insere o JSON pronto de cada PublicQuestion em vez de codificá-la de novo.
+
+Memória de um banco grande: python benchmark_questions.py [perguntas]
+"""
+import collections
+import json
+import sys
+import threading
+import types
+import logging
+
+logger = logging.getLogger(__name__)
+
+OPTION_LETTERS = 'ABCD'
+NUM_OPTIONS = len(OPTION_LETTERS)
+MIN_OPTIONS = 2
+DEFAULT_EXPLANATION = 'Sem explicação disponível.'
+
+# Campos tratados pela compilação (os demais seguem como campos extras públicos)
+QUESTION_KEYS = ('id', 'question', 'options', 'correct', 'correct_answer', 'explanation')
+
+# Textos curtos (opções como "Verdadeiro", categorias) se repetem no banco e são internados;
+# internar textos longos e únicos só aumentaria a tabela de strings do interpretador
+INTERN_MAX_LENGTH = 32
+
+# Perguntas inválidas (compiladas sob demanda) puladas seguidas antes de o quiz parar
+MAX_SKIPPED_QUESTIONS = 100
+
+# Tuplas de nomes de campos extras compartilhadas entre as perguntas com os mesmos campos
+_extra_layouts = {}
+
+# Resposta de uma pergunta: índice (0-based), letra e explicação
+Answer = collections.namedtuple('Answer', 'index letter explanation')
+
+
+class QuestionError(ValueError):
+    """Pergunta inválida: posição no banco (0-based), campo e motivo."""
+
+    def __init__(self, position, field, message):
+        super().__init__(f"Pergunta {position + 1}: {message}")
+        self.position = position
+        self.field = field
+        self.reason = message
+
+    def to_dict(self):
+        return {'index': self.position, 'field': self.field, 'message': str(self)}
+
+
+def encode(data):
+    """JSON compacto (UTF-8 sem escapes), o formato enviado aos clientes."""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class PublicQuestion(dict):
+    """Parte pública de uma pergunta com o JSON codificado uma única vez (json_text)."""
+
+    __slots__ = ('json_text',)
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.json_text = encode(self)
+
+    def __reduce__(self):
+        # Para outros processos (fila de mensagens) a pergunta segue como um dicionário comum
+        return (dict, (dict(self),))
+
+
+class CompiledQuestion:
+    """Pergunta validada: dados normalizados, parte pública e resposta privada."""
+
+    __slots__ = ('position', 'id', 'text', 'options', 'correct', 'explanation',
+                 'extra_keys', 'extra_values', '_public')
+
+    def __init__(self, position, question_id, text, options, correct, explanation=None, extra=None):
+        self.position = position
+        self.id = question_id  # None: a pergunta não tinha id (a posição é usada)
+        self.text = text
+        self.options = options  # Tupla com option_count textos
+        self.correct = correct
+        self.explanation = explanation
+        # Campos extras (categoria, imagem, ...): nomes compartilhados e valores em tuplas
+        if extra:
+            keys = tuple(extra)
+            self.extra_keys = _extra_layouts.setdefault(keys, keys)
+            self.extra_values = tuple(extra.values())
+        else:
+            self.extra_keys = self.extra_values = None
+        self._public = None
+
+    @property
+    def option_count(self):
+        return len(self.options)
+
+    @property
+    def extra(self):
+        """Campos extras como dicionário (None se a pergunta não tem)."""
+        return dict(zip(self.extra_keys, self.extra_values)) if self.extra_keys else None
+
+    @property
+    def public(self):
+        """Parte pública (PublicQuestion), montada e codificada no primeiro uso."""
+        public = self._public
+        if public is None:
+            data = {'id': self.position if self.id is None else self.id, 'question': self.text}
+            if self.extra_keys:
+                data.update(zip(self.extra_keys, self.extra_values))
+            # Os clientes mostram sempre 4 botões
+            data['options'] = list(self.options) + [''] * (NUM_OPTIONS - len(self.options))
+            public = self._public = PublicQuestion(data)
+        return public
+
+    @property
+    def answer(self):
+        """Resposta privada: revelada apenas na fase de resultados."""
+        return Answer(self.correct, OPTION_LETTERS[self.correct], self.explanation or DEFAULT_EXPLANATION)
+
+    def to_dict(self):
+        """Pergunta no formato do banco (normalizado), para exportar e gravar."""
+        data = {} if self.id is None else {'id': self.id}
+        data['question'] = self.text
+        data['options'] = list(self.options)
+        data['correct'] = self.correct
+        if self.explanation is not None:
+            data['explanation'] = self.explanation
+        if self.extra_keys:
+            data.update(zip(self.extra_keys, self.extra_values))
+        return data
+
+
+def _short_intern(text):
+    return sys.intern(text) if len(text) <= INTERN_MAX_LENGTH else text
+
+
+def _option_text(value, position, letter):
+    if isinstance(value, str):
+        return _short_intern(value.strip())
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _short_intern(str(value))
+    raise QuestionError(position, 'options', f"opção {letter} deve ser texto, não {type(value).__name__}")
+
+
+def _compile_options(options, position):
+    if isinstance(options, dict):
+        letters = {str(key).strip().upper(): value for key, value in options.items()}
+        unknown = sorted(key for key in letters if key not in OPTION_LETTERS)
+        if unknown:
+            raise QuestionError(position, 'options', f"letras de opção desconhecidas: {', '.join(unknown)} (use A a D)")
+        count = max((OPTION_LETTERS.index(key) + 1 for key in letters), default=0)
+        options = [letters.get(letter, '') for letter in OPTION_LETTERS[:count]]
+    elif not isinstance(options, list):
+        raise QuestionError(position, 'options', "'options' ausente ou inválido (use uma lista ou um objeto A-D)")
+    if not MIN_OPTIONS <= len(options) <= NUM_OPTIONS:
+        raise QuestionError(position, 'options', f"{len(options)} opções (use de {MIN_OPTIONS} a {NUM_OPTIONS})")
+    return tuple(_option_text(value, position, letter) for letter, value in zip(OPTION_LETTERS, options))
+
+
+def _compile_correct(question, position, option_count):
+    field = 'correct' if 'correct' in question else 'correct_answer'
+    if field not in question:
+        raise QuestionError(position, 'correct', "resposta correta ausente ('correct' ou 'correct_answer')")
+    value = question[field]
+    if isinstance(value, str):
+        text = value.strip().upper()
+        if len(text) == 1 and text in OPTION_LETTERS:
+            value = OPTION_LETTERS.index(text)
+        elif text.isdigit():
+            value = int(text)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise QuestionError(position, field, f"resposta correta {value!r} inválida (use o índice 0 a {option_count - 1} ou a letra)")
+    if not 0 <= value < option_count:
+        raise QuestionError(position, field, f"resposta correta {value} fora das opções (0 a {option_count - 1})")
+    return value
+
+
+def compile_question(question, position):
+    """Valida e compila uma pergunta (dicionário do banco); lança QuestionError se ela for inválida."""
+    if not isinstance(question, dict):
+        raise QuestionError(position, None, f"deve ser um objeto, não {type(question).__name__}")
+    text = question.get('question')
+    if not isinstance(text, str) or not text.strip():
+        raise QuestionError(position, 'question', "texto da pergunta ('question') ausente ou vazio")
+    question_id = question.get('id')
+    if question_id is not None and (isinstance(question_id, bool) or not isinstance(question_id, (str, int))):
+        raise QuestionError(position, 'id', "'id' deve ser texto ou número")
+    options = _compile_options(question.get('options'), position)
+    correct = _compile_correct(question, position, len(options))
+    explanation = question.get('explanation')
+    if explanation is not None and not isinstance(explanation, str):
+        raise QuestionError(position, 'explanation', "'explanation' deve ser texto")
+    # Campos extras (categoria, dificuldade, ...) costumam se repetir: chaves e textos curtos internados
+    extra = {sys.intern(key): _short_intern(value) if isinstance(value, str) else value
+             for key, value in question.items() if key not in QUESTION_KEYS}
+    return CompiledQuestion(position, question_id, text.strip(), options, correct, explanation, extra)
+
+
+def validate_questions(questions, limit=50):
+    """Erros de validação (QuestionError) de uma lista de perguntas, até limit."""
+    if not isinstance(questions, list):
+        return [QuestionError(-1, None, 'as perguntas devem ser uma lista')]
+    errors = []
+    for position, question in enumerate(questions):
+        try:
+            compile_question(question, position)
+        except QuestionError as e:
+            errors.append(e)
+            if len(errors) >= limit:
+                break
+    return errors
+
+
+class CompiledQuestions:
+    """
+    Sequência de perguntas compiladas sobre a sequência original.
+
+    Uma lista é compilada inteira na criação (ao carregar as perguntas) e
+    pode ser descartada: a iteração devolve as perguntas no formato do
+    banco. As entradas inválidas ficam de fora e vão para errors.
+    Outras sequências (SQLiteQuestionList) são compiladas sob demanda, com
+    um cache LRU que recompila a posição quando a pergunta original muda.
+    """
+
+    def __init__(self, source, cache_size=256):
+        self.source = None
+        self.cache_size = cache_size
+        self.errors = []
+        self._compiled = None
+        if isinstance(source, CompiledQuestions):
+            self._compiled = source._compiled
+            self.source = source.source
+            self.errors = source.errors
+        elif isinstance(source, list):
+            self._compiled = []
+            for position, question in enumerate(source):
+                try:
+                    self._compiled.append(compile_question(question, len(self._compiled)))
+                except QuestionError as e:
+                    # Mensagem com a posição no arquivo original
+                    self.errors.append(QuestionError(position, e.field, e.reason))
+            if self.errors:
+                logger.warning(f"{len(self.errors)} perguntas inválidas ignoradas; primeira: {self.errors[0]}")
+        else:
+            self.source = source
+        self._cache = collections.OrderedDict()  # posição -> (pergunta original, compilada)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._compiled) if self._compiled is not None else len(self.source)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __iter__(self):
+        if self._compiled is None:
+            return iter(self.source)
+        return (question.to_dict() for question in self._compiled)
+
+    def tolist(self):
+        """Todas as perguntas no formato do banco (para exportação)."""
+        return list(self)
+
+    def __getitem__(self, position):
+        if self._compiled is not None:
+            return self._compiled[position]
+        if position < 0:
+            position += len(self)
+        question = self.source[position]
+        with self._lock:
+            entry = self._cache.get(position)
+            if entry is not None and entry[0] is question:
+                self._cache.move_to_end(position)
+                return entry[1]
+        compiled = compile_question(question, position)
+        with self._lock:
+            self._cache[position] = (question, compiled)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compiled
+
+
+# Profundidade máxima em que dumps() procura perguntas públicas (pacote -> dados -> pergunta)
+_SPLICE_DEPTH = 3
+
+
+def _contains_public(data, depth):
+    if isinstance(data, PublicQuestion):
+        return True
+    if depth <= 0:
+        return False
+    if isinstance(data, dict):
+        return any(_contains_public(value, depth - 1) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_contains_public(value, depth - 1) for value in data)
+    return False
+
+
+def dumps(data, **kwargs):
+    """json.dumps que reaproveita o JSON já codificado das perguntas públicas."""
+    if not _contains_public(data, _SPLICE_DEPTH):
+        return json.dumps(data, **kwargs)
+    if isinstance(data, PublicQuestion):
+        return data.json_text
+    item_separator, key_separator = kwargs.get('separators') or (', ', ': ')
+    if isinstance(data, dict):
+        return '{' + item_separator.join(
+            json.dumps(str(key)) + key_separator + dumps(value, **kwargs) for key, value in data.items()
+        ) + '}'
+    return '[' + item_separator.join(dumps(value, **kwargs) for value in data) + ']'
+
+
+# Módulo json dos pacotes do Socket.IO (parâmetro json do servidor)
+packet_json = types.SimpleNamespace(dumps=dumps, loads=json.loads)
@@ -0,0 +1,396 @@
+"""
+Ordem das perguntas do quiz: estratégias de escolha da próxima pergunta.
+
+Configurada por 'question_order' (quiz ou sala):
+
+- 'sequential' (padrão): a ordem do banco, voltando ao início no fim;
+- 'shuffle': embaralhada, sem repetir até passar por todas;
+- 'category': uma pergunta de cada categoria por vez, embaralhadas dentro da
+  categoria;
+- 'adaptive': dificuldade ajustada ao público, pela taxa de acerto observada
+  de cada pergunta (histórico) e pelo desempenho do público nas anteriores.
+
+A escolha não lê o banco: usa o QuestionCatalog, pré-calculado em segundo
+plano (posições por categoria e por faixa de taxa de acerto), então a
+transição de fase não depende do tamanho do banco. Enquanto o catálogo é
+montado, as estratégias que dependem dele embaralham as perguntas.
+"""
+import array
+import random
+import threading
+import time
+import logging
+
+from question_store import facet_value
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ORDER = 'sequential'
+
+# Taxa de acerto presumida de uma pergunta sem histórico e quantos votos ela "vale"
+PRIOR_RATE = 0.5
+PRIOR_VOTES = 20
+
+DESIRED_RATE = 0.6  # Taxa de acerto buscada pela ordem adaptativa
+ADAPTIVE_GAIN = 0.5  # Quanto o alvo anda a cada pergunta, em proporção ao erro
+MIN_OBSERVED_VOTES = 5  # Votos mínimos para uma pergunta ajustar o alvo
+RATE_BUCKETS = 50  # Faixas de taxa de acerto estimada (de 2 em 2%)
+
+NO_CATEGORY = ''
+
+
+def estimated_rate(votes, correct):
+    """Taxa de acerto suavizada: com poucos votos fica perto de PRIOR_RATE."""
+    return (correct + PRIOR_RATE * PRIOR_VOTES) / (votes + PRIOR_VOTES)
+
+
+def rate_bucket(rate):
+    """Faixa (0 a RATE_BUCKETS - 1) de uma taxa de acerto."""
+    return min(RATE_BUCKETS - 1, max(0, int(rate * RATE_BUCKETS)))
+
+
+class QuestionCatalog:
+    """
+    Dados pré-calculados das perguntas para as estratégias.
+
+    Por categoria: as posições das perguntas; por faixa de taxa de acerto
+    estimada (RATE_BUCKETS faixas, pelo histórico): as posições das
+    perguntas na faixa. Montado em uma thread a partir da sequência de
+    perguntas quando ela muda (invalidate) e alguma estratégia o pede;
+    update() muda a pergunta de faixa depois que ela é feita.
+    """
+
+    def __init__(self, history=None):
+        self.history = history
+        self.size = 0
+        self.categories = {}  # categoria -> posições (array), NO_CATEGORY para as sem categoria
+        self.category_names = []
+        self.buckets = []  # faixa de taxa -> posições (array)
+        self._positions = {}  # id -> posição
+        self._bucket_of = array.array('B')  # posição -> faixa
+        self._slot_of = array.array('I')  # posição -> índice na faixa
+        self._source = None
+        self._dirty = False
+        self._building = False
+        self._lock = threading.Lock()
+
+        # Contadores
+        self.builds = 0
+        self.build_seconds = 0.0
+        self.updates = 0
+
+    def invalidate(self, questions):
+        """As perguntas mudaram: o catálogo é remontado a partir delas na próxima vez em que for pedido."""
+        with self._lock:
+            self._source = questions
+            self._dirty = True
+
+    def current(self):
+        """O catálogo atual (ou None se nunca foi montado); dispara a montagem se as perguntas mudaram."""
+        with self._lock:
+            if self._dirty and not self._building and self._source is not None:
+                self._building = True
+                thread = threading.Thread(target=self._build_loop, daemon=True)
+                thread.start()
+            return self if self.builds else None
+
+    def _build_loop(self):
+        while True:
+            with self._lock:
+                if not self._dirty:
+                    self._building = False
+                    return
+                self._dirty = False
+                source = self._source
+            try:
+                self.rebuild(source)
+            except Exception as e:
+                logger.error(f"Erro ao montar o catálogo de perguntas: {e}")
+
+    def rebuild(self, questions):
+        """Monta o catálogo lendo as perguntas uma vez (O(n))."""
+        start = time.perf_counter()
+        stats = self.history.snapshot() if self.history else {}
+        positions, categories = {}, {}
+        buckets = [array.array('I') for _ in range(RATE_BUCKETS)]
+        bucket_of, slot_of = array.array('B'), array.array('I')
+        size = 0
+        for position, question in enumerate(questions):
+            question_id = question.get('id')
+            entry = None
+            if question_id is not None:
+                question_id = str(question_id)
+                positions[question_id] = position
+                entry = stats.get(question_id)
+            category = facet_value(question, 'category') or NO_CATEGORY
+            categories.setdefault(category, array.array('I')).append(position)
+            bucket = rate_bucket(estimated_rate(entry.votes, entry.correct) if entry else PRIOR_RATE)
+            bucket_of.append(bucket)
+            slot_of.append(len(buckets[bucket]))
+            buckets[bucket].append(position)
+            size += 1
+            if size % 1000 == 0:
+                time.sleep(0)  # Cede a vez às fases do quiz (gevent/threads) durante a montagem
+        with self._lock:
+            self.size = size
+            self._positions, self._bucket_of, self._slot_of = positions, bucket_of, slot_of
+            self.buckets = buckets
+            self.categories = categories
+            self.category_names = sorted(categories)
+            self.builds += 1
+            self.build_seconds = time.perf_counter() - start
+        logger.info(f"Catálogo de perguntas montado: {size} perguntas, {len(categories)} categorias "
+                    f"em {self.build_seconds:.2f}s")
+
+    def update(self, question_id):
+        """Recalcula a taxa de acerto de uma pergunta a partir do histórico (depois de ela ser feita)."""
+        if self.history is None:
+            return
+        stats = self.history.get(question_id)
+        with self._lock:
+            position = self._positions.get(str(question_id))
+            if stats is None or position is None:
+                return
+            bucket = rate_bucket(estimated_rate(stats.votes, stats.correct))
+            old = self._bucket_of[position]
+            if bucket == old:
+                return
+            # Sai da faixa antiga trocando de lugar com a última posição dela (O(1))
+            positions = self.buckets[old]
+            slot = self._slot_of[position]
+            last = positions.pop()
+            if last != position:
+                positions[slot] = last
+                self._slot_of[last] = slot
+            self._bucket_of[position] = bucket
+            self._slot_of[position] = len(self.buckets[bucket])
+            self.buckets[bucket].append(position)
+            self.updates += 1
+
+    def draw(self, bucket, deck, skip):
+        """Próxima posição da faixa no embaralhamento deck que skip(posição) não recusa, ou None se acabaram."""
+        with self._lock:
+            positions = self.buckets[bucket]
+            while deck.remaining(len(positions)):
+                position = positions[deck.draw(len(positions))]
+                if not skip(position):
+                    return position
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'questions': self.size,
+                'categories': len(self.categories),
+                'builds': self.builds,
+                'build_seconds': round(self.build_seconds, 3),
+                'updates': self.updates,
+                'dirty': self._dirty
+            }
+
+
+class QuestionOrder:
+    """Estratégia de ordem: next() escolhe a próxima posição; observe() recebe o resultado da pergunta."""
+
+    name = None
+
+    def next(self, size, current, catalog):
+        raise NotImplementedError
+
+    def observe(self, position, votes, correct, catalog):
+        pass
+
+
+class SequentialOrder(QuestionOrder):
+    """A ordem do banco (comportamento original)."""
+
+    name = 'sequential'
+
+    def next(self, size, current, catalog):
+        return (current + 1) % size
+
+
+class ShuffleOrder(QuestionOrder):
+    """
+    Ordem embaralhada sem repetição (Fisher-Yates sob demanda).
+
+    Só as trocas feitas ficam em memória (um dicionário), então cada
+    escolha é O(1) sem montar uma permutação do banco inteiro. Perguntas
+    acrescentadas entram no ciclo atual; se o banco diminui, o ciclo recomeça.
+    """
+
+    name = 'shuffle'
+
+    def __init__(self, rng=random):
+        self._rng = rng
+        self._size = 0
+        self._drawn = 0
+        self._swaps = {}
+
+    def draw(self, size):
+        """Próximo índice (0 a size - 1) do ciclo atual."""
+        if size < self._size or self._drawn >= size:
+            self._drawn = 0
+            self._swaps = {}
+        self._size = size
+        i = self._drawn
+        j = self._rng.randrange(i, size)
+        value = self._swaps.pop(j, j)
+        if j != i:
+            self._swaps[j] = self._swaps.pop(i, i)
+        self._drawn += 1
+        return value
+
+    def remaining(self, size):
+        """Quantos índices ainda faltam no ciclo atual (draw começa um novo quando chega a zero)."""
+        return size if size < self._size else size - self._drawn
+
+    def next(self, size, current, catalog):
+        position = self.draw(size)
+        if position == current and size > 1:
+            position = self.draw(size)  # Sem repetir a pergunta atual na virada do ciclo
+        return position
+
+
+class CategoryOrder(QuestionOrder):
+    """Uma categoria por vez (em ordem alfabética), com as perguntas de cada uma embaralhadas."""
+
+    name = 'category'
+
+    def __init__(self):
+        self._turn = 0
+        self._decks = {}  # categoria -> ShuffleOrder
+        self._fallback = ShuffleOrder()
+
+    def next(self, size, current, catalog):
+        if catalog is None or catalog.size != size or not catalog.category_names:
+            return self._fallback.next(size, current, catalog)
+        names = catalog.category_names
+        category = names[self._turn % len(names)]
+        self._turn += 1
+        positions = catalog.categories[category]
+        deck = self._decks.setdefault(category, ShuffleOrder())
+        return positions[deck.draw(len(positions))]
+
+
+class AdaptiveOrder(QuestionOrder):
+    """
+    Dificuldade adaptada ao público.
+
+    O alvo é uma taxa de acerto: começa em DESIRED_RATE e, a cada pergunta
+    com votos suficientes, desce se o público acertou mais que o desejado
+    (perguntas mais difíceis) e sobe se acertou menos. A próxima pergunta
+    sai da faixa de taxa estimada mais próxima do alvo que ainda tem
+    perguntas não feitas no ciclo, embaralhada dentro da faixa; a taxa
+    estimada combina o acerto observado com o volume de votos
+    (estimated_rate).
+    """
+
+    name = 'adaptive'
+
+    def __init__(self, desired_rate=DESIRED_RATE, gain=ADAPTIVE_GAIN):
+        self.desired_rate = desired_rate
+        self.gain = gain
+        self.target = desired_rate
+        self._asked = set()
+        self._decks = {}  # faixa -> ShuffleOrder
+        self._fallback = ShuffleOrder()
+
+    def observe(self, position, votes, correct, catalog):
+        if votes < MIN_OBSERVED_VOTES:
+            return
+        error = correct / votes - self.desired_rate
+        self.target = min(0.95, max(0.05, self.target - self.gain * error))
+
+    def _new_cycle(self):
+        self._asked = set()
+        self._decks = {}
+
+    def _nearest(self, catalog, current):
+        asked = self._asked
+        skip = lambda position: position in asked or position == current
+        center = rate_bucket(self.target)
+        for distance in range(RATE_BUCKETS):
+            for bucket in ((center,) if distance == 0 else (center - distance, center + distance)):
+                if 0 <= bucket < RATE_BUCKETS:
+                    deck = self._decks.setdefault(bucket, ShuffleOrder())
+                    position = catalog.draw(bucket, deck, skip)
+                    if position is not None:
+                        return position
+        return None
+
+    def next(self, size, current, catalog):
+        if catalog is None or catalog.size != size:
+            return self._fallback.next(size, current, catalog)
+        if len(self._asked) >= size:
+            self._new_cycle()  # Todas feitas: novo ciclo
+        position = self._nearest(catalog, current)
+        if position is None:
+            self._new_cycle()
+            position = self._nearest(catalog, current)
+            if position is None:
+                return (current + 1) % size
+        self._asked.add(position)
+        return position
+
+
+ORDERS = {order.name: order for order in (SequentialOrder, ShuffleOrder, CategoryOrder, AdaptiveOrder)}
+
+
+def validate_order(name):
+    """ValueError se name não é uma das ordens (ORDERS)."""
+    if name not in ORDERS:
+        raise ValueError(f"Ordem de perguntas inválida: {name} (use {', '.join(ORDERS)})")
+    return name
+
+
+def make_order(name):
+    """Estratégia pelo nome; ValueError se ele não existe."""
+    return ORDERS[validate_order(name)]()
+
+
+class QuestionPicker:
+    """
+    Estratégia de um quiz, recriada quando 'question_order' muda na configuração.
+
+    Erros da estratégia não param o quiz: a pergunta seguinte no banco é usada.
+    """
+
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+        self._name = None  # Nome configurado da estratégia atual (mesmo se inválido)
+        self._order = None
+
+    def reset(self):
+        """Novo quiz: a estratégia começa do zero (novo embaralhamento, alvo inicial)."""
+        self._name = None
+        self._order = None
+
+    def order(self, name):
+        if self._order is None or self._name != name:
+            try:
+                self._order = make_order(name)
+            except ValueError as e:
+                # Registrado uma vez: a ordem do banco fica associada ao nome inválido
+                logger.error(f"{e}; usando a ordem do banco")
+                self._order = SequentialOrder()
+            self._name = name
+        return self._order
+
+    def next(self, name, size, current):
+        """Posição da próxima pergunta (0 a size - 1)."""
+        order = self.order(name)
+        try:
+            catalog = self.catalog.current() if self.catalog is not None and order.name != 'sequential' else None
+            return order.next(size, current, catalog) % size
+        except Exception as e:
+            logger.error(f"Erro ao escolher a próxima pergunta ({order.name}): {e}")
+            return (current + 1) % size
+
+    def observe(self, name, position, votes, correct):
+        """Resultado da pergunta feita (total de votos e acertos)."""
+        try:
+            catalog = self.catalog.current() if self.catalog is not None else None
+            self.order(name).observe(position, votes, correct, catalog)
+        except Exception as e:
+            logger.error(f"Erro ao registrar o resultado na ordem de perguntas: {e}")
@@ -0,0 +1,338 @@
+"""
+Busca textual no banco de perguntas: índice invertido em memória.
+
+O texto da pergunta, as opções, a explicação e a categoria são quebrados em
+termos normalizados (minúsculas, sem acentos: "ação" e "acao" são o mesmo
+termo) sem as palavras mais comuns do português. Cada termo aponta para os
+documentos (uma versão de uma pergunta) em que aparece, com um peso por
+campo (o texto da pergunta vale mais que a explicação).
+
+O índice é montado na primeira busca e atualizado pergunta a pergunta
+(update/remove) quando uma pergunta é criada, editada ou excluída: uma
+edição indexa a pergunta como um documento novo e marca o anterior como
+removido; os removidos são descartados de uma vez quando passam de um
+quarto do índice. Uma importação ou substituição do banco invalida o índice,
+que é remontado na busca seguinte.
+
+Os resultados são ordenados por BM25; a busca parte do termo mais raro e
+só confere os demais nos documentos que ainda são candidatos, então uma
+consulta em 100 mil perguntas leva poucos milissegundos.
+"""
+import array
+import bisect
+import heapq
+import itertools
+import math
+import re
+import threading
+import time
+import unicodedata
+import logging
+
+from question_store import FACETS, facet_value
+
+logger = logging.getLogger(__name__)
+
+# Peso de cada campo na contagem de um termo
+FIELD_WEIGHTS = (('question', 3), ('options', 2), ('category', 2), ('explanation', 1))
+
+# Palavras comuns demais para distinguir perguntas (já sem acentos)
+STOPWORDS = frozenset("""
+a o as os e de da do das dos em no na nos nas num numa um uma uns umas para pra por pelo pela pelos pelas
+com sem que se ao aos ou mas como mais foi ser era isso este esta esse essa qual quais
+""".split())
+
+MAX_PREFIX_TERMS = 50  # Termos completados a partir do último termo da busca
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r'\w+')
+# Marcas de acento (decomposição NFKD) removidas na normalização
+_ACCENTS = re.compile('[\u0300-\u036f]+')
+_MAX_CACHED_WORDS = 200000
+
+_normalized_words = {}  # palavra -> termo (o vocabulário se repete muito entre as perguntas)
+
+
+def normalize(text):
+    """Texto em minúsculas e sem acentos."""
+    if text.isascii():
+        return text.lower()
+    return _ACCENTS.sub('', unicodedata.normalize('NFKD', text)).casefold()
+
+
+def tokenize(text):
+    """Termos de busca de um texto (normalizados, sem palavras comuns)."""
+    cache = _normalized_words
+    terms = []
+    for word in _TOKEN.findall(text):
+        term = cache.get(word)
+        if term is None:
+            if len(cache) >= _MAX_CACHED_WORDS:
+                cache.clear()
+            term = cache[word] = normalize(word)
+        if term not in STOPWORDS:
+            terms.append(term)
+    return terms
+
+
+def question_terms(question):
+    """Peso de cada termo da pergunta, somando os campos em que ele aparece."""
+    weights = {}
+    for field, weight in FIELD_WEIGHTS:
+        value = question.get(field)
+        if not value:
+            continue
+        text = ' '.join(str(item) for item in value) if isinstance(value, list) else str(value)
+        for term in tokenize(text):
+            weights[term] = weights.get(term, 0) + weight
+    return weights
+
+
+class QuestionSearchIndex:
+    """
+    Índice invertido das perguntas de um banco, por id.
+
+    search() retorna os ids na ordem de relevância; o app lê só as
+    perguntas da página pedida. Seguro para várias threads.
+    """
+
+    def __init__(self, facets=FACETS):
+        self.facets = facets
+        self._lock = threading.RLock()
+        self._ready = False
+        self._reset()
+
+        # Contadores
+        self.builds = 0
+        self.build_seconds = 0.0
+        self.searches = 0
+
+    def _reset(self):
+        self._postings = {}  # termo -> (documentos, pesos): arrays paralelos em ordem de documento
+        self._vocabulary = []  # Termos em ordem alfabética (para completar prefixos)
+        self._doc_ids = []  # documento -> id da pergunta (None: removido)
+        self._doc_lengths = array.array('I')  # documento -> soma dos pesos dos termos
+        self._doc_facets = []  # documento -> valores dos campos de filtro
+        self._docs = {}  # id (texto) -> documento atual
+        self._facet_docs = {}  # (campo, valor) -> documentos com o valor
+        self._removed = 0
+        self._total_length = 0
+
+    # Manutenção
+
+    def invalidate(self):
+        """O banco foi substituído: o índice é remontado na próxima busca."""
+        with self._lock:
+            self._ready = False
+
+    def ensure(self, questions):
+        """Monta o índice a partir das perguntas, se ele não está pronto."""
+        with self._lock:
+            if self._ready:
+                return
+            start = time.perf_counter()
+            self._reset()
+            for count, question in enumerate(questions, 1):
+                self._add(question)
+                if count % 1000 == 0:
+                    time.sleep(0)  # Cede a vez às fases do quiz (gevent/threads) durante a montagem
+            self._vocabulary = sorted(self._postings)
+            self._ready = True
+            self.builds += 1
+            self.build_seconds = time.perf_counter() - start
+            logger.info(f"Índice de busca montado: {len(self._docs)} perguntas, {len(self._postings)} termos "
+                        f"em {self.build_seconds:.2f}s")
+
+    def update(self, question):
+        """Indexa a versão atual de uma pergunta (nova ou editada)."""
+        with self._lock:
+            if not self._ready or question.get('id') is None:
+                return
+            self._remove(str(question['id']))
+            self._add(question, incremental=True)
+            self._compact_if_needed()
+
+    def remove(self, question_id):
+        """Retira uma pergunta excluída do índice."""
+        with self._lock:
+            if self._ready:
+                self._remove(str(question_id))
+                self._compact_if_needed()
+
+    def refresh(self, questions, question_id):
+        """Atualiza uma pergunta a partir do banco (questions.get(id)): editada ou excluída."""
+        found = questions.get(question_id)
+        if found is None:
+            self.remove(question_id)
+        else:
+            self.update(found[1])
+
+    def _add(self, question, incremental=False):
+        question_id = question.get('id')
+        if question_id is None:
+            return
+        doc = len(self._doc_ids)
+        terms = question_terms(question)
+        for term, weight in terms.items():
+            entry = self._postings.get(term)
+            if entry is None:
+                entry = self._postings[term] = (array.array('I'), array.array('H'))
+                if incremental:
+                    bisect.insort(self._vocabulary, term)
+            entry[0].append(doc)
+            entry[1].append(weight if weight < 0xFFFF else 0xFFFF)
+        length = sum(terms.values())
+        self._doc_ids.append(str(question_id))
+        self._doc_lengths.append(length)
+        facets = tuple(facet_value(question, facet) for facet in self.facets)
+        self._doc_facets.append(facets)
+        for i, value in enumerate(facets):
+            if value is not None:
+                self._facet_docs.setdefault((i, value), array.array('I')).append(doc)
+        self._docs[str(question_id)] = doc
+        self._total_length += length
+
+    def _remove(self, question_id):
+        doc = self._docs.pop(question_id, None)
+        if doc is not None:
+            self._doc_ids[doc] = None
+            self._total_length -= self._doc_lengths[doc]
+            self._removed += 1
+
+    def _compact_if_needed(self):
+        """Descarta os documentos removidos quando eles passam de um quarto do índice."""
+        if self._removed < 1000 or self._removed * 4 < len(self._doc_ids):
+            return
+        start = time.perf_counter()
+        renumber = array.array('i', [-1]) * len(self._doc_ids)
+        doc_ids, doc_lengths, doc_facets = [], array.array('I'), []
+        for doc, question_id in enumerate(self._doc_ids):
+            if question_id is not None:
+                renumber[doc] = len(doc_ids)
+                doc_ids.append(question_id)
+                doc_lengths.append(self._doc_lengths[doc])
+                doc_facets.append(self._doc_facets[doc])
+        for term, (docs, weights) in list(self._postings.items()):
+            kept = [(renumber[doc], weight) for doc, weight in zip(docs, weights) if renumber[doc] >= 0]
+            if kept:
+                self._postings[term] = (array.array('I', (doc for doc, _ in kept)),
+                                        array.array('H', (weight for _, weight in kept)))
+            else:
+                del self._postings[term]
+        self._vocabulary = sorted(self._postings)
+        self._doc_ids, self._doc_lengths, self._doc_facets = doc_ids, doc_lengths, doc_facets
+        self._docs = {question_id: doc for doc, question_id in enumerate(doc_ids)}
+        self._facet_docs = {}
+        for doc, facets in enumerate(doc_facets):
+            for i, value in enumerate(facets):
+                if value is not None:
+                    self._facet_docs.setdefault((i, value), array.array('I')).append(doc)
+        self._removed = 0
+        logger.info(f"Índice de busca compactado em {time.perf_counter() - start:.2f}s")
+
+    # Busca
+
+    def _expand(self, term, prefix):
+        """Termos do índice para um termo da busca (com prefix, os que começam com ele)."""
+        if not prefix:
+            return [term] if term in self._postings else []
+        vocabulary = self._vocabulary
+        start = bisect.bisect_left(vocabulary, term)
+        terms = []
+        for candidate in vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not candidate.startswith(term):
+                break
+            terms.append(candidate)
+        return terms
+
+    def search(self, query, filters=None, exclude=(), offset=0, limit=50, prefix=True):
+        """
+        (total, [(id, pontuação), ...]) das perguntas que contêm todos os termos de query.
+
+        filters: campo -> valor (texto) dos campos de filtro; exclude: ids a
+        deixar de fora (ex.: as perguntas já feitas). Com prefix o último
+        termo também casa com os termos que começam com ele. Sem termos,
+        todas as perguntas que passam nos filtros, na ordem do banco.
+        """
+        with self._lock:
+            self.searches += 1
+            doc_ids, doc_facets = self._doc_ids, self._doc_facets
+            checks = [(i, filters[facet]) for i, facet in enumerate(self.facets)
+                      if (filters or {}).get(facet) is not None]
+            terms = list(dict.fromkeys(tokenize(query or '')))
+            if not terms and not checks and not exclude:
+                # Todas as perguntas na ordem do banco: só percorre até a página
+                live = (doc for doc, question_id in enumerate(doc_ids) if question_id is not None)
+                return len(self._docs), [(doc_ids[doc], 0.0) for doc in itertools.islice(live, offset, offset + limit)]
+            if not terms:
+                # Sem termos: parte da menor lista de um filtro (ou de todas as perguntas), na ordem do banco
+                candidates = enumerate(doc_ids)
+                if checks:
+                    base = min(checks, key=lambda check: len(self._facet_docs.get(check, ())))
+                    checks.remove(base)
+                    candidates = ((doc, doc_ids[doc]) for doc in self._facet_docs.get(base, ()))
+                if checks:
+                    candidates = ((doc, question_id) for doc, question_id in candidates
+                                  if all(doc_facets[doc][i] == value for i, value in checks))
+                matches = [doc for doc, question_id in candidates if question_id is not None and question_id not in exclude]
+                return len(matches), [(doc_ids[doc], 0.0) for doc in matches[offset:offset + limit]]
+            # O último termo é completado enquanto a pessoa digita (sem espaço no fim)
+            completing = prefix and query == query.rstrip()
+            groups = [self._expand(term, completing and i == len(terms) - 1) for i, term in enumerate(terms)]
+            if not all(groups):
+                return 0, []
+            scores = self._score(groups)
+            if checks or exclude:
+                scores = {doc: score for doc, score in scores.items()
+                          if doc_ids[doc] not in exclude and all(doc_facets[doc][i] == value for i, value in checks)}
+            top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return len(scores), [(doc_ids[doc], round(score, 4)) for doc, score in top[offset:]]
+
+    def _score(self, groups):
+        """Documentos com todos os grupos de termos (documento -> BM25), do grupo mais raro ao mais comum."""
+        postings = self._postings
+        live = len(self._docs) or 1
+        average = (self._total_length / live) or 1.0
+        lengths, doc_ids = self._doc_lengths, self._doc_ids
+        groups = sorted(groups, key=lambda group: sum(len(postings[term][0]) for term in group))
+        scores = None
+        for group in groups:
+            found = {}
+            for term in group:
+                docs, weights = postings[term]
+                idf = math.log(1 + (live - len(docs) + 0.5) / (len(docs) + 0.5))
+                if scores is not None and len(scores) * 16 < len(docs):
+                    # Poucos candidatos: busca binária de cada um na lista do termo
+                    pairs = []
+                    for doc in scores:
+                        i = bisect.bisect_left(docs, doc)
+                        if i < len(docs) and docs[i] == doc:
+                            pairs.append((doc, weights[i]))
+                else:
+                    pairs = zip(docs, weights)
+                    if scores is not None:
+                        pairs = ((doc, weight) for doc, weight in pairs if doc in scores)
+                for doc, weight in pairs:
+                    if doc_ids[doc] is None:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / average)
+                    found[doc] = found.get(doc, 0.0) + idf * weight * (BM25_K1 + 1) / (weight + norm)
+            if scores is not None:
+                found = {doc: score + scores[doc] for doc, score in found.items()}
+            scores = found
+            if not scores:
+                break
+        return scores
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready,
+                'questions': len(self._docs),
+                'terms': len(self._postings),
+                'removed': self._removed,
+                'builds': self.builds,
+                'build_seconds': round(self.build_seconds, 3),
+                'searches': self.searches
+            }
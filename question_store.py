@@ -0,0 +1,977 @@
+"""
+Banco de perguntas indexado em disco.
+
+As perguntas ficam em data/questions.jsonl (uma pergunta validada e
+normalizada por linha) e o índice em data/questions.idx: o deslocamento de
+cada pergunta, o hash do id de cada pergunta (ordenado, para achar uma
+pergunta pelo id) e, para os campos de FACETS (categoria, dificuldade), a
+lista ordenada das posições de cada valor. Os dois arquivos são lidos com
+mmap: abrir o banco não carrega nenhuma pergunta, questions[i] decodifica
+apenas a linha i (com um pequeno cache LRU) e uma página filtrada da
+listagem só lê as perguntas da página. O tempo de inicialização e a
+memória não crescem com o tamanho do banco.
+
+O arquivo de perguntas só cresce: uma gravação (QuestionWriter) acrescenta
+linhas em lotes. Uma pergunta gravada com o id de uma existente (upsert)
+ocupa a posição dela; uma exclusão grava uma linha {"_deleted": id} e a
+posição fica marcada como excluída no índice (as seguintes continuam
+numeradas sem buracos). As linhas antigas ficam no arquivo até a próxima
+substituição completa.
+
+O cabeçalho do índice guarda até onde o arquivo está confirmado. Uma edição
+pequena (uma pergunta pela API) acrescenta a linha e só atualiza esse
+número no cabeçalho: custo de E/S constante, qualquer que seja o tamanho do
+banco. Os leitores aplicam as linhas confirmadas depois do índice por cima
+dele, e o índice é regravado quando essas linhas passam de TAIL_LIMIT ou
+em uma importação grande. Linhas depois da parte confirmada (importação em
+andamento ou interrompida) são ignoradas pelos leitores e descartadas pela
+próxima gravação.
+
+Se o índice não corresponde ao arquivo (outro arquivo, arquivo menor) ele é
+reconstruído em uma única leitura sequencial. Vários processos podem ler o
+mesmo banco: a troca dos arquivos é percebida pelo stat, no máximo uma vez
+por refresh_interval; as gravações são serializadas com um lock de arquivo.
+"""
+import array
+import bisect
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos (um único worker)
+    fcntl = None
+
+from question_model import QuestionError, compile_question
+from state_versions import etag_matches
+
+logger = logging.getLogger(__name__)
+
+FACETS = ('category', 'difficulty')  # Campos indexados para filtrar a listagem
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+WRITE_MODES = ('append', 'upsert', 'replace')
+DELETED_KEY = '_deleted'  # Linha de exclusão: {"_deleted": id}
+
+# Bytes de edições confirmadas depois do índice antes de ele ser regravado
+TAIL_LIMIT = 1024 * 1024
+
+# Até este número de mudanças o índice é corrigido item a item (busca binária); acima, reconstruído
+SMALL_CHANGE = 64
+
+INDEX_MAGIC = b'QUIZIDX3'
+# magic, inode do arquivo de perguntas, bytes cobertos pelo índice, bytes confirmados,
+# posições (com as excluídas), ids, posições excluídas, bytes do catálogo
+INDEX_HEADER = struct.Struct('<8sQQQQQQQ')
+COMMITTED_FIELD = struct.Struct('<Q')
+COMMITTED_OFFSET = 24  # Único campo do cabeçalho atualizado no lugar (a cada edição)
+
+
+class QuestionNotFound(KeyError):
+    """Nenhuma pergunta com o id."""
+
+
+class QuestionConflict(Exception):
+    """A pergunta mudou desde a versão (ETag) que o cliente editou."""
+
+    def __init__(self, question, etag):
+        super().__init__("A pergunta foi alterada por outra pessoa")
+        self.question = question  # Versão atual
+        self.etag = etag
+
+
+def facet_value(question, facet):
+    """Valor indexado de um campo da pergunta (texto) ou None."""
+    value = question.get(facet)
+    if value is None or value == '' or isinstance(value, (dict, list)):
+        return None
+    return str(value)
+
+
+def id_key(question_id):
+    """Hash estável (64 bits) do id de uma pergunta; 1 e "1" são o mesmo id."""
+    return int.from_bytes(hashlib.blake2b(str(question_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def new_question_id():
+    return uuid.uuid4().hex[:12]
+
+
+def with_id(question):
+    """A pergunta com um id gerado se ela não tem (os ids são estáveis: as edições usam o id)."""
+    if question.get('id') is not None:
+        return question
+    return {'id': new_question_id(), **question}
+
+
+def question_etag(question):
+    """ETag de uma pergunta: hash do conteúdo normalizado (muda a cada edição)."""
+    return f'"{hashlib.blake2b(encode_line(question), digest_size=8).hexdigest()}"'
+
+
+def merge_question(current, patch, position):
+    """
+    Pergunta atual com os campos de patch (JSON Merge Patch: null remove o campo), validada.
+
+    Lança QuestionError se o resultado for inválido ou se patch mudar o id.
+    """
+    if 'id' in patch and patch['id'] is not None and str(patch['id']) != str(current.get('id')):
+        raise QuestionError(position, 'id', "o id de uma pergunta não pode ser alterado")
+    merged = dict(current)
+    # A resposta pode vir como índice ('correct') ou letra ('correct_answer'): a nova substitui a atual
+    if 'correct' in patch or 'correct_answer' in patch:
+        merged.pop('correct', None)
+        merged.pop('correct_answer', None)
+    for key, value in patch.items():
+        if key == 'id':
+            continue
+        if value is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = value
+    return compile_question(merged, position).to_dict()
+
+
+def encode_line(question):
+    return (json.dumps(question, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def _aligned(size, alignment=8):
+    return (size + alignment - 1) // alignment * alignment
+
+
+def _copy(items, code):
+    """Cópia mutável (array) de uma sequência de inteiros do índice (memoryview ou array)."""
+    result = array.array(code)
+    result.frombytes(memoryview(items).cast('B'))
+    return result
+
+
+def _contains(positions, position):
+    i = bisect.bisect_left(positions, position)
+    return i < len(positions) and positions[i] == position
+
+
+class _StoreState:
+    """Arquivos abertos de uma versão do banco (trocada inteira ao recarregar)."""
+
+    __slots__ = ('key', 'header', 'base', 'size', 'data', 'index', 'offsets', 'id_hashes', 'id_positions',
+                 'deleted', 'postings', 'slots', 'count')
+
+    def __init__(self, key=None, size=0, data=None, offsets=(), id_hashes=(), id_positions=(), deleted=(),
+                 postings=None, index=None, header=None, base=None):
+        self.key = key  # (inode, tamanho, mtime) do arquivo de perguntas
+        self.header = header  # Cabeçalho do índice lido (None se o índice foi montado em memória)
+        self.index = index  # mmap do questions.idx
+        self.size = size  # Bytes confirmados do arquivo de perguntas
+        self.base = size if base is None else base  # Bytes cobertos pelo índice gravado
+        self.data = data  # mmap do questions.jsonl
+        self.offsets = offsets  # Deslocamento da linha atual de cada posição interna
+        self.id_hashes = id_hashes  # Hashes dos ids, ordenados
+        self.id_positions = id_positions  # Posição interna da pergunta de cada hash
+        self.deleted = deleted  # Posições internas excluídas, ordenadas
+        self.postings = postings or {facet: {} for facet in FACETS}  # campo -> valor -> posições internas
+        self.slots = len(offsets)
+        self.count = self.slots - len(deleted)
+
+    def slot(self, position):
+        """Posição interna da pergunta na posição (contada sem as excluídas)."""
+        deleted = self.deleted
+        if not len(deleted):
+            return position
+        slot = position
+        while True:
+            following = position + bisect.bisect_right(deleted, slot)
+            if following == slot:
+                return slot
+            slot = following
+
+    def position(self, slot):
+        """Posição (sem as excluídas) de uma posição interna."""
+        return slot - bisect.bisect_left(self.deleted, slot) if len(self.deleted) else slot
+
+    def live_slots(self, start=0, stop=None):
+        """Posições internas das perguntas de start a stop (sem as excluídas)."""
+        deleted = self.deleted
+        stop = self.count if stop is None else min(stop, self.count)
+        slot = self.slot(start)
+        i = bisect.bisect_left(deleted, slot)
+        for _ in range(start, stop):
+            while i < len(deleted) and deleted[i] == slot:
+                i += 1
+                slot += 1
+            yield slot
+            slot += 1
+
+
+class _IndexBuilder:
+    """
+    Índice em construção: deslocamentos, ids, exclusões e posições por campo.
+
+    Começa com uma cópia do índice atual (acréscimos e edições) ou vazio
+    (banco novo). add() com o id de uma pergunta existente substitui a
+    pergunta naquela posição e delete() marca a posição como excluída; as
+    listas por campo e os ids são corrigidos uma única vez em finish().
+    """
+
+    def __init__(self, state=None):
+        if state is not None and state.slots:
+            self.offsets = _copy(state.offsets, 'Q')
+            self.postings = {facet: {value: _copy(positions, 'I') for value, positions in values.items()}
+                             for facet, values in state.postings.items()}
+            self.id_hashes, self.id_positions, self.deleted = state.id_hashes, state.id_positions, state.deleted
+        else:
+            self.offsets = array.array('Q')
+            self.postings = {facet: {} for facet in FACETS}
+            self.id_hashes, self.id_positions, self.deleted = array.array('Q'), array.array('I'), array.array('I')
+        self.new_ids = {}  # hash do id -> posição (ids novos nesta gravação)
+        self.removed_ids = set()  # Hashes de ids do índice atual que foram excluídos
+        self.replaced = {}  # posição substituída -> valores finais dos campos indexados
+        self.removed = set()  # Posições excluídas nesta gravação
+        self.added = 0
+        self.updated = 0
+
+    def position_of(self, question_id):
+        """Posição interna da pergunta com o id (None se não existe); compara os hashes de 64 bits."""
+        key = id_key(question_id)
+        position = self.new_ids.get(key)
+        if position is None and key not in self.removed_ids:
+            i = bisect.bisect_left(self.id_hashes, key)
+            if i < len(self.id_hashes) and self.id_hashes[i] == key:
+                position = self.id_positions[i]
+        return position
+
+    def deleted_before(self, position):
+        """Número de posições excluídas antes de position."""
+        return bisect.bisect_left(self.deleted, position) + sum(1 for slot in self.removed if slot < position)
+
+    def add(self, question, offset):
+        """Registra a linha da pergunta; retorna (posição interna, True se substituiu uma pergunta com o mesmo id)."""
+        question_id = question.get('id')
+        position = self.position_of(question_id) if question_id is not None else None
+        if position is not None:
+            self.offsets[position] = offset
+            self.replaced[position] = tuple(facet_value(question, facet) for facet in FACETS)
+            self.updated += 1
+            return position, True
+        position = len(self.offsets)
+        self.offsets.append(offset)
+        for facet in FACETS:
+            value = facet_value(question, facet)
+            if value is not None:
+                self.postings[facet].setdefault(value, array.array('I')).append(position)
+        if question_id is not None:
+            self.new_ids[id_key(question_id)] = position
+        self.added += 1
+        return position, False
+
+    def delete(self, question_id):
+        """Marca a pergunta com o id como excluída; retorna a posição interna dela (None se não existe)."""
+        position = self.position_of(question_id)
+        if position is None:
+            return None
+        key = id_key(question_id)
+        if self.new_ids.pop(key, None) is None:
+            self.removed_ids.add(key)
+        self.replaced.pop(position, None)
+        self.removed.add(position)
+        return position
+
+    def finish(self):
+        """(offsets, postings, id_hashes, id_positions, deleted) prontos para gravar."""
+        changed = self.removed.union(self.replaced)
+        if changed:
+            for i, facet in enumerate(FACETS):
+                values = self.postings[facet]
+                for value, positions in list(values.items()):
+                    if len(changed) <= SMALL_CHANGE:
+                        for position in changed:
+                            j = bisect.bisect_left(positions, position)
+                            if j < len(positions) and positions[j] == position:
+                                del positions[j]
+                    else:
+                        values[value] = array.array('I', (p for p in positions if p not in changed))
+                additions = {}
+                for position, facet_values in self.replaced.items():
+                    if facet_values[i] is not None:
+                        additions.setdefault(facet_values[i], []).append(position)
+                for value, added in additions.items():
+                    positions = values.setdefault(value, array.array('I'))
+                    if len(added) <= SMALL_CHANGE:
+                        for position in added:
+                            bisect.insort(positions, position)
+                    else:
+                        values[value] = array.array('I', sorted(positions.tolist() + added))
+                for value in [value for value, positions in values.items() if not positions]:
+                    del values[value]
+            self.replaced = {}
+        if self.removed:
+            self.deleted = array.array('I', sorted(set(self.deleted).union(self.removed)))
+            self.removed = set()
+        if self.new_ids or self.removed_ids:
+            self.id_hashes, self.id_positions = self._merged_ids()
+            self.new_ids, self.removed_ids = {}, set()
+        return self.offsets, self.postings, self.id_hashes, self.id_positions, self.deleted
+
+    def _merged_ids(self):
+        if len(self.new_ids) + len(self.removed_ids) <= SMALL_CHANGE:
+            id_hashes, id_positions = _copy(self.id_hashes, 'Q'), _copy(self.id_positions, 'I')
+            for key in self.removed_ids:
+                i = bisect.bisect_left(id_hashes, key)
+                if i < len(id_hashes) and id_hashes[i] == key:
+                    del id_hashes[i]
+                    del id_positions[i]
+            for key, position in self.new_ids.items():
+                i = bisect.bisect_left(id_hashes, key)
+                id_hashes.insert(i, key)
+                id_positions.insert(i, position)
+            return id_hashes, id_positions
+        # Ids novos ordenados em arrays (sem uma lista de tuplas do tamanho do banco) e intercalados com os atuais
+        new_hashes = array.array('Q', sorted(self.new_ids))
+        new_positions = array.array('I', map(self.new_ids.__getitem__, new_hashes))
+        current = zip(self.id_hashes, self.id_positions)
+        if self.removed_ids:
+            current = ((key, position) for key, position in current if key not in self.removed_ids)
+        id_hashes = array.array('Q')
+        id_positions = array.array('I')
+        for key, position in heapq.merge(current, zip(new_hashes, new_positions)):
+            id_hashes.append(key)
+            id_positions.append(position)
+        return id_hashes, id_positions
+
+
+class QuestionStore:
+    """
+    Sequência das perguntas, lida sob demanda do disco.
+
+    Substitui a lista global `questions` nos apps, como SQLiteQuestionList:
+    len() e questions[i] consultam o índice; page() e facets() servem a
+    listagem paginada de /api/questions; get(), add() e edit() acessam uma
+    pergunta pelo id; writer() e replace() gravam em lotes.
+    """
+
+    def __init__(self, data_dir, name='questions', cache_size=64, refresh_interval=1.0):
+        self.path = os.path.join(data_dir, f'{name}.jsonl')
+        self.index_path = os.path.join(data_dir, f'{name}.idx')
+        self.lock_path = os.path.join(data_dir, f'{name}.lock')
+        self.cache_size = cache_size
+        self.refresh_interval = refresh_interval
+        self._state = None
+        self._checked_at = 0.0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        # Contadores
+        self.index_builds = 0
+        self.index_writes = 0
+        self.reads = 0
+        self.writes = 0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def older_than(self, path):
+        """True se path foi modificado depois do banco (ex.: questions.json editado à mão)."""
+        try:
+            return os.path.getmtime(path) > os.path.getmtime(self.path)
+        except OSError:
+            return False
+
+    def invalidate(self):
+        """Confere os arquivos na próxima leitura (após gravar o banco neste processo)."""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def _stat_key(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _current(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state is None or now - self._checked_at >= self.refresh_interval:
+                self._checked_at = now
+                key = self._stat_key()
+                if self._state is None or key != self._state.key:
+                    state = self._open(key)
+                    if self._state is None or state.header is None or state.header != self._state.header:
+                        self._cache.clear()
+                    self._state = state
+            return self._state
+
+    def _open(self, key):
+        """Abre o arquivo de perguntas e o índice (reconstruído se não corresponde ao arquivo). Chamar com o lock."""
+        if key is None or key[1] == 0:
+            return _StoreState(key)
+        with open(self.path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        state = self._load_index(key, data)
+        if state is None:
+            # Índice de outro arquivo: talvez uma gravação esteja trocando os dois arquivos agora
+            time.sleep(0.2)
+            state = self._load_index(key, data)
+        if state is not None:
+            return state
+        start = time.perf_counter()
+        builder = _IndexBuilder()
+        _scan(data, builder, self.path)
+        offsets, postings, id_hashes, id_positions, deleted = builder.finish()
+        self.index_builds += 1
+        logger.info(f"Índice de perguntas reconstruído: {len(offsets)} perguntas em {time.perf_counter() - start:.2f}s")
+        lock = self._file_lock(blocking=False)
+        if lock is not None:
+            # Grava o índice só se nenhuma gravação está em andamento (em outro processo)
+            with lock:
+                if self._stat_key() == key:
+                    self._write_index(key[0], key[1], offsets, postings, id_hashes, id_positions, deleted)
+        return _StoreState(key, key[1], data, offsets, id_hashes, id_positions, deleted, postings)
+
+    def _load_index(self, key, data):
+        """Estado com o índice mapeado em memória, ou None se ele não existe ou é de outro arquivo."""
+        try:
+            with open(self.index_path, 'rb') as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        if len(index) < INDEX_HEADER.size:
+            return None
+        header = index[:INDEX_HEADER.size]
+        magic, inode, base, committed, slots, id_count, deleted_count, catalog_size = INDEX_HEADER.unpack(header)
+        if magic != INDEX_MAGIC or inode != key[0] or not base <= committed <= key[1]:
+            return None
+        current = self._state
+        if current is not None and current.header is not None:
+            if current.header == header:
+                # Mesmo índice (o arquivo só ganhou linhas de uma gravação em andamento): reaproveita o atual
+                return _StoreState(key, current.size, data, current.offsets, current.id_hashes, current.id_positions,
+                                   current.deleted, current.postings, current.index, header, current.base)
+            same_base = current.header[:COMMITTED_OFFSET] == header[:COMMITTED_OFFSET] and \
+                current.header[COMMITTED_OFFSET + 8:] == header[COMMITTED_OFFSET + 8:]
+            if same_base and committed > current.size:
+                # Só novas edições confirmadas: aplica as linhas novas sobre o estado atual
+                state = _StoreState(key, current.size, data, current.offsets, current.id_hashes, current.id_positions,
+                                    current.deleted, current.postings, current.index, header, current.base)
+                return self._apply_tail(state, current.size, committed)
+        view = memoryview(index)
+        position = INDEX_HEADER.size
+        catalog = json.loads(bytes(view[position:position + catalog_size]))
+        position += _aligned(catalog_size)
+
+        def take(itemsize, items, code):
+            nonlocal position
+            end = position + itemsize * items
+            result = view[position:end].cast(code)
+            position = end
+            return result
+
+        offsets = take(8, slots, 'Q')
+        id_hashes = take(8, id_count, 'Q')
+        id_positions = take(4, id_count, 'I')
+        deleted = take(4, deleted_count, 'I')
+        postings = {facet: {} for facet in FACETS}
+        for facet, values in catalog.items():
+            for value, items in values:
+                postings.setdefault(facet, {})[value] = take(4, items, 'I')
+        state = _StoreState(key, base, data, offsets, id_hashes, id_positions, deleted, postings, index, header)
+        return self._apply_tail(state, base, committed) if committed > base else state
+
+    def _apply_tail(self, state, start, end):
+        """Estado com as linhas confirmadas de start a end (edições depois do índice) aplicadas."""
+        builder = _IndexBuilder(state)
+        _scan(state.data, builder, self.path, start, end)
+        offsets, postings, id_hashes, id_positions, deleted = builder.finish()
+        return _StoreState(state.key, end, state.data, offsets, id_hashes, id_positions, deleted, postings,
+                           state.index, state.header, state.base)
+
+    def _write_index(self, inode, size, offsets, postings, id_hashes, id_positions, deleted):
+        catalog = {facet: [[value, len(positions)] for value, positions in values.items()]
+                   for facet, values in postings.items()}
+        catalog_bytes = json.dumps(catalog, ensure_ascii=False).encode('utf-8')
+        temp_path = f'{self.index_path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, inode, size, size, len(offsets), len(id_hashes), len(deleted),
+                                      len(catalog_bytes)))
+            f.write(catalog_bytes.ljust(_aligned(len(catalog_bytes)), b' '))
+            for items in (offsets, id_hashes, id_positions, deleted):
+                f.write(memoryview(items).cast('B'))
+            for values in postings.values():
+                for positions in values.values():
+                    f.write(positions.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.index_path)
+        self.index_writes += 1
+
+    def _commit_tail(self, size):
+        """Confirma as linhas gravadas até size sem regravar o índice (só o campo do cabeçalho)."""
+        with open(self.index_path, 'r+b') as f:
+            f.seek(COMMITTED_OFFSET)
+            f.write(COMMITTED_FIELD.pack(size))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _file_lock(self, blocking=True):
+        """Lock exclusivo das gravações entre processos (None se blocking=False e outro processo grava)."""
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        handle = open(self.lock_path, 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except OSError:
+                handle.close()
+                return None
+        return handle  # Fechar o arquivo libera o lock
+
+    # Gravação
+
+    def writer(self, mode='append'):
+        """QuestionWriter para gravar perguntas em lotes ('append', 'upsert' ou 'replace')."""
+        return QuestionWriter(self, mode)
+
+    def replace(self, questions):
+        """
+        Grava um banco novo com as perguntas válidas (normalizadas) e o índice.
+
+        Retorna a lista de QuestionError das entradas ignoradas. questions
+        pode ser este próprio banco: o arquivo novo só substitui o atual no fim.
+        """
+        errors = []
+        with self.writer('replace') as writer:
+            batch = []
+            for index, question in enumerate(questions):
+                try:
+                    batch.append((index, compile_question(question, index).to_dict()))
+                except QuestionError as e:
+                    errors.append(e)
+                if len(batch) >= 1000:
+                    errors.extend(writer.write(batch))
+                    batch = []
+            errors.extend(writer.write(batch))
+        if errors:
+            logger.warning(f"{len(errors)} perguntas inválidas ignoradas; primeira: {errors[0]}")
+        return errors
+
+    def import_json(self, path):
+        """Converte um questions.json (lista de perguntas) para o banco indexado."""
+        with open(path, 'r', encoding='utf-8') as f:
+            questions = json.load(f)
+        if not isinstance(questions, list):
+            raise ValueError(f"{path} não contém uma lista de perguntas")
+        return self.replace(questions)
+
+    def assign_ids(self):
+        """Grava um id nas perguntas que não têm (bancos anteriores aos ids estáveis); retorna quantas."""
+        state = self._current()
+        missing = state.count - len(state.id_hashes)
+        if missing > 0:
+            self.replace(self)
+            logger.info(f"Ids gerados para {missing} perguntas")
+        return max(missing, 0)
+
+    def add(self, question):
+        """Acrescenta uma pergunta normalizada; retorna (posição, pergunta gravada com o id)."""
+        question = with_id(question)
+        with self.writer('append') as writer:
+            errors = writer.write([(len(self), question)])
+            if errors:
+                raise errors[0]
+            position = writer.position_of(question['id'])
+        return position, question
+
+    def edit(self, question_id, change, if_match=None):
+        """
+        Altera uma pergunta pelo id: change(atual, posição) retorna a pergunta nova ou None (excluir).
+
+        A versão atual é conferida com if_match (ETag) sob o lock de gravação:
+        QuestionConflict se ela mudou, QuestionNotFound se o id não existe.
+        Retorna (posição, pergunta gravada ou None). Grava uma única linha.
+        """
+        with self.writer('upsert') as writer:
+            current = writer.get(question_id)
+            if current is None:
+                raise QuestionNotFound(question_id)
+            etag = question_etag(current)
+            if if_match and not etag_matches(if_match, etag):
+                raise QuestionConflict(current, etag)
+            position = writer.position_of(question_id)
+            question = change(current, position)
+            if question is None:
+                writer.delete(question_id)
+            else:
+                question = dict(question, id=current['id'])
+                writer.write([(position, question)])
+        return position, question
+
+    # Leitura
+
+    def _line(self, state, slot):
+        """Texto JSON (bytes) da pergunta: a linha que começa no deslocamento dela."""
+        start = state.offsets[slot]
+        end = state.data.find(b'\n', start)
+        return state.data[start:end if end >= 0 else len(state.data)]
+
+    def _read(self, state, slot):
+        self.reads += 1
+        return json.loads(self._line(state, slot))
+
+    def __len__(self):
+        return self._current().count
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        state = self._current()
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(state.count))]
+        if index < 0:
+            index += state.count
+        if not 0 <= index < state.count:
+            raise IndexError("Índice de pergunta fora do intervalo")
+        with self._lock:
+            if state is self._state and index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+        question = self._read(state, state.slot(index))
+        with self._lock:
+            if state is self._state:
+                self._cache[index] = question
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return question
+
+    def __iter__(self):
+        state = self._current()
+        return (self._read(state, slot) for slot in state.live_slots())
+
+    def tolist(self):
+        """Todas as perguntas como lista (para exportação)."""
+        return list(self)
+
+    def iter_json(self):
+        """Texto JSON (bytes) de cada pergunta, sem decodificar: exportação em stream."""
+        state = self._current()
+        for slot in state.live_slots():
+            yield self._line(state, slot).rstrip()
+
+    def _slot_of(self, state, question_id):
+        key = id_key(question_id)
+        i = bisect.bisect_left(state.id_hashes, key)
+        if i < len(state.id_hashes) and state.id_hashes[i] == key:
+            return state.id_positions[i]
+        return None
+
+    def position_of(self, question_id):
+        """Posição da pergunta com o id, ou None."""
+        state = self._current()
+        slot = self._slot_of(state, question_id)
+        return None if slot is None else state.position(slot)
+
+    def get(self, question_id):
+        """(posição, pergunta) com o id, ou None."""
+        state = self._current()
+        slot = self._slot_of(state, question_id)
+        if slot is None:
+            return None
+        question = self._read(state, slot)
+        if str(question.get('id')) != str(question_id):
+            return None  # Outro id com o mesmo hash de 64 bits
+        return state.position(slot), question
+
+    def _matching(self, state, filters):
+        """Posições internas ordenadas que atendem aos filtros (campo -> valor), ou None sem filtros."""
+        lists = []
+        for facet, value in filters.items():
+            positions = state.postings.get(facet, {}).get(value)
+            if positions is None:
+                return []
+            lists.append(positions)
+        if not lists:
+            return None
+        lists.sort(key=len)
+        if len(lists) == 1:
+            return lists[0]
+        smallest, others = lists[0], lists[1:]
+        return [position for position in smallest if all(_contains(other, position) for other in others)]
+
+    def page(self, offset=0, limit=DEFAULT_PAGE_SIZE, filters=None):
+        """(total que atende aos filtros, [(posição, pergunta), ...]) da página pedida."""
+        state = self._current()
+        slots = self._matching(state, filters or {})
+        if slots is None:
+            total = state.count
+            window = state.live_slots(offset, offset + limit) if offset < total else ()
+        else:
+            total = len(slots)
+            window = slots[offset:offset + limit]
+        return total, [(state.position(slot), self._read(state, slot)) for slot in window]
+
+    def facets(self):
+        """Valores de cada campo indexado com o número de perguntas."""
+        state = self._current()
+        return {facet: {value: len(positions) for value, positions in values.items()}
+                for facet, values in state.postings.items()}
+
+    def stats(self):
+        state = self._current()
+        with self._lock:
+            return {
+                'questions': state.count,
+                'deleted': len(state.deleted),
+                'data_bytes': len(state.data) if state.data is not None else 0,
+                'indexed_bytes': state.base,
+                'tail_bytes': state.size - state.base,
+                'index_bytes': len(state.index) if state.index is not None else 0,
+                'cached': len(self._cache),
+                'index_builds': self.index_builds,
+                'index_writes': self.index_writes,
+                'writes': self.writes,
+                'reads': self.reads
+            }
+
+
+class QuestionWriter:
+    """
+    Gravação de perguntas em lotes, visível de uma vez no commit.
+
+    - 'replace': as perguntas formam um banco novo (arquivo temporário que
+      substitui o atual no commit);
+    - 'append': as perguntas são acrescentadas; um id que já existe é recusado;
+    - 'upsert': uma pergunta com o id de uma existente a substitui.
+
+    Use como context manager: commit() na saída normal, abort() em exceção
+    (o arquivo volta ao tamanho anterior). write() recebe perguntas já
+    validadas e normalizadas e retorna os erros por registro; as perguntas
+    sem id recebem um. Se o que foi gravado é pequeno (TAIL_LIMIT), commit()
+    só confirma as linhas no cabeçalho do índice; senão regrava o índice.
+    """
+
+    def __init__(self, store, mode='append'):
+        if mode not in WRITE_MODES:
+            raise ValueError(f"Modo de gravação inválido: {mode} (use {', '.join(WRITE_MODES)})")
+        self.store = store
+        self.mode = mode
+        self._file = None
+        self._lock_handle = None
+        self._locked = False
+        self._builder = None
+        self._path = None
+        self._start = 0
+        self._base = 0
+        self._indexed = False
+        self._offset = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+    @property
+    def added(self):
+        return self._builder.added if self._builder else 0
+
+    @property
+    def updated(self):
+        return self._builder.updated if self._builder else 0
+
+    def open(self):
+        store = self.store
+        store._write_lock.acquire()
+        self._locked = True
+        try:
+            self._lock_handle = store._file_lock()
+            if self.mode == 'replace':
+                self._path = f'{store.path}.{os.getpid()}.tmp'
+                self._file = open(self._path, 'w+b')
+                self._builder = _IndexBuilder()
+                return
+            store.invalidate()
+            state = store._current()
+            self._path = store.path
+            self._file = open(self._path, 'a+b')  # As escritas vão sempre para o fim; as leituras usam seek
+            if state.key is not None and state.key[1] > state.size:
+                logger.warning(f"{state.key[1] - state.size} bytes não confirmados descartados em {store.path} "
+                               f"(gravação interrompida)")
+                self._file.truncate(state.size)
+            self._builder = _IndexBuilder(state)
+            self._start = self._offset = state.size
+            self._base = state.base
+            self._indexed = state.header is not None
+        except Exception:
+            self._release()
+            raise
+
+    def _read_at(self, offset):
+        self._file.flush()
+        self._file.seek(offset)
+        return json.loads(self._file.readline())
+
+    def get(self, question_id):
+        """Pergunta atual com o id (incluindo o que já foi gravado nesta gravação), ou None."""
+        slot = self._builder.position_of(question_id)
+        if slot is None:
+            return None
+        question = self._read_at(self._builder.offsets[slot])
+        return question if str(question.get('id')) == str(question_id) else None
+
+    def position_of(self, question_id):
+        """Posição (sem as excluídas) da pergunta com o id, ou None."""
+        slot = self._builder.position_of(question_id)
+        return None if slot is None else slot - self._builder.deleted_before(slot)
+
+    def write(self, records):
+        """Grava um lote de (número do registro, pergunta normalizada); retorna os QuestionError recusados."""
+        errors = []
+        lines = []
+        for number, question in records:
+            question_id = question.get('id')
+            if self.mode == 'append' and question_id is not None and self._builder.position_of(question_id) is not None:
+                errors.append(QuestionError(number, 'id', f"id {question_id!r} já existe (use o modo upsert)"))
+                continue
+            question = with_id(question)
+            line = encode_line(question)
+            self._builder.add(question, self._offset)
+            lines.append(line)
+            self._offset += len(line)
+        if lines:
+            self._file.write(b''.join(lines))
+        return errors
+
+    def delete(self, question_id):
+        """Exclui a pergunta com o id; retorna False se ela não existe."""
+        if self._builder.delete(question_id) is None:
+            return False
+        line = encode_line({DELETED_KEY: question_id})
+        self._file.write(line)
+        self._offset += len(line)
+        return True
+
+    def commit(self):
+        """Confirma as linhas gravadas (e troca o arquivo no modo replace): as perguntas ficam visíveis."""
+        store = self.store
+        try:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            if self.mode == 'replace':
+                os.replace(self._path, store.path)
+            if self.mode != 'replace' and self._indexed and self._offset - self._base <= TAIL_LIMIT:
+                store._commit_tail(self._offset)
+            else:
+                inode = os.stat(store.path).st_ino
+                store._write_index(inode, self._offset, *self._builder.finish())
+            store.writes += 1
+            store.invalidate()
+        finally:
+            self._release()
+
+    def abort(self):
+        """Descarta o que foi gravado."""
+        try:
+            if self._file is not None:
+                if self.mode == 'replace':
+                    self._file.close()
+                    os.remove(self._path)
+                else:
+                    self._file.truncate(self._start)
+                    self._file.close()
+                self._file = None
+        finally:
+            self._release()
+
+    def _release(self):
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+        if self._locked:
+            self._locked = False
+            self.store._write_lock.release()
+
+
+def _scan(data, builder, path, start=0, end=None):
+    """Indexa as linhas do arquivo de perguntas de start a end (id repetido substitui; _deleted exclui)."""
+    end = len(data) if end is None else end
+    while start < end:
+        stop = data.find(b'\n', start, end)
+        if stop < 0:
+            stop = end
+        line = data[start:stop]
+        if line.strip():
+            try:
+                question = json.loads(line)
+            except ValueError:
+                logger.warning(f"Linha inválida ignorada em {path} (byte {start})")
+            else:
+                if DELETED_KEY in question:
+                    builder.delete(question[DELETED_KEY])
+                else:
+                    builder.add(question, start)
+        start = stop + 1
+
+
+def list_page(questions, offset=0, limit=DEFAULT_PAGE_SIZE, filters=None):
+    """page() para sequências sem índice (lista, perguntas do SQLite): leitura sequencial."""
+    if hasattr(questions, 'page'):
+        return questions.page(offset, limit, filters)
+    filters = filters or {}
+    total = 0
+    items = []
+    for position, question in enumerate(questions):
+        if all(facet_value(question, facet) == value for facet, value in filters.items()):
+            if offset <= total < offset + limit:
+                items.append((position, question))
+            total += 1
+    return total, items
+
+
+def list_facets(questions):
+    """facets() para sequências sem índice."""
+    if hasattr(questions, 'facets'):
+        return questions.facets()
+    facets = {facet: {} for facet in FACETS}
+    for question in questions:
+        for facet in FACETS:
+            value = facet_value(question, facet)
+            if value is not None:
+                facets[facet][value] = facets[facet].get(value, 0) + 1
+    return facets
+
+
+def json_array_chunks(questions, batch=500):
+    """Lista JSON das perguntas em pedaços de batch perguntas (bytes), para responder em stream."""
+    if hasattr(questions, 'iter_json'):
+        records = questions.iter_json()
+    else:
+        records = (json.dumps(question, ensure_ascii=False).encode('utf-8') for question in questions)
+    chunk = []
+    first = True
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= batch:
+            yield (b'[' if first else b',') + b','.join(chunk)
+            first = False
+            chunk = []
+    if first:
+        yield b'[' + b','.join(chunk) + b']'
+    else:
+        yield (b',' + b','.join(chunk) if chunk else b'') + b']'
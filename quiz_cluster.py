@@ -0,0 +1,161 @@
+"""
+Coordenação de vários workers servindo o mesmo quiz.
+
+Um único worker (o líder) executa o agendador de fases, lê o chat e conta
+os votos. A liderança é um lease com expiração no backend de estado
+compartilhado, renovado periodicamente; se o líder morrer, outro worker
+adquire o lease quando ele expirar.
+
+- O líder publica os eventos das salas no canal de eventos; os demais
+  workers (seguidores) aplicam esses eventos nas réplicas das salas e
+  assim respondem às rotas HTTP com o mesmo estado do líder.
+- Mudanças feitas em qualquer worker que todos precisam aplicar (salas
+  criadas ou removidas, configuração, perguntas) usam broadcast_event.
+- Os seguidores encaminham ao líder, pelo canal de comandos, as ações que
+  alteram o quiz (iniciar, parar, pausar, mensagens de chat, ...).
+- Os envios aos sockets são distribuídos pela fila de mensagens do
+  Socket.IO, não por este módulo.
+"""
+import threading
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = 'quiz:events'
+COMMANDS_CHANNEL = 'quiz:commands'
+LEADER_LEASE = 'quiz:leader'
+
+
+class QuizCluster:
+    """
+    Eleição do líder e replicação dos eventos entre os workers.
+
+    on_event(room_id, event, data): chamado nos seguidores para cada evento do líder.
+    on_command(command): chamado no líder para cada comando de um seguidor.
+    on_leader_change(is_leader): chamado na eleição inicial e a cada mudança.
+    """
+
+    def __init__(self, backend, on_event, on_command, on_leader_change, lease_ttl=5.0, node_id=None):
+        self.backend = backend
+        self.on_event = on_event
+        self.on_command = on_command
+        self.on_leader_change = on_leader_change
+        self.lease_ttl = float(lease_ttl)
+        self.node_id = node_id or uuid.uuid4().hex
+        self.is_leader = False
+        self.started = False
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Contadores
+        self.events_published = 0
+        self.events_applied = 0
+        self.commands_sent = 0
+        self.commands_handled = 0
+        self.leader_changes = 0
+
+    @property
+    def shared(self):
+        """True se o estado é compartilhado com outros processos."""
+        return not getattr(self.backend, 'local', False)
+
+    def start(self):
+        """Assina os canais, faz a primeira eleição e inicia a renovação do lease."""
+        if self.started:
+            return
+        self.started = True
+        if self.shared:
+            self.backend.subscribe([EVENTS_CHANNEL, COMMANDS_CHANNEL], self._dispatch)
+        self._elect(initial=True)
+        self._thread = threading.Thread(target=self._run, name='quiz-leader-election')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Para a renovação e libera o lease (outro worker assume imediatamente)."""
+        self._stop.set()
+        if self.is_leader:
+            try:
+                self.backend.release_lease(LEADER_LEASE, self.node_id)
+            except Exception as e:
+                logger.error(f"Erro ao liberar a liderança: {e}")
+
+    def _run(self):
+        # Renovar com folga: três tentativas por período do lease
+        while not self._stop.wait(self.lease_ttl / 3):
+            self._elect()
+
+    def _elect(self, initial=False):
+        try:
+            leader = bool(self.backend.acquire_lease(LEADER_LEASE, self.node_id, self.lease_ttl))
+        except Exception as e:
+            logger.error(f"Erro na eleição do líder: {e}")
+            leader = False
+        if leader != self.is_leader or initial:
+            self.is_leader = leader
+            if not initial:
+                self.leader_changes += 1
+            logger.info(f"Worker {self.node_id[:8]} agora é {'líder' if leader else 'seguidor'}")
+            try:
+                self.on_leader_change(leader)
+            except Exception as e:
+                logger.error(f"Erro ao aplicar a mudança de liderança: {e}")
+
+    # Mensagens
+
+    def publish_event(self, room_id, event, data):
+        """Publica um evento de sala para os seguidores (apenas com estado compartilhado)."""
+        if not self.shared:
+            return
+        try:
+            self.backend.publish(EVENTS_CHANNEL, {'node': self.node_id, 'room': room_id, 'event': event, 'data': data})
+            self.events_published += 1
+        except Exception as e:
+            logger.error(f"Erro ao publicar evento {event} da sala {room_id}: {e}")
+
+    def broadcast_event(self, room_id, event, data):
+        """Publica um evento aplicado por todos os outros workers, inclusive o líder."""
+        if not self.shared:
+            return
+        try:
+            self.backend.publish(EVENTS_CHANNEL, {'node': self.node_id, 'room': room_id, 'event': event,
+                                                  'data': data, 'all': True})
+            self.events_published += 1
+        except Exception as e:
+            logger.error(f"Erro ao publicar evento {event} da sala {room_id}: {e}")
+
+    def send_command(self, action, room_id, **fields):
+        """Encaminha uma ação ao líder."""
+        command = dict(fields, node=self.node_id, action=action, room=room_id)
+        try:
+            self.backend.publish(COMMANDS_CHANNEL, command)
+            self.commands_sent += 1
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao encaminhar o comando {action} ao líder: {e}")
+            return False
+
+    def _dispatch(self, channel, message):
+        if message.get('node') == self.node_id:
+            return  # Mensagem publicada por este worker
+        if channel == EVENTS_CHANNEL:
+            if self.is_leader and not message.get('all'):
+                return  # O líder é a fonte dos eventos das salas
+            self.events_applied += 1
+            self.on_event(message.get('room'), message.get('event'), message.get('data'))
+        elif channel == COMMANDS_CHANNEL and self.is_leader:
+            self.commands_handled += 1
+            self.on_command(message)
+
+    def stats(self):
+        return {
+            'node_id': self.node_id,
+            'is_leader': self.is_leader,
+            'shared': self.shared,
+            'leader_changes': self.leader_changes,
+            'events_published': self.events_published,
+            'events_applied': self.events_applied,
+            'commands_sent': self.commands_sent,
+            'commands_handled': self.commands_handled
+        }
@@ -0,0 +1,550 @@
+"""
+Salas de quiz: várias instâncias independentes do quiz no mesmo processo.
+
+Cada QuizRoom guarda o seu próprio estado (pergunta atual, votos, chat,
+ranking e configuração) e o seu QuizScheduler. Todas as salas compartilham
+um único TimerService e um único transmissor de votos, então centenas de
+quizzes rodam no mesmo processo sem uma thread por sala.
+
+A sala não conhece o Socket.IO nem o armazenamento: o app informa a função
+de envio (emit) e o callback de resultados (on_results), que pontua e
+persiste o ranking.
+
+Com vários workers, apenas o líder executa as fases; nos demais a sala é
+uma réplica (replica=True) atualizada pelos eventos do líder (apply_event).
+"""
+import gc
+import itertools
+import re
+import threading
+import time
+import logging
+
+from chat_history import ChatHistory, record_to_dict
+from leaderboard import Leaderboard
+from question_model import MAX_SKIPPED_QUESTIONS, QuestionError
+from question_order import DEFAULT_ORDER, QuestionPicker
+from quiz_scheduler import QuizScheduler, PHASE_IDLE, PHASE_QUESTION, PHASE_COUNTING, PHASE_RESULTS
+from state_versions import StateVersions
+from vote_broadcaster import VoteBroadcaster
+from vote_tally import VoteTally
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROOM = 'default'
+
+# Identificador de sala aceito nas URLs e nos eventos do Socket.IO
+ROOM_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Configurações que podem ser definidas por sala
+ROOM_CONFIG_KEYS = (
+    'youtube_url', 'answer_time', 'result_display_time',
+    'primary_color', 'secondary_color', 'vote_policy', 'vote_lock_seconds',
+    'question_order'
+)
+
+# Fase usada pelas réplicas em eventos que mudam de fase
+EVENT_PHASES = {
+    'next_question': PHASE_QUESTION,
+    'show_counting_votes': PHASE_COUNTING,
+    'show_results': PHASE_RESULTS
+}
+
+# Partes do estado alteradas por cada evento (versões nas réplicas)
+EVENT_PIECES = {
+    'next_question': ('phase', 'question', 'tally'),
+    'show_counting_votes': ('phase',),
+    'show_results': ('phase', 'tally'),
+    'quiz_phase': ('phase',),
+    'update_votes': ('tally',),
+    'chat_message': ('chat',)
+}
+
+# Tópicos em que os clientes Socket.IO se inscrevem e os eventos de cada um
+# (eventos fora desta tabela vão para todos os clientes da sala)
+TOPICS = ('chat', 'votes', 'phase', 'ranking')
+EVENT_TOPICS = {
+    'chat_message': 'chat',
+    'clear_chat': 'chat',
+    'update_votes': 'votes',
+    'next_question': 'phase',
+    'show_counting_votes': 'phase',
+    'show_results': 'phase',
+    'quiz_phase': 'phase',
+    'ranking_update': 'ranking',
+    'update_ranking': 'ranking',
+    'prepare_ranking_update': 'ranking',
+    'ranking_item': 'ranking',
+    'ranking_update_complete': 'ranking'
+}
+
+# Perguntas feitas em todas as salas (para a coleta de lixo periódica)
+_questions_asked = itertools.count(1)
+
+
+def validate_room_id(room_id):
+    """Retorna o identificador da sala ou lança ValueError se for inválido."""
+    if not isinstance(room_id, str) or not ROOM_ID_PATTERN.match(room_id):
+        raise ValueError("Identificador de sala inválido (use letras, números, '-' ou '_', até 64 caracteres)")
+    return room_id
+
+
+def room_channel(room_id):
+    """Nome da sala do Socket.IO usada para os envios de uma sala de quiz."""
+    return f'quiz:{room_id}'
+
+
+def topic_channel(room_id, topic):
+    """Sala do Socket.IO dos inscritos em um tópico de uma sala de quiz."""
+    return f'quiz:{room_id}:{topic}'
+
+
+def event_channel(room_id, event):
+    """Sala do Socket.IO que recebe um evento: a do tópico do evento ou a da sala inteira."""
+    topic = EVENT_TOPICS.get(event)
+    return topic_channel(room_id, topic) if topic else room_channel(room_id)
+
+
+def parse_topics(value):
+    """
+    Tópicos pedidos pelo cliente (lista ou texto separado por vírgulas).
+
+    Sem tópicos o cliente recebe todos; lança ValueError com os tópicos
+    desconhecidos.
+    """
+    if not value:
+        return TOPICS
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, (list, tuple)):
+        raise ValueError('Tópicos devem ser uma lista')
+    topics = [str(topic).strip() for topic in value if str(topic).strip()]
+    unknown = [topic for topic in topics if topic not in TOPICS]
+    if unknown:
+        raise ValueError(f"Tópicos desconhecidos: {', '.join(unknown)} (use {', '.join(TOPICS)})")
+    return tuple(topic for topic in TOPICS if topic in topics) or TOPICS
+
+
+class QuizRoom:
+    """
+    Estado e fases de um quiz.
+
+    questions: função que retorna a sequência de perguntas compiladas da sala
+    (question_model.CompiledQuestions; lida a cada pergunta, então recarregar
+    o banco de perguntas tem efeito imediato). current_question é a
+    CompiledQuestion atual: só a parte pública dela é enviada aos clientes.
+    emit(event, data): envia um evento aos clientes da sala.
+    on_results(room, position, correct_letter, user_votes, votes): chamado
+    ao exibir os resultados com a fotografia dos votos.
+    votes: transmissor de votos compartilhado (RoomVoteBroadcaster).
+    """
+
+    def __init__(self, room_id, config, questions, timer, emit, on_results=None,
+                 votes=None, counting_time=2, chat_history_size=1000, catalog=None):
+        self.room_id = validate_room_id(room_id)
+        self.config = config
+        self.questions = questions
+        self.emit = emit
+        self.on_results = on_results
+        self.votes = votes
+        self.counting_time = counting_time
+        self.created_at = time.time()
+
+        self.current_question_index = 0
+        self.current_question = None
+        self._advance_pending = False  # A próxima pergunta avança o índice (após os resultados)
+        # Escolha da próxima pergunta (config 'question_order'), com o catálogo compartilhado
+        self.picker = QuestionPicker(catalog)
+
+        # Estado recebido do líder quando esta sala é uma réplica
+        self.replica = False
+        self._replica_phase = {'phase': PHASE_IDLE, 'paused': False, 'deadline': None, 'remaining': None}
+        self._replica_votes = None
+        self._replica_total = None
+
+        self.vote_tally = VoteTally(
+            num_options=4,
+            policy=config.get('vote_policy', 'last'),
+            lock_after=config.get('vote_lock_seconds', 0)
+        )
+        self.chat_history = ChatHistory(chat_history_size)
+        self.ranking = Leaderboard()
+        # Versões de cada parte do estado (ETags das rotas de polling); o app marca o ranking
+        self.versions = StateVersions()
+
+        self.scheduler = QuizScheduler(
+            timer,
+            {
+                PHASE_QUESTION: self._start_question_phase,
+                PHASE_COUNTING: self._start_counting_phase,
+                PHASE_RESULTS: self._start_results_phase
+            },
+            self.phase_durations,
+            on_state=self._on_state,
+            name=room_id
+        )
+
+    # Controle
+
+    @property
+    def running(self):
+        if self.replica:
+            return self._replica_phase['phase'] != PHASE_IDLE
+        return self.scheduler.running
+
+    def phase_state(self):
+        """Fase atual, prazo e tempo restante (da réplica, nos seguidores)."""
+        if not self.replica:
+            return self.scheduler.state()
+        state = dict(self._replica_phase)
+        now_ms = int(time.time() * 1000)
+        if state['deadline'] and not state['paused']:
+            state['remaining'] = max(0.0, (state['deadline'] - now_ms) / 1000)
+        state['server_time'] = now_ms
+        return state
+
+    def start(self):
+        """Inicia o quiz pela primeira pergunta. Retorna False se já estiver rodando."""
+        if self.running:
+            return False
+        # A primeira pergunta também é escolhida pela ordem configurada
+        self.current_question_index = -1
+        self._advance_pending = True
+        self.picker.reset()
+        return self.scheduler.start()
+
+    def stop(self):
+        return self.scheduler.stop()
+
+    def pause(self):
+        return self.scheduler.pause()
+
+    def resume(self):
+        return self.scheduler.resume()
+
+    def skip(self):
+        return self.scheduler.skip()
+
+    def _on_state(self, state):
+        # Pausa, retomada ou parada
+        self.versions.bump('phase')
+        self.emit('quiz_phase', state)
+
+    def phase_durations(self):
+        """Durações das fases, lidas a cada fase para refletir mudanças de configuração."""
+        return {
+            PHASE_QUESTION: self.config['answer_time'],
+            PHASE_COUNTING: self.counting_time,
+            PHASE_RESULTS: self.config['result_display_time']
+        }
+
+    # Votos e chat
+
+    def apply_vote_policy(self):
+        """Aplica a política de troca de voto configurada."""
+        try:
+            self.vote_tally.configure(self.config.get('vote_policy', 'last'), self.config.get('vote_lock_seconds', 0))
+        except (ValueError, TypeError) as e:
+            logger.error(f"Política de votação inválida na configuração da sala {self.room_id}: {e}")
+
+    def question_order(self):
+        """Ordem das perguntas configurada ('sequential', 'shuffle', 'category' ou 'adaptive')."""
+        return self.config.get('question_order', DEFAULT_ORDER)
+
+    def count_votes(self):
+        if self.replica and self._replica_votes is not None:
+            return dict(self._replica_votes)
+        return self.vote_tally.counts_by_letter()
+
+    def handle_chat(self, author, message, vote):
+        """Registra o voto (se houver), grava a mensagem no histórico e a retransmite."""
+        if vote is not None and self.vote_tally.vote_letter(author, vote):
+            logger.info(f"Voto registrado na sala {self.room_id}: {author} votou na opção !{vote}")
+            self.versions.bump('tally')
+            if self.votes:
+                self.votes.mark_dirty(self)
+
+        record = self.chat_history.append(author, message)
+        self.versions.bump('chat')
+        self.emit('chat_message', record_to_dict(record))
+        return record
+
+    def _flush_votes(self):
+        if self.votes:
+            self.votes.flush(self)
+
+    # Estado
+
+    def total_questions(self):
+        if self.replica and self._replica_total is not None:
+            return self._replica_total
+        return len(self.questions())
+
+    def status(self):
+        """Resumo do estado da sala para as rotas HTTP."""
+        return {
+            'room_id': self.room_id,
+            'quiz_running': self.running,
+            'phase': self.phase_state(),
+            'question_num': self.current_question_index + 1 if self.current_question is not None else None,
+            'total_questions': self.total_questions(),
+            'participants': len(self.ranking),
+            'created_at': self.created_at
+        }
+
+    # Réplica (workers seguidores)
+
+    def apply_event(self, event, data):
+        """Atualiza a réplica a partir de um evento emitido pelo líder."""
+        if event in EVENT_PHASES:
+            self._replica_phase = {
+                'phase': EVENT_PHASES[event],
+                'paused': False,
+                'deadline': data.get('deadline'),
+                'remaining': None
+            }
+        if event == 'next_question':
+            # A pergunta (com a resposta privada) vem do banco deste worker, não do evento
+            self.current_question_index = data.get('question_num', 1) - 1
+            self.current_question = self._question_at(self.current_question_index)
+            self._replica_total = data.get('total_questions')
+            self._replica_votes = dict.fromkeys(self.vote_tally.counts_by_letter(), 0)
+        elif event in ('update_votes', 'show_results'):
+            self._replica_votes = data.get('votes')
+        elif event == 'quiz_phase':
+            self._replica_phase = {key: data.get(key) for key in ('phase', 'paused', 'deadline', 'remaining')}
+        elif event == 'chat_message' and data.get('seq'):
+            self.chat_history.add_record((data['seq'], data['timestamp'], data['author'], data['message']))
+        self.versions.bump(*EVENT_PIECES.get(event, ()))
+
+    def _question_at(self, position):
+        questions = self.questions()
+        return questions[position] if 0 <= position < len(questions) else None
+
+    def promote(self):
+        """
+        Assume as fases da sala (este worker virou o líder).
+
+        Se a réplica indicava um quiz em andamento, ele é retomado a partir da
+        pergunta atual (ou da seguinte, se ela já tinha sido pontuada); um quiz
+        pausado continua pausado na mesma fase, com o tempo que restava.
+        Retorna True nesse caso.
+        """
+        if not self.replica:
+            return False
+        was_running = self.running
+        phase = dict(self._replica_phase)
+        self.replica = False
+        self.versions.bump('phase')
+        if not was_running:
+            return False
+        # Depois dos resultados, a próxima fase de pergunta passa para a pergunta seguinte
+        self._advance_pending = phase.get('phase') == PHASE_RESULTS
+        if phase.get('paused') and self.current_question is not None:
+            logger.info(f"Sala {self.room_id}: assumindo o quiz pausado na pergunta {self.current_question_index + 1}")
+            if phase.get('phase') == PHASE_QUESTION:
+                # Os votos de cada usuário ficaram no líder anterior
+                self.apply_vote_policy()
+                self.vote_tally.reset()
+                self.versions.bump('tally')
+            return self.scheduler.restore_paused(phase.get('phase'), phase.get('remaining'))
+        logger.info(f"Sala {self.room_id}: assumindo o quiz na pergunta {self.current_question_index + 1}")
+        return self.scheduler.start()
+
+    def demote(self):
+        """Passa a seguir o líder: para o agendador local sem avisar os clientes."""
+        if self.replica:
+            return
+        self._replica_phase = {key: value for key, value in self.scheduler.state().items() if key != 'server_time'}
+        self._replica_votes = self.vote_tally.counts_by_letter()
+        self._replica_total = len(self.questions())
+        self.scheduler.stop(notify=False)
+        self.replica = True
+        self.versions.bump('phase')
+
+    # Fases
+
+    def _start_question_phase(self, deadline):
+        questions = self.questions()
+        if not questions:
+            logger.warning(f"Nenhuma pergunta cadastrada; parando o quiz da sala {self.room_id}")
+            self.stop()
+            return
+
+        # Forçar coleta de lixo a cada 100 perguntas (somando todas as salas)
+        if next(_questions_asked) % 100 == 0:
+            gc.collect()
+
+        # Avançar depois dos resultados da pergunta anterior e selecionar a pergunta atual
+        position = self.current_question_index
+        if self._advance_pending:
+            position = self.picker.next(self.question_order(), len(questions), position)
+        position = position % len(questions)
+        question = None
+        for _ in range(min(len(questions), MAX_SKIPPED_QUESTIONS)):
+            try:
+                question = questions[position]
+                break
+            except QuestionError as e:
+                # Pergunta gravada inválida (banco antigo): pulada sem mexer no estado da anterior
+                logger.warning(f"Sala {self.room_id}: pergunta inválida ignorada: {e}")
+                position = self.picker.next(self.question_order(), len(questions), position)
+        if question is None:
+            logger.warning(f"Nenhuma pergunta válida; parando o quiz da sala {self.room_id}")
+            self.stop()
+            return
+        self.current_question_index = position
+        self._advance_pending = False
+        self.current_question = question
+
+        # Limpar votos para a nova pergunta
+        self.apply_vote_policy()
+        self.vote_tally.reset()
+        self.versions.bump('phase', 'question', 'tally')
+
+        logger.info(f"Sala {self.room_id}: enviando pergunta {self.current_question_index + 1}/{len(questions)}")
+        self.emit('next_question', {
+            'question': self.current_question.public,
+            'question_num': self.current_question_index + 1,
+            'total_questions': len(questions),
+            'answer_time': self.config['answer_time'],
+            'deadline': deadline,
+            'server_time': int(time.time() * 1000)
+        })
+
+    def _start_counting_phase(self, deadline):
+        logger.info(f"Sala {self.room_id}: contabilizando votos ({self.counting_time}s)")
+        self.versions.bump('phase')
+        # Enviar imediatamente a contagem final antes da mudança de fase
+        self._flush_votes()
+        self.emit('show_counting_votes', {
+            'time': self.counting_time,
+            'deadline': deadline,
+            'server_time': int(time.time() * 1000)
+        })
+
+    def _start_results_phase(self, deadline):
+        # Resposta privada da pergunta (letra 0=A, 1=B, 2=C, 3=D), revelada só agora
+        answer = self.current_question.answer
+        correct_letter = answer.letter
+
+        # Fotografia dos votos: o ranking pontua exatamente o que o gráfico mostra
+        final_user_votes = self.vote_tally.user_letters()
+        final_votes = self.count_votes()
+        self.picker.observe(self.question_order(), self.current_question_index,
+                            sum(final_votes.values()), final_votes.get(correct_letter, 0))
+
+        # A próxima fase de pergunta avança para a pergunta seguinte
+        self._advance_pending = True
+        self.versions.bump('phase')
+
+        logger.info(f"Sala {self.room_id}: resultados, resposta correta={correct_letter}, votos={final_votes}")
+        self._flush_votes()
+        self.emit('show_results', {
+            'correct_answer': correct_letter,
+            'explanation': answer.explanation,
+            'votes': final_votes,
+            'deadline': deadline,
+            'server_time': int(time.time() * 1000)
+        })
+
+        if self.on_results:
+            self.on_results(self, self.current_question_index, correct_letter, final_user_votes, final_votes)
+
+
+class RoomVoteBroadcaster:
+    """
+    Transmissão agregada de votos para todas as salas com uma única thread.
+
+    Cada voto marca a sala como "suja"; a cada tick são enviadas apenas as
+    contagens das salas que mudaram.
+    """
+
+    def __init__(self, emit_fn, interval=0.2):
+        # emit_fn(room) deve ler a contagem atual da sala e enviá-la aos clientes
+        self.emit_fn = emit_fn
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self.broadcaster = VoteBroadcaster(self._emit_dirty, interval=interval)
+
+    def start(self):
+        self.broadcaster.start()
+
+    def stop(self, timeout=1.0):
+        self.broadcaster.stop(timeout)
+
+    def mark_dirty(self, room):
+        with self._lock:
+            self._dirty[room.room_id] = room
+        self.broadcaster.mark_dirty()
+
+    def flush(self, room):
+        """Envia a contagem da sala imediatamente (usado nas mudanças de fase)."""
+        with self._lock:
+            self._dirty.pop(room.room_id, None)
+        self.emit_fn(room)
+        self.broadcaster.flushes += 1
+
+    def _emit_dirty(self):
+        with self._lock:
+            rooms = list(self._dirty.values())
+            self._dirty.clear()
+        for room in rooms:
+            try:
+                self.emit_fn(room)
+            except Exception as e:
+                logger.error(f"Erro ao transmitir votos da sala {room.room_id}: {e}")
+
+    def stats(self):
+        stats = self.broadcaster.stats()
+        with self._lock:
+            stats['dirty_rooms'] = len(self._dirty)
+        return stats
+
+
+class RoomManager:
+    """Registro das salas de quiz do processo."""
+
+    def __init__(self, max_rooms=500):
+        self.max_rooms = max_rooms
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def add(self, room):
+        """Registra uma sala; lança ValueError se o id já existir ou o limite for atingido."""
+        with self._lock:
+            if room.room_id in self._rooms:
+                raise ValueError(f"Sala já existe: {room.room_id}")
+            if len(self._rooms) >= self.max_rooms:
+                raise ValueError(f"Limite de {self.max_rooms} salas atingido")
+            self._rooms[room.room_id] = room
+        logger.info(f"Sala criada: {room.room_id}")
+        return room
+
+    def get(self, room_id):
+        with self._lock:
+            return self._rooms.get(room_id)
+
+    def remove(self, room_id):
+        """Para o quiz da sala e a remove do registro."""
+        with self._lock:
+            room = self._rooms.pop(room_id, None)
+        if room:
+            room.stop()
+            logger.info(f"Sala removida: {room_id}")
+        return room
+
+    def rooms(self):
+        with self._lock:
+            return list(self._rooms.values())
+
+    def running_count(self):
+        return sum(1 for room in self.rooms() if room.running)
+
+    def __contains__(self, room_id):
+        with self._lock:
+            return room_id in self._rooms
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rooms)
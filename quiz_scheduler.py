@@ -0,0 +1,295 @@
+"""
+Agendador de fases do quiz baseado em prazos (deadlines).
+
+Substitui a sequência de time.sleep do quiz_loop. Cada fase
+(pergunta -> contabilização -> resultados -> próxima pergunta) termina em
+um prazo absoluto no relógio monotônico; o prazo da fase seguinte é
+calculado a partir do prazo anterior e não do momento em que o código
+terminou de executar, então o atraso dos emits não se acumula entre as
+perguntas.
+
+Um único TimerService (uma thread com um heap de prazos) dispara as
+transições de qualquer número de agendadores. Pausar, retomar, pular e
+parar têm efeito imediato: basta cancelar ou reagendar o prazo.
+"""
+import heapq
+import itertools
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PHASE_IDLE = 'idle'
+PHASE_QUESTION = 'question'
+PHASE_COUNTING = 'counting'
+PHASE_RESULTS = 'results'
+
+# Ordem das fases; depois dos resultados volta para a pergunta (seguinte)
+NEXT_PHASE = {
+    PHASE_QUESTION: PHASE_COUNTING,
+    PHASE_COUNTING: PHASE_RESULTS,
+    PHASE_RESULTS: PHASE_QUESTION
+}
+
+
+def monotonic_to_epoch_ms(deadline):
+    """Converte um prazo do relógio monotônico em milissegundos de época (para os clientes)."""
+    return int((time.time() + (deadline - time.monotonic())) * 1000)
+
+
+class TimerHandle:
+    """Referência a uma chamada agendada; permite cancelá-la."""
+
+    __slots__ = ('deadline', 'callback', 'cancelled')
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerService:
+    """Uma thread que executa callbacks em prazos do relógio monotônico."""
+
+    def __init__(self, name='quiz-timer'):
+        self.name = name
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Inicia a thread do timer (idempotente)."""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=self.name)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def call_at(self, deadline, callback):
+        """Agenda callback para o prazo monotônico informado."""
+        handle = TimerHandle(deadline, callback)
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._counter), handle))
+            self._condition.notify()
+        self.start()
+        return handle
+
+    def call_later(self, delay, callback):
+        return self.call_at(time.monotonic() + max(0.0, delay), callback)
+
+    def call_soon(self, callback):
+        return self.call_at(time.monotonic(), callback)
+
+    def pending(self):
+        """Número de chamadas agendadas (inclui canceladas ainda no heap)."""
+        with self._condition:
+            return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    deadline, _, handle = self._heap[0]
+                    if handle.cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        heapq.heappop(self._heap)
+                        break
+                    self._condition.wait(remaining)
+                else:
+                    return
+            try:
+                handle.callback()
+            except Exception as e:
+                logger.error(f"Erro em callback agendado: {e}")
+
+
+class QuizScheduler:
+    """
+    Máquina de estados das fases do quiz.
+
+    handlers: dicionário fase -> função chamada ao entrar na fase; recebe o
+    prazo da fase em milissegundos de época.
+    durations: função que retorna {fase: duração em segundos}, lida a cada
+    fase para refletir mudanças de configuração.
+    on_state: função chamada (com state()) quando o quiz é pausado,
+    retomado ou parado, para transmitir o novo estado aos clientes.
+
+    Os handlers rodam na thread do TimerService e devem ser rápidos:
+    trabalho pesado deve ir para outra thread.
+    """
+
+    def __init__(self, timer, handlers, durations, on_state=None, name='quiz'):
+        self.timer = timer
+        self.handlers = handlers
+        self.durations = durations
+        self.on_state = on_state
+        self.name = name
+        self._lock = threading.RLock()
+        self.phase = PHASE_IDLE
+        self.paused = False
+        self.deadline = None  # Prazo da fase atual (relógio monotônico)
+        self._remaining = None  # Tempo restante guardado durante a pausa
+        self._handle = None
+        self._generation = 0  # Invalida transições agendadas antes de stop/skip
+
+    @property
+    def running(self):
+        return self.phase != PHASE_IDLE
+
+    def start(self):
+        """Inicia o quiz pela fase de pergunta. Retorna False se já estiver rodando."""
+        with self._lock:
+            if self.running:
+                return False
+            self.paused = False
+            self._enter(PHASE_QUESTION, time.monotonic())
+            return True
+
+    def restore_paused(self, phase, remaining):
+        """
+        Assume um quiz pausado em outro processo: entra na fase já pausada,
+        sem chamar o handler; resume() a continua com remaining segundos.
+        """
+        with self._lock:
+            if self.running or phase not in self.handlers:
+                return False
+            self.phase = phase
+            self.paused = True
+            self.deadline = None
+            self._remaining = max(0.0, float(remaining or 0))
+        self._notify_state()
+        return True
+
+    def stop(self, notify=True):
+        """Para o quiz imediatamente (notify=False não transmite o novo estado)."""
+        with self._lock:
+            if not self.running:
+                return False
+            self._cancel()
+            self.phase = PHASE_IDLE
+            self.paused = False
+            self.deadline = None
+            self._remaining = None
+        if notify:
+            self._notify_state()
+        return True
+
+    def pause(self):
+        """Congela o prazo da fase atual."""
+        with self._lock:
+            if not self.running or self.paused:
+                return False
+            self._cancel()
+            self._remaining = max(0.0, self.deadline - time.monotonic())
+            self.paused = True
+        self._notify_state()
+        return True
+
+    def resume(self):
+        """Retoma a fase atual com o tempo que restava na pausa."""
+        with self._lock:
+            if not self.running or not self.paused:
+                return False
+            self.paused = False
+            self.deadline = time.monotonic() + self._remaining
+            self._remaining = None
+            self._schedule_end()
+        self._notify_state()
+        return True
+
+    def skip(self):
+        """Encerra a fase atual agora e passa para a seguinte."""
+        with self._lock:
+            if not self.running:
+                return False
+            self._cancel()
+            self.paused = False
+            self._remaining = None
+            generation = self._generation
+        self.timer.call_soon(lambda: self._advance(generation, time.monotonic()))
+        return True
+
+    def state(self):
+        """Estado atual para transmissão aos clientes."""
+        with self._lock:
+            if self.paused:
+                remaining = self._remaining
+            elif self.deadline is not None:
+                remaining = max(0.0, self.deadline - time.monotonic())
+            else:
+                remaining = None
+            return {
+                'phase': self.phase,
+                'paused': self.paused,
+                'deadline': monotonic_to_epoch_ms(self.deadline) if self.deadline and not self.paused else None,
+                'remaining': remaining,
+                'server_time': int(time.time() * 1000)
+            }
+
+    # Internos
+
+    def _cancel(self):
+        self._generation += 1
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+
+    def _duration(self, phase):
+        try:
+            return max(0.0, float(self.durations().get(phase, 0)))
+        except Exception as e:
+            logger.error(f"Erro ao obter duração da fase {phase}: {e}")
+            return 0.0
+
+    def _enter(self, phase, start):
+        """Entra na fase com início em start (monotônico) e agenda o seu fim."""
+        self.phase = phase
+        self.deadline = start + self._duration(phase)
+        self._schedule_end()
+        handler = self.handlers.get(phase)
+        if handler:
+            try:
+                handler(monotonic_to_epoch_ms(self.deadline))
+            except Exception as e:
+                logger.error(f"Erro ao iniciar a fase {phase} ({self.name}): {e}")
+
+    def _schedule_end(self):
+        generation = self._generation
+        deadline = self.deadline
+        self._handle = self.timer.call_at(deadline, lambda: self._advance(generation, deadline))
+
+    def _advance(self, generation, start):
+        with self._lock:
+            if generation != self._generation or not self.running or self.paused:
+                return
+            self._handle = None
+            # O prazo seguinte parte do prazo anterior: sem deriva acumulada
+            self._enter(NEXT_PHASE[self.phase], start)
+
+    def _notify_state(self):
+        if self.on_state:
+            try:
+                self.on_state(self.state())
+            except Exception as e:
+                logger.error(f"Erro ao transmitir estado do quiz ({self.name}): {e}")
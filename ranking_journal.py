@@ -0,0 +1,217 @@
+"""
+Persistência do ranking em diário (journal) com compactação periódica.
+
+Em vez de reescrever o ranking inteiro a cada pergunta, cada pergunta
+acrescenta uma linha ao diário com as variações de pontuação:
+
+    {"seq": 12, "ts": 1700000000.0, "deltas": {"usuario": 1, "outro": 0}}
+
+De tempos em tempos o diário é compactado em um snapshot
+(ranking.snapshot.json) que guarda o ranking completo e a sequência da
+última linha incluída. Na inicialização o ranking é reconstruído a partir
+do snapshot mais as linhas do diário com sequência maior, de modo que uma
+queda no meio da compactação não duplica pontos.
+
+Toda a escrita é feita por uma única thread, e um lock de arquivo impede
+que dois processos escrevam no mesmo diário ao mesmo tempo.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_COMPACT = object()
+_STOP = object()
+
+
+class RankingJournal:
+    """Diário de variações do ranking com um único escritor."""
+
+    def __init__(self, data_dir, name='ranking', compact_every=200, legacy_file=None):
+        self.data_dir = data_dir
+        self.snapshot_file = os.path.join(data_dir, f'{name}.snapshot.json')
+        self.journal_file = os.path.join(data_dir, f'{name}.journal')
+        self.lock_file = os.path.join(data_dir, f'{name}.lock')
+        # Ranking no formato antigo (dicionário completo), importado se não houver snapshot
+        self.legacy_file = legacy_file
+        self.compact_every = max(1, int(compact_every))
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock_handle = None
+        self._journal = None
+        self._seq = 0
+        self._entries_since_compact = 0
+        self.writable = False
+
+    # Leitura
+
+    def _read_snapshot(self):
+        """Retorna (sequência, ranking) do snapshot, ou do arquivo antigo se não houver snapshot."""
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            return snapshot.get('seq', 0), snapshot.get('ranking', {})
+        if self.legacy_file and os.path.exists(self.legacy_file):
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                return 0, json.load(f)
+        return 0, {}
+
+    def _replay(self):
+        """
+        Reconstrói o ranking a partir do snapshot e do diário.
+
+        Retorna (ranking, última sequência, entradas no diário, posição do
+        fim da última linha válida).
+        """
+        last_seq, scores = self._read_snapshot()
+        entries = 0
+        valid_end = 0
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Linha incompleta (queda durante a escrita): ignorar o restante
+                        logger.warning("Linha inválida no diário do ranking; ignorando o restante do arquivo")
+                        break
+                    valid_end += len(line)
+                    entries += 1
+                    seq = entry.get('seq', 0)
+                    if seq <= last_seq:
+                        continue  # Já incluída no snapshot
+                    for user, delta in entry.get('deltas', {}).items():
+                        scores[user] = scores.get(user, 0) + delta
+                    last_seq = seq
+        return scores, last_seq, entries, valid_end
+
+    def load(self, read_only=False):
+        """
+        Carrega o ranking e prepara o diário para escrita.
+
+        Se outro processo já for o escritor (ou com read_only=True), o
+        diário é aberto apenas para leitura e append() passa a ser ignorado.
+        Pode ser chamado de novo para reler o ranking gravado pelo escritor.
+        """
+        os.makedirs(self.data_dir, exist_ok=True)
+        if self.writable:
+            return self._replay()[0]
+        self.writable = not read_only and self._acquire_writer_lock()
+        scores, self._seq, self._entries_since_compact, valid_end = self._replay()
+
+        if self.writable:
+            # Descartar uma eventual linha incompleta no fim do diário
+            if os.path.exists(self.journal_file) and os.path.getsize(self.journal_file) > valid_end:
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(valid_end)
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            self._thread = threading.Thread(target=self._writer, name='ranking-journal')
+            self._thread.daemon = True
+            self._thread.start()
+        elif not read_only:
+            logger.warning("Outro processo está escrevendo o ranking; diário aberto somente para leitura")
+
+        logger.info(f"Ranking reconstruído do snapshot + diário ({self._entries_since_compact} entradas)")
+        return scores
+
+    # Escrita
+
+    def _acquire_writer_lock(self):
+        if fcntl is None:
+            return True
+        handle = open(self.lock_file, 'a')
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._lock_handle = handle
+        return True
+
+    def append(self, deltas):
+        """Enfileira as variações de pontuação de uma pergunta."""
+        if not self.writable or not deltas:
+            return
+        self._queue.put(dict(deltas))
+
+    def compact(self):
+        """Pede uma compactação do diário em segundo plano."""
+        if self.writable:
+            self._queue.put(_COMPACT)
+
+    def flush(self, timeout=None):
+        """Aguarda até que todas as escritas pendentes sejam concluídas."""
+        if not self.writable:
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Compacta, encerra a thread de escrita e libera o lock."""
+        if not self.writable:
+            return
+        self._queue.put(_COMPACT)
+        self._queue.put(_STOP)
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        if self._lock_handle:
+            self._lock_handle.close()
+            self._lock_handle = None
+        self.writable = False
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    self._journal.close()
+                    return
+                if item is _COMPACT:
+                    self._compact()
+                elif isinstance(item, threading.Event):
+                    item.set()
+                else:
+                    self._write_entry(item)
+                    if self._entries_since_compact >= self.compact_every:
+                        self._compact()
+            except Exception as e:
+                logger.error(f"Erro na escrita do diário do ranking: {e}")
+
+    def _write_entry(self, deltas):
+        self._seq += 1
+        line = json.dumps({'seq': self._seq, 'ts': time.time(), 'deltas': deltas},
+                          ensure_ascii=False, separators=(',', ':'))
+        self._journal.write(line + '\n')
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._entries_since_compact += 1
+
+    def _compact(self):
+        """Grava um novo snapshot e esvazia o diário."""
+        if self._entries_since_compact == 0 and os.path.exists(self.snapshot_file):
+            return
+        scores, last_seq, _, _ = self._replay()
+
+        temp_file = self.snapshot_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'seq': last_seq, 'ranking': scores}, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.snapshot_file)
+
+        # O snapshot já inclui todas as linhas; se cairmos antes daqui a sequência evita duplicação
+        self._journal.close()
+        self._journal = open(self.journal_file, 'w', encoding='utf-8')
+        self._entries_since_compact = 0
+        logger.info(f"Diário do ranking compactado ({len(scores)} usuários, seq={last_seq})")
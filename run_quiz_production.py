@@ -16,6 +16,8 @@ logger = logging.getLogger(__name__)
 # Constantes
 PORT = 5000
 WORKERS = 4  # Número de workers concorrentes
+# gevent: app.py no gunicorn; asyncio: app_async.py (um processo, milhares de conexões)
+ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'gevent')
 
 def get_local_ip():
     """Obter o endereço IP local da máquina"""
@@ -57,7 +59,8 @@ def install_requirements():
     """Instalar dependências necessárias"""
     try:
         logger.info("Verificando dependências...")
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "gunicorn", "gevent"])
+        packages = ["aiohttp"] if ASYNC_MODE == 'asyncio' else ["gunicorn", "gevent"]
+        subprocess.check_call([sys.executable, "-m", "pip", "install", *packages])
         logger.info("Dependências instaladas com sucesso")
         return True
     except Exception as e:
@@ -73,7 +76,10 @@ def run_gunicorn_server():
         time.sleep(2)
     
     # Preparar comando gunicorn
-    if sys.platform == 'win32':
+    if ASYNC_MODE == 'asyncio':
+        # Servidor asyncio (aiohttp): um único processo, sem gunicorn
+        cmd = [sys.executable, "app_async.py"]
+    elif sys.platform == 'win32':
         # Windows não suporta gunicorn nativamente, então usamos o waitress
         cmd = [
             sys.executable, "-m", "waitress", 
@@ -99,7 +105,8 @@ def run_gunicorn_server():
     # Variáveis de ambiente
     env = os.environ.copy()
     env["QUIZ_MODE"] = "production"
-    env["SOCKETIO_ASYNC_MODE"] = "gevent"
+    env["SOCKETIO_ASYNC_MODE"] = ASYNC_MODE
+    env["PORT"] = str(PORT)
     env["PYTHONUNBUFFERED"] = "1"
     
     # Iniciar o servidor
@@ -0,0 +1,306 @@
+"""
+Backends de estado compartilhado entre processos (workers).
+
+Todos os backends oferecem a mesma interface:
+
+- get(key), set(key, value, ttl=None), delete(key);
+- acquire_lease(name, owner, ttl) / release_lease(name, owner): lease com
+  expiração usado na eleição do líder;
+- publish(channel, message) / subscribe(channels, callback): pub/sub, com
+  callback(channel, message) chamado em uma thread do backend.
+
+Backends:
+- 'local' (padrão): em memória, um único processo;
+- 'tcp://host:porta': o broker local de state_broker.py (testes offline);
+- 'redis://...': Redis (requer o pacote redis).
+
+BrokerClientManager usa o broker local como fila de mensagens do Socket.IO,
+para que um evento emitido em qualquer worker chegue aos sockets de todos.
+"""
+import itertools
+import json
+import queue
+import socket
+import threading
+import time
+import logging
+from urllib.parse import urlparse
+
+import socketio
+
+try:
+    import redis
+except ImportError:  # Opcional: apenas para STATE_BACKEND=redis://...
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class LocalStateBackend:
+    """Estado em memória (um único processo)."""
+
+    local = True
+
+    def __init__(self):
+        self._data = {}
+        self._leases = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def acquire_lease(self, name, owner, ttl):
+        with self._lock:
+            now = time.monotonic()
+            current = self._leases.get(name)
+            if current and current[0] != owner and current[1] > now:
+                return False
+            self._leases[name] = (owner, now + ttl)
+            return True
+
+    def release_lease(self, name, owner):
+        with self._lock:
+            current = self._leases.get(name)
+            if current and current[0] == owner:
+                del self._leases[name]
+                return True
+            return False
+
+    def publish(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(channel, message)
+            except Exception as e:
+                logger.error(f"Erro no assinante do canal {channel}: {e}")
+        return len(callbacks)
+
+    def subscribe(self, channels, callback):
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, []).append(callback)
+
+    def close(self):
+        pass
+
+
+class BrokerStateBackend:
+    """Cliente do broker local (state_broker.py)."""
+
+    local = False
+
+    def __init__(self, host, port, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._socket = None
+        self._reader = None
+        self._subscriptions = []  # (canais, callback) para reassinar após reconexão
+        self._closed = False
+
+    # Requisições
+
+    def _connect(self):
+        connection = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection
+
+    def _request(self, op, **fields):
+        fields['op'] = op
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._socket is None:
+                        self._socket = self._connect()
+                        self._reader = self._socket.makefile('rb')
+                    fields['id'] = next(self._ids)
+                    self._socket.sendall((json.dumps(fields, ensure_ascii=False) + '\n').encode('utf-8'))
+                    line = self._reader.readline()
+                    if not line:
+                        raise ConnectionError("Conexão com o broker encerrada")
+                    response = json.loads(line)
+                    break
+                except OSError:
+                    self._reset()
+                    if attempt:
+                        raise
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', 'Erro no broker de estado'))
+        return response.get('value')
+
+    def _reset(self):
+        try:
+            if self._socket:
+                self._socket.close()
+        except OSError:
+            pass
+        self._socket = None
+        self._reader = None
+
+    def get(self, key):
+        return self._request('get', key=key)
+
+    def set(self, key, value, ttl=None):
+        return self._request('set', key=key, value=value, ttl=ttl)
+
+    def delete(self, key):
+        return self._request('delete', key=key)
+
+    def acquire_lease(self, name, owner, ttl):
+        return self._request('lease', name=name, owner=owner, ttl=ttl)
+
+    def release_lease(self, name, owner):
+        return self._request('release', name=name, owner=owner)
+
+    def publish(self, channel, message):
+        return self._request('publish', channel=channel, message=message)
+
+    # Assinaturas: uma conexão dedicada por assinatura, com reconexão
+
+    def subscribe(self, channels, callback):
+        channels = list(channels)
+        self._subscriptions.append((channels, callback))
+        thread = threading.Thread(target=self._listen, args=(channels, callback), name='state-subscriber')
+        thread.daemon = True
+        thread.start()
+
+    def _listen(self, channels, callback):
+        retry_sleep = 0.5
+        while not self._closed:
+            try:
+                connection = socket.create_connection((self.host, self.port), timeout=self.timeout)
+                connection.settimeout(None)
+                connection.sendall((json.dumps({'id': 0, 'op': 'subscribe', 'channels': channels}) + '\n').encode('utf-8'))
+                retry_sleep = 0.5
+                with connection.makefile('rb') as reader:
+                    for line in reader:
+                        payload = json.loads(line)
+                        if 'channel' not in payload:
+                            continue  # Resposta ao subscribe
+                        try:
+                            callback(payload['channel'], payload['message'])
+                        except Exception as e:
+                            logger.error(f"Erro no assinante do canal {payload['channel']}: {e}")
+            except (OSError, ValueError) as e:
+                logger.warning(f"Assinatura no broker interrompida ({e}); reconectando em {retry_sleep}s")
+            if not self._closed:
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 10)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            self._reset()
+
+
+class RedisStateBackend:
+    """Estado compartilhado no Redis (valores serializados em JSON)."""
+
+    local = False
+
+    # Libera o lease apenas se ainda pertencer ao owner
+    _RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+    # Renova o lease do owner ou o adquire se estiver livre
+    _LEASE_SCRIPT = (
+        "local current = redis.call('get', KEYS[1]) "
+        "if current == false or current == ARGV[1] then "
+        "redis.call('set', KEYS[1], ARGV[1], 'PX', ARGV[2]) return 1 end return 0"
+    )
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("O pacote redis não está instalado (pip install redis)")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        return bool(self.client.set(key, json.dumps(value, ensure_ascii=False), px=int(ttl * 1000) if ttl else None))
+
+    def delete(self, key):
+        return bool(self.client.delete(key))
+
+    def acquire_lease(self, name, owner, ttl):
+        return bool(self.client.eval(self._LEASE_SCRIPT, 1, name, owner, int(ttl * 1000)))
+
+    def release_lease(self, name, owner):
+        return bool(self.client.eval(self._RELEASE_SCRIPT, 1, name, owner))
+
+    def publish(self, channel, message):
+        return self.client.publish(channel, json.dumps(message, ensure_ascii=False))
+
+    def subscribe(self, channels, callback):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+
+        def handler(item):
+            callback(item['channel'], json.loads(item['data']))
+
+        pubsub.subscribe(**{channel: handler for channel in channels})
+        pubsub.run_in_thread(sleep_time=0.5, daemon=True)
+
+    def close(self):
+        self.client.close()
+
+
+def parse_tcp_url(url):
+    """Retorna (host, porta) de uma URL tcp://host:porta."""
+    parsed = urlparse(url)
+    return parsed.hostname or '127.0.0.1', parsed.port or 6390
+
+
+def create_state_backend(url=None):
+    """Cria o backend a partir da URL ('local', 'tcp://...' ou 'redis://...')."""
+    if not url or url == 'local':
+        return LocalStateBackend()
+    if url.startswith('tcp://'):
+        return BrokerStateBackend(*parse_tcp_url(url))
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisStateBackend(url)
+    raise ValueError(f"Backend de estado desconhecido: {url}")
+
+
+class BrokerClientManager(socketio.PubSubManager):
+    """Fila de mensagens do Socket.IO sobre o broker local (tcp://host:porta)."""
+
+    name = 'state-broker'
+
+    def __init__(self, url, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.backend = BrokerStateBackend(*parse_tcp_url(url))
+        self._messages = None
+
+    def _publish(self, data):
+        try:
+            self.backend.publish(self.channel, data)
+        except Exception as e:
+            self._get_logger().error(f"Erro ao publicar no broker de estado: {e}")
+
+    def _listen(self):
+        if self._messages is None:
+            self._messages = queue.Queue()
+            self.backend.subscribe([self.channel], lambda channel, message: self._messages.put(message))
+        while True:
+            yield self._messages.get()
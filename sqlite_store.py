@@ -0,0 +1,557 @@
+"""
+Armazenamento opcional em SQLite (biblioteca padrão) para ranking,
+perguntas, configurações e resultados das perguntas.
+
+Ativado com a variável de ambiente QUIZ_STORAGE=sqlite (caminho do banco em
+QUIZ_DB_PATH, padrão data/quiz.db). O banco usa WAL, o que permite vários
+leitores simultâneos enquanto um processo escreve; assim vários workers do
+gunicorn enxergam o mesmo ranking em vez de cada um manter a sua cópia.
+
+- as variações de pontuação de uma pergunta são gravadas em uma única transação;
+- as perguntas são lidas sob demanda (SQLiteQuestionList);
+- o top-N do ranking usa o índice (score DESC, user);
+- uma importação grava as perguntas em lotes em questions_import e as
+  copia para questions em uma única transação no fim (SQLiteQuestionWriter);
+- uma pergunta é editada ou excluída pelo id em uma transação, conferindo a
+  ETag da versão editada (edit_question).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+
+from question_model import QuestionError, compile_question
+from question_store import (FACETS, WRITE_MODES, QuestionConflict, QuestionNotFound, question_etag,
+                            with_id)
+from state_versions import etag_matches
+
+logger = logging.getLogger(__name__)
+
+# Linhas de importações interrompidas (processo encerrado) são apagadas depois deste tempo
+STALE_IMPORT_SECONDS = 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ranking (
+    user TEXT PRIMARY KEY,
+    score INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ranking_score ON ranking (score DESC, user);
+
+CREATE TABLE IF NOT EXISTS questions (
+    position INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_questions_id ON questions (CAST(json_extract(data, '$.id') AS TEXT));
+
+-- Perguntas de uma importação em andamento, copiadas para questions no commit
+CREATE TABLE IF NOT EXISTS questions_import (
+    token TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    PRIMARY KEY (token, seq)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS config (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS session_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question_position INTEGER,
+    correct_answer TEXT,
+    votes TEXT NOT NULL,
+    total_votes INTEGER NOT NULL,
+    correct_votes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_session_results_question ON session_results (question_position);
+"""
+
+
+def storage_backend():
+    """Backend de armazenamento configurado ('json' ou 'sqlite')."""
+    return os.environ.get('QUIZ_STORAGE', 'json').lower()
+
+
+class SQLiteStore:
+    """Acesso ao banco SQLite com uma conexão por thread."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def transaction(self):
+        """Context manager com uma transação de escrita (BEGIN IMMEDIATE)."""
+        return _Transaction(self._connection())
+
+    # Ranking
+
+    def apply_score_deltas(self, deltas):
+        """Soma as variações de pontuação de uma pergunta em uma única transação."""
+        if not deltas:
+            return
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO ranking (user, score, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user) DO UPDATE SET score = score + excluded.score, updated_at = excluded.updated_at",
+                [(user, int(delta), now) for user, delta in deltas.items()]
+            )
+
+    def replace_ranking(self, scores):
+        """Substitui o ranking inteiro (usado na migração)."""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM ranking")
+            conn.executemany(
+                "INSERT INTO ranking (user, score, updated_at) VALUES (?, ?, ?)",
+                [(user, int(score), now) for user, score in scores.items()]
+            )
+
+    def load_ranking(self):
+        """Ranking completo como dicionário usuário -> pontuação."""
+        return dict(self._connection().execute("SELECT user, score FROM ranking"))
+
+    def top_ranking(self, limit=10, offset=0):
+        """Página do ranking como lista de (usuário, pontuação), pelo índice de pontuação."""
+        return self._connection().execute(
+            "SELECT user, score FROM ranking ORDER BY score DESC, user LIMIT ? OFFSET ?",
+            (int(limit), int(offset))
+        ).fetchall()
+
+    def get_score(self, user):
+        """Pontuação do usuário, ou None."""
+        row = self._connection().execute("SELECT score FROM ranking WHERE user = ?", (user,)).fetchone()
+        return row[0] if row else None
+
+    def rank(self, user):
+        """Posição (1-based) do usuário, ou None."""
+        conn = self._connection()
+        row = conn.execute("SELECT score FROM ranking WHERE user = ?", (user,)).fetchone()
+        if row is None:
+            return None
+        above = conn.execute(
+            "SELECT COUNT(*) FROM ranking WHERE score > ? OR (score = ? AND user < ?)",
+            (row[0], row[0], user)
+        ).fetchone()[0]
+        return above + 1
+
+    def ranking_size(self):
+        """Número de usuários no ranking."""
+        return self._connection().execute("SELECT COUNT(*) FROM ranking").fetchone()[0]
+
+    # Perguntas
+
+    def questions_version(self):
+        """Versão das perguntas; muda a cada substituição (em qualquer processo)."""
+        row = self._connection().execute(
+            "SELECT value FROM meta WHERE key = 'questions_version'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def count_questions(self):
+        """Número de perguntas cadastradas."""
+        return self._connection().execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def get_question(self, position):
+        """Pergunta na posição informada (0-based), ou None."""
+        row = self._connection().execute(
+            "SELECT data FROM questions WHERE position = ?", (int(position),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list_questions(self):
+        """Todas as perguntas, na ordem de cadastro."""
+        return [json.loads(row[0]) for row in
+                self._connection().execute("SELECT data FROM questions ORDER BY position")]
+
+    def question_position(self, question_id):
+        """Posição da pergunta com o id (1 e "1" são o mesmo id), ou None."""
+        row = self._connection().execute(
+            "SELECT position FROM questions WHERE CAST(json_extract(data, '$.id') AS TEXT) = ? LIMIT 1",
+            (str(question_id),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_question_by_id(self, question_id):
+        """(posição, pergunta) com o id, ou None."""
+        row = self._connection().execute(
+            "SELECT position, data FROM questions WHERE CAST(json_extract(data, '$.id') AS TEXT) = ? LIMIT 1",
+            (str(question_id),)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def add_question(self, question):
+        """Acrescenta uma pergunta normalizada; retorna (posição, pergunta gravada com o id)."""
+        question = with_id(question)
+        with self.transaction() as conn:
+            if self.question_position(question['id']) is not None:
+                raise QuestionError(self.count_questions(), 'id', f"id {question['id']!r} já existe")
+            position = self.count_questions()
+            conn.execute("INSERT INTO questions (position, data) VALUES (?, ?)",
+                         (position, json.dumps(question, ensure_ascii=False)))
+            self._bump_questions_version(conn)
+        return position, question
+
+    def edit_question(self, question_id, change, if_match=None):
+        """
+        Altera uma pergunta pelo id em uma transação (mesma interface de QuestionStore.edit).
+
+        change(atual, posição) retorna a pergunta nova ou None (excluir; as
+        perguntas seguintes sobem uma posição).
+        """
+        with self.transaction() as conn:
+            found = self.get_question_by_id(question_id)
+            if found is None:
+                raise QuestionNotFound(question_id)
+            position, current = found
+            etag = question_etag(current)
+            if if_match and not etag_matches(if_match, etag):
+                raise QuestionConflict(current, etag)
+            question = change(current, position)
+            if question is None:
+                conn.execute("DELETE FROM questions WHERE position = ?", (position,))
+                # Em dois passos: position é a chave primária e o UPDATE não tem ordem garantida
+                conn.execute("UPDATE questions SET position = -position WHERE position > ?", (position,))
+                conn.execute("UPDATE questions SET position = -position - 1 WHERE position < 0")
+            else:
+                question = dict(question, id=current['id'])
+                conn.execute("UPDATE questions SET data = ? WHERE position = ?",
+                             (json.dumps(question, ensure_ascii=False), position))
+            self._bump_questions_version(conn)
+        return position, question
+
+    def assign_question_ids(self):
+        """Grava um id nas perguntas que não têm (bancos anteriores aos ids estáveis); retorna quantas."""
+        with self.transaction() as conn:
+            rows = conn.execute("SELECT position, data FROM questions WHERE json_extract(data, '$.id') IS NULL").fetchall()
+            if rows:
+                conn.executemany("UPDATE questions SET data = ? WHERE position = ?",
+                                 [(json.dumps(with_id(json.loads(data)), ensure_ascii=False), position)
+                                  for position, data in rows])
+                self._bump_questions_version(conn)
+        if rows:
+            logger.info(f"Ids gerados para {len(rows)} perguntas")
+        return len(rows)
+
+    def _bump_questions_version(self, conn):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('questions_version', 1) "
+            "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+        )
+
+    def page_questions(self, offset=0, limit=50, filters=None):
+        """(total que atende aos filtros, [(posição, pergunta), ...]); filters: campo -> valor (texto)."""
+        where = ' AND '.join(f"CAST(json_extract(data, '$.{field}') AS TEXT) = ?" for field in (filters or {}))
+        where = f' WHERE {where}' if where else ''
+        params = tuple((filters or {}).values())
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM questions{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT position, data FROM questions{where} ORDER BY position LIMIT ? OFFSET ?",
+            params + (int(limit), int(offset))
+        )
+        return total, [(position, json.loads(data)) for position, data in rows]
+
+    def question_facets(self, fields):
+        """Valores de cada campo com o número de perguntas."""
+        conn = self._connection()
+        return {field: dict(conn.execute(
+            f"SELECT CAST(json_extract(data, '$.{field}') AS TEXT) AS value, COUNT(*) FROM questions "
+            f"WHERE value IS NOT NULL AND value != '' GROUP BY value"
+        )) for field in fields}
+
+    def replace_questions(self, questions):
+        """
+        Substitui o banco de perguntas em uma única transação, só com as válidas (normalizadas).
+
+        Retorna a lista de QuestionError das entradas ignoradas.
+        """
+        rows, errors = [], []
+        for index, question in enumerate(questions):
+            try:
+                rows.append((len(rows), json.dumps(compile_question(question, index).to_dict(), ensure_ascii=False)))
+            except QuestionError as e:
+                errors.append(e)
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM questions")
+            conn.executemany("INSERT INTO questions (position, data) VALUES (?, ?)", rows)
+            self._bump_questions_version(conn)
+        if errors:
+            logger.warning(f"{len(errors)} perguntas inválidas ignoradas; primeira: {errors[0]}")
+        return errors
+
+    def question_writer(self, mode='append'):
+        """SQLiteQuestionWriter para gravar perguntas em lotes ('append', 'upsert' ou 'replace')."""
+        return SQLiteQuestionWriter(self, mode)
+
+    # Configurações
+
+    def load_config(self):
+        """Configurações gravadas como dicionário."""
+        return {key: json.loads(value) for key, value in
+                self._connection().execute("SELECT key, value FROM config")}
+
+    def save_config(self, config):
+        """Grava (ou atualiza) as chaves de configuração informadas."""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO config (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in config.items()]
+            )
+
+    # Resultados
+
+    def record_question_result(self, question_position, correct_answer, votes):
+        """Registra a contagem final de uma pergunta (votos no formato {'A': n, ...})."""
+        total_votes = sum(votes.values())
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO session_results (question_position, correct_answer, votes, total_votes, correct_votes, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (question_position, correct_answer, json.dumps(votes), total_votes,
+                 votes.get(correct_answer, 0), time.time())
+            )
+
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')
+        return False
+
+
+class SQLiteQuestionWriter:
+    """
+    Gravação de perguntas em lotes, com a mesma interface de QuestionWriter.
+
+    Os lotes vão para questions_import (transações curtas, que não seguram
+    as gravações do ranking); commit() copia as perguntas para questions em
+    uma única transação, então os leitores veem a importação inteira ou
+    nada. A posição de cada pergunta é decidida em write(): uma pergunta com
+    o id de uma existente (upsert) ocupa a posição dela.
+    """
+
+    def __init__(self, store, mode='append'):
+        if mode not in WRITE_MODES:
+            raise ValueError(f"Modo de gravação inválido: {mode} (use {', '.join(WRITE_MODES)})")
+        self.store = store
+        self.mode = mode
+        self.token = uuid.uuid4().hex
+        self.added = 0
+        self.updated = 0
+        self._started_at = None
+        self._version = None
+        self._count = 0
+        self._seq = 0
+        self._new_ids = {}  # id (texto) -> posição das perguntas novas desta importação
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+    def open(self):
+        self._started_at = time.time()
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM questions_import WHERE started_at < ?",
+                         (self._started_at - STALE_IMPORT_SECONDS,))
+        self._version = self.store.questions_version()
+        self._count = 0 if self.mode == 'replace' else self.store.count_questions()
+
+    def _position_of(self, question_id):
+        position = self._new_ids.get(str(question_id))
+        if position is None and self.mode != 'replace':
+            position = self.store.question_position(question_id)
+        return position
+
+    def write(self, records):
+        """Grava um lote de (número do registro, pergunta normalizada); retorna os QuestionError recusados."""
+        errors = []
+        rows = []
+        for number, question in records:
+            question_id = question.get('id')
+            position = self._position_of(question_id) if question_id is not None else None
+            if position is not None and self.mode == 'append':
+                errors.append(QuestionError(number, 'id', f"id {question_id!r} já existe (use o modo upsert)"))
+                continue
+            if position is None:
+                question = with_id(question)
+                position = self._count
+                self._count += 1
+                self.added += 1
+                self._new_ids[str(question['id'])] = position
+            else:
+                self.updated += 1
+            rows.append((self.token, self._seq, position, json.dumps(question, ensure_ascii=False), self._started_at))
+            self._seq += 1
+        if rows:
+            with self.store.transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO questions_import (token, seq, position, data, started_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+        return errors
+
+    def commit(self):
+        """Copia as perguntas para o banco em uma única transação."""
+        try:
+            with self.store.transaction() as conn:
+                if self.store.questions_version() != self._version:
+                    raise RuntimeError("As perguntas foram alteradas durante a importação; importe novamente")
+                if self.mode == 'replace':
+                    conn.execute("DELETE FROM questions")
+                # Em seq crescente: a última versão de uma pergunta repetida prevalece
+                conn.execute(
+                    "INSERT OR REPLACE INTO questions (position, data) "
+                    "SELECT position, data FROM questions_import WHERE token = ? ORDER BY seq",
+                    (self.token,)
+                )
+                self.store._bump_questions_version(conn)
+        finally:
+            self.abort()
+
+    def abort(self):
+        """Descarta os lotes gravados."""
+        with self.store.transaction() as conn:
+            conn.execute("DELETE FROM questions_import WHERE token = ?", (self.token,))
+
+
+class SQLiteQuestionList:
+    """
+    Sequência das perguntas, lida sob demanda do banco.
+
+    Substitui a lista global `questions` nos apps: len() e questions[i]
+    consultam o banco, com um pequeno cache LRU das últimas perguntas. A
+    versão das perguntas é conferida no máximo uma vez por refresh_interval
+    para perceber substituições feitas por outros processos.
+    """
+
+    def __init__(self, store, cache_size=64, refresh_interval=1.0):
+        self.store = store
+        self.cache_size = cache_size
+        self.refresh_interval = refresh_interval
+        self._cache = OrderedDict()
+        self._count = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Descarta o cache (após substituir as perguntas neste processo)."""
+        with self._lock:
+            self._checked_at = 0.0
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        version = self.store.questions_version()
+        if version != self._version:
+            self._cache.clear()
+            self._count = None
+            self._version = version
+
+    def __len__(self):
+        with self._lock:
+            self._check_version()
+            if self._count is None:
+                self._count = self.store.count_questions()
+            return self._count
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        with self._lock:
+            self._check_version()
+            if index in self._cache:
+                self._cache.move_to_end(index)
+                return self._cache[index]
+        question = self.store.get_question(index)
+        if question is None:
+            raise IndexError("Índice de pergunta fora do intervalo")
+        with self._lock:
+            self._cache[index] = question
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return question
+
+    def __iter__(self):
+        return iter(self.store.list_questions())
+
+    def tolist(self):
+        """Todas as perguntas como lista (para exportação)."""
+        return self.store.list_questions()
+
+    def page(self, offset=0, limit=50, filters=None):
+        return self.store.page_questions(offset, limit, filters)
+
+    def facets(self):
+        return self.store.question_facets(FACETS)
+
+    def writer(self, mode='append'):
+        return self.store.question_writer(mode)
+
+    def get(self, question_id):
+        return self.store.get_question_by_id(question_id)
+
+    def position_of(self, question_id):
+        return self.store.question_position(question_id)
+
+    def add(self, question):
+        return self.store.add_question(question)
+
+    def edit(self, question_id, change, if_match=None):
+        return self.store.edit_question(question_id, change, if_match)
+
+    def assign_ids(self):
+        return self.store.assign_question_ids()
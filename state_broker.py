@@ -0,0 +1,198 @@
+"""
+Servidor local de estado compartilhado e pub/sub (substituto leve do Redis).
+
+Permite testar offline vários workers servindo o mesmo quiz: os workers se
+conectam a este servidor (STATE_BACKEND=tcp://host:porta) para guardar
+chaves, disputar a liderança (lease com expiração) e trocar mensagens
+(pub/sub). O mesmo servidor também pode ser a fila de mensagens do
+Socket.IO (SOCKETIO_MESSAGE_QUEUE=tcp://host:porta).
+
+Protocolo: uma requisição JSON por linha, com resposta JSON por linha:
+
+    {"id": 1, "op": "set", "key": "k", "value": 1, "ttl": 5}
+    {"id": 1, "ok": true, "value": true}
+
+Depois de {"op": "subscribe", "channels": [...]} a conexão passa a receber
+as mensagens publicadas: {"channel": "c", "message": ...}.
+
+Uso:
+    python state_broker.py [host] [porta]
+"""
+import json
+import socketserver
+import sys
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 6390
+
+
+class StateStore:
+    """Chaves com expiração opcional, leases e assinantes por canal."""
+
+    def __init__(self):
+        self._data = {}  # chave -> (valor, expira_em ou None)
+        self._subscribers = {}  # canal -> conjunto de conexões
+        self._lock = threading.Lock()
+
+    def _get(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del self._data[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key, time.monotonic())
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            expires_at = time.monotonic() + ttl if ttl else None
+            self._data[key] = (value, expires_at)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def lease(self, name, owner, ttl):
+        """Adquire ou renova o lease se estiver livre, expirado ou já for do owner."""
+        with self._lock:
+            now = time.monotonic()
+            current = self._get(name, now)
+            if current is not None and current != owner:
+                return False
+            self._data[name] = (owner, now + ttl)
+            return True
+
+    def release(self, name, owner):
+        with self._lock:
+            if self._get(name, time.monotonic()) == owner:
+                del self._data[name]
+                return True
+            return False
+
+    def subscribe(self, connection, channels):
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(connection)
+
+    def unsubscribe_all(self, connection):
+        with self._lock:
+            for subscribers in self._subscribers.values():
+                subscribers.discard(connection)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        line = _encode({'channel': channel, 'message': message})
+        delivered = 0
+        for connection in subscribers:
+            if connection.send_line(line):
+                delivered += 1
+        return delivered
+
+
+def _encode(payload):
+    return (json.dumps(payload, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+class _ConnectionHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self._send_lock = threading.Lock()
+        self._alive = True
+
+    def send_line(self, line):
+        if not self._alive:
+            return False
+        try:
+            with self._send_lock:
+                self.wfile.write(line)
+                self.wfile.flush()
+            return True
+        except OSError:
+            self._alive = False
+            return False
+
+    def handle(self):
+        store = self.server.store
+        try:
+            for raw in self.rfile:
+                try:
+                    request = json.loads(raw)
+                    response = {'id': request.get('id'), 'ok': True,
+                                'value': self._execute(store, request)}
+                except Exception as e:
+                    response = {'id': None, 'ok': False, 'error': str(e)}
+                self.send_line(_encode(response))
+        except OSError:
+            pass
+        finally:
+            self._alive = False
+            store.unsubscribe_all(self)
+
+    def _execute(self, store, request):
+        op = request.get('op')
+        if op == 'get':
+            return store.get(request['key'])
+        if op == 'set':
+            return store.set(request['key'], request.get('value'), request.get('ttl'))
+        if op == 'delete':
+            return store.delete(request['key'])
+        if op == 'lease':
+            return store.lease(request['name'], request['owner'], float(request['ttl']))
+        if op == 'release':
+            return store.release(request['name'], request['owner'])
+        if op == 'publish':
+            return store.publish(request['channel'], request.get('message'))
+        if op == 'subscribe':
+            store.subscribe(self, request.get('channels', []))
+            return True
+        if op == 'ping':
+            return 'pong'
+        raise ValueError(f"Operação desconhecida: {op}")
+
+
+class StateBrokerServer(socketserver.ThreadingTCPServer):
+    """Servidor TCP do broker (uma thread por conexão de worker)."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        super().__init__((host, port), _ConnectionHandler)
+        self.store = StateStore()
+
+    def start_background(self):
+        """Roda o servidor em uma thread daemon (útil em testes) e retorna a thread."""
+        thread = threading.Thread(target=self.serve_forever, name='state-broker')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    host = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_HOST
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT
+    server = StateBrokerServer(host, port)
+    logger.info(f"Broker de estado ouvindo em tcp://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Broker encerrado")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
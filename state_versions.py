@@ -0,0 +1,178 @@
+"""
+Versões do estado do quiz para respostas HTTP condicionais (ETag / 304).
+
+Cada parte do estado (fase, pergunta, contagem de votos, chat e ranking)
+guarda a versão global em que mudou pela última vez; a versão global só
+cresce. A ETag de uma rota é formada pela época do processo e pela maior
+versão das partes que a resposta usa, então ela só muda quando o conteúdo
+muda e nunca se repete após um reinício (época nova).
+
+O corpo JSON de cada rota é serializado uma única vez por versão e servido
+aos demais pollings; com If-None-Match igual à ETag a rota responde 304
+sem corpo, o que permite um micro-cache (nginx, CDN) na frente do Python.
+
+A versão global também serve de cursor para /api/quiz/state?since=...: o
+cliente recebe apenas as partes que mudaram depois do cursor que enviou.
+"""
+import collections
+import itertools
+import os
+import threading
+import time
+
+from question_model import dumps
+
+PIECES = ('phase', 'question', 'tally', 'chat', 'ranking')
+
+_epochs = itertools.count(1)
+
+
+def new_epoch():
+    return f'{os.getpid():x}{int(time.time()):x}.{next(_epochs)}'
+
+
+def stable_phase(phase):
+    """
+    Fase sem os campos que mudam a cada leitura.
+
+    server_time e o tempo restante de uma fase em andamento mudariam o corpo
+    a cada polling; os clientes calculam o tempo a partir do prazo (deadline).
+    Na pausa o tempo restante fica congelado e é mantido.
+    """
+    return {
+        'phase': phase.get('phase'),
+        'paused': phase.get('paused'),
+        'deadline': phase.get('deadline'),
+        'remaining': phase.get('remaining') if phase.get('paused') else None
+    }
+
+
+def etag_of(versions, pieces):
+    """ETag das partes indicadas em uma fotografia de StateVersions.snapshot()."""
+    return f'"{versions["epoch"]}-{max(versions["pieces"][piece] for piece in pieces)}"'
+
+
+def cursor_of(versions):
+    """Cursor enviado aos clientes: época e versão global."""
+    return f'{versions["epoch"]}-{versions["version"]}'
+
+
+def parse_cursor(cursor, versions):
+    """Versão de um cursor desta época; None se ausente, inválido ou de outro processo."""
+    if not cursor:
+        return None
+    epoch, _, version = cursor.rpartition('-')
+    if epoch != versions['epoch']:
+        return None
+    try:
+        return int(version)
+    except ValueError:
+        return None
+
+
+def pieces_changed(versions, since):
+    """Partes que mudaram depois da versão since (todas se since for None)."""
+    return {piece for piece, version in versions['pieces'].items() if since is None or version > since}
+
+
+def etag_matches(if_none_match, etag):
+    """True se o cabeçalho If-None-Match contém a ETag (comparação fraca, aceita '*')."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Proxies que comprimem a resposta costumam marcar a ETag como fraca (W/)
+    tags = (tag.strip() for tag in if_none_match.split(','))
+    return etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+class StateVersions:
+    """
+    Versões das partes do estado e cache dos corpos serializados por versão.
+
+    bump() pode ser chamado de qualquer thread. Os workers que servem o
+    estado de outro processo passam a fotografia das versões dele para
+    cached() (as ETags ficam iguais em todos os workers).
+    """
+
+    def __init__(self, cache_size=128):
+        self.cache_size = cache_size
+        self.on_change = None  # Chamada após cada bump (ex.: acordar esperas de um event loop)
+        self.epoch = new_epoch()
+        self.version = 0
+        self._changed = dict.fromkeys(PIECES, 0)
+        self._bodies = collections.OrderedDict()  # chave -> (etag, corpo, status)
+        self._lock = threading.Lock()
+        self._changed_condition = threading.Condition(self._lock)
+
+        # Contadores
+        self.builds = 0
+        self.hits = 0
+
+    def bump(self, *pieces):
+        """Registra a mudança das partes indicadas; retorna a nova versão global."""
+        with self._lock:
+            self.version += 1
+            for piece in pieces:
+                self._changed[piece] = self.version
+            self._changed_condition.notify_all()
+            version = self.version
+        if self.on_change:
+            self.on_change()
+        return version
+
+    def wait(self, version, timeout):
+        """Espera a versão global passar de version (long-poll); retorna False no timeout."""
+        with self._lock:
+            return self._changed_condition.wait_for(lambda: self.version > version, timeout)
+
+    def renew(self):
+        """Nova época (este processo passou a produzir o estado)."""
+        with self._lock:
+            self.epoch = new_epoch()
+            self.version += 1
+            self._changed = dict.fromkeys(PIECES, self.version)
+            self._changed_condition.notify_all()
+
+    def snapshot(self):
+        with self._lock:
+            return {'epoch': self.epoch, 'version': self.version, 'pieces': dict(self._changed)}
+
+    def cached(self, key, pieces, build, versions=None):
+        """
+        (etag, corpo, status) da rota identificada por key.
+
+        build() retorna (dados, status) e só é chamado quando alguma das
+        partes mudou desde a última serialização. As versões (as deste
+        objeto ou a fotografia versions) são lidas antes de build(), então o
+        corpo guardado nunca é mais antigo que a ETag.
+        """
+        etag = etag_of(versions or self.snapshot(), pieces)
+        with self._lock:
+            entry = self._bodies.get(key)
+            if entry and entry[0] == etag:
+                self._bodies.move_to_end(key)
+                self.hits += 1
+                return entry
+        data, status = build()
+        entry = (etag, dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), status)
+        if status >= 500:
+            return entry  # Erros não são guardados: a próxima leitura tenta de novo
+        with self._lock:
+            self._bodies[key] = entry
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.cache_size:
+                self._bodies.popitem(last=False)
+            self.builds += 1
+        return entry
+
+    def stats(self):
+        with self._lock:
+            return {
+                'epoch': self.epoch,
+                'version': self.version,
+                'pieces': dict(self._changed),
+                'cached_bodies': len(self._bodies),
+                'builds': self.builds,
+                'hits': self.hits
+            }
@@ -30,9 +30,16 @@ document.addEventListener('DOMContentLoaded', function() {
     const jsonImport = document.getElementById('jsonImport');
     const fileImport = document.getElementById('fileImport');
     const closeBtns = document.querySelectorAll('.close');
+    const questionSearch = document.getElementById('questionSearch');
+    const questionCategory = document.getElementById('questionCategory');
+    const questionNeverAsked = document.getElementById('questionNeverAsked');
 
     // Variáveis globais
-    let questions = [];
+    let questions = [];  // Perguntas da página carregada (cada uma com a sua position no banco)
+    const QUESTIONS_PAGE_SIZE = 20;
+    let questionsOffset = 0;
+    let questionsTotal = 0;
+    let searchTimer = null;
 
     // Carregar configurações
     function loadConfig() {
@@ -72,21 +79,26 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    // Carregar perguntas
-    function loadQuestions() {
-        // Verificar se o elemento questionsList existe
-        if (questionsList) {
-            questionsList.innerHTML = '<div class="loading">Carregando perguntas...</div>';
+    // Carregar uma página de perguntas (o banco pode ter centenas de milhares)
+    function loadQuestions(offset = questionsOffset) {
+        // Sem a lista na página não há o que baixar
+        if (!questionsList) {
+            return;
         }
+        questionsList.innerHTML = '<div class="loading">Carregando perguntas...</div>';
         
-        fetch('/api/questions')
+        fetch(questionsUrl(offset))
             .then(response => response.json())
             .then(data => {
-                questions = data;
-                // Só renderizar as perguntas se o elemento questionsList existir
-                if (questionsList) {
-                    renderQuestions();
+                questions = data.questions;
+                questionsOffset = data.offset;
+                questionsTotal = data.total;
+                // A página ficou vazia (perguntas excluídas): voltar para a anterior
+                if (questions.length === 0 && questionsOffset > 0) {
+                    loadQuestions(Math.max(0, questionsOffset - QUESTIONS_PAGE_SIZE));
+                    return;
                 }
+                renderQuestions();
             })
             .catch(error => {
                 console.error('Erro ao carregar perguntas:', error);
@@ -97,6 +109,45 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // Listagem simples ou busca (palavras, categoria, nunca perguntadas), ordenada por relevância
+    function questionsUrl(offset) {
+        const params = new URLSearchParams({ offset: offset, limit: QUESTIONS_PAGE_SIZE });
+        const query = questionSearch ? questionSearch.value : '';
+        const category = questionCategory ? questionCategory.value : '';
+        const neverAsked = questionNeverAsked && questionNeverAsked.checked;
+        if (!query.trim() && !category && !neverAsked) {
+            return `/api/questions?${params}`;
+        }
+        params.set('q', query);
+        if (category) params.set('category', category);
+        if (neverAsked) params.set('never_asked', '1');
+        return `/api/questions/search?${params}`;
+    }
+
+    // Buscar enquanto a pessoa digita (espera uma pausa na digitação)
+    function scheduleSearch() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => loadQuestions(0), 250);
+    }
+
+    // Categorias do banco no filtro da busca
+    function loadCategories() {
+        if (!questionCategory) {
+            return;
+        }
+        fetch('/api/questions/facets')
+            .then(response => response.json())
+            .then(data => {
+                Object.keys((data.facets || {}).category || {}).sort().forEach(category => {
+                    const option = document.createElement('option');
+                    option.value = category;
+                    option.textContent = category;
+                    questionCategory.appendChild(option);
+                });
+            })
+            .catch(error => console.error('Erro ao carregar categorias:', error));
+    }
+
     // Renderizar lista de perguntas
     function renderQuestions() {
         // Verificar se o elemento questionsList existe
@@ -106,14 +157,17 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         if (questions.length === 0) {
-            questionsList.innerHTML = '<div class="empty-list">Nenhuma pergunta cadastrada. Clique em "Adicionar Pergunta" para começar.</div>';
+            const searching = questionsUrl(0).startsWith('/api/questions/search');
+            questionsList.innerHTML = searching
+                ? '<div class="empty-list">Nenhuma pergunta encontrada.</div>'
+                : '<div class="empty-list">Nenhuma pergunta cadastrada. Clique em "Adicionar Pergunta" para começar.</div>';
             return;
         }
 
         let html = '';
         questions.forEach((question, index) => {
             const options = question.options;
-            const correctOptionIndex = question.correct_answer;
+            const correctOptionIndex = question.correct !== undefined ? question.correct : question.correct_answer;
             const correctOptionLetter = ['A', 'B', 'C', 'D'][correctOptionIndex];
             
             html += `
@@ -122,7 +176,7 @@ document.addEventListener('DOMContentLoaded', function() {
                         <button class="edit" title="Editar"><i class="fas fa-edit"></i></button>
                         <button class="delete" title="Excluir"><i class="fas fa-trash"></i></button>
                     </div>
-                    <h3>${index + 1}. ${question.question}</h3>
+                    <h3>${question.position + 1}. ${question.question}</h3>
                     <div class="question-options">
                         <div class="question-option ${correctOptionIndex === 0 ? 'correct' : ''}">
                             <strong>A:</strong> ${options[0]}
@@ -144,8 +198,25 @@ document.addEventListener('DOMContentLoaded', function() {
             `;
         });
 
+        // Paginação
+        const lastShown = Math.min(questionsOffset + questions.length, questionsTotal);
+        html += `
+            <div class="questions-pagination">
+                <button class="btn page-prev" ${questionsOffset === 0 ? 'disabled' : ''}><i class="fas fa-chevron-left"></i></button>
+                <span>${questionsOffset + 1}–${lastShown} de ${questionsTotal}</span>
+                <button class="btn page-next" ${lastShown >= questionsTotal ? 'disabled' : ''}><i class="fas fa-chevron-right"></i></button>
+            </div>
+        `;
+
         questionsList.innerHTML = html;
 
+        questionsList.querySelector('.page-prev').addEventListener('click', () => {
+            loadQuestions(Math.max(0, questionsOffset - QUESTIONS_PAGE_SIZE));
+        });
+        questionsList.querySelector('.page-next').addEventListener('click', () => {
+            loadQuestions(questionsOffset + QUESTIONS_PAGE_SIZE);
+        });
+
         // Adicionar event listeners para botões de editar e excluir
         questionsList.querySelectorAll('.edit').forEach(btn => {
             btn.addEventListener('click', function() {
@@ -251,17 +322,18 @@ document.addEventListener('DOMContentLoaded', function() {
         optionA.value = question.options[0];
         optionB.value = question.options[1];
         optionC.value = question.options[2];
-        optionD.value = question.options[3];
-        correctAnswer.value = question.correct_answer;
+        optionD.value = question.options[3] || '';
+        correctAnswer.value = question.correct !== undefined ? question.correct : question.correct_answer;
         explanation.value = question.explanation;
         
         questionModal.style.display = 'block';
     }
 
-    // Excluir pergunta
+    // Excluir pergunta (pelo id; If-Match: só se ninguém a alterou desde que a página foi carregada)
     function deleteQuestion(index) {
-        questions.splice(index, 1);
-        saveQuestions();
+        const question = questions[index];
+        sendQuestion(`/api/questions/${encodeURIComponent(question.id)}`, 'DELETE', question.etag, null,
+                     'Pergunta excluída!');
     }
 
     // Salvar pergunta (nova ou editada)
@@ -277,59 +349,54 @@ document.addEventListener('DOMContentLoaded', function() {
                 optionC.value,
                 optionD.value
             ],
-            correct_answer: parseInt(correctAnswer.value),
+            correct: parseInt(correctAnswer.value),
             explanation: explanation.value
         };
 
         if (index === -1) {
             // Nova pergunta
-            questions.push(question);
+            sendQuestion('/api/questions', 'POST', null, question, 'Pergunta adicionada!');
         } else {
-            // Editar pergunta existente
-            questions[index] = question;
+            // Editar pergunta existente: só os campos do formulário
+            const current = questions[index];
+            sendQuestion(`/api/questions/${encodeURIComponent(current.id)}`, 'PATCH', current.etag, question,
+                         'Pergunta salva com sucesso!');
         }
 
-        saveQuestions();
         questionModal.style.display = 'none';
     }
 
-    // Salvar todas as perguntas no servidor
-    function saveQuestions() {
-        fetch('/api/questions', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ questions: questions })
+    // Enviar uma pergunta ao servidor; 412: outra pessoa a alterou, a página é recarregada com a versão atual
+    function sendQuestion(url, method, etag, body, successMessage) {
+        const headers = { 'Content-Type': 'application/json' };
+        if (etag) {
+            headers['If-Match'] = etag;
+        }
+        fetch(url, {
+            method: method,
+            headers: headers,
+            body: body ? JSON.stringify(body) : undefined
         })
-        .then(response => response.json())
-        .then(data => {
+        .then(response => response.json().then(data => ({ status: response.status, data: data })))
+        .then(({ status, data }) => {
             if (data.success) {
-                showNotification('Perguntas salvas com sucesso!', 'success');
-                renderQuestions();
+                showNotification(successMessage, 'success');
+            } else if (status === 412) {
+                showNotification('A pergunta foi alterada por outra pessoa. A lista foi recarregada; confira e tente novamente.', 'error');
             } else {
-                showNotification('Erro ao salvar perguntas', 'error');
+                showNotification('Erro ao salvar pergunta: ' + (data.message || 'Erro desconhecido'), 'error');
             }
+            loadQuestions();
         })
         .catch(error => {
-            console.error('Erro ao salvar perguntas:', error);
-            showNotification('Erro ao salvar perguntas', 'error');
+            console.error('Erro ao salvar pergunta:', error);
+            showNotification('Erro ao salvar pergunta', 'error');
         });
     }
 
-    // Exportar perguntas como JSON
+    // Exportar perguntas como JSON (o navegador baixa o arquivo direto do servidor, em stream)
     function exportQuestions() {
-        const jsonData = JSON.stringify(questions, null, 2);
-        const blob = new Blob([jsonData], { type: 'application/json' });
-        const url = URL.createObjectURL(blob);
-        
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = 'quiz-perguntas.json';
-        document.body.appendChild(a);
-        a.click();
-        document.body.removeChild(a);
-        URL.revokeObjectURL(url);
+        window.location.href = '/api/questions?download=1';
     }
 
     // Abrir modal de importação
@@ -338,47 +405,38 @@ document.addEventListener('DOMContentLoaded', function() {
         importModal.style.display = 'block';
     }
 
-    // Importar perguntas do JSON
+    // Importar perguntas do JSON (lista ou uma pergunta por linha): o servidor valida cada pergunta
     function importQuestions() {
-        try {
-            const jsonData = jsonImport.value.trim();
-            if (!jsonData) {
-                showNotification('Por favor, insira um JSON válido', 'error');
-                return;
-            }
-            
-            const importedQuestions = JSON.parse(jsonData);
-            
-            // Validar formato das perguntas
-            if (!Array.isArray(importedQuestions)) {
-                throw new Error('O JSON deve ser um array de perguntas');
-            }
-            
-            importedQuestions.forEach(q => {
-                if (!q.question || !Array.isArray(q.options) || q.options.length !== 4 || 
-                    typeof q.correct_answer !== 'number' || !q.explanation) {
-                    throw new Error('Formato de pergunta inválido');
+        const jsonData = jsonImport.value.trim();
+        if (!jsonData) {
+            showNotification('Por favor, insira um JSON válido', 'error');
+            return;
+        }
+        
+        // Confirmar substituição ou adição (perguntas com o id de uma existente a substituem)
+        const action = confirm('Deseja substituir todas as perguntas existentes? Clique em OK para substituir ou Cancelar para adicionar às perguntas existentes.');
+        
+        fetch(`/api/questions/import?mode=${action ? 'replace' : 'upsert'}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: jsonData
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    throw new Error(data.message || 'Erro desconhecido');
                 }
+                const errors = (data.errors || []).slice(0, 5).map(error => error.message);
+                showNotification([`Importação concluída: ${data.message}.`, ...errors].join('\n'));
+                importModal.style.display = 'none';
+                loadQuestions();
+            })
+            .catch(error => {
+                console.error('Erro ao importar perguntas:', error);
+                showNotification('Erro ao importar: ' + error.message, 'error');
             });
-            
-            // Confirmar substituição ou adição
-            const action = confirm('Deseja substituir todas as perguntas existentes? Clique em OK para substituir ou Cancelar para adicionar às perguntas existentes.');
-            
-            if (action) {
-                // Substituir
-                questions = importedQuestions;
-            } else {
-                // Adicionar
-                questions = questions.concat(importedQuestions);
-            }
-            
-            saveQuestions();
-            importModal.style.display = 'none';
-            
-        } catch (error) {
-            console.error('Erro ao importar perguntas:', error);
-            showNotification('Erro ao importar: ' + error.message, 'error');
-        }
     }
 
     // Importar de arquivo
@@ -409,6 +467,9 @@ document.addEventListener('DOMContentLoaded', function() {
     if (btnConfirmImport) btnConfirmImport.addEventListener('click', importQuestions);
     if (btnCancelImport) btnCancelImport.addEventListener('click', () => importModal.style.display = 'none');
     if (fileImport) fileImport.addEventListener('change', handleFileImport);
+    if (questionSearch) questionSearch.addEventListener('input', scheduleSearch);
+    if (questionCategory) questionCategory.addEventListener('change', () => loadQuestions(0));
+    if (questionNeverAsked) questionNeverAsked.addEventListener('change', () => loadQuestions(0));
     
     // Event listeners para os presets de cores
     if (colorPresets && colorPresets.length > 0) {
@@ -456,5 +517,6 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Inicialização
     loadConfig();
+    loadCategories();
     loadQuestions();
 });
@@ -20,6 +20,9 @@ document.addEventListener('DOMContentLoaded', function() {
     let countdownInterval = null;
     let currentTime = 0;
     let pollInterval = null;
+    let eventSource = null;
+    let chatLog = [];  // Últimas mensagens recebidas pelo stream
+    let rankingData = {};
     
     // Inicializar
     init();
@@ -30,8 +33,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Verificar status do quiz
         checkQuizStatus();
         
-        // Configurar polling para atualizações
-        setupPolling();
+        // Receber atualizações pelo stream SSE (polling se ele não estiver disponível)
+        setupEventStream();
         
         // Carregar ranking inicial
         loadRanking();
@@ -64,6 +67,95 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Stream SSE: uma conexão com as fases, votos, chat e ranking no lugar das quatro
+    // requisições de polling (o navegador reconecta e retoma pelo Last-Event-ID)
+    function setupEventStream() {
+        if (!window.EventSource) {
+            setupPolling();
+            return;
+        }
+        
+        let errors = 0;
+        eventSource = new EventSource('/api/quiz/stream');
+        
+        function on(event, handler) {
+            eventSource.addEventListener(event, function(e) {
+                errors = 0;
+                handler(JSON.parse(e.data));
+            });
+        }
+        
+        on('snapshot', function(data) {
+            quizRunning = data.quiz_running;
+            updateUI();
+            if (data.question && data.phase.phase === 'question') {
+                showQuestion(questionView(data, data.phase.remaining));
+            }
+            updateVotes(data.votes);
+            chatLog = [];
+            appendChat(data.chat);
+            rankingData = {};
+            (data.ranking || []).forEach(item => { rankingData[item.name] = item.score; });
+            updateRanking(rankingData);
+        });
+        
+        on('next_question', function(data) {
+            quizRunning = true;
+            updateUI();
+            showQuestion(questionView(data, data.answer_time));
+        });
+        
+        on('show_results', function(data) {
+            updateVotes(data.votes);
+        });
+        
+        on('quiz_phase', function(data) {
+            quizRunning = data.phase !== 'idle';
+            updateUI();
+        });
+        
+        on('update_votes', function(data) {
+            updateVotes(data.votes);
+        });
+        
+        on('chat_message', function(data) {
+            appendChat([data]);
+        });
+        
+        on('ranking_update', function(data) {
+            rankingData = {};
+            (data.ranking || []).forEach(item => { rankingData[item.name] = item.score; });
+            updateRanking(rankingData);
+        });
+        
+        eventSource.onerror = function() {
+            errors++;
+            if (eventSource.readyState === EventSource.CLOSED || errors > 5) {
+                console.log('Stream de eventos indisponível. Usando polling.');
+                eventSource.close();
+                eventSource = null;
+                setupPolling();
+            }
+        };
+    }
+    
+    // Dados da pergunta no formato usado por showQuestion
+    function questionView(data, time) {
+        const options = data.question.options || [];
+        return {
+            question_num: data.question_num,
+            question: data.question.question,
+            options: Array.isArray(options) ? {A: options[0], B: options[1], C: options[2], D: options[3]} : options,
+            answer_time: Math.ceil(time || 0)
+        };
+    }
+    
+    // Acrescentar mensagens ao chat (mantém as 50 últimas)
+    function appendChat(messages) {
+        chatLog = chatLog.concat(messages || []).slice(-50);
+        updateChat(chatLog);
+    }
+    
     // Configurar polling para atualizações periódicas
     function setupPolling() {
         // Polling a cada 2 segundos
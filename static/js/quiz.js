@@ -28,6 +28,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Variáveis globais
     let socket = null;
+    // Sala de quiz (?room=<id>); sem parâmetro, o cliente acompanha o quiz padrão
+    const quizRoomId = new URLSearchParams(window.location.search).get('room');
     let quizRunning = false;
     let fallbackErrorCount = 0;
     let serverHealthy = true;
@@ -74,7 +76,15 @@ document.addEventListener('DOMContentLoaded', function() {
     let socketConnected = false;
     let usingFallback = false;
     let lastChatTimestamp = 0;
+    let lastChatSeq = 0; // Sequência da última mensagem recebida (busca O(1) no servidor)
     let fallbackPollingInterval = null;
+    let stateVersion = null; // Cursor do último estado recebido de /api/quiz/state
+    let stateHandlers = null; // Handlers dos eventos do quiz usados pelo polling do estado
+    let statePollGeneration = 0;
+    const STATE_POLL_WAIT = 25; // Segundos que o servidor segura a requisição sem novidades
+    const STATE_POLL_DELAY = 250; // Intervalo mínimo entre requisições (ms)
+    let eventSource = null; // Stream SSE usado quando o WebSocket não está disponível
+    let eventStreamErrors = 0;
     let reconnectAttempts = 0;
     const MAX_RECONNECT_ATTEMPTS = 3;
 
@@ -261,8 +271,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Adicionar notificação de fallback
         addFallbackNotice();
         
-        // Iniciar polling para atualizações
-        startFallbackPolling();
+        // Receber as atualizações pelo stream SSE (ou por polling, se ele não estiver disponível)
+        startEventStream();
         
         // Adicionar mensagem de sistema no chat
         addSystemMessage('Modo de compatibilidade ativado. Usando requisições HTTP.');
@@ -297,9 +307,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 if (usingFallback) {
                     usingFallback = false;
                     
-                    // Parar polling HTTP
+                    // Parar stream SSE e polling HTTP
+                    stopEventStream();
                     if (fallbackPollingInterval) {
-                        clearInterval(fallbackPollingInterval);
+                        clearTimeout(fallbackPollingInterval);
                         fallbackPollingInterval = null;
                     }
                     
@@ -359,145 +370,217 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
-    // Iniciar polling para atualizações no modo fallback com tratamento de erros aprimorado
-    function startFallbackPolling() {
-        // Parar polling anterior se existir
-        if (fallbackPollingInterval) {
-            clearInterval(fallbackPollingInterval);
+    // Stream SSE: fases, votos, chat e ranking em uma única conexão HTTP
+    // (o navegador reconecta sozinho e retoma a partir do Last-Event-ID)
+    function startEventStream() {
+        if (!window.EventSource) {
+            startFallbackPolling();
+            return;
         }
         
-        // Resetar contador de erros
-        fallbackErrorCount = 0;
+        stopEventStream();
+        const streamUrl = quizRoomId ? `/api/rooms/${encodeURIComponent(quizRoomId)}/stream` : '/api/quiz/stream';
+        eventSource = new EventSource(streamUrl);
+        eventStreamErrors = 0;
         
-        // Verificar status inicial
-        checkQuizStatus();
+        // Os mesmos handlers dos eventos do Socket.IO
+        registerQuizEvents(function(event, handler) {
+            eventSource.addEventListener(event, function(e) {
+                handler(JSON.parse(e.data));
+            });
+        });
         
-        // Configurar polling a cada 3 segundos (aumentado para reduzir carga no servidor)
-        fallbackPollingInterval = setInterval(function() {
-            // Verificar se tivemos muitos erros consecutivos
-            if (fallbackErrorCount > 5) {
-                console.log('Muitos erros no modo fallback. Reduzindo frequência de polling...');
-                // Reduzir frequência de polling temporariamente
-                clearInterval(fallbackPollingInterval);
-                setTimeout(function() {
-                    // Reiniciar polling com frequência normal após pausa
-                    fallbackErrorCount = 0;
+        // Estado completo na primeira conexão ou quando eventos foram perdidos
+        eventSource.addEventListener('snapshot', function(e) {
+            applyStreamSnapshot(JSON.parse(e.data));
+        });
+        
+        eventSource.onopen = function() {
+            console.log('Stream de eventos conectado');
+            eventStreamErrors = 0;
+        };
+        
+        eventSource.onerror = function() {
+            eventStreamErrors++;
+            // Stream recusado (limite de conexões, servidor sem SSE) ou falhas seguidas: voltar ao polling
+            if (eventSource.readyState === EventSource.CLOSED || eventStreamErrors > 5) {
+                console.log('Stream de eventos indisponível. Usando polling HTTP.');
+                stopEventStream();
+                if (usingFallback) {
                     startFallbackPolling();
-                }, 10000);  // Pausa de 10 segundos
-                return;
+                }
             }
+        };
+    }
+    
+    // Fechar o stream SSE (ao voltar para o Socket.IO)
+    function stopEventStream() {
+        if (eventSource) {
+            eventSource.close();
+            eventSource = null;
+        }
+    }
+    
+    // Aplicar a fotografia do estado enviada pelo stream SSE
+    function applyStreamSnapshot(data) {
+        console.log('Estado do quiz recebido pelo stream:', data);
+        syncServerClock(data.server_time);
+        quizRunning = data.quiz_running;
+        updateUI();
+        
+        if (data.question) {
+            quizState.currentQuestion = data.question;
+            quizState.questionNumber = data.question_num;
+            quizState.totalQuestions = data.total_questions;
+            saveQuizState();
             
-            // Verificar status do quiz
-            checkQuizStatus();
-            
-            if (quizRunning) {
-                // Escalonar as requisições para não sobrecarregar o servidor
-                setTimeout(function() { getVotes(); }, 500);
-                setTimeout(function() { getChatMessages(); }, 1000);
+            if (data.phase.phase === 'question') {
+                hideResults();
+                showQuestion(data.question, data.question_num, data.total_questions);
+                if (!data.phase.paused) {
+                    startTimer(data.phase.remaining, data.phase.deadline);
+                }
             }
-        }, 3000);
+        }
+        
+        updateAllVotes(data.votes);
+        updateRanking(data.ranking);
         
-        // Carregar ranking a cada 10 segundos (aumentado para reduzir carga no servidor)
-        setInterval(function() {
-            if (fallbackErrorCount < 3) {  // Só atualizar ranking se não estiver tendo muitos erros
-                getRanking();
+        // Apenas as mensagens que ainda não estão na tela
+        (data.chat || []).forEach(msg => {
+            if (msg.seq > lastChatSeq) {
+                addChatMessage(msg.author, msg.message);
+                lastChatSeq = msg.seq;
+                lastChatTimestamp = msg.timestamp;
             }
-        }, 10000);
+        });
     }
     
-    // Verificar status do quiz via HTTP com tratamento de erro aprimorado
-    function checkQuizStatus() {
+    // Polling do estado no modo fallback: uma única requisição por ciclo a /api/quiz/state,
+    // que devolve apenas o que mudou desde o cursor e espera (long-poll) até haver novidade
+    function startFallbackPolling() {
+        // Parar polling anterior se existir
+        if (fallbackPollingInterval) {
+            clearTimeout(fallbackPollingInterval);
+        }
+        
+        // Resetar contador de erros
+        fallbackErrorCount = 0;
+        fallbackPollingInterval = true;  // Marca o polling como ativo até a próxima requisição ser agendada
+        statePollGeneration++;
+        pollQuizState(statePollGeneration);
+    }
+    
+    // Polling parado (ou reiniciado) enquanto a requisição estava pendente
+    function statePollStopped(generation) {
+        return !fallbackPollingInterval || generation !== statePollGeneration;
+    }
+    
+    function pollQuizState(generation) {
         const baseUrl = window.location.origin;
-        fetch(`${baseUrl}/api/quiz/status-http`)
+        const stateUrl = quizRoomId ? `/api/rooms/${encodeURIComponent(quizRoomId)}/state` : '/api/quiz/state';
+        const params = new URLSearchParams({ wait: STATE_POLL_WAIT });
+        if (stateVersion) {
+            params.set('since', stateVersion);
+        }
+        if (lastChatSeq > 0) {
+            params.set('chat_seq', lastChatSeq);
+        }
+        
+        fetch(`${baseUrl}${stateUrl}?${params}`, { cache: 'no-store' })
             .then(response => {
-                // Verificar se a resposta é válida antes de tentar processar como JSON
                 if (!response.ok) {
                     throw new Error(`Erro HTTP: ${response.status}`);
                 }
                 return response.json();
             })
             .then(data => {
-                if (data && data.success) {
-                    quizRunning = data.quiz_running;
-                    updateUI();
+                if (statePollStopped(generation)) {
+                    return;
                 }
+                fallbackErrorCount = 0;
+                applyStateDelta(data);
+                fallbackPollingInterval = setTimeout(pollQuizState, STATE_POLL_DELAY, generation);
             })
             .catch(error => {
-                console.error('Erro ao verificar status:', error);
-                // Tentar reconectar ao Socket.IO se o fallback também estiver falhando
-                if (fallbackErrorCount === undefined) fallbackErrorCount = 0;
+                console.error('Erro ao obter o estado do quiz:', error);
+                if (statePollStopped(generation)) {
+                    return;
+                }
                 fallbackErrorCount++;
                 
                 // Se tivermos muitos erros consecutivos no modo fallback, tentar voltar para Socket.IO
                 if (fallbackErrorCount > 3 && usingFallback) {
                     console.log('Múltiplos erros no modo fallback. Tentando voltar para Socket.IO...');
-                    // Limpar o polling do fallback
-                    if (fallbackPollingInterval) {
-                        clearInterval(fallbackPollingInterval);
-                        fallbackPollingInterval = null;
-                    }
-                    // Tentar reconectar via Socket.IO
+                    fallbackPollingInterval = null;
                     usingFallback = false;
                     connectSocket();
+                    return;
                 }
+                
+                // Esperar mais a cada erro antes de tentar de novo
+                fallbackPollingInterval = setTimeout(pollQuizState, 3000 * fallbackErrorCount, generation);
             });
     }
     
-    // Obter votos via HTTP com tratamento de erro aprimorado
-    function getVotes() {
-        // Se tivermos muitos erros, pular esta requisição
-        if (fallbackErrorCount > 3) {
-            console.log('Muitos erros recentes, pulando requisição de votos');
+    // Aplicar a diferença do estado recebida de /api/quiz/state com os mesmos
+    // handlers dos eventos do Socket.IO
+    function applyStateDelta(data) {
+        if (!data || !data.success) {
             return;
         }
-        
-        const baseUrl = window.location.origin;
-        fetch(`${baseUrl}/api/quiz/votes-http`)
-            .then(response => {
-                if (!response.ok) {
-                    fallbackErrorCount++;
-                    throw new Error(`Erro HTTP: ${response.status}`);
-                }
-                // Reset do contador de erros em caso de sucesso
-                fallbackErrorCount = 0;
-                return response.json();
-            })
-            .then(data => {
-                if (data && data.success) {
-                    updateAllVotes(data.votes);
-                }
-            })
-            .catch(error => {
-                console.error('Erro ao obter votos:', error);
-                fallbackErrorCount++;
-                
-                // Se tivermos muitos erros consecutivos, tentar voltar para Socket.IO
-                if (fallbackErrorCount > 5 && usingFallback) {
-                    console.log('Problemas persistentes com o modo fallback. Tentando voltar para Socket.IO...');
-                    usingFallback = false;
-                    connectSocket();
-                }
+        if (!stateHandlers) {
+            stateHandlers = {};
+            registerQuizEvents(function(event, handler) {
+                stateHandlers[event] = handler;
             });
-    }
-    
-    // Obter mensagens do chat via HTTP
-    function getChatMessages() {
-        const baseUrl = window.location.origin;
-        fetch(`${baseUrl}/api/quiz/chat-http?since=${lastChatTimestamp}`)
-            .then(response => response.json())
-            .then(data => {
-                if (data.success && data.messages && data.messages.length > 0) {
-                    data.messages.forEach(msg => {
-                        addChatMessage(msg.author, msg.message);
-                        
-                        // Atualizar o timestamp da última mensagem
-                        if (msg.timestamp > lastChatTimestamp) {
-                            lastChatTimestamp = msg.timestamp;
-                        }
-                    });
-                }
-            })
-            .catch(error => console.error('Erro ao obter mensagens do chat:', error));
+        }
+        stateVersion = data.version;
+        syncServerClock(data.server_time);
+        
+        // Com o Socket.IO conectado as fases já chegam pelos eventos; o polling só completa votos, chat e ranking
+        const followPhases = !(socket && socket.connected);
+        const phase = data.phase;
+        
+        if (data.quiz_running !== undefined) {
+            quizRunning = data.quiz_running;
+            updateUI();
+        }
+        
+        if (followPhases && data.question && (data.full || data.question_num !== quizState.questionNumber)) {
+            quizState.currentQuestion = data.question;
+            quizState.questionNumber = data.question_num;
+            quizState.totalQuestions = data.total_questions;
+            saveQuizState();
+            if (phase && phase.phase === 'question') {
+                hideResults();
+                showQuestion(data.question, data.question_num, data.total_questions);
+                startTimer(phase.remaining, phase.deadline);
+            }
+        } else if (followPhases && phase) {
+            if (phase.phase === 'counting' && !phase.paused) {
+                stateHandlers.show_counting_votes({ time: Math.ceil(phase.remaining || 0) });
+            } else if (phase.phase === 'results' && data.results) {
+                stateHandlers.show_results(data.results);
+            } else {
+                stateHandlers.quiz_phase(phase);
+            }
+        }
+        
+        if (data.votes) {
+            stateHandlers.update_votes({ votes: data.votes });
+        }
+        
+        // Apenas as mensagens que ainda não estão na tela
+        (data.chat || []).forEach(msg => {
+            if (msg.seq > lastChatSeq) {
+                stateHandlers.chat_message(msg);
+            }
+        });
+        
+        if (data.ranking) {
+            updateRanking(data.ranking);
+        }
     }
     
     // Obter ranking via HTTP
@@ -547,6 +630,11 @@ document.addEventListener('DOMContentLoaded', function() {
             socketConnected = true;
             reconnectAttempts = 0; // Resetar tentativas de reconexão
             
+            // Entrar (ou voltar, após reconexão) na sala de quiz escolhida
+            if (quizRoomId) {
+                socket.emit('join_quiz_room', { room_id: quizRoomId });
+            }
+            
             // Remover notificação de fallback se existir
             const fallbackNotice = document.getElementById('fallbackNotice');
             if (fallbackNotice) {
@@ -559,8 +647,9 @@ document.addEventListener('DOMContentLoaded', function() {
             // Se estava usando fallback, desativar
             if (usingFallback) {
                 usingFallback = false;
+                stopEventStream();
                 if (fallbackPollingInterval) {
-                    clearInterval(fallbackPollingInterval);
+                    clearTimeout(fallbackPollingInterval);
                     fallbackPollingInterval = null;
                 }
                 console.log('Modo fallback desativado. Usando Socket.IO.');
@@ -717,14 +806,101 @@ document.addEventListener('DOMContentLoaded', function() {
             updateTimer(data.time);
         });
         
+        // Eventos do quiz (os mesmos recebidos pelo stream SSE)
+        registerQuizEvents(function(event, handler) {
+            socket.on(event, handler);
+        });
+        
+        // Variável para controlar a frequência de keep-alives
+        let lastKeepAliveResponse = 0;
+        let lastPingSent = 0;
+        const KEEP_ALIVE_THROTTLE = 2000; // Limitar a 1 resposta a cada 2 segundos
+        const PING_THROTTLE = 3000; // Limitar a 1 ping a cada 3 segundos
+        
+        // Evento de keep-alive durante a contabilização de votos e momentos críticos
+        socket.on('keep_alive', function(data) {
+            console.log('Keep-alive recebido:', data);
+            
+            // Resetar contador de tentativas de reconexão
+            reconnectAttempts = 0;
+            
+            // Verificar se já enviamos uma resposta recentemente para evitar flood
+            const now = Date.now();
+            if (now - lastKeepAliveResponse > KEEP_ALIVE_THROTTLE) {
+                // Responder ao keep-alive para manter a conexão ativa nos dois sentidos
+                if (socket && socket.connected) {
+                    socket.emit('keep_alive_response', {
+                        timestamp: now,
+                        questionNumber: quizState.questionNumber,
+                        clientId: socket.id
+                    });
+                    lastKeepAliveResponse = now;
+                }
+            }
+            
+            // Verificar se estamos na terceira pergunta ou em outro momento crítico
+            // E se já enviamos um ping recentemente para evitar flood
+            if ((quizState.questionNumber === 3 || data.critical === true) && 
+                (now - lastPingSent > PING_THROTTLE)) {
+                console.log('Keep-alive em momento crítico - ativando fallback HTTP');
+                
+                // Ativar fallback HTTP para manter a conexão ativa
+                if (socket && socket.connected) {
+                    try {
+                        fetch('/api/quiz/keep-alive-http', {
+                            method: 'POST',
+                            headers: {
+                                'Content-Type': 'application/json'
+                            },
+                            body: JSON.stringify({
+                                timestamp: now,
+                                questionNumber: quizState.questionNumber,
+                                clientId: socket.id
+                            })
+                        })
+                        .then(response => response.json())
+                        .then(data => {
+                            console.log('Resposta ao keep-alive HTTP:', data);
+                            if (data.success) {
+                                lastKeepAliveResponse = now;
+                            } else {
+                                console.error('Erro ao enviar keep-alive HTTP:', data.message);
+                            }
+                        })
+                        .catch(error => {
+                            console.error('Erro ao enviar keep-alive HTTP:', error);
+                        });
+                    } catch (e) {
+                        console.error('Erro ao enviar keep-alive HTTP:', e);
+                    }
+                }
+            }
+            if (window.location.search.includes('debug=true')) {
+                console.log('Keep-alive recebido:', data);
+            }
+            
+            // Resetar contador de erros de conexão quando recebe um keep-alive
+            fallbackErrorCount = 0;
+        });
+        
+        // Evento de erro
+        socket.on('error', function(data) {
+            console.error('Erro recebido:', data);
+            alert('Erro: ' + (data.message || 'Erro desconhecido'));
+        });
+    }
+
+    // Registrar os handlers dos eventos do quiz; on(evento, handler) é o socket.on
+    // do Socket.IO ou o registro no EventSource do stream SSE
+    function registerQuizEvents(on) {
         // Atualizar ranking
-        socket.on('update_ranking', function(data) {
+        on('update_ranking', function(data) {
             console.log('Ranking atualizado:', data);
             updateRanking(data.ranking);
         });
         
         // Adicionar listener para o evento ranking_update
-        socket.on('ranking_update', function(data) {
+        on('ranking_update', function(data) {
             console.log('Ranking recebido via ranking_update:', data);
             if (data && data.success && data.ranking) {
                 updateRanking(data.ranking);
@@ -732,7 +908,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         
         // Receber mensagem de chat
-        socket.on('chat_message', function(data) {
+        on('chat_message', function(data) {
             console.log('Mensagem de chat recebida:', data);
             addChatMessage(data.author, data.message);
             
@@ -740,10 +916,13 @@ document.addEventListener('DOMContentLoaded', function() {
             if (data.timestamp) {
                 lastChatTimestamp = data.timestamp;
             }
+            if (data.seq) {
+                lastChatSeq = data.seq;
+            }
         });
         
         // Atualizar votos
-        socket.on('update_votes', function(data) {
+        on('update_votes', function(data) {
             console.log('Votos atualizados:', data);
             
             // Verificar se os dados são válidos
@@ -784,7 +963,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
         
         // Evento de contabilização de votos
-        socket.on('show_counting_votes', function(data) {
+        on('show_counting_votes', function(data) {
             console.log('Contabilizando votos:', data);
             showCountingVotes(data.time);
             
@@ -792,80 +971,27 @@ document.addEventListener('DOMContentLoaded', function() {
             fallbackErrorCount = 0;
         });
         
-        // Variável para controlar a frequência de keep-alives
-        let lastKeepAliveResponse = 0;
-        let lastPingSent = 0;
-        const KEEP_ALIVE_THROTTLE = 2000; // Limitar a 1 resposta a cada 2 segundos
-        const PING_THROTTLE = 3000; // Limitar a 1 ping a cada 3 segundos
-        
-        // Evento de keep-alive durante a contabilização de votos e momentos críticos
-        socket.on('keep_alive', function(data) {
-            console.log('Keep-alive recebido:', data);
-            
-            // Resetar contador de tentativas de reconexão
-            reconnectAttempts = 0;
+        // Pausa, retomada e parada do quiz (prazo da fase atual)
+        on('quiz_phase', function(data) {
+            console.log('Estado da fase do quiz:', data);
+            syncServerClock(data.server_time);
             
-            // Verificar se já enviamos uma resposta recentemente para evitar flood
-            const now = Date.now();
-            if (now - lastKeepAliveResponse > KEEP_ALIVE_THROTTLE) {
-                // Responder ao keep-alive para manter a conexão ativa nos dois sentidos
-                if (socket && socket.connected) {
-                    socket.emit('keep_alive_response', {
-                        timestamp: now,
-                        questionNumber: quizState.questionNumber,
-                        clientId: socket.id
-                    });
-                    lastKeepAliveResponse = now;
+            if (data.paused || data.phase === 'idle') {
+                // Congelar o timer enquanto o quiz estiver pausado ou parado
+                if (countdownInterval) {
+                    clearInterval(countdownInterval);
+                    countdownInterval = null;
                 }
-            }
-            
-            // Verificar se estamos na terceira pergunta ou em outro momento crítico
-            // E se já enviamos um ping recentemente para evitar flood
-            if ((quizState.questionNumber === 3 || data.critical === true) && 
-                (now - lastPingSent > PING_THROTTLE)) {
-                console.log('Keep-alive em momento crítico - ativando fallback HTTP');
-                
-                // Ativar fallback HTTP para manter a conexão ativa
-                if (socket && socket.connected) {
-                    try {
-                        fetch('/api/quiz/keep-alive-http', {
-                            method: 'POST',
-                            headers: {
-                                'Content-Type': 'application/json'
-                            },
-                            body: JSON.stringify({
-                                timestamp: now,
-                                questionNumber: quizState.questionNumber,
-                                clientId: socket.id
-                            })
-                        })
-                        .then(response => response.json())
-                        .then(data => {
-                            console.log('Resposta ao keep-alive HTTP:', data);
-                            if (data.success) {
-                                lastKeepAliveResponse = now;
-                            } else {
-                                console.error('Erro ao enviar keep-alive HTTP:', data.message);
-                            }
-                        })
-                        .catch(error => {
-                            console.error('Erro ao enviar keep-alive HTTP:', error);
-                        });
-                    } catch (e) {
-                        console.error('Erro ao enviar keep-alive HTTP:', e);
-                    }
+                if (data.paused && data.phase === 'question' && data.remaining !== null) {
+                    updateTimer(Math.ceil(data.remaining));
                 }
+            } else if (data.phase === 'question' && data.deadline) {
+                startTimer(data.remaining, data.deadline);
             }
-            if (window.location.search.includes('debug=true')) {
-                console.log('Keep-alive recebido:', data);
-            }
-            
-            // Resetar contador de erros de conexão quando recebe um keep-alive
-            fallbackErrorCount = 0;
         });
         
         // Exibir resultados
-        socket.on('show_results', function(data) {
+        on('show_results', function(data) {
             console.log('Exibindo resultados:', data);
             
             // Resetar contador de erros de conexão
@@ -886,7 +1012,7 @@ document.addEventListener('DOMContentLoaded', function() {
         });
 
         // Próxima pergunta
-        socket.on('next_question', function(data) {
+        on('next_question', function(data) {
             console.log('Próxima pergunta:', data);
             
             // Resetar contador de erros de conexão
@@ -901,7 +1027,8 @@ document.addEventListener('DOMContentLoaded', function() {
             
             hideResults();
             showQuestion(data.question, data.question_num, data.total_questions);
-            startTimer(data.answer_time);
+            syncServerClock(data.server_time);
+            startTimer(data.answer_time, data.deadline);
             
             // Se estamos chegando na terceira pergunta (momento crítico), enviar ping adicional
             if (data.question_num === 3) {
@@ -926,8 +1053,11 @@ document.addEventListener('DOMContentLoaded', function() {
                 }, 3000); // Aumentar o intervalo para reduzir a frequência
                 
                 // Ativar o modo de fallback HTTP para garantir a continuidade
-                console.log('Ativando modo de fallback HTTP para a terceira pergunta');
-                startFallbackPolling();
+                // (desnecessário se os eventos já chegam pelo stream SSE)
+                if (!eventSource) {
+                    console.log('Ativando modo de fallback HTTP para a terceira pergunta');
+                    startFallbackPolling();
+                }
                 
                 // NÃO realizar a reconexão preventiva que estava causando problemas
                 // Apenas salvar o estado para garantir a recuperação se necessário
@@ -935,12 +1065,6 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log('Estado do quiz salvo para recuperação se necessário');
             }
         });
-        
-        // Evento de erro
-        socket.on('error', function(data) {
-            console.error('Erro recebido:', data);
-            alert('Erro: ' + (data.message || 'Erro desconhecido'));
-        });
     }
 
     // Carregar ranking
@@ -1035,8 +1159,23 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Iniciar o timer
-    function startTimer(seconds) {
+    // Diferença entre o relógio do servidor e o do navegador (ms)
+    let serverClockOffset = 0;
+    
+    // Atualizar a diferença de relógio a partir do horário enviado pelo servidor
+    function syncServerClock(serverTime) {
+        if (serverTime) {
+            serverClockOffset = serverTime - Date.now();
+        }
+    }
+    
+    // Segundos restantes até um prazo absoluto do servidor (ms de época)
+    function secondsUntil(deadline) {
+        return Math.max(0, Math.ceil((deadline - (Date.now() + serverClockOffset)) / 1000));
+    }
+
+    // Iniciar o timer (com prazo do servidor, a contagem é recalculada a cada tick e não acumula atraso)
+    function startTimer(seconds, deadline) {
         console.log('Iniciando timer com ' + seconds + ' segundos');
         
         // Parar timer anterior se existir
@@ -1045,19 +1184,21 @@ document.addEventListener('DOMContentLoaded', function() {
             countdownInterval = null;
         }
         
-        // Verificar se o valor de seconds é válido
-        if (!seconds || isNaN(seconds) || seconds <= 0) {
+        if (deadline) {
+            seconds = secondsUntil(deadline);
+        } else if (!seconds || isNaN(seconds) || seconds <= 0) {
+            // Verificar se o valor de seconds é válido
             console.error('Valor inválido para timer:', seconds);
             seconds = 30; // Valor padrão em caso de erro
         }
         
         // Definir tempo inicial
-        currentTime = parseInt(seconds);
+        currentTime = Math.ceil(seconds);
         updateTimer(currentTime);
         
         // Iniciar contagem regressiva
         countdownInterval = setInterval(function() {
-            currentTime--;
+            currentTime = deadline ? secondsUntil(deadline) : currentTime - 1;
             updateTimer(currentTime);
             console.log('Timer: ' + currentTime + ' segundos restantes');
             
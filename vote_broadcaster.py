@@ -0,0 +1,99 @@
+"""
+Transmissão agregada da contagem de votos.
+
+Cada voto apenas marca a contagem como "suja"; uma thread única envia o
+estado atual no máximo uma vez por intervalo (tick). Nas mudanças de fase
+(contabilização e resultados) o envio é feito imediatamente com flush().
+Assim o custo no servidor depende da frequência dos ticks e não da
+quantidade de votos.
+"""
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class VoteBroadcaster:
+    """Agrega atualizações de votos e as envia em intervalos fixos."""
+
+    def __init__(self, emit_fn, interval=0.2, name='vote-broadcaster'):
+        # emit_fn() deve ler a contagem atual e enviá-la aos clientes
+        self.emit_fn = emit_fn
+        self.interval = max(0.01, float(interval))
+        self.name = name
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._emit_lock = threading.Lock()
+        self._thread = None
+        self._last_emit = 0.0
+
+        # Contadores
+        self.marks = 0
+        self.broadcasts = 0
+        self.flushes = 0
+
+    def start(self):
+        """Inicia a thread de transmissão (idempotente)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name)
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info(f"Transmissão de votos iniciada (intervalo de {int(self.interval * 1000)}ms)")
+
+    def stop(self, timeout=1.0):
+        """Para a thread de transmissão."""
+        self._stop.set()
+        self._dirty.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def mark_dirty(self):
+        """Sinaliza que a contagem mudou; o envio ocorre no próximo tick."""
+        self.marks += 1
+        self._dirty.set()
+
+    def flush(self):
+        """Envia a contagem imediatamente (usado nas mudanças de fase)."""
+        self._dirty.clear()
+        self._emit()
+        self.flushes += 1
+
+    def _emit(self):
+        with self._emit_lock:
+            try:
+                self.emit_fn()
+                self.broadcasts += 1
+            except Exception as e:
+                logger.error(f"Erro ao transmitir votos: {e}")
+            finally:
+                self._last_emit = time.monotonic()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._dirty.wait()
+            if self._stop.is_set():
+                break
+
+            # Respeitar o intervalo mínimo desde o último envio
+            remaining = self._last_emit + self.interval - time.monotonic()
+            if remaining > 0 and self._stop.wait(remaining):
+                break
+
+            # Um flush pode ter enviado o estado enquanto esperávamos
+            if not self._dirty.is_set():
+                continue
+            self._dirty.clear()
+            self._emit()
+
+    def stats(self):
+        """Retorna os contadores da transmissão."""
+        return {
+            'interval_ms': int(self.interval * 1000),
+            'marks': self.marks,
+            'broadcasts': self.broadcasts,
+            'flushes': self.flushes
+        }
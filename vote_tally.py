@@ -0,0 +1,128 @@
+"""
+Contagem de votos compartilhada por app.py e app_render.py.
+
+Mantém um contador por opção e um mapa usuário -> opção. Cada voto é
+registrado em O(1) sob um lock, inclusive a troca de voto (decrementa a
+opção antiga e incrementa a nova), de modo que a soma dos contadores é
+sempre igual ao número de usuários que votaram e o ranking pontua
+exatamente o que o gráfico mostra.
+
+Políticas de troca de voto:
+- 'last': vale o último voto do usuário;
+- 'first': vale o primeiro voto, trocas são ignoradas;
+- 'lock': trocas são aceitas até lock_after segundos após o início da
+  pergunta; depois disso o voto de quem já votou fica travado.
+"""
+import threading
+import time
+
+VOTE_POLICIES = ('last', 'first', 'lock')
+
+OPTION_LETTERS = 'ABCDEFGH'
+
+
+def letter_to_index(letter):
+    """Converte uma letra (A, B, ...) no índice da opção (0, 1, ...)."""
+    return ord(letter.upper()) - ord('A')
+
+
+def index_to_letter(index):
+    """Converte o índice da opção na letra correspondente."""
+    return OPTION_LETTERS[index]
+
+
+class VoteTally:
+    """Contagem de votos thread-safe com semântica de troca de voto configurável."""
+
+    def __init__(self, num_options=4, policy='last', lock_after=0):
+        self._lock = threading.Lock()
+        self.policy = 'last'
+        self.lock_after = 0
+        self.configure(policy, lock_after)
+        self._counts = [0] * num_options
+        self._user_votes = {}
+        self._started_at = time.monotonic()
+
+    def configure(self, policy='last', lock_after=0):
+        """Define a política de troca de voto."""
+        if policy not in VOTE_POLICIES:
+            raise ValueError(f"Política de votação inválida: {policy}")
+        with self._lock:
+            self.policy = policy
+            self.lock_after = max(0, float(lock_after or 0))
+
+    def reset(self, num_options=None):
+        """Zera a contagem para uma nova pergunta."""
+        with self._lock:
+            if num_options is None:
+                num_options = len(self._counts)
+            self._counts = [0] * num_options
+            self._user_votes = {}
+            self._started_at = time.monotonic()
+
+    def vote(self, user, option):
+        """
+        Registra o voto de um usuário na opção (índice).
+
+        Retorna True se a contagem mudou e False se o voto foi ignorado
+        (opção inválida, voto repetido ou troca não permitida pela política).
+        """
+        with self._lock:
+            if not 0 <= option < len(self._counts):
+                return False
+
+            previous = self._user_votes.get(user)
+            if previous is None:
+                self._user_votes[user] = option
+                self._counts[option] += 1
+                return True
+
+            if previous == option or self.policy == 'first':
+                return False
+            if self.policy == 'lock' and time.monotonic() - self._started_at > self.lock_after:
+                return False
+
+            # Troca de voto atômica
+            self._counts[previous] -= 1
+            self._counts[option] += 1
+            self._user_votes[user] = option
+            return True
+
+    def vote_letter(self, user, letter):
+        """Registra um voto informado como letra (A, B, C, D)."""
+        return self.vote(user, letter_to_index(letter))
+
+    def counts(self):
+        """Cópia dos contadores por opção."""
+        with self._lock:
+            return list(self._counts)
+
+    def counts_by_letter(self):
+        """Contadores no formato {'A': n, 'B': n, ...}."""
+        with self._lock:
+            return {OPTION_LETTERS[i]: count for i, count in enumerate(self._counts)}
+
+    def user_votes(self):
+        """Cópia do mapa usuário -> índice da opção."""
+        with self._lock:
+            return dict(self._user_votes)
+
+    def user_letters(self):
+        """Cópia do mapa usuário -> letra da opção."""
+        with self._lock:
+            return {user: OPTION_LETTERS[option] for user, option in self._user_votes.items()}
+
+    def get(self, user):
+        """Índice da opção votada pelo usuário, ou None."""
+        with self._lock:
+            return self._user_votes.get(user)
+
+    def total(self):
+        """Número de usuários que votaram."""
+        with self._lock:
+            return len(self._user_votes)
+
+    def has_voted(self, user):
+        """Indica se o usuário já votou na pergunta atual."""
+        with self._lock:
+            return user in self._user_votes